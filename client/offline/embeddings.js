@@ -4,8 +4,33 @@ import { reqToPromise, txDone } from './idb.js';
 let embeddingCache = null;
 let embeddingCacheLoadedAt = 0;
 
+function halfToFloat(h) {
+  const sign = h & 0x8000 ? -1 : 1;
+  const exp = (h >> 10) & 0x1f;
+  const frac = h & 0x3ff;
+  if (exp === 0) return sign * 2 ** -14 * (frac / 1024);
+  if (exp === 0x1f) return frac ? NaN : sign * Infinity;
+  return sign * 2 ** (exp - 15) * (1 + frac / 1024);
+}
+
+// Сервер может отдавать векторы упакованными (format=f32-b64 / f16-b64): little-endian float32/float16 в base64.
+export function decodePackedEmbedding(b64, encoding = 'f32-b64') {
+  const bin = atob(String(b64 || ''));
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i += 1) bytes[i] = bin.charCodeAt(i);
+  const view = new DataView(bytes.buffer);
+  if (encoding === 'f16-b64') {
+    const out = new Float32Array(bytes.length / 2);
+    for (let i = 0; i < out.length; i += 1) out[i] = halfToFloat(view.getUint16(i * 2, true));
+    return out;
+  }
+  const out = new Float32Array(bytes.length / 4);
+  for (let i = 0; i < out.length; i += 1) out[i] = view.getFloat32(i * 4, true);
+  return out;
+}
+
 function normalizeEmbedding(vec) {
-  const arr = Array.isArray(vec) ? vec : [];
+  const arr = Array.isArray(vec) || ArrayBuffer.isView(vec) ? vec : [];
   const out = new Float32Array(arr.length);
   let sum = 0;
   for (let i = 0; i < arr.length; i += 1) {
@@ -25,7 +50,7 @@ export function invalidateEmbeddingsCache() {
   embeddingCacheLoadedAt = 0;
 }
 
-export async function upsertArticleEmbeddings(articleId, embeddings) {
+export async function upsertArticleEmbeddings(articleId, embeddings, encoding = null) {
   if (!articleId) return;
   const db = await getOfflineDbReady();
   const items = Array.isArray(embeddings) ? embeddings : [];
@@ -34,8 +59,8 @@ export async function upsertArticleEmbeddings(articleId, embeddings) {
   for (const item of items) {
     const sectionId = String(item?.blockId || item?.sectionId || '');
     const updatedAt = String(item?.updatedAt || '') || null;
-    const vec = item?.embedding;
-    if (!sectionId || !Array.isArray(vec) || !vec.length) continue;
+    const vec = encoding ? decodePackedEmbedding(item?.embedding, encoding) : item?.embedding;
+    if (!sectionId || !(Array.isArray(vec) || ArrayBuffer.isView(vec)) || !vec.length) continue;
     const normalized = normalizeEmbedding(vec);
     await reqToPromise(
       store.put({
@@ -50,6 +75,42 @@ export async function upsertArticleEmbeddings(articleId, embeddings) {
   invalidateEmbeddingsCache();
 }
 
+// Полная замена embeddings статьи (лента /api/sync/changes, replace=true): секции могли исчезнуть.
+export async function replaceArticleEmbeddings(articleId, embeddings, encoding = null) {
+  if (!articleId) return;
+  const db = await getOfflineDbReady();
+  const tx = db.transaction(['section_embeddings'], 'readwrite');
+  const store = tx.objectStore('section_embeddings');
+  const keys = (await reqToPromise(store.index('byArticleId').getAllKeys(String(articleId))).catch(() => [])) || [];
+  for (const key of keys) {
+    await reqToPromise(store.delete(key));
+  }
+  await txDone(tx);
+  await upsertArticleEmbeddings(articleId, embeddings, encoding);
+}
+
+// Вектор заголовка статьи (titleEmbedding из /embeddings и ленты /api/sync/changes); null — вектора нет.
+export async function upsertArticleTitleEmbedding(articleId, item, encoding = null) {
+  if (!articleId) return;
+  const db = await getOfflineDbReady();
+  const tx = db.transaction(['article_title_embeddings'], 'readwrite');
+  const store = tx.objectStore('article_title_embeddings');
+  const vec = item ? (encoding ? decodePackedEmbedding(item.embedding, encoding) : item.embedding) : null;
+  if ((Array.isArray(vec) || ArrayBuffer.isView(vec)) && vec.length) {
+    await reqToPromise(
+      store.put({
+        articleId: String(articleId),
+        updatedAt: String(item?.updatedAt || '') || null,
+        vec: normalizeEmbedding(vec),
+      }),
+    );
+  } else {
+    await reqToPromise(store.delete(String(articleId)));
+  }
+  await txDone(tx);
+  invalidateEmbeddingsCache();
+}
+
 export async function deleteSectionEmbeddings(sectionIds) {
   const ids = (sectionIds || []).map((x) => String(x || '')).filter(Boolean);
   if (!ids.length) return;
@@ -72,26 +133,37 @@ export async function countLocalEmbeddings() {
   return Number(n || 0);
 }
 
+function storedVector(raw) {
+  if (!raw) return null;
+  let vec = null;
+  if (raw instanceof Float32Array) vec = raw;
+  else if (raw instanceof ArrayBuffer) vec = new Float32Array(raw);
+  else if (Array.isArray(raw)) vec = normalizeEmbedding(raw);
+  return vec && vec.length ? vec : null;
+}
+
 export async function loadEmbeddingsCache() {
   if (embeddingCache) return embeddingCache;
   const db = await getOfflineDbReady();
-  const tx = db.transaction(['section_embeddings'], 'readonly');
-  const store = tx.objectStore('section_embeddings');
-  const rows = (await reqToPromise(store.getAll()).catch(() => [])) || [];
+  const tx = db.transaction(['section_embeddings', 'article_title_embeddings'], 'readonly');
+  const rows = (await reqToPromise(tx.objectStore('section_embeddings').getAll()).catch(() => [])) || [];
+  const titleRows =
+    (await reqToPromise(tx.objectStore('article_title_embeddings').getAll()).catch(() => [])) || [];
   await txDone(tx);
 
+  const titleVecByArticle = new Map();
+  for (const row of titleRows) {
+    const vec = storedVector(row?.vec);
+    if (row?.articleId && vec) titleVecByArticle.set(String(row.articleId), vec);
+  }
+
   const cache = [];
   for (const row of rows) {
     const sectionId = String(row?.sectionId || '');
     const articleId = String(row?.articleId || '');
-    const raw = row?.vec;
-    if (!sectionId || !articleId || !raw) continue;
-    let vec = null;
-    if (raw instanceof Float32Array) vec = raw;
-    else if (raw instanceof ArrayBuffer) vec = new Float32Array(raw);
-    else if (Array.isArray(raw)) vec = normalizeEmbedding(raw);
-    if (!vec || !vec.length) continue;
-    cache.push({ sectionId, articleId, vec });
+    const vec = storedVector(row?.vec);
+    if (!sectionId || !articleId || !vec) continue;
+    cache.push({ sectionId, articleId, vec, titleVec: titleVecByArticle.get(articleId) || null });
   }
   embeddingCache = cache;
   embeddingCacheLoadedAt = Date.now();
@@ -33,7 +33,7 @@ function dbNameForUser(userKey) {
   return `memus_offline_v1_${sanitizeKey(userKey)}`;
 }
 
-const DB_VERSION = 4;
+const DB_VERSION = 5;
 
 const KNOWN_USER_KEYS_KEY = 'ttree_offline_known_user_keys_v1';
 
@@ -91,6 +91,11 @@ export async function openOfflineIdb({ userKey } = {}) {
       store.createIndex('byUpdatedAt', 'updatedAt', { unique: false });
     }
 
+    // Вектор заголовка статьи: офлайн-ранжирование смешивает его близость с близостью секции.
+    if (!db.objectStoreNames.contains('article_title_embeddings')) {
+      db.createObjectStore('article_title_embeddings', { keyPath: 'articleId' });
+    }
+
     if (!db.objectStoreNames.contains('media_assets')) {
       const store = db.createObjectStore('media_assets', { keyPath: 'url' });
       store.createIndex('byStatus', 'status', { unique: false });
@@ -33,7 +33,8 @@ async function fetchQueryEmbedding(query) {
   const data = await res.json().catch(() => null);
   const vec = data?.embedding;
   if (!Array.isArray(vec) || !vec.length) return null;
-  return normalizeEmbedding(vec);
+  const titleWeight = Math.min(1, Math.max(0, Number(data?.titleWeight) || 0));
+  return { vec: normalizeEmbedding(vec), titleWeight };
 }
 
 async function fetchBlocksBySectionIds(sectionIds) {
@@ -80,8 +81,9 @@ export async function localSemanticSearch(query, { limit = 30 } = {}) {
   const count = await countLocalEmbeddings().catch(() => 0);
   if (!count) return null;
 
-  const qVec = await fetchQueryEmbedding(q);
-  if (!qVec) return null;
+  const queryEmbedding = await fetchQueryEmbedding(q);
+  if (!queryEmbedding) return null;
+  const { vec: qVec, titleWeight } = queryEmbedding;
 
   const embRows = await loadEmbeddingsCache();
   if (!embRows.length) return null;
@@ -90,7 +92,10 @@ export async function localSemanticSearch(query, { limit = 30 } = {}) {
   const k = Math.max(1, Math.min(Number(limit) || 30, 50));
   const top = [];
   for (const row of embRows) {
-    const score = dot(qVec, row.vec);
+    // Как на сервере: (1 - w) * близость секции + w * близость заголовка; нет вектора заголовка — берём секцию.
+    const sectionScore = dot(qVec, row.vec);
+    const titleScore = row.titleVec ? dot(qVec, row.titleVec) : sectionScore;
+    const score = (1 - titleWeight) * sectionScore + titleWeight * titleScore;
     if (!Number.isFinite(score)) continue;
     if (top.length < k) {
       top.push({ sectionId: row.sectionId, score });
@@ -5,18 +5,25 @@ import {
   getCachedArticle,
   getCachedArticlesIndex,
   getCachedArticlesSyncMeta,
+  markCachedArticleDeleted,
   touchCachedArticleUpdatedAt,
   touchCachedArticleOutlineStructureRev,
   updateCachedDocJson,
 } from './cache.js';
 import { enqueueOp, listOutbox, markOutboxError, removeOutboxOp } from './outbox.js';
-import { deleteSectionEmbeddings, upsertArticleEmbeddings } from './embeddings.js';
+import {
+  deleteSectionEmbeddings,
+  replaceArticleEmbeddings,
+  upsertArticleEmbeddings,
+  upsertArticleTitleEmbedding,
+} from './embeddings.js';
 import { startMediaPrefetchLoop, pruneUnusedMedia, updateMediaRefsForArticle } from './media.js';
 import { deleteOutlineSections, fetchArticlesIndex } from '../api.js';
 import { removePendingQuickNoteBySectionId } from '../quickNotes/pending.js';
 import { revertLog, docJsonHash } from '../debug/revertLog.js';
 
 const OUTLINE_QUEUE_KEY = 'ttree_outline_autosave_queue_docjson_v1';
+const SYNC_CHANGES_CURSOR_KEY = 'ttree_sync_changes_cursor_v1';
 
 function clearQueuedDocJsonIfNotNewer(articleId, clientQueuedAt = null) {
   try {
@@ -455,9 +462,9 @@ async function flushOp(op) {
       if (removed.length) await deleteSectionEmbeddings(removed);
       if (changed.length) {
         const resp = await rawApiRequest(
-          `/api/articles/${encodeURIComponent(op.articleId)}/embeddings?ids=${encodeURIComponent(changed.join(','))}`,
+          `/api/articles/${encodeURIComponent(op.articleId)}/embeddings?format=f32-b64&ids=${encodeURIComponent(changed.join(','))}`,
         );
-        await upsertArticleEmbeddings(op.articleId, resp?.embeddings || []);
+        await upsertArticleEmbeddings(op.articleId, resp?.embeddings || [], resp?.encoding || null);
       }
     } catch {
       // ignore embeddings refresh failures
@@ -1169,6 +1176,80 @@ export function startSyncLoop() {
     .catch(() => {});
 }
 
+async function applySyncChangesRecord(record) {
+  if (!record || typeof record !== 'object') return;
+  if (record.type === 'deleted') {
+    await markCachedArticleDeleted(record.articleId, record.deletedAt);
+    return;
+  }
+  if (record.type === 'article') {
+    if (record.docJsonChanged) {
+      await cacheArticle(record);
+    } else {
+      // Содержимое не менялось — обновляем только метаданные, сохранённый docJson не трогаем.
+      await cacheArticlesIndex([record]);
+    }
+    return;
+  }
+  if (record.type === 'embeddings') {
+    const encoding = record.encoding || null;
+    if (record.replace) await replaceArticleEmbeddings(record.articleId, record.embeddings || [], encoding);
+    else await upsertArticleEmbeddings(record.articleId, record.embeddings || [], encoding);
+    if ('titleEmbedding' in record) await upsertArticleTitleEmbedding(record.articleId, record.titleEmbedding, encoding);
+  }
+}
+
+// Дельта-синхронизация: GET /api/sync/changes?cursor=... отдаёт NDJSON (одна запись на строку),
+// последняя строка — {type: 'cursor', cursor, hasMore}. Курсор сохраняем только после применения страницы.
+async function pullSyncChangesFeed(onProgress) {
+  let cursor = '';
+  try {
+    cursor = window.localStorage.getItem(SYNC_CHANGES_CURSOR_KEY) || '';
+  } catch {
+    cursor = '';
+  }
+  for (;;) {
+    const qs = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`/api/sync/changes?format=f32-b64${qs}`, { credentials: 'include' });
+    if (!response.ok || !response.body) {
+      const err = new Error(`sync changes failed: ${response.status}`);
+      err.status = response.status;
+      throw err;
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let tail = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      let nl = buffer.indexOf('\n');
+      while (nl >= 0) {
+        const line = buffer.slice(0, nl);
+        buffer = buffer.slice(nl + 1);
+        nl = buffer.indexOf('\n');
+        if (!line) continue;
+        const record = JSON.parse(line);
+        if (record.type === 'cursor') {
+          tail = record;
+          continue;
+        }
+        await applySyncChangesRecord(record);
+        if (record.type === 'article' || record.type === 'deleted') onProgress();
+      }
+      if (done) break;
+    }
+    if (!tail || !tail.cursor) throw new Error('sync changes: truncated response');
+    cursor = String(tail.cursor);
+    try {
+      window.localStorage.setItem(SYNC_CHANGES_CURSOR_KEY, cursor);
+    } catch {
+      // ignore
+    }
+    if (!tail.hasMore) return;
+  }
+}
+
 export function startBackgroundFullPull(options = {}) {
   const force = Boolean(options && options.force);
   if (fullPullRunning) return;
@@ -1200,6 +1281,25 @@ export function startBackgroundFullPull(options = {}) {
         emitFullPullStatus();
         return;
       }
+      try {
+        fullPullStatus = { ...fullPullStatus, phase: 'articles' };
+        emitFullPullStatus();
+        await pullSyncChangesFeed(() => {
+          fullPullStatus = { ...fullPullStatus, processed: Number(fullPullStatus.processed || 0) + 1 };
+          emitFullPullStatus();
+        });
+        pruneUnusedMedia().catch(() => {});
+        fullPullStatus = {
+          ...fullPullStatus,
+          running: false,
+          phase: 'done',
+          finishedAt: new Date().toISOString(),
+        };
+        emitFullPullStatus();
+        return;
+      } catch {
+        // Старый сервер без ленты или обрыв — откатываемся на постатейный pull ниже.
+      }
       let localMetaById = new Map();
       try {
         const localMeta = await getCachedArticlesSyncMeta();
@@ -1251,8 +1351,9 @@ export function startBackgroundFullPull(options = {}) {
           const article = await rawApiRequest(`/api/articles/${encodeURIComponent(row.id)}`);
           await cacheArticle(article);
           try {
-            const emb = await rawApiRequest(`/api/articles/${encodeURIComponent(row.id)}/embeddings`);
-            await upsertArticleEmbeddings(row.id, emb?.embeddings || []);
+            const emb = await rawApiRequest(`/api/articles/${encodeURIComponent(row.id)}/embeddings?format=f32-b64`);
+            await upsertArticleEmbeddings(row.id, emb?.embeddings || [], emb?.encoding || null);
+            await upsertArticleTitleEmbedding(row.id, emb?.titleEmbedding || null, emb?.encoding || null);
           } catch {
             // ignore embeddings pull
           }
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк лемматизации для FTS: старый путь (pymorphy2 на каждый токен + повторная токенизация
+для normalized) против text_utils.analyze() с LRU-кэшем лемм.
+
+Корпус — реальные тексты: по умолчанию docs/**/*.md репозитория, либо свои файлы/каталоги через --corpus
+(например, выгрузка статей). Секции — абзацы, разделённые пустой строкой.
+analyze() меряется дважды: cold — с пустым кэшем лемм (первая индексация), warm — повторный проход
+по тому же корпусу (переиндексация неизменённого словаря).
+
+Запуск: python scripts/bench_lemmatizer.py [--corpus path ...] [--rounds 1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from servpy.app.text_utils import MORPH, analyze, get_lemma_cache_stats, lemmatize_token, tokenize
+
+CORPUS_SUFFIXES = ('.md', '.txt', '.html')
+
+
+def load_sections(paths: list[Path]) -> list[str]:
+    files: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.is_file() and p.suffix.lower() in CORPUS_SUFFIXES))
+        else:
+            files.append(path)
+    sections: list[str] = []
+    for file in files:
+        text = file.read_text(encoding='utf-8', errors='ignore')
+        sections.extend(part.strip() for part in text.split('\n\n') if tokenize(part))
+    return sections
+
+
+def legacy_index(text: str) -> tuple[str, str]:
+    # Как было до кэша: build_lemma и build_normalized_tokens токенизируют текст независимо.
+    lemma = ' '.join(MORPH.parse(token)[0].normal_form for token in tokenize(text))
+    normalized = ' '.join(tokenize(text))
+    return lemma, normalized
+
+
+def cached_index(text: str) -> tuple[str, str]:
+    analysis = analyze(text)
+    return analysis.lemma, analysis.normalized
+
+
+def bench(name: str, fn, sections: list[str], rounds: int) -> float:
+    tokens = sum(len(tokenize(s)) for s in sections) * rounds
+    before = get_lemma_cache_stats()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in sections:
+            fn(text)
+    elapsed = time.perf_counter() - started
+    after = get_lemma_cache_stats()
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    print(f'{name:>13}: {elapsed:8.3f}s  {tokens / elapsed:12,.0f} tokens/s  cache hits={hits:,} misses={misses:,}')
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', type=Path, action='append', help='файл или каталог с текстами (можно несколько)')
+    parser.add_argument('--rounds', type=int, default=1)
+    args = parser.parse_args()
+
+    sections = load_sections(args.corpus or [ROOT / 'docs'])
+    if not sections:
+        raise SystemExit('пустой корпус')
+    words = [token for s in sections for token in tokenize(s)]
+    print(f'{len(sections):,} sections, {len(words):,} tokens, {len(set(words)):,} distinct')
+    assert all(legacy_index(s) == cached_index(s) for s in sections[:50])
+
+    legacy = bench('legacy', legacy_index, sections, args.rounds)
+    lemmatize_token.cache_clear()
+    cold = bench('analyze cold', cached_index, sections, 1)
+    warm = bench('analyze warm', cached_index, sections, args.rounds)
+    # legacy на 1 раунд — сравнимо с cold; warm — с повторными раундами legacy.
+    legacy_round = legacy / max(1, args.rounds)
+    print(f'speedup: cold {legacy_round / cold:.1f}x, warm {legacy / warm:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк полнотекстового поиска на синтетическом русском корпусе: старый построитель tsquery
+(все леммы/токены/5-символьные префиксы через OR с :*) против нового (AND по словам) и режима fuzzy
+(tsvector + pg_trgm). Печатает латентность страницы (LIMIT 30) и recall/precision по всем совпадениям.
+
+Нужна PostgreSQL с pg_trgm; данные пишутся во временную таблицу, но импорт data_store применяет
+миграции — указывайте тестовую БД:
+    SERVPY_DATABASE_URL=postgresql://... python scripts/bench_search_query.py [--sections 20000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from servpy.app.data_store import CONN, build_postgres_ts_query, build_trigram_search_term
+from servpy.app.text_utils import analyze
+
+# Лемма -> словоформы, которые встречаются в тексте.
+FORMS = {
+    'книга': ['книга', 'книги', 'книгу', 'книгой', 'книгами', 'книгах'],
+    'сервер': ['сервер', 'сервера', 'серверу', 'сервером', 'серверах'],
+    'встреча': ['встреча', 'встречи', 'встречу', 'встречей', 'встречах'],
+    'миграция': ['миграция', 'миграции', 'миграцию', 'миграцией'],
+    'документация': ['документация', 'документации', 'документацию'],
+    'привет': ['привет', 'приветы', 'приветом'],
+    'расшифровка': ['расшифровка', 'расшифровки', 'расшифровку', 'расшифровкой'],
+    'заметка': ['заметка', 'заметки', 'заметку', 'заметками', 'заметках'],
+}
+FILLER = """
+вчера на совещании обсуждали перенос в новый дата центр и план базы нужно проверить резервные копии
+обновить договориться о времени простоя с командой статьи в журнале пишутся каждый день короткие записи
+о прочитанных идеях после обеда разбирали входящие голосовые сообщения попадают в отдельные секции
+семантический поиск использует векторные представления а полнотекстовый леммы и префиксы слов когда
+документ большой каждое сохранение не должно пересчитывать индекс для неизменённых разделов ссылки
+между статьями строятся по заголовкам и телу секций вложенные разделы обрабатываются отдельно
+""".split()
+
+
+def legacy_ts_query(term: str) -> str:
+    # Прежний построитель: леммы + токены + 5-символьные префиксы, всё через OR с :*.
+    analysis = analyze(term)
+    tokens = list(analysis.tokens)
+    prefixes = [t[:5] for t in tokens if len(t) >= 5 and t[:5] not in tokens]
+    out: list[str] = []
+    for tok in list(analysis.lemma_tokens) + tokens + prefixes:
+        if tok and tok not in out:
+            out.append(tok)
+    return ' | '.join(f'{tok}:*' for tok in out)
+
+
+def typo(word: str, rnd: random.Random) -> str:
+    i = rnd.randint(1, len(word) - 3)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def build_corpus(count: int, seed: int) -> tuple[list[str], dict[str, set[str]]]:
+    rnd = random.Random(seed)
+    texts: list[str] = []
+    truth: dict[str, set[str]] = {lemma: set() for lemma in FORMS}
+    for i in range(count):
+        words = [rnd.choice(FILLER) for _ in range(rnd.randint(20, 60))]
+        for lemma in rnd.sample(list(FORMS), rnd.randint(0, 2)):
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(FORMS[lemma]))
+            truth[lemma].add(f's{i}')
+        texts.append(' '.join(words))
+    return texts, truth
+
+
+def build_queries(seed: int) -> list[tuple[str, str, str]]:
+    rnd = random.Random(seed)
+    queries: list[tuple[str, str, str]] = []
+    for lemma, forms in FORMS.items():
+        queries.append(('form', lemma, rnd.choice(forms[1:])))
+        queries.append(('prefix', lemma, lemma[:4]))
+        queries.append(('typo', lemma, typo(lemma, rnd)))
+    return queries
+
+
+def load(texts: list[str]) -> None:
+    CONN.execute(
+        """
+        CREATE TEMP TABLE bench_fts (
+            section_id TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            lemma TEXT NOT NULL,
+            normalized_text TEXT NOT NULL,
+            search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('simple', coalesce(lemma, '') || ' ' || coalesce(normalized_text, ''))
+            ) STORED
+        ) ON COMMIT DROP
+        """
+    )
+    analyses = [analyze(t) for t in texts]
+    CONN.execute(
+        'INSERT INTO bench_fts (section_id, text, lemma, normalized_text) '
+        'SELECT * FROM unnest(?::text[], ?::text[], ?::text[], ?::text[])',
+        ([f's{i}' for i in range(len(texts))], texts, [a.lemma for a in analyses], [a.normalized for a in analyses]),
+    )
+    CONN.execute('CREATE INDEX ON bench_fts USING GIN (search_vector)')
+    CONN.execute('CREATE INDEX ON bench_fts USING GIN (normalized_text gin_trgm_ops)')
+    CONN.execute('ANALYZE bench_fts')
+
+
+def run(strategy: str, term: str, limit: int | None) -> list[str]:
+    if strategy == 'fuzzy':
+        sql = """
+            SELECT section_id FROM bench_fts
+            WHERE search_vector @@ to_tsquery('simple', ?) OR ? <% normalized_text
+            ORDER BY ts_rank_cd(search_vector, to_tsquery('simple', ?)) + word_similarity(?, normalized_text) * 0.5 DESC
+        """
+        ts_query = build_postgres_ts_query(term)
+        trgm = build_trigram_search_term(term)
+        params: list = [ts_query, trgm, ts_query, trgm]
+    else:
+        ts_query = legacy_ts_query(term) if strategy == 'legacy' else build_postgres_ts_query(term)
+        sql = """
+            SELECT section_id FROM bench_fts
+            WHERE search_vector @@ to_tsquery('simple', ?)
+            ORDER BY ts_rank_cd(search_vector, to_tsquery('simple', ?)) DESC
+        """
+        params = [ts_query, ts_query]
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return [row['section_id'] for row in CONN.execute(sql, tuple(params)).fetchall()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sections', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    texts, truth = build_corpus(args.sections, args.seed)
+    queries = build_queries(args.seed)
+    with CONN:
+        CONN.execute("SELECT set_config('pg_trgm.word_similarity_threshold', ?, true)", (str(args.threshold),))
+        load(texts)
+        print(f'{args.sections} sections, {len(queries)} queries, threshold={args.threshold}')
+        print(f"{'strategy':>8} {'kind':>6} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7} {'precision':>9}")
+        for strategy in ('legacy', 'fts', 'fuzzy'):
+            for kind in ('form', 'prefix', 'typo'):
+                timings: list[float] = []
+                recalls: list[float] = []
+                precisions: list[float] = []
+                for q_kind, lemma, term in queries:
+                    if q_kind != kind:
+                        continue
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        run(strategy, term, 30)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    found = set(run(strategy, term, None))
+                    relevant = truth[lemma]
+                    recalls.append(len(found & relevant) / len(relevant) if relevant else 1.0)
+                    precisions.append(len(found & relevant) / len(found) if found else 1.0)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(
+                    f'{strategy:>8} {kind:>6} {statistics.median(timings):8.2f} {p95:8.2f} '
+                    f'{statistics.mean(recalls):7.3f} {statistics.mean(precisions):9.3f}'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Сравнение ранжирования семантического поиска на синтетическом корпусе: прежняя схема
+(один вектор на строку "<заголовок статьи>\\n<текст секции>") против новой (вектор секции без заголовка
++ вектор заголовка статьи, score = (1 - w) * cos(секция) + w * cos(заголовок), как в search_similar_blocks).
+Печатает recall@k по запросам «по тексту» и «по теме статьи + тексту», число входов embeddings
+на индексацию и на переименование статьи.
+
+По умолчанию векторы считает настроенный провайдер (embed_text_batch, с кэшем embedding_cache, если задан
+SERVPY_DATABASE_URL). --offline — детерминированный bag-of-lemmas embedder без сети:
+    python scripts/bench_semantic_recall.py --offline [--articles 60] [--k 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import os
+import random
+import statistics
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from servpy.app import embeddings
+from servpy.app.text_utils import analyze
+
+# Тема статьи -> варианты заголовков; факт секции -> варианты фраз.
+TOPICS = {
+    'ремонт': ['Ремонт квартиры', 'Ремонт на даче', 'Ремонт кухни'],
+    'поездка': ['Поездка в Казань', 'Поездка на море', 'Поездка к родителям'],
+    'учёба': ['Курс по статистике', 'Учёба в магистратуре', 'Подготовка к экзамену'],
+    'работа': ['Рабочие встречи', 'Проект миграции', 'Планы команды'],
+}
+FACTS = {
+    'бюджет': ['бюджет вышел больше плана', 'посчитать бюджет и расходы', 'расходы превысили бюджет'],
+    'сроки': ['сроки сдвинулись на неделю', 'обсудить сроки и дедлайн', 'дедлайн перенесли'],
+    'покупки': ['список покупок на выходные', 'купить материалы и инструменты', 'заказать покупки заранее'],
+    'заметки': ['короткие заметки по итогам дня', 'записать идеи и заметки', 'заметки на полях'],
+}
+FILLER = """
+вчера обсуждали разные вопросы и договорились вернуться к ним позже нужно проверить детали
+написать письмо коллегам уточнить время созвониться вечером посмотреть старые записи
+""".split()
+
+
+def build_corpus(articles: int, seed: int) -> list[dict]:
+    rnd = random.Random(seed)
+    sections: list[dict] = []
+    for a in range(articles):
+        topic = rnd.choice(list(TOPICS))
+        title = rnd.choice(TOPICS[topic])
+        for s in range(rnd.randint(3, 8)):
+            fact = rnd.choice(list(FACTS))
+            words = [rnd.choice(FILLER) for _ in range(rnd.randint(6, 20))]
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(FACTS[fact]))
+            sections.append(
+                {'id': f'a{a}s{s}', 'article': f'a{a}', 'title': title, 'topic': topic, 'fact': fact, 'text': ' '.join(words)}
+            )
+    return sections
+
+
+def build_queries() -> list[tuple[str, str, str | None, str]]:
+    # (kind, fact, topic, query): 'content' — релевантны все секции с фактом; 'context' — ещё и в статье темы.
+    queries: list[tuple[str, str, str | None, str]] = []
+    for fact, phrases in FACTS.items():
+        queries.append(('content', fact, None, phrases[0]))
+        for topic, titles in TOPICS.items():
+            queries.append(('context', fact, topic, f'{fact} {titles[0].lower()}'))
+    return queries
+
+
+def offline_embed(texts: list[str], dim: int = 256) -> list[list[float]]:
+    out: list[list[float]] = []
+    for text in texts:
+        acc = [0.0] * dim
+        for lemma in analyze(text).lemma_tokens:
+            rnd = random.Random(hashlib.sha256(lemma.encode('utf-8')).digest())
+            for i in range(dim):
+                acc[i] += rnd.gauss(0.0, 1.0)
+        norm = math.sqrt(sum(x * x for x in acc)) or 1.0
+        out.append([x / norm for x in acc])
+    return out
+
+
+def cosine(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=60)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--weights', default='0.2,0.3,0.5')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    if not os.environ.get('SERVPY_DATABASE_URL'):
+        embeddings.EMBEDDING_CACHE_MAX_ROWS = 0
+    embed = offline_embed if args.offline else embeddings.embed_text_batch
+
+    sections = build_corpus(args.articles, args.seed)
+    queries = build_queries()
+    titles = sorted({s['title'] for s in sections})
+    legacy_vecs = embed([f"{s['title']}\n{s['text']}" for s in sections])
+    content_vecs = embed([s['text'] for s in sections])
+    title_vecs = dict(zip(titles, embed(titles)))
+    query_vecs = embed([q for *_, q in queries])
+
+    per_article: dict[str, int] = {}
+    for s in sections:
+        per_article[s['article']] = per_article.get(s['article'], 0) + 1
+    print(f'{len(sections)} sections, {args.articles} articles, {len(queries)} queries, recall@{args.k}')
+    print(
+        f'embedding inputs: legacy index={len(sections)}, new index={len(sections) + len(titles)}; '
+        f'rename: legacy={statistics.mean(per_article.values()):.1f} (sections per article), new=1'
+    )
+
+    strategies: list[tuple[str, callable]] = [('legacy', lambda i, qv: cosine(qv, legacy_vecs[i]))]
+    for w in [float(x) for x in args.weights.split(',') if x.strip()]:
+        strategies.append(
+            (
+                f'w={w:g}',
+                lambda i, qv, w=w: (1 - w) * cosine(qv, content_vecs[i]) + w * cosine(qv, title_vecs[sections[i]['title']]),
+            )
+        )
+
+    print(f"{'strategy':>8} {'content':>8} {'context':>8}")
+    for name, score in strategies:
+        recalls: dict[str, list[float]] = {'content': [], 'context': []}
+        for (kind, fact, topic, _query), qv in zip(queries, query_vecs):
+            relevant = {
+                s['id'] for s in sections if s['fact'] == fact and (topic is None or s['topic'] == topic)
+            }
+            if not relevant:
+                continue
+            ranked = sorted(range(len(sections)), key=lambda i: score(i, qv), reverse=True)[: args.k]
+            found = {sections[i]['id'] for i in ranked}
+            recalls[kind].append(len(found & relevant) / min(len(relevant), args.k))
+        print(f"{name:>8} {statistics.mean(recalls['content']):8.3f} {statistics.mean(recalls['context']):8.3f}")
+
+
+if __name__ == '__main__':
+    main()
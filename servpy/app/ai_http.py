@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any
+
+import httpx
+
+logger = logging.getLogger('uvicorn.error')
+
+# Общий HTTP-слой исходящих запросов к AI-провайдерам (embeddings, summary, заголовки, транскрипция):
+#   - один долгоживущий httpx.Client на провайдера: keep-alive пул, без TCP+TLS рукопожатия на каждый вызов;
+#   - HTTP/2, если установлен h2 (httpx[http2]);
+#   - ограничение параллельных запросов к провайдеру (семафор);
+#   - повтор с экспоненциальной задержкой на 429/5xx и обрыв соединения (учитывается Retry-After);
+#   - метрики латентности по провайдерам (get_provider_http_stats).
+#
+# Env:
+#   SERVPY_HTTPS_PROXY / SERVPY_HTTP_PROXY (приоритет), HTTPS_PROXY / HTTP_PROXY, SERVPY_ALL_PROXY / ALL_PROXY
+#   SERVPY_AI_HTTP_MAX_CONNECTIONS (на провайдера, по умолчанию 20)
+#   SERVPY_AI_HTTP_KEEPALIVE_SECONDS (сколько держать простаивающее соединение, по умолчанию 60)
+#   SERVPY_AI_HTTP2 (0 — выключить HTTP/2)
+#   SERVPY_AI_HTTP_RETRIES (повторов после первой попытки, по умолчанию 3)
+#   SERVPY_AI_HTTP_BACKOFF_SECONDS (первая задержка, удваивается; по умолчанию 0.5)
+#   SERVPY_AI_CONCURRENCY_<PROVIDER> (например SERVPY_AI_CONCURRENCY_OPENAI; по умолчанию 8)
+HTTP_PROXY = os.environ.get('SERVPY_HTTP_PROXY') or os.environ.get('HTTP_PROXY') or ''
+HTTPS_PROXY = os.environ.get('SERVPY_HTTPS_PROXY') or os.environ.get('HTTPS_PROXY') or ''
+ALL_PROXY = os.environ.get('SERVPY_ALL_PROXY') or os.environ.get('ALL_PROXY') or ''
+
+AI_HTTP_MAX_CONNECTIONS = int(os.environ.get('SERVPY_AI_HTTP_MAX_CONNECTIONS') or '20')
+AI_HTTP_KEEPALIVE_SECONDS = float(os.environ.get('SERVPY_AI_HTTP_KEEPALIVE_SECONDS') or '60')
+AI_HTTP2 = (os.environ.get('SERVPY_AI_HTTP2') or '1') != '0' and importlib.util.find_spec('h2') is not None
+AI_HTTP_RETRIES = int(os.environ.get('SERVPY_AI_HTTP_RETRIES') or '3')
+AI_HTTP_BACKOFF_SECONDS = float(os.environ.get('SERVPY_AI_HTTP_BACKOFF_SECONDS') or '0.5')
+AI_HTTP_BACKOFF_MAX_SECONDS = float(os.environ.get('SERVPY_AI_HTTP_BACKOFF_MAX_SECONDS') or '20')
+AI_DEFAULT_CONCURRENCY = int(os.environ.get('SERVPY_AI_CONCURRENCY') or '8')
+
+RETRY_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# Запрос точно не дошёл до провайдера (или keep-alive соединение закрыто сервером) — повтор безопасен.
+# ReadTimeout не повторяем: генерация могла выполниться и быть оплачена.
+_RETRY_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+_LATENCY_WINDOW = 512
+
+
+def httpx_proxies() -> str | dict | None:
+    """
+    Возвращает proxy-конфиг для httpx.
+    Поддерживаем env:
+      - SERVPY_HTTPS_PROXY / SERVPY_HTTP_PROXY (приоритет)
+      - HTTPS_PROXY / HTTP_PROXY (fallback)
+      - SERVPY_ALL_PROXY / ALL_PROXY
+    """
+    if ALL_PROXY:
+        return ALL_PROXY
+    if HTTP_PROXY or HTTPS_PROXY:
+        proxies: dict[str, str] = {}
+        if HTTP_PROXY:
+            proxies['http://'] = HTTP_PROXY
+        if HTTPS_PROXY:
+            proxies['https://'] = HTTPS_PROXY
+        return proxies
+    return None
+
+
+def _retry_delay(attempt: int, response: httpx.Response | None) -> float:
+    delay = AI_HTTP_BACKOFF_SECONDS * (2 ** attempt)
+    if response is not None:
+        retry_after = (response.headers.get('retry-after') or '').strip()
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return min(max(0.0, delay), AI_HTTP_BACKOFF_MAX_SECONDS)
+
+
+class ProviderClient:
+    """Долгоживущий пул соединений к одному провайдеру; потокобезопасен."""
+
+    def __init__(self, name: str, max_concurrency: int) -> None:
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._client: httpx.Client | None = None
+        self._client_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._requests = 0
+        self._errors = 0
+        self._retries = 0
+        self._in_flight = 0
+        self._total_ms = 0.0
+
+    def _get_client(self) -> httpx.Client:
+        with self._client_lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    http2=AI_HTTP2,
+                    proxies=httpx_proxies(),
+                    limits=httpx.Limits(
+                        max_connections=max(1, AI_HTTP_MAX_CONNECTIONS),
+                        max_keepalive_connections=max(1, AI_HTTP_MAX_CONNECTIONS),
+                        keepalive_expiry=AI_HTTP_KEEPALIVE_SECONDS,
+                    ),
+                )
+            return self._client
+
+    def _record(self, elapsed_ms: float, *, error: bool) -> None:
+        with self._stats_lock:
+            self._requests += 1
+            self._total_ms += elapsed_ms
+            self._latencies.append(elapsed_ms)
+            if error:
+                self._errors += 1
+
+    def request(self, method: str, url: str, *, timeout: float, **kwargs: Any) -> httpx.Response:
+        """
+        Запрос с повторами; возвращает успешный ответ или бросает httpx.HTTPError
+        (HTTPStatusError — после исчерпания повторов или на не-повторяемый статус).
+        """
+        attempts = max(0, AI_HTTP_RETRIES) + 1
+        client = self._get_client()
+        for attempt in range(attempts):
+            response: httpx.Response | None = None
+            failure: httpx.HTTPError | None = None
+            with self._semaphore:
+                with self._stats_lock:
+                    self._in_flight += 1
+                started = time.monotonic()
+                try:
+                    response = client.request(method, url, timeout=timeout, **kwargs)
+                except httpx.HTTPError as exc:
+                    failure = exc
+                finally:
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    with self._stats_lock:
+                        self._in_flight -= 1
+                    self._record(
+                        elapsed_ms,
+                        error=failure is not None or (response is not None and response.status_code >= 400),
+                    )
+            retryable = (failure is not None and isinstance(failure, _RETRY_TRANSPORT_ERRORS)) or (
+                response is not None and response.status_code in RETRY_STATUS_CODES
+            )
+            if not retryable or attempt + 1 >= attempts:
+                if failure is not None:
+                    raise failure
+                assert response is not None
+                response.raise_for_status()
+                return response
+            delay = _retry_delay(attempt, response)
+            logger.info(
+                'ai_http: %s %s retry %s/%s in %.2fs (%s)',
+                self.name,
+                method,
+                attempt + 1,
+                attempts - 1,
+                delay,
+                response.status_code if response is not None else repr(failure),
+            )
+            with self._stats_lock:
+                self._retries += 1
+            time.sleep(delay)
+        raise RuntimeError('unreachable')
+
+    def post(self, url: str, *, timeout: float, **kwargs: Any) -> httpx.Response:
+        return self.request('POST', url, timeout=timeout, **kwargs)
+
+    def stats(self) -> dict[str, Any]:
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            requests = self._requests
+            out: dict[str, Any] = {
+                'requests': requests,
+                'errors': self._errors,
+                'retries': self._retries,
+                'inFlight': self._in_flight,
+                'maxConcurrency': self.max_concurrency,
+                'avgMs': round(self._total_ms / requests, 1) if requests else 0.0,
+            }
+        if latencies:
+            out['p50Ms'] = round(latencies[len(latencies) // 2], 1)
+            out['p95Ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1)
+            out['maxMs'] = round(latencies[-1], 1)
+        return out
+
+    def close(self) -> None:
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_PROVIDERS: dict[str, ProviderClient] = {}
+_PROVIDERS_LOCK = threading.Lock()
+
+
+def get_provider_client(name: str) -> ProviderClient:
+    with _PROVIDERS_LOCK:
+        provider = _PROVIDERS.get(name)
+        if provider is None:
+            env = f'SERVPY_AI_CONCURRENCY_{name.upper()}'
+            provider = ProviderClient(name, int(os.environ.get(env) or str(AI_DEFAULT_CONCURRENCY)))
+            _PROVIDERS[name] = provider
+        return provider
+
+
+def get_provider_http_stats() -> dict[str, dict[str, Any]]:
+    with _PROVIDERS_LOCK:
+        providers = list(_PROVIDERS.values())
+    return {provider.name: provider.stats() for provider in providers}
+
+
+def close_provider_clients() -> None:
+    with _PROVIDERS_LOCK:
+        providers = list(_PROVIDERS.values())
+        _PROVIDERS.clear()
+    for provider in providers:
+        provider.close()
@@ -11,8 +11,9 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any
 
-from .data_store import get_yandex_tokens
+from .data_store import get_yandex_tokens, materialize_stale_article_doc_jsons
 from .db import CONN
+from .outline_doc_json import analyze_outline_doc
 
 logger = logging.getLogger('uvicorn.error')
 
@@ -77,61 +78,13 @@ def _extract_refs_from_doc_json(doc_json_str: str) -> set[str]:
       - link marks href
       - image node src
       - yandex proxy /api/yandex/disk/file?path=... (decoded to app:/... as well)
+    Uses the shared single-pass outline analyzer.
     """
-    refs: set[str] = set()
-
-    def add_href(href: str) -> None:
-        h = str(href or '').strip()
-        if not h:
-            return
-        refs.add(h)
-        if h.startswith('/api/yandex/disk/file?'):
-            try:
-                url = urllib.parse.urlparse(h)
-                qs = urllib.parse.parse_qs(url.query or '')
-                p = (qs.get('path') or [''])[0]
-                if p:
-                    refs.add(p)
-            except Exception:
-                pass
-
-    def walk(node: Any) -> None:
-        if isinstance(node, list):
-            for item in node:
-                walk(item)
-            return
-        if not isinstance(node, dict):
-            return
-        # link marks
-        marks = node.get('marks')
-        if isinstance(marks, list):
-            for m in marks:
-                if not isinstance(m, dict) or m.get('type') != 'link':
-                    continue
-                attrs = m.get('attrs')
-                if isinstance(attrs, dict):
-                    add_href(str(attrs.get('href') or ''))
-        # images (outline uses image nodes with attrs.src)
-        if node.get('type') == 'image':
-            attrs = node.get('attrs')
-            if isinstance(attrs, dict):
-                add_href(str(attrs.get('src') or ''))
-        # generic attrs that can include href
-        attrs = node.get('attrs')
-        if isinstance(attrs, dict):
-            if isinstance(attrs.get('href'), str):
-                add_href(str(attrs.get('href') or ''))
-            if isinstance(attrs.get('src'), str):
-                add_href(str(attrs.get('src') or ''))
-        # recurse
-        walk(node.get('content'))
-
     try:
         doc = json.loads(doc_json_str or '')
-        walk(doc)
     except Exception:
-        return refs
-    return refs
+        return set()
+    return analyze_outline_doc(doc).attachment_refs
 
 
 def _attachment_ref_keys(*, article_id: str, stored_path: str) -> set[str]:
@@ -213,6 +166,7 @@ def run_attachments_gc_once() -> None:
 
     # 1) Collect refs from all articles doc_json.
     referenced_hrefs: set[str] = set()
+    materialize_stale_article_doc_jsons()
     rows = CONN.execute(
         """
         SELECT id, article_doc_json
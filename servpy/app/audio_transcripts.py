@@ -15,10 +15,9 @@ from pathlib import Path
 from typing import Any
 from uuid import uuid4
 
-import httpx
-
+from .ai_http import get_provider_client
 from .auth import get_user_by_id
-from .data_store import get_article, get_yandex_tokens, save_article_doc_json
+from .data_store import get_article, get_yandex_tokens, materialize_article_doc_json, save_article_doc_json
 from .db import CONN
 
 logger = logging.getLogger('uvicorn.error')
@@ -38,9 +37,6 @@ CHUNK_SECONDS = 600
 OVERLAP_SECONDS = 2
 MAX_AUDIO_BYTES = int(os.environ.get('SERVPY_AUDIO_MAX_BYTES') or str(20 * 1024 * 1024))  # 20MB
 
-HTTP_PROXY = os.environ.get('SERVPY_HTTP_PROXY') or os.environ.get('HTTP_PROXY') or ''
-HTTPS_PROXY = os.environ.get('SERVPY_HTTPS_PROXY') or os.environ.get('HTTPS_PROXY') or ''
-ALL_PROXY = os.environ.get('SERVPY_ALL_PROXY') or os.environ.get('ALL_PROXY') or ''
 
 _AUDIO_EXTS = {'.oga', '.ogg', '.opus', '.mp3', '.wav', '.m4a', '.aac', '.flac', '.webm'}
 
@@ -57,19 +53,6 @@ def is_audio_attachment(*, original_name: str, content_type: str = '') -> bool:
     return ext in _AUDIO_EXTS
 
 
-def _httpx_proxies() -> str | dict | None:
-    if ALL_PROXY:
-        return ALL_PROXY
-    if HTTP_PROXY or HTTPS_PROXY:
-        proxies: dict[str, str] = {}
-        if HTTP_PROXY:
-            proxies['http://'] = HTTP_PROXY
-        if HTTPS_PROXY:
-            proxies['https://'] = HTTPS_PROXY
-        return proxies
-    return None
-
-
 def _iso_now() -> str:
     return datetime.utcnow().isoformat()
 
@@ -285,17 +268,19 @@ def _openai_audio_transcribe_mp3(mp3_bytes: bytes) -> dict[str, Any]:
         '- Если кусок не разобрать: напиши [неразборчиво].\n'
     )
     url = f'{OPENAI_BASE_URL.rstrip("/")}/audio/transcriptions'
-    with httpx.Client(timeout=TRANSCRIBE_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-        resp = client.post(url, headers={'Authorization': f'Bearer {OPENAI_API_KEY}'}, files={
-            'file': ('audio.mp3', mp3_bytes, 'audio/mpeg'),
-        }, data={
+    resp = get_provider_client('openai').post(
+        url,
+        timeout=TRANSCRIBE_TIMEOUT_SECONDS,
+        headers={'Authorization': f'Bearer {OPENAI_API_KEY}'},
+        files={'file': ('audio.mp3', mp3_bytes, 'audio/mpeg')},
+        data={
             'model': TRANSCRIBE_MODEL,
             'prompt': prompt,
             # gpt-4o-mini-transcribe supports 'json' or 'text' (not 'verbose_json').
             'response_format': 'json',
-        })
-        resp.raise_for_status()
-        data = resp.json()
+        },
+    )
+    data = resp.json()
     if isinstance(data, dict):
         return data
     return {}
@@ -338,14 +323,13 @@ def _openai_chat_text_to_clean(raw_text: str) -> dict[str, Any]:
         'temperature': 0.2,
         'max_tokens': 4000,
     }
-    with httpx.Client(timeout=CLEANUP_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-        resp = client.post(
-            url,
-            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
-            json=payload,
-        )
-        resp.raise_for_status()
-        data = resp.json()
+    resp = get_provider_client('openai').post(
+        url,
+        timeout=CLEANUP_TIMEOUT_SECONDS,
+        headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
+        json=payload,
+    )
+    data = resp.json()
     content = ''
     try:
         choices = data.get('choices') if isinstance(data, dict) else None
@@ -633,8 +617,8 @@ def _requeue_done_jobs_missing_transcript_marker_on_startup(limit: int = 50) ->
             if not job_id or not article_id or not attachment_id:
                 continue
             marker = f'[transcript:{attachment_id}]'
-            art = CONN.execute('SELECT article_doc_json FROM articles WHERE id = ? AND deleted_at IS NULL', (article_id,)).fetchone()
-            doc_str = (art.get('article_doc_json') if art else '') or ''
+            art = CONN.execute('SELECT 1 FROM articles WHERE id = ? AND deleted_at IS NULL', (article_id,)).fetchone()
+            doc_str = (materialize_article_doc_json(article_id) if art else '') or ''
             # New marker is stored in outlineSection.attrs.transcriptAttachmentIds.
             has_new_marker = ('transcriptAttachmentIds' in doc_str) and (f'\"{attachment_id}\"' in doc_str)
             has_old_marker = marker in doc_str
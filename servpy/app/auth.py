@@ -2,20 +2,36 @@ from __future__ import annotations
 
 import hashlib
 import hmac
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from fastapi import Cookie, Depends, HTTPException, Request, Response
 
-from .db import CONN
+from .db import CONN, engine
 from .schema import init_schema
 
+logger = logging.getLogger('uvicorn.error')
 
 SESSION_COOKIE_NAME = 'ttree_session'
 SESSION_TTL = timedelta(days=30)
 
+# In-process кэш session_id → (User, expires_at): снимает 2 запроса к БД с каждого API/uploads-запроса.
+# TTL короткий — это страховка на случай потерянного NOTIFY; основная инвалидация идёт через
+# invalidate_session/invalidate_user_sessions (локально + NOTIFY для остальных воркеров).
+SESSION_CACHE_SIZE = int(os.environ.get('SERVPY_SESSION_CACHE_SIZE') or '2048')
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get('SERVPY_SESSION_CACHE_TTL_SECONDS') or '60')
+SESSION_CACHE_NOTIFY = (os.environ.get('SERVPY_SESSION_CACHE_NOTIFY') or '1').strip().lower() in {'1', 'true', 'yes'}
+# Только приём NOTIFY (фоновый LISTEN с выделенным соединением); отправка управляется SESSION_CACHE_NOTIFY.
+# Тесты выключают слушатель: приложение импортируется заново в каждом тесте.
+SESSION_CACHE_LISTENER = (os.environ.get('SERVPY_SESSION_CACHE_LISTENER') or '1').strip().lower() in {'1', 'true', 'yes'}
+SESSION_CACHE_CHANNEL = 'ttree_auth_invalidate'
+
 
 @dataclass
 class User:
@@ -50,18 +66,138 @@ def hash_password_for_store(password: str) -> str:
     return f'{salt}${hex_hash}'
 
 
-def _create_sessions_table() -> None:
-    init_schema()
-    CONN.execute(
-        '''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id TEXT PRIMARY KEY,
-            user_id TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            expires_at TEXT NOT NULL
-        )
-        ''',
-    )
+_SESSION_CACHE: 'OrderedDict[str, tuple[User, datetime, float]]' = OrderedDict()
+_SESSION_CACHE_LOCK = threading.Lock()
+SESSION_CACHE_STATS = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+_LISTENER_LOCK = threading.Lock()
+_LISTENER_THREAD: threading.Thread | None = None
+
+
+def _session_cache_get(session_id: str) -> Optional[User]:
+    if SESSION_CACHE_SIZE <= 0:
+        return None
+    now_mono = time.monotonic()
+    with _SESSION_CACHE_LOCK:
+        entry = _SESSION_CACHE.get(session_id)
+        if entry is not None:
+            user, expires, cached_at = entry
+            if now_mono - cached_at <= SESSION_CACHE_TTL_SECONDS and expires >= datetime.now(timezone.utc):
+                _SESSION_CACHE.move_to_end(session_id)
+                SESSION_CACHE_STATS['hits'] += 1
+                return user
+            _SESSION_CACHE.pop(session_id, None)
+        SESSION_CACHE_STATS['misses'] += 1
+    return None
+
+
+def _session_cache_put(session_id: str, user: User, expires: datetime) -> None:
+    if SESSION_CACHE_SIZE <= 0:
+        return
+    with _SESSION_CACHE_LOCK:
+        _SESSION_CACHE[session_id] = (user, expires, time.monotonic())
+        _SESSION_CACHE.move_to_end(session_id)
+        while len(_SESSION_CACHE) > SESSION_CACHE_SIZE:
+            _SESSION_CACHE.popitem(last=False)
+            SESSION_CACHE_STATS['evictions'] += 1
+
+
+def _drop_cached(session_id: str | None = None, user_id: str | None = None) -> None:
+    with _SESSION_CACHE_LOCK:
+        if session_id:
+            if _SESSION_CACHE.pop(session_id, None) is not None:
+                SESSION_CACHE_STATS['invalidations'] += 1
+        if user_id:
+            for sid in [k for k, v in _SESSION_CACHE.items() if v[0].id == user_id]:
+                _SESSION_CACHE.pop(sid, None)
+                SESSION_CACHE_STATS['invalidations'] += 1
+
+
+def _notify_invalidation(payload: str) -> None:
+    if not SESSION_CACHE_NOTIFY:
+        return
+    try:
+        # Внутри `with CONN:` NOTIFY доставляется только после commit — это то, что нужно.
+        CONN.execute('SELECT pg_notify(?, ?)', (SESSION_CACHE_CHANNEL, payload))
+    except Exception as exc:  # noqa: BLE001
+        logger.warning('auth: session cache NOTIFY failed: %r', exc)
+
+
+def invalidate_session(session_id: str) -> None:
+    """Сбрасывает кэш для одной сессии во всех воркерах."""
+    if not session_id:
+        return
+    _drop_cached(session_id=session_id)
+    _notify_invalidation(f'session:{session_id}')
+
+
+def invalidate_user_sessions(user_id: str) -> None:
+    """Сбрасывает кэш всех сессий пользователя во всех воркерах (удаление, смена прав/пароля)."""
+    if not user_id:
+        return
+    _drop_cached(user_id=user_id)
+    _notify_invalidation(f'user:{user_id}')
+
+
+def clear_session_cache() -> None:
+    with _SESSION_CACHE_LOCK:
+        _SESSION_CACHE.clear()
+
+
+def get_session_cache_stats() -> dict:
+    with _SESSION_CACHE_LOCK:
+        return {**SESSION_CACHE_STATS, 'size': len(_SESSION_CACHE)}
+
+
+def _apply_invalidation_payload(payload: str) -> None:
+    kind, _, value = (payload or '').partition(':')
+    if kind == 'session':
+        _drop_cached(session_id=value)
+    elif kind == 'user':
+        _drop_cached(user_id=value)
+    else:
+        clear_session_cache()
+
+
+def kick_session_cache_listener() -> None:
+    """
+    Background LISTEN на канале инвалидации: другие воркеры шлют NOTIFY при logout/удалении
+    пользователя/смене прав. При обрыве соединения кэш сбрасывается целиком и слушатель переподключается.
+    """
+    global _LISTENER_THREAD
+    if not SESSION_CACHE_NOTIFY or not SESSION_CACHE_LISTENER or SESSION_CACHE_SIZE <= 0:
+        return
+    with _LISTENER_LOCK:
+        if _LISTENER_THREAD and _LISTENER_THREAD.is_alive():
+            return
+
+        def _runner() -> None:
+            while True:
+                raw = None
+                try:
+                    raw = engine.raw_connection()
+                    conn = raw.driver_connection
+                    # Выделенное соединение: из пула его забираем навсегда.
+                    raw.detach()
+                    conn.autocommit = True
+                    conn.execute(f'LISTEN {SESSION_CACHE_CHANNEL}')
+                    # Пока не слушали — могли пропустить инвалидации.
+                    clear_session_cache()
+                    for notify in conn.notifies():
+                        _apply_invalidation_payload(notify.payload)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning('auth: session cache listener error: %r', exc)
+                finally:
+                    if raw is not None:
+                        try:
+                            raw.close()
+                        except Exception:
+                            pass
+                clear_session_cache()
+                time.sleep(5)
+
+        _LISTENER_THREAD = threading.Thread(target=_runner, name='session-cache-listener', daemon=True)
+        _LISTENER_THREAD.start()
 
 
 def get_user_by_username(username: str) -> Optional[User]:
@@ -104,7 +240,7 @@ def create_user(
 
 
 def create_session(user_id: str) -> str:
-    _create_sessions_table()
+    init_schema()
     now = datetime.now(timezone.utc)
     sid = os.urandom(16).hex()
     expires = now + SESSION_TTL
@@ -119,7 +255,10 @@ def create_session(user_id: str) -> str:
 def get_user_by_session(session_id: str | None) -> Optional[User]:
     if not session_id:
         return None
-    _create_sessions_table()
+    cached = _session_cache_get(session_id)
+    if cached is not None:
+        return cached
+    init_schema()
     row = CONN.execute(
         'SELECT user_id, expires_at FROM sessions WHERE id = ?',
         (session_id,),
@@ -134,7 +273,18 @@ def get_user_by_session(session_id: str | None) -> Optional[User]:
         with CONN:
             CONN.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
         return None
-    return get_user_by_id(row['user_id'])
+    user = get_user_by_id(row['user_id'])
+    if user is not None:
+        _session_cache_put(session_id, user, expires)
+    return user
+
+
+def delete_session(session_id: str | None) -> None:
+    if not session_id:
+        return
+    with CONN:
+        CONN.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+        invalidate_session(session_id)
 
 
 def get_current_user(
@@ -181,6 +331,7 @@ def ensure_superuser(username: str, password: str, display_name: str | None = No
                 'UPDATE users SET password_hash = ?, is_superuser = ? WHERE id = ?',
                 (pwd_hash, True, row['id']),
             )
+            invalidate_user_sessions(row['id'])
         return
     # Создаём нового суперпользователя.
     create_user(username, password, display_name or username, is_superuser=True)
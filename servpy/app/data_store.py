@@ -1,30 +1,44 @@
 from __future__ import annotations
 
+import base64
+import hashlib
 import html as html_mod
 import json
 import logging
 import os
 import re
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from functools import wraps
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from sqlalchemy.engine import RowMapping
 
-from .db import CONN, mark_search_index_clean
+from .auth import invalidate_user_sessions
+from .db import CONN
 from .schema import init_schema
 from .html_sanitizer import sanitize_html
-from .text_utils import build_lemma, build_lemma_tokens, build_normalized_tokens, strip_html
+from .text_utils import analyze, build_lemma, build_normalized_tokens, strip_html
 from .outline_doc_json import (
+    OutlineDocAnalysis,
+    OutlineSectionInfo,
+    analyze_outline_doc,
     build_outline_section_internal_links_map,
-    build_outline_section_plain_text,
     build_outline_section_plain_text_map,
-    build_outline_section_fragments_map,
+    outline_section_content_hash,
+    outline_text_hash,
 )
 from .blocks_to_outline_doc_json import convert_blocks_to_outline_doc_json
+from .embeddings import EmbeddingsUnavailable
 from .semantic_search import (
     delete_block_embeddings,
+    mark_article_title_embeddings,
+    search_similar_blocks,
     upsert_block_embedding,
     upsert_embeddings_for_block_tree,
     upsert_embeddings_for_plain_texts,
@@ -297,28 +311,433 @@ def _apply_outline_structure_snapshot(doc_json: Any, nodes: list[dict[str, Any]]
     return doc_json
 
 
-def _try_mark_op_applied(op_id: str, *, article_id: str, op_type: str, section_id: str | None = None) -> bool:
-    oid = str(op_id or '').strip()
-    if not oid:
-        return True
-    now = iso_now()
-    now_dt = datetime.utcnow()
-    now_dt = datetime.utcnow()
-    now_dt = datetime.utcnow()
-    try:
-        with CONN:
-            row = CONN.execute('SELECT 1 AS ok FROM applied_ops WHERE op_id = ?', (oid,)).fetchone()
-            if row:
+# --- Посекционное хранилище outline (outline_sections) ---
+# Правки одной секции пишут одну строку outline_sections вместо перезаписи всего article_doc_json.
+# article_doc_json остаётся кэшированной проекцией: помечается doc_json_stale и собирается при чтении.
+
+
+def _split_outline_section_content(sec: dict[str, Any]) -> tuple[Any, Any, list[Any]]:
+    heading = None
+    body = None
+    children: list[Any] = []
+    for c in sec.get('content') or []:
+        if not isinstance(c, dict):
+            continue
+        ctype = c.get('type')
+        if ctype == 'outlineHeading' and heading is None:
+            heading = c
+        elif ctype == 'outlineBody' and body is None:
+            body = c
+        elif ctype == 'outlineChildren':
+            children = c.get('content') or []
+    return heading, body, children
+
+
+def _outline_doc_is_section_tree(doc_json: Any) -> bool:
+    """
+    Посекционное хранение возможно только для «чистого» дерева секций: doc → outlineSection[],
+    у секции только heading/body/children, id уникальны. Иначе остаёмся на article_doc_json.
+    """
+    if not isinstance(doc_json, dict) or doc_json.get('type') != 'doc':
+        return False
+    if set(doc_json.keys()) - {'type', 'content'}:
+        return False
+    seen: set[str] = set()
+
+    def check(items: Any) -> bool:
+        if not isinstance(items, list):
+            return False
+        for item in items:
+            if not isinstance(item, dict) or item.get('type') != 'outlineSection':
                 return False
-            CONN.execute(
-                'INSERT INTO applied_ops (op_id, article_id, section_id, op_type, created_at) VALUES (?, ?, ?, ?, ?)',
-                (oid, article_id, section_id, op_type, now),
+            if set(item.keys()) - {'type', 'attrs', 'content'}:
+                return False
+            sid = str((item.get('attrs') or {}).get('id') or '').strip()
+            if not sid or sid in seen:
+                return False
+            seen.add(sid)
+            content = item.get('content') or []
+            if not isinstance(content, list):
+                return False
+            for c in content:
+                if not isinstance(c, dict) or c.get('type') not in {'outlineHeading', 'outlineBody', 'outlineChildren'}:
+                    return False
+                if c.get('type') == 'outlineChildren' and not check(c.get('content') or []):
+                    return False
+        return True
+
+    return check(doc_json.get('content') or [])
+
+
+def _hydrate_outline_sections(article_id: str, doc_json: Any, now: str) -> bool:
+    """
+    Переносит секции документа в outline_sections (вызывается под FOR UPDATE статьи).
+    Возвращает False, если документ не укладывается в посекционную модель.
+    """
+    if not _outline_doc_is_section_tree(doc_json):
+        return False
+    rows: list[tuple[Any, ...]] = []
+
+    def walk(items: list[Any], parent_id: str | None) -> None:
+        for pos, sec in enumerate(items):
+            attrs = dict(sec.get('attrs') or {})
+            sid = str(attrs.get('id') or '').strip()
+            heading, body, children = _split_outline_section_content(sec)
+            heading = heading if _json_is_outline_heading(heading) else {'type': 'outlineHeading', 'content': []}
+            body = body if _json_is_outline_body(body) else {'type': 'outlineBody', 'content': [{'type': 'paragraph'}]}
+            heading_str = json.dumps(heading, ensure_ascii=False)
+            body_str = json.dumps(body, ensure_ascii=False)
+            rows.append(
+                (
+                    article_id,
+                    sid,
+                    parent_id,
+                    float(pos),
+                    bool(attrs.get('collapsed', False)),
+                    json.dumps(attrs, ensure_ascii=False),
+                    heading_str,
+                    body_str,
+                    outline_section_content_hash(heading, body),
+                    now,
+                )
             )
+            walk(children, sid)
+
+    walk(doc_json.get('content') or [], None)
+    CONN.execute('DELETE FROM outline_sections WHERE article_id = ?', (article_id,))
+    if rows:
+        CONN.executemany(
+            '''
+            INSERT INTO outline_sections
+                (article_id, section_id, parent_id, position, collapsed, attrs_json, heading_json, body_json, content_hash, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            rows,
+        )
+    CONN.execute('UPDATE articles SET sections_synced = TRUE, doc_json_stale = FALSE WHERE id = ?', (article_id,))
+    return True
+
+
+def _outline_section_node_from_row(row: RowMapping) -> dict[str, Any]:
+    try:
+        attrs = json.loads(row.get('attrs_json') or '{}')
     except Exception:
-        return True
+        attrs = {}
+    if not isinstance(attrs, dict):
+        attrs = {}
+    attrs['id'] = row['section_id']
+    attrs['collapsed'] = bool(row.get('collapsed'))
+    return {
+        'type': 'outlineSection',
+        'attrs': attrs,
+        'content': [
+            json.loads(row['heading_json']),
+            json.loads(row['body_json']),
+            {'type': 'outlineChildren', 'content': []},
+        ],
+    }
+
+
+def _build_doc_from_outline_sections(article_id: str) -> dict[str, Any]:
+    rows = CONN.execute(
+        '''
+        SELECT section_id, parent_id, collapsed, attrs_json, heading_json, body_json
+        FROM outline_sections
+        WHERE article_id = ?
+        ORDER BY position, section_id
+        ''',
+        (article_id,),
+    ).fetchall()
+    nodes = {row['section_id']: _outline_section_node_from_row(row) for row in rows}
+    root: list[dict[str, Any]] = []
+    for row in rows:
+        node = nodes[row['section_id']]
+        parent = nodes.get(row.get('parent_id') or '')
+        if parent is None:
+            # Сироты (родитель удалён) поднимаются в корень — как в structure snapshot.
+            root.append(node)
+        else:
+            parent['content'][2]['content'].append(node)
+    return {'type': 'doc', 'content': root}
+
+
+def doc_json_stats(doc_json_str: str | None) -> tuple[int | None, str | None]:
+    """
+    Размер (байты UTF-8) и sha256 текста article_doc_json — пишутся вместе с ним,
+    чтобы чтение/ETag/meta не сериализовали документ заново.
+    """
+    if doc_json_str is None:
+        return None, None
+    data = doc_json_str.encode('utf-8')
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+def materialize_article_doc_json(article_id: str) -> str | None:
+    """
+    Возвращает актуальный article_doc_json; если проекция устарела — собирает её из outline_sections
+    и сохраняет. Дёшево для актуальных статей (один SELECT без блокировки).
+    """
+    if not article_id:
+        return None
+    row = CONN.execute('SELECT doc_json_stale, article_doc_json FROM articles WHERE id = ?', (article_id,)).fetchone()
+    if not row:
+        return None
+    if not row.get('doc_json_stale'):
+        return row.get('article_doc_json')
+    with CONN:
+        row = CONN.execute(
+            'SELECT doc_json_stale, article_doc_json FROM articles WHERE id = ? FOR UPDATE',
+            (article_id,),
+        ).fetchone()
+        if not row or not row.get('doc_json_stale'):
+            return (row or {}).get('article_doc_json')
+        doc_json_str = json.dumps(_build_doc_from_outline_sections(article_id), ensure_ascii=False)
+        CONN.execute(
+            'UPDATE articles SET article_doc_json = ?, doc_json_bytes = ?, doc_json_hash = ?, doc_json_stale = FALSE '
+            'WHERE id = ?',
+            (doc_json_str, *doc_json_stats(doc_json_str), article_id),
+        )
+    return doc_json_str
+
+
+def materialize_stale_article_doc_jsons(author_id: str | None = None) -> int:
+    """Материализует все устаревшие проекции (для фоновых задач, читающих article_doc_json напрямую)."""
+    sql = 'SELECT id FROM articles WHERE doc_json_stale'
+    params: tuple[Any, ...] = ()
+    if author_id is not None:
+        sql += ' AND author_id = ?'
+        params = (author_id,)
+    rows = CONN.execute(sql, params).fetchall()
+    for row in rows:
+        try:
+            materialize_article_doc_json(row['id'])
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('Failed to materialize article_doc_json for %s: %r', row['id'], exc)
+    return len(rows)
+
+
+def _locked_article_doc_json_str(article_id: str, article_row: RowMapping) -> str:
+    """Текущий doc_json статьи, строка которой уже взята FOR UPDATE."""
+    if article_row.get('doc_json_stale'):
+        return materialize_article_doc_json(article_id) or ''
+    if 'article_doc_json' in article_row:
+        return article_row.get('article_doc_json') or ''
+    row = CONN.execute('SELECT article_doc_json FROM articles WHERE id = ?', (article_id,)).fetchone()
+    return (row or {}).get('article_doc_json') or ''
+
+
+def _outline_section_info(section_id: str, heading: Any, body: Any) -> OutlineSectionInfo | None:
+    mini = {'type': 'doc', 'content': [_ensure_outline_section_node(section_id, heading=heading, body=body)]}
+    return analyze_outline_doc(mini).sections.get(section_id)
+
+
+def _section_plain_and_fragments(section_id: str, heading: Any, body: Any) -> tuple[str, dict[str, Any]]:
+    info = _outline_section_info(section_id, heading, body)
+    if info is None:
+        return '', {}
+    return info.plain_text, {'heading': info.heading, 'body': info.body}
+
+
+def _mark_ops_applied(article_id: str, ops: list[tuple[str, str, str | None]]) -> set[str]:
+    """
+    Регистрирует op_id пакета в applied_ops одним INSERT (ops: op_id, op_type, section_id).
+    Возвращает op_id, которые раньше не применялись; повторы внутри пакета учитывает вызывающий.
+    """
+    pending: dict[str, tuple[str, str | None]] = {}
+    for op_id, op_type, section_id in ops:
+        oid = str(op_id or '').strip()
+        if oid and oid not in pending:
+            pending[oid] = (op_type, section_id)
+    if not pending:
+        return set()
+    op_ids = list(pending)
+    rows = CONN.execute(
+        '''
+        INSERT INTO applied_ops (op_id, article_id, section_id, op_type, created_at)
+        SELECT o.op_id, ?, NULLIF(o.section_id, ''), o.op_type, ?
+        FROM unnest(?::text[], ?::text[], ?::text[]) AS o(op_id, section_id, op_type)
+        ON CONFLICT (op_id) DO NOTHING
+        RETURNING op_id
+        ''',
+        (
+            article_id,
+            iso_now(),
+            op_ids,
+            [pending[oid][1] or '' for oid in op_ids],
+            [pending[oid][0] for oid in op_ids],
+        ),
+    ).fetchall()
+    return {str(r['op_id']) for r in rows}
+
+
+# --- История правок секций (article_history_entries) ---
+# Запись истории — insert-only строка (article_id, seq); строку articles не переписываем.
+# Undo/redo помечают одну запись через undone_seq, новые правки удаляют только redo-хвост.
+
+ARTICLE_HISTORY_PAGE_LIMIT = int(os.environ.get('SERVPY_ARTICLE_HISTORY_PAGE_LIMIT') or '500')
+
+
+def _history_entry_from_row(row: RowMapping) -> Dict[str, Any]:
+    try:
+        entry = json.loads(row.get('entry_json') or '{}')
+    except Exception:
+        entry = {}
+    if not isinstance(entry, dict):
+        entry = {}
+    entry.setdefault('id', row.get('entry_id'))
+    entry['seq'] = int(row.get('seq') or 0)
+    return entry
+
+
+def _allocate_history_seq(article_id: str, count: int) -> int:
+    """Резервирует `count` номеров в articles.history_seq и возвращает последний."""
+    row = CONN.execute(
+        'UPDATE articles SET history_seq = history_seq + ? WHERE id = ? RETURNING history_seq',
+        (int(count), article_id),
+    ).fetchone()
+    if not row:
+        raise ArticleNotFound('Article not found')
+    return int(row['history_seq'])
+
+
+def append_article_history_entries(article_id: str, entries: List[Dict[str, Any]]) -> None:
+    if not entries:
+        return
+    last = _allocate_history_seq(article_id, len(entries))
+    first = last - len(entries) + 1
+    CONN.executemany(
+        '''
+        INSERT INTO article_history_entries (article_id, seq, entry_id, block_id, created_at, undone_seq, entry_json)
+        VALUES (?, ?, ?, ?, ?, NULL, ?)
+        ''',
+        [
+            (
+                article_id,
+                first + i,
+                str(entry.get('id') or uuid.uuid4()),
+                str(entry.get('blockId') or ''),
+                str(entry.get('timestamp') or iso_now()),
+                json.dumps(entry, ensure_ascii=False),
+            )
+            for i, entry in enumerate(entries)
+        ],
+    )
+
+
+def clear_article_redo_history(article_id: str) -> None:
+    CONN.execute(
+        'DELETE FROM article_history_entries WHERE article_id = ? AND undone_seq IS NOT NULL',
+        (article_id,),
+    )
+
+
+def clear_article_history(article_id: str) -> None:
+    CONN.execute('DELETE FROM article_history_entries WHERE article_id = ?', (article_id,))
+
+
+def _update_article_history_entry(article_id: str, entry_id: str, patch: Dict[str, Any]) -> bool:
+    row = CONN.execute(
+        'SELECT seq, entry_id, entry_json FROM article_history_entries WHERE article_id = ? AND entry_id = ?',
+        (article_id, entry_id),
+    ).fetchone()
+    if not row:
+        return False
+    entry = _history_entry_from_row(row)
+    entry.pop('seq', None)
+    entry.update(patch)
+    CONN.execute(
+        'UPDATE article_history_entries SET entry_json = ? WHERE article_id = ? AND seq = ?',
+        (json.dumps(entry, ensure_ascii=False), article_id, row['seq']),
+    )
     return True
 
 
+def list_article_history(
+    article_id: str,
+    *,
+    block_id: str | None = None,
+    before_seq: int | None = None,
+    limit: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Keyset-страница истории (без redo): последние `limit` записей с seq < before_seq.
+    Записи в странице идут по возрастанию seq (как раньше в articles.history);
+    nextCursor — значение before_seq для следующей (более старой) страницы.
+    """
+    page = max(1, int(limit or ARTICLE_HISTORY_PAGE_LIMIT))
+    clauses = ['article_id = ?', 'undone_seq IS NULL']
+    params: list[Any] = [article_id]
+    if block_id is not None:
+        clauses.append('block_id = ?')
+        params.append(block_id)
+    if before_seq is not None:
+        clauses.append('seq < ?')
+        params.append(int(before_seq))
+    rows = CONN.execute(
+        f'''
+        SELECT seq, entry_id, entry_json
+        FROM article_history_entries
+        WHERE {' AND '.join(clauses)}
+        ORDER BY seq DESC
+        LIMIT ?
+        ''',
+        (*params, page + 1),
+    ).fetchall()
+    has_more = len(rows) > page
+    entries = [_history_entry_from_row(r) for r in rows[:page]]
+    entries.reverse()
+    return {
+        'entries': entries,
+        'nextCursor': entries[0]['seq'] if has_more and entries else None,
+    }
+
+
+def list_article_redo_history(article_id: str, limit: int | None = None) -> List[Dict[str, Any]]:
+    rows = CONN.execute(
+        '''
+        SELECT seq, entry_id, entry_json
+        FROM article_history_entries
+        WHERE article_id = ? AND undone_seq IS NOT NULL
+        ORDER BY undone_seq DESC
+        LIMIT ?
+        ''',
+        (article_id, max(1, int(limit or ARTICLE_HISTORY_PAGE_LIMIT))),
+    ).fetchall()
+    entries = [_history_entry_from_row(r) for r in rows]
+    entries.reverse()
+    return entries
+
+
+def _pick_history_entry_row(article_id: str, entry_id: Optional[str], *, undone: bool) -> Optional[RowMapping]:
+    state_clause = 'undone_seq IS NOT NULL' if undone else 'undone_seq IS NULL'
+    if entry_id:
+        return CONN.execute(
+            f'SELECT seq, entry_id, entry_json FROM article_history_entries '
+            f'WHERE article_id = ? AND entry_id = ? AND {state_clause}',
+            (article_id, entry_id),
+        ).fetchone()
+    order = 'undone_seq DESC' if undone else 'seq DESC'
+    return CONN.execute(
+        f'SELECT seq, entry_id, entry_json FROM article_history_entries '
+        f'WHERE article_id = ? AND {state_clause} ORDER BY {order} LIMIT 1',
+        (article_id,),
+    ).fetchone()
+
+
+def _set_history_entry_undone(article_id: str, seq: int, undone: bool) -> None:
+    if undone:
+        undone_seq = _allocate_history_seq(article_id, 1)
+        CONN.execute(
+            'UPDATE article_history_entries SET undone_seq = ? WHERE article_id = ? AND seq = ?',
+            (undone_seq, article_id, seq),
+        )
+    else:
+        CONN.execute(
+            'UPDATE article_history_entries SET undone_seq = NULL WHERE article_id = ? AND seq = ?',
+            (article_id, seq),
+        )
+
+
 def _coerce_embedding_to_list(value: Any) -> list[float]:
     """
     Converts pgvector/driver embedding values into a JSON-serializable list[float].
@@ -326,9 +745,12 @@ def _coerce_embedding_to_list(value: Any) -> list[float]:
       - list[float]
       - tuple[float]
       - string like '[0.1, 0.2, ...]'
+      - numpy.ndarray (binary pgvector adapter)
     """
     if value is None:
         return []
+    if hasattr(value, 'tolist'):
+        value = value.tolist()
     if isinstance(value, list):
         try:
             return [float(x) for x in value]
@@ -363,22 +785,40 @@ def _coerce_embedding_to_list(value: Any) -> list[float]:
     return []
 
 
+# Упакованные embeddings для офлайн-клиента: little-endian float32/float16 (как Float32Array в браузере).
+EMBEDDING_PACKED_DTYPES = ('f32', 'f16')
+
+
+def pack_vector_send(raw: bytes, dtype: str = 'f32') -> bytes:
+    """
+    Перепаковывает бинарную форму pgvector (vector_send: uint16 dim, uint16 unused, dim × float4 big-endian)
+    в little-endian float32 или float16 — без разбора текстового '[0.1, ...]' в Python-float.
+    """
+    data = bytes(raw)
+    dim = int.from_bytes(data[0:2], 'big')
+    values = np.frombuffer(data, dtype='>f4', count=dim, offset=4)
+    return values.astype('<f2' if dtype == 'f16' else '<f4').tobytes()
+
+
 def get_article_block_embeddings(
     *,
     article_id: str,
     author_id: str,
     since: str | None = None,
     block_ids: list[str] | None = None,
+    dtype: str | None = None,
 ) -> list[dict[str, Any]]:
     """
     Returns embeddings for outline sections (block_id == section_id) for a given article.
     Used for offline-first client to perform semantic ranking locally.
+    dtype='f32'/'f16': embedding — упакованные bytes (см. pack_vector_send) вместо list[float].
     """
     if not article_id or not author_id:
         return []
     ids = [str(x) for x in (block_ids or []) if str(x)]
+    emb_expr = 'vector_send(be.embedding)' if dtype else 'be.embedding'
     sql = (
-        'SELECT be.block_id AS blockId, be.article_id AS articleId, be.updated_at AS updatedAt, be.embedding AS embedding '
+        f'SELECT be.block_id AS blockId, be.article_id AS articleId, be.updated_at AS updatedAt, {emb_expr} AS embedding '
         'FROM block_embeddings be '
         'JOIN articles a ON a.id = be.article_id '
         'WHERE a.deleted_at IS NULL AND be.article_id = ? AND be.author_id = ?'
@@ -398,17 +838,52 @@ def get_article_block_embeddings(
         mapping = getattr(row, '_mapping', row)
         bid = _mapping_get_first(mapping, 'blockId', 'blockid', 'block_id') or ''
         updated_at = _mapping_get_first(mapping, 'updatedAt', 'updated_at') or ''
-        emb = _mapping_get_first(mapping, 'embedding')  # may be list/str
+        emb = _mapping_get_first(mapping, 'embedding')  # may be list/str, bytes for dtype
         out.append(
             {
                 'blockId': bid,
                 'updatedAt': updated_at,
-                'embedding': _coerce_embedding_to_list(emb),
+                'embedding': pack_vector_send(emb, dtype) if dtype else _coerce_embedding_to_list(emb),
             }
         )
     return out
 
 
+def get_article_title_embeddings(
+    *,
+    article_ids: list[str],
+    author_id: str,
+    dtype: str | None = None,
+) -> dict[str, dict[str, Any]]:
+    """
+    Векторы заголовков статей (article_embeddings) для офлайн-ранжирования: articleId → {updatedAt, embedding}.
+    Статей без вектора (пустой заголовок, ещё не посчитан, нет pgvector) в ответе нет.
+    """
+    ids = [str(x) for x in (article_ids or []) if str(x)]
+    if not ids or not author_id:
+        return {}
+    if not CONN.execute("SELECT to_regclass('article_embeddings') IS NOT NULL AS ok").fetchone()['ok']:
+        return {}
+    emb_expr = 'vector_send(embedding)' if dtype else 'embedding'
+    rows = CONN.execute(
+        f'''
+        SELECT article_id, updated_at, {emb_expr} AS embedding
+        FROM article_embeddings
+        WHERE author_id = ? AND article_id = ANY(?) AND embedding IS NOT NULL
+        ''',
+        (author_id, ids),
+    ).fetchall()
+    return {
+        row['article_id']: {
+            'updatedAt': row['updated_at'],
+            'embedding': (
+                pack_vector_send(row['embedding'], dtype) if dtype else _coerce_embedding_to_list(row['embedding'])
+            ),
+        }
+        for row in rows or []
+    }
+
+
 _PIPE_TABLE_RE = re.compile(
     r'^(?:\s*<p>(?:\s|\&nbsp;|<br\s*/?>)*\|.*?\|\s*</p>\s*)+$',
     re.IGNORECASE | re.DOTALL,
@@ -600,48 +1075,61 @@ def _extract_article_links_from_blocks(blocks: List[Dict[str, Any]]) -> List[str
     return list(ids)
 
 
-def _rebuild_article_links_for_article_id(article_id: str, *, doc_json: Any | None = None) -> None:
+def _insert_article_links(article_id: str, link_map: dict[str, set[str]]) -> None:
+    """Вставляет ссылки секций (section_id -> ids статей) в article_links; старые строки не трогает."""
+    values: list[tuple[str, str, str]] = []
+    for section_id, targets in (link_map or {}).items():
+        for target_id in targets or set():
+            if not target_id or target_id == article_id:
+                continue
+            values.append((section_id, target_id, 'internal'))
+    if not values:
+        return
+    # IMPORTANT:
+    # `article_links.to_id` has a FK to `articles.id`. Links to missing articles MUST be skipped,
+    # otherwise Postgres marks the whole transaction as aborted and callers (like structure snapshots)
+    # get rolled back.
+    #
+    # Do it in a single statement with a JOIN to `articles` to guarantee FK safety.
+    placeholders = ','.join(['(?, ?, ?)'] * len(values))
+    params: list[Any] = []
+    for block_id, to_id, kind in values:
+        params.extend([block_id, to_id, kind])
+    CONN.execute(
+        f'''
+        INSERT INTO article_links (from_id, block_id, to_id, kind)
+        SELECT ?, v.block_id, v.to_id, v.kind
+        FROM (VALUES {placeholders}) AS v(block_id, to_id, kind)
+        JOIN articles a ON a.id = v.to_id
+        ON CONFLICT (from_id, block_id, to_id) DO NOTHING
+        ''',
+        (article_id, *params),
+    )
+
+
+def _rebuild_article_links_for_article_id(
+    article_id: str,
+    *,
+    doc_json: Any | None = None,
+    link_map: dict[str, set[str]] | None = None,
+) -> None:
     """
     Пересобирает связи article_links для статьи по всем её блокам
     (используется при инкрементальном редактировании блоков).
+    link_map — уже посчитанные ссылки секций (analyze_outline_doc), чтобы не обходить doc_json ещё раз.
     """
     if not article_id:
         return
 
     # doc_json-first: extract links from outline sections (heading+body, without children).
-    if doc_json is not None:
+    if doc_json is not None or link_map is not None:
         CONN.execute('DELETE FROM article_links WHERE from_id = ?', (article_id,))
-        values: list[tuple[str, str, str, str]] = []
-        try:
-            link_map = build_outline_section_internal_links_map(doc_json)
-        except Exception:
-            link_map = {}
-        for section_id, targets in (link_map or {}).items():
-            for target_id in targets or set():
-                if not target_id or target_id == article_id:
-                    continue
-                values.append((article_id, section_id, target_id, 'internal'))
-        if values:
-            # IMPORTANT:
-            # `article_links.to_id` has a FK to `articles.id`. Links to missing articles MUST be skipped,
-            # otherwise Postgres marks the whole transaction as aborted and callers (like structure snapshots)
-            # get rolled back.
-            #
-            # Do it in a single statement with a JOIN to `articles` to guarantee FK safety.
-            placeholders = ','.join(['(?, ?, ?)'] * len(values))
-            params: list[Any] = []
-            for _, block_id, to_id, kind in values:
-                params.extend([block_id, to_id, kind])
-            CONN.execute(
-                f'''
-                INSERT INTO article_links (from_id, block_id, to_id, kind)
-                SELECT ?, v.block_id, v.to_id, v.kind
-                FROM (VALUES {placeholders}) AS v(block_id, to_id, kind)
-                JOIN articles a ON a.id = v.to_id
-                ON CONFLICT (from_id, block_id, to_id) DO NOTHING
-                ''',
-                (article_id, *params),
-            )
+        if link_map is None:
+            try:
+                link_map = build_outline_section_internal_links_map(doc_json)
+            except Exception:
+                link_map = {}
+        _insert_article_links(article_id, link_map or {})
         return
 
     rows = CONN.execute(
@@ -777,16 +1265,59 @@ def upsert_outline_section_search_index(
         return
     CONN.execute(
         '''
-        INSERT INTO outline_sections_fts (section_id, article_id, text, lemma, normalized_text, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?)
+        INSERT INTO outline_sections_fts (section_id, article_id, text, lemma, normalized_text, updated_at, author_id, deleted)
+        SELECT ?, a.id, ?, ?, ?, ?, COALESCE(a.author_id, ''), a.deleted_at IS NOT NULL
+        FROM articles a
+        WHERE a.id = ?
+        ON CONFLICT (section_id) DO UPDATE
+        SET article_id = EXCLUDED.article_id,
+            text = EXCLUDED.text,
+            lemma = EXCLUDED.lemma,
+            normalized_text = EXCLUDED.normalized_text,
+            updated_at = EXCLUDED.updated_at,
+            author_id = EXCLUDED.author_id,
+            deleted = EXCLUDED.deleted
+        ''',
+        (section_id, text, lemma, normalized_text, updated_at, article_id),
+    )
+
+
+def upsert_outline_sections_search_index_batch(article_id: str, texts: Dict[str, str], updated_at: str) -> None:
+    """
+    Batch-upsert FTS rows for the given sections in one statement (section_id -> plain text).
+    Lemmatization runs only for the sections passed in.
+    """
+    ids: list[str] = []
+    plains: list[str] = []
+    lemmas: list[str] = []
+    normalized: list[str] = []
+    for sid, plain in (texts or {}).items():
+        if not sid:
+            continue
+        text = (plain or '').strip()
+        ids.append(sid)
+        plains.append(text)
+        analysis = analyze(text)
+        lemmas.append(analysis.lemma)
+        normalized.append(analysis.normalized)
+    if not ids:
+        return
+    CONN.execute(
+        '''
+        INSERT INTO outline_sections_fts (section_id, article_id, text, lemma, normalized_text, updated_at, author_id, deleted)
+        SELECT u.section_id, a.id, u.text, u.lemma, u.normalized_text, ?, COALESCE(a.author_id, ''), a.deleted_at IS NOT NULL
+        FROM unnest(?::text[], ?::text[], ?::text[], ?::text[]) AS u(section_id, text, lemma, normalized_text)
+        JOIN articles a ON a.id = ?
         ON CONFLICT (section_id) DO UPDATE
         SET article_id = EXCLUDED.article_id,
             text = EXCLUDED.text,
             lemma = EXCLUDED.lemma,
             normalized_text = EXCLUDED.normalized_text,
-            updated_at = EXCLUDED.updated_at
+            updated_at = EXCLUDED.updated_at,
+            author_id = EXCLUDED.author_id,
+            deleted = EXCLUDED.deleted
         ''',
-        (section_id, article_id, text, lemma, normalized_text, updated_at),
+        (updated_at, ids, plains, lemmas, normalized, article_id),
     )
 
 
@@ -794,8 +1325,7 @@ def delete_outline_sections_search_index(section_ids: list[str]) -> None:
     ids = [s for s in (section_ids or []) if s]
     if not ids:
         return
-    placeholders = ','.join('?' for _ in ids)
-    CONN.execute(f'DELETE FROM outline_sections_fts WHERE section_id IN ({placeholders})', tuple(ids))
+    CONN.execute('DELETE FROM outline_sections_fts WHERE section_id = ANY(?)', (ids,))
 
 
 def rows_to_tree(article_id: str) -> List[Dict[str, Any]]:
@@ -834,6 +1364,8 @@ def build_article_from_row(row: RowMapping | None, *, include_blocks: bool = Tru
     doc_json_value = None
     if not encrypted_flag:
         raw_doc_json = row.get('article_doc_json')
+        if row.get('doc_json_stale'):
+            raw_doc_json = materialize_article_doc_json(row['id'])
         if raw_doc_json:
             try:
                 parsed = json.loads(raw_doc_json)
@@ -861,6 +1393,7 @@ def build_article_from_row(row: RowMapping | None, *, include_blocks: bool = Tru
         'authorId': row.get('author_id'),
         'publicSlug': row.get('public_slug'),
         'outlineStructureRev': int(row.get('outline_structure_rev') or 0) if row.get('outline_structure_rev') is not None else 0,
+        'contentRev': int(row.get('content_rev') or 0),
         'history': deserialize_history(row['history']),
         'redoHistory': deserialize_history(row['redo_history']),
         'blockTrash': deserialize_history(row.get('block_trash')),
@@ -912,22 +1445,19 @@ def get_articles_index(author_id: str) -> List[Dict[str, Any]]:
         """,
         (author_id,),
     ).fetchall()
-    out: List[Dict[str, Any]] = []
-    for row in rows:
-        if not row:
-            continue
-        out.append(
-            {
-                'id': row['id'],
-                'title': row['title'],
-                'updatedAt': row['updated_at'],
-                'parentId': row.get('parent_id'),
-                'position': row.get('position') or 0,
-                'publicSlug': row.get('public_slug'),
-                'encrypted': _infer_article_encrypted_flag(row, log_inferred=False),
-            }
-        )
-    return out
+    return [_article_index_entry(row) for row in rows if row]
+
+
+def _article_index_entry(row: RowMapping) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'updatedAt': row['updated_at'],
+        'parentId': row.get('parent_id'),
+        'position': row.get('position') or 0,
+        'publicSlug': row.get('public_slug'),
+        'encrypted': _infer_article_encrypted_flag(row, log_inferred=False),
+    }
 
 
 def get_deleted_articles(author_id: str) -> List[Dict[str, Any]]:
@@ -938,16 +1468,263 @@ def get_deleted_articles(author_id: str) -> List[Dict[str, Any]]:
     return [build_article_from_row(row, include_blocks=False) for row in rows if row]
 
 
-def _fetch_article_siblings(parent_id: Optional[str], author_id: str) -> list[RowMapping]:
+# Поддерево статьи — по материализованному пути articles.tree_path (id предков + свой id, от корня).
+# Потомки: tree_path @> ARRAY[id] (GIN idx_articles_tree_path), предки: id = ANY(tree_path), без рекурсии.
+_SUBTREE_WHERE = 'author_id = ? AND tree_path @> ARRAY[?]::text[]'
+# Родители раньше детей, дети в порядке position — дерево строится за один проход.
+_SUBTREE_ORDER = 'ORDER BY cardinality(tree_path), parent_id, position, updated_at DESC'
+_ARTICLE_INDEX_COLUMNS = (
+    'id, title, updated_at, parent_id, position, public_slug, is_encrypted, encryption_salt, encryption_verifier'
+)
+
+
+def get_article_subtree(article_id: str, author_id: str, include_deleted: bool = False) -> List[Dict[str, Any]]:
+    """Лёгкий индекс статьи и всех её потомков (формат /api/articles) плюс depth относительно корня поддерева."""
+    sql = f'SELECT {_ARTICLE_INDEX_COLUMNS}, tree_path FROM articles WHERE {_SUBTREE_WHERE}'
+    if not include_deleted:
+        sql += ' AND deleted_at IS NULL'
+    rows = CONN.execute(f'{sql} {_SUBTREE_ORDER}', (author_id, article_id)).fetchall()
+    if not rows:
+        return []
+    base_depth = len(rows[0]['tree_path'] or [])
+    out: List[Dict[str, Any]] = []
+    for row in rows:
+        entry = _article_index_entry(row)
+        entry['depth'] = len(row['tree_path'] or []) - base_depth
+        out.append(entry)
+    return out
+
+
+def get_article_subtree_articles(article_id: str, author_id: str) -> List[Dict[str, Any]]:
+    """Полные статьи поддерева (для экспорта ветки), родители раньше детей."""
+    rows = CONN.execute(
+        f'SELECT * FROM articles WHERE {_SUBTREE_WHERE} AND deleted_at IS NULL {_SUBTREE_ORDER}',
+        (author_id, article_id),
+    ).fetchall()
+    return [build_article_from_row(row, include_blocks=False) for row in rows if row]
+
+
+def get_article_ancestors(article_id: str, author_id: str) -> List[Dict[str, Any]]:
+    """Предки статьи от корня к непосредственному родителю (хлебные крошки)."""
+    row = CONN.execute(
+        'SELECT tree_path FROM articles WHERE id = ? AND author_id = ?',
+        (article_id, author_id),
+    ).fetchone()
+    if not row:
+        raise ArticleNotFound('Article not found')
+    path = list(row['tree_path'] or [])[:-1]
+    if not path:
+        return []
+    rows = CONN.execute(
+        f'SELECT {_ARTICLE_INDEX_COLUMNS} FROM articles WHERE author_id = ? AND id = ANY(?)',
+        (author_id, path),
+    ).fetchall()
+    by_id = {r['id']: r for r in rows}
+    return [_article_index_entry(by_id[aid]) for aid in path if aid in by_id]
+
+
+def delete_article_subtree(article_id: str, author_id: str, force: bool = False) -> List[str]:
+    """
+    Удаляет статью вместе со всеми потомками. Возвращает id затронутых статей ([] — статьи нет).
+    Мягкое удаление ставит всей ветке один deleted_at, чтобы restore_article_subtree вернул ровно её.
+    """
+    with CONN:
+        if force:
+            rows = CONN.execute(f'SELECT id FROM articles WHERE {_SUBTREE_WHERE}', (author_id, article_id)).fetchall()
+            ids = [r['id'] for r in rows]
+            if not ids:
+                return []
+            CONN.execute('DELETE FROM outline_sections_fts WHERE article_id = ANY(?)', (ids,))
+            CONN.execute('DELETE FROM articles_fts WHERE article_id = ANY(?)', (ids,))
+            CONN.execute('DELETE FROM articles WHERE id = ANY(?)', (ids,))
+            # Tombstones для ленты /api/sync/changes — по одному на каждую статью ветки.
+            CONN.execute(
+                '''
+                INSERT INTO article_tombstones (article_id, author_id, deleted_at, change_xid)
+                SELECT aid, ?, ?, pg_current_xact_id() FROM unnest(?::text[]) AS aid
+                ON CONFLICT (article_id) DO UPDATE
+                SET author_id = EXCLUDED.author_id,
+                    deleted_at = EXCLUDED.deleted_at,
+                    change_xid = EXCLUDED.change_xid
+                ''',
+                (author_id, iso_now(), ids),
+            )
+            return ids
+        now = iso_now()
+        rows = CONN.execute(
+            f'''
+            UPDATE articles
+            SET deleted_at = ?, updated_at = ?, content_rev = content_rev + 1
+            WHERE {_SUBTREE_WHERE} AND deleted_at IS NULL
+            RETURNING id
+            ''',
+            (now, now, author_id, article_id),
+        ).fetchall()
+    return [r['id'] for r in rows]
+
+
+def restore_article_subtree(article_id: str, author_id: str) -> List[str]:
+    """
+    Восстанавливает удалённую статью и потомков, удалённых вместе с ней (тот же deleted_at).
+    Возвращает id восстановленных статей ([] — статья не найдена или не удалена).
+    """
+    with CONN:
+        root = CONN.execute(
+            'SELECT deleted_at FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NOT NULL',
+            (article_id, author_id),
+        ).fetchone()
+        if not root:
+            return []
+        rows = CONN.execute(
+            f'''
+            UPDATE articles
+            SET deleted_at = NULL, updated_at = ?, content_rev = content_rev + 1
+            WHERE {_SUBTREE_WHERE} AND (id = ? OR deleted_at = ?)
+            RETURNING id
+            ''',
+            (iso_now(), author_id, article_id, article_id, root['deleted_at']),
+        ).fetchall()
+    return [r['id'] for r in rows]
+
+
+# Порядок статей среди siblings — дробный position (DOUBLE PRECISION, как outline_sections.position):
+# перемещение пишет одну строку — середину между соседями. Если зазор исчерпан или позиции совпали,
+# siblings перенумеровываются одним UPDATE; слишком мелкие зазоры заранее выравнивает фоновый ребалансер.
+ARTICLE_POSITION_MIN_GAP = 1e-6
+
+_POSITION_REBALANCE_LOCK = threading.Lock()
+_POSITION_REBALANCE_THREAD: threading.Thread | None = None
+_POSITION_REBALANCE_PENDING: set[tuple[str, Optional[str]]] = set()
+
+
+def _article_parent_clause(parent_id: Optional[str]) -> tuple[str, tuple[Any, ...]]:
     if parent_id is None:
-        return CONN.execute(
-            'SELECT id, parent_id, position FROM articles WHERE deleted_at IS NULL AND author_id = ? AND parent_id IS NULL ORDER BY position',
-            (author_id,),
+        return 'parent_id IS NULL', ()
+    return 'parent_id = ?', (parent_id,)
+
+
+def rebalance_article_positions(author_id: str, parent_id: Optional[str]) -> int:
+    """
+    Перенумеровывает siblings в 0, 1, 2, … в текущем порядке списка. Возвращает число изменённых строк.
+    Меняется только структура: двигаем change_xid (статья попадёт в /api/sync/changes), но не content_rev —
+    иначе триггер сдвинет content_xid и клиенты перекачают docJson всех siblings.
+    """
+    clause, params = _article_parent_clause(parent_id)
+    with CONN:
+        rows = CONN.execute(
+            f"""
+            UPDATE articles a
+            SET position = r.pos, change_xid = pg_current_xact_id()
+            FROM (
+                SELECT id, (row_number() OVER (ORDER BY position, updated_at DESC) - 1)::double precision AS pos
+                FROM articles
+                WHERE deleted_at IS NULL AND author_id = ? AND {clause}
+            ) r
+            WHERE a.id = r.id AND a.position <> r.pos
+            RETURNING a.id
+            """,
+            (author_id, *params),
         ).fetchall()
-    return CONN.execute(
-        'SELECT id, parent_id, position FROM articles WHERE deleted_at IS NULL AND author_id = ? AND parent_id = ? ORDER BY position',
-        (author_id, parent_id),
-    ).fetchall()
+    return len(rows)
+
+
+def _kick_article_position_rebalance(author_id: str, parent_id: Optional[str]) -> None:
+    global _POSITION_REBALANCE_THREAD
+    with _POSITION_REBALANCE_LOCK:
+        _POSITION_REBALANCE_PENDING.add((author_id, parent_id))
+        if _POSITION_REBALANCE_THREAD and _POSITION_REBALANCE_THREAD.is_alive():
+            return
+
+        def _runner() -> None:
+            while True:
+                with _POSITION_REBALANCE_LOCK:
+                    if not _POSITION_REBALANCE_PENDING:
+                        return
+                    key = _POSITION_REBALANCE_PENDING.pop()
+                try:
+                    rebalance_article_positions(*key)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning('article positions rebalance failed for %s: %r', key, exc)
+
+        _POSITION_REBALANCE_THREAD = threading.Thread(target=_runner, name='article-positions', daemon=True)
+        _POSITION_REBALANCE_THREAD.start()
+
+
+def _article_position_bounds(
+    author_id: str,
+    parent_id: Optional[str],
+    exclude_id: str,
+    anchor_id: Optional[str],
+    placement: Optional[str],
+) -> tuple[Optional[float], Optional[float]]:
+    # Соседние позиции места вставки (без самой перемещаемой статьи); без якоря — конец списка.
+    clause, params = _article_parent_clause(parent_id)
+    base = f'FROM articles WHERE deleted_at IS NULL AND author_id = ? AND {clause} AND id <> ?'
+    base_params = (author_id, *params, exclude_id)
+    anchor = None
+    if anchor_id and placement in ('before', 'after'):
+        anchor = CONN.execute(f'SELECT position {base} AND id = ?', (*base_params, anchor_id)).fetchone()
+    if anchor is None:
+        row = CONN.execute(f'SELECT MAX(position) AS p {base}', base_params).fetchone()
+        return (row or {}).get('p'), None
+    anchor_pos = float(anchor['position'])
+    if placement == 'after':
+        row = CONN.execute(
+            f'SELECT MIN(position) AS p {base} AND id <> ? AND position >= ?', (*base_params, anchor_id, anchor_pos)
+        ).fetchone()
+        return anchor_pos, (row or {}).get('p')
+    row = CONN.execute(
+        f'SELECT MAX(position) AS p {base} AND id <> ? AND position <= ?', (*base_params, anchor_id, anchor_pos)
+    ).fetchone()
+    return (row or {}).get('p'), anchor_pos
+
+
+def _article_position_slot(
+    author_id: str,
+    parent_id: Optional[str],
+    exclude_id: str,
+    anchor_id: Optional[str] = None,
+    placement: Optional[str] = None,
+) -> float:
+    """Позиция для статьи среди siblings parent_id: до/после anchor_id либо в конец."""
+    for _ in range(2):
+        lo, hi = _article_position_bounds(author_id, parent_id, exclude_id, anchor_id, placement)
+        if lo is None and hi is None:
+            return 0.0
+        if lo is None:
+            return float(hi) - 1.0
+        if hi is None:
+            return float(lo) + 1.0
+        pos = (float(lo) + float(hi)) / 2
+        if lo < pos < hi:
+            if hi - lo < ARTICLE_POSITION_MIN_GAP:
+                _kick_article_position_rebalance(author_id, parent_id)
+            return pos
+        # Совпавшие позиции или исчерпанная точность double — перенумеровываем и считаем заново.
+        rebalance_article_positions(author_id, parent_id)
+    raise InvalidOperation('Cannot allocate article position')
+
+
+def _article_neighbor(author_id: str, article_id: str, direction: str) -> tuple[RowMapping, Optional[RowMapping]]:
+    """Строка статьи (parent_id, position) и ближайший сосед сверху ('up') или снизу ('down')."""
+    for _ in range(2):
+        row = CONN.execute(
+            'SELECT parent_id, position FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NULL',
+            (article_id, author_id),
+        ).fetchone()
+        if not row:
+            raise ArticleNotFound('Article not found')
+        clause, params = _article_parent_clause(row['parent_id'])
+        op, order = ('<=', 'DESC') if direction == 'up' else ('>=', 'ASC')
+        neighbor = CONN.execute(
+            f'SELECT id, position FROM articles WHERE deleted_at IS NULL AND author_id = ? AND {clause} '
+            f'AND id <> ? AND position {op} ? ORDER BY position {order} LIMIT 1',
+            (author_id, *params, article_id, row['position']),
+        ).fetchone()
+        if not neighbor or neighbor['position'] != row['position']:
+            return row, neighbor
+        rebalance_article_positions(author_id, row['parent_id'])
+    return row, neighbor
 
 
 def move_article_to_parent(
@@ -964,153 +1741,67 @@ def move_article_to_parent(
     - target_parent_id = None — корень;
     - anchor_id + placement ('before'/'after'/'inside') определяют место вставки;
     - если anchor_id не задан, статья добавляется в конец children целевого родителя.
+    Пишется одна строка: position — середина между соседями места вставки
+    (tree_path поддерева переписывает триггер articles_propagate_tree_path).
     """
-    rows = CONN.execute(
-        'SELECT id, parent_id, position FROM articles WHERE deleted_at IS NULL AND author_id = ? ORDER BY position',
-        (author_id,),
-    ).fetchall()
-    if not rows:
-        raise ArticleNotFound('Article not found')
-
-    # Собираем дерево: parent_id -> [child_ids] в порядке position.
-    children_map: dict[Optional[str], list[str]] = {}
-    for row in rows:
-        pid = row['parent_id']
-        aid = row['id']
-        children_map.setdefault(pid, []).append(aid)
-
-    all_ids = {row['id'] for row in rows}
-    if article_id not in all_ids:
+    row = CONN.execute(
+        'SELECT parent_id FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NULL',
+        (article_id, author_id),
+    ).fetchone()
+    if not row:
         raise ArticleNotFound('Article not found')
-    if target_parent_id is not None and target_parent_id not in all_ids:
-        raise ArticleNotFound('Target parent not found')
-
-    # Запрещаем перемещение в себя или в потомка.
-    descendants: set[str] = set()
-
-    def collect_descendants(current_id: str) -> None:
-        for child_id in children_map.get(current_id, []):
-            if child_id not in descendants:
-                descendants.add(child_id)
-                collect_descendants(child_id)
-
-    collect_descendants(article_id)
-    if target_parent_id is not None and target_parent_id in descendants.union({article_id}):
-        raise InvalidOperation('Cannot move article into itself or its descendant')
-
-    # Исходный родитель.
-    origin_parent_id: Optional[str] = None
-    for row in rows:
-        if row['id'] == article_id:
-            origin_parent_id = row['parent_id']
-            break
-
-    origin_order = list(children_map.get(origin_parent_id, []))
-    if article_id not in origin_order:
-        raise ArticleNotFound('Article not found in origin siblings')
-
-    # Базовый список потомков целевого родителя.
-    target_order = list(children_map.get(target_parent_id, []))
-    # Удаляем статью, если она там уже фигурирует.
-    target_order = [aid for aid in target_order if aid != article_id]
-
-    # Если целевой родитель тот же, работаем с origin без текущей статьи.
-    if target_parent_id == origin_parent_id:
-        target_order = [aid for aid in origin_order if aid != article_id]
+    if target_parent_id is not None:
+        target = CONN.execute(
+            'SELECT tree_path FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NULL',
+            (target_parent_id, author_id),
+        ).fetchone()
+        if not target:
+            raise ArticleNotFound('Target parent not found')
+        # Запрещаем перемещение в себя или в потомка: статья не должна быть на пути целевого родителя.
+        if article_id in (target['tree_path'] or []):
+            raise InvalidOperation('Cannot move article into itself or its descendant')
 
-    insertion_index: Optional[int] = None
     # Вставка «внутрь» всегда делает статью последним ребёнком,
     # независимо от положения курсора или anchor_id.
     if placement == 'inside':
-        insertion_index = len(target_order)
-    elif anchor_id and anchor_id in target_order:
-        anchor_idx = target_order.index(anchor_id)
-        if placement == 'before':
-            insertion_index = anchor_idx
-        elif placement == 'after':
-            insertion_index = anchor_idx + 1
-    if insertion_index is None:
-        insertion_index = len(target_order)
-
-    insertion_index = max(0, min(insertion_index, len(target_order)))
-    target_order.insert(insertion_index, article_id)
-
+        anchor_id = None
     now = iso_now()
     with CONN:
-        if target_parent_id != origin_parent_id:
-            # Сжимаем порядок в исходном родителе.
-            origin_compact = [aid for aid in origin_order if aid != article_id]
-            for pos, aid in enumerate(origin_compact):
-                CONN.execute(
-                    'UPDATE articles SET position = ?, updated_at = ? WHERE id = ? AND author_id = ?',
-                    (pos, now, aid, author_id),
-                )
-
-        # Выставляем порядок для целевого родителя.
-        for pos, aid in enumerate(target_order):
-            CONN.execute(
-                'UPDATE articles SET parent_id = ?, position = ?, updated_at = ? WHERE id = ? AND author_id = ?',
-                (target_parent_id, pos, now, aid, author_id),
-            )
+        position = _article_position_slot(author_id, target_parent_id, article_id, anchor_id, placement)
+        CONN.execute(
+            'UPDATE articles SET parent_id = ?, position = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ? AND author_id = ?',
+            (target_parent_id, position, now, article_id, author_id),
+        )
 
     return get_article(article_id, author_id)
 
 
 def move_article(article_id: str, direction: str, author_id: str) -> Dict[str, Any]:
-    row = CONN.execute(
-        'SELECT parent_id FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NULL',
-        (article_id, author_id),
-    ).fetchone()
-    if not row:
-        raise ArticleNotFound('Article not found')
-    parent_id = row['parent_id']
-    siblings = _fetch_article_siblings(parent_id, author_id)
-    ids = [r['id'] for r in siblings]
-    if article_id not in ids:
-        raise ArticleNotFound('Article not found')
-    idx = ids.index(article_id)
-    if direction == 'up' and idx == 0:
-        return get_article(article_id, author_id)
-    if direction == 'down' and idx == len(ids) - 1:
-        return get_article(article_id, author_id)
-    new_idx = idx - 1 if direction == 'up' else idx + 1
-    ids[idx], ids[new_idx] = ids[new_idx], ids[idx]
     with CONN:
-        for pos, aid in enumerate(ids):
-            CONN.execute(
-                'UPDATE articles SET position = ? WHERE id = ? AND author_id = ?',
-                (pos, aid, author_id),
-            )
+        row, neighbor = _article_neighbor(author_id, article_id, direction)
+        if not neighbor:
+            return get_article(article_id, author_id)
+        position = _article_position_slot(
+            author_id, row['parent_id'], article_id, neighbor['id'], 'before' if direction == 'up' else 'after'
+        )
+        CONN.execute(
+            'UPDATE articles SET position = ?, content_rev = content_rev + 1 WHERE id = ? AND author_id = ?',
+            (position, article_id, author_id),
+        )
     return get_article(article_id, author_id)
 
 
 def indent_article(article_id: str, author_id: str) -> Dict[str, Any]:
-    row = CONN.execute(
-        'SELECT parent_id FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NULL',
-        (article_id, author_id),
-    ).fetchone()
-    if not row:
-        raise ArticleNotFound('Article not found')
-    parent_id = row['parent_id']
-    siblings = _fetch_article_siblings(parent_id, author_id)
-    ids = [r['id'] for r in siblings]
-    if article_id not in ids:
-        raise ArticleNotFound('Article not found')
-    idx = ids.index(article_id)
-    if idx == 0:
-        # Не во что вкладывать.
-        return get_article(article_id, author_id)
-    new_parent_id = ids[idx - 1]
-    max_pos_row = CONN.execute(
-        'SELECT MAX(position) AS maxp FROM articles WHERE parent_id = ? AND author_id = ? AND deleted_at IS NULL',
-        (new_parent_id, author_id),
-    ).fetchone()
-    new_pos = (max_pos_row['maxp'] or 0) + 1
-    now = iso_now()
     with CONN:
+        _, prev = _article_neighbor(author_id, article_id, 'up')
+        if not prev:
+            # Не во что вкладывать.
+            return get_article(article_id, author_id)
+        new_parent_id = prev['id']
+        position = _article_position_slot(author_id, new_parent_id, article_id)
         CONN.execute(
-            'UPDATE articles SET parent_id = ?, position = ?, updated_at = ? WHERE id = ? AND author_id = ?',
-            (new_parent_id, new_pos, now, article_id, author_id),
+            'UPDATE articles SET parent_id = ?, position = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ? AND author_id = ?',
+            (new_parent_id, position, iso_now(), article_id, author_id),
         )
     return get_article(article_id, author_id)
 
@@ -1133,23 +1824,13 @@ def outdent_article(article_id: str, author_id: str) -> Dict[str, Any]:
     ).fetchone()
     new_parent_id = parent_row['parent_id'] if parent_row else None
 
-    siblings = _fetch_article_siblings(new_parent_id, author_id)
-    ids = [r['id'] for r in siblings]
-    insert_after_idx = len(ids) - 1
-    if parent_id in ids:
-        insert_after_idx = ids.index(parent_id)
-    # Строим новый порядок: оставляем все, но добавим/переместим article_id после parent_id.
-    if article_id in ids:
-        ids.remove(article_id)
-    ids.insert(insert_after_idx + 1, article_id)
-
-    now = iso_now()
+    # Встаём сразу после бывшего родителя (если его нет среди новых siblings — в конец).
     with CONN:
-        for pos, aid in enumerate(ids):
-            CONN.execute(
-                'UPDATE articles SET parent_id = ?, position = ?, updated_at = ? WHERE id = ? AND author_id = ?',
-                (new_parent_id, pos, now, aid, author_id),
-            )
+        position = _article_position_slot(author_id, new_parent_id, article_id, parent_id, 'after')
+        CONN.execute(
+            'UPDATE articles SET parent_id = ?, position = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ? AND author_id = ?',
+            (new_parent_id, position, iso_now(), article_id, author_id),
+        )
     return get_article(article_id, author_id)
 
 
@@ -1189,8 +1870,9 @@ def get_article(
             now = iso_now()
             with CONN:
                 CONN.execute(
-                    'UPDATE articles SET article_doc_json = ?, updated_at = ?, redo_history = ? WHERE id = ?',
-                    (doc_json_str, now, '[]', article_id),
+                    'UPDATE articles SET article_doc_json = ?, doc_json_bytes = ?, doc_json_hash = ?, updated_at = ?, content_rev = content_rev + 1, '
+                    'redo_history = ?, sections_synced = FALSE, doc_json_stale = FALSE WHERE id = ?',
+                    (doc_json_str, *doc_json_stats(doc_json_str), now, '[]', article_id),
                 )
             return True
 
@@ -1213,8 +1895,7 @@ def get_article(
         def _try_restore_inbox_from_history() -> bool:
             # Inbox is outline-first: blocks table is not authoritative and can be incomplete/empty.
             try:
-                raw_hist = row.get('history') or '[]'
-                hist = json.loads(raw_hist) if isinstance(raw_hist, str) else (raw_hist or [])
+                hist = list_article_history(article_id, limit=ARTICLE_HISTORY_PAGE_LIMIT).get('entries') or []
             except Exception:
                 hist = []
             if not isinstance(hist, list) or not hist:
@@ -1287,20 +1968,274 @@ def get_article(
     return article
 
 
+# Колонки для чтения статьи без разбора article_doc_json (GET /api/articles/{id}).
+_ARTICLE_READ_COLUMNS = (
+    'id, title, created_at, updated_at, deleted_at, parent_id, position, author_id, public_slug, '
+    'outline_structure_rev, is_encrypted, encryption_salt, encryption_verifier, encryption_hint, '
+    'content_rev, doc_json_stale, doc_json_bytes, doc_json_hash, article_doc_json'
+)
+# Так начинается любой непустой outline-документ, сохранённый через json.dumps.
+_DOC_JSON_NONEMPTY_PREFIX = '{"type": "doc", "content": [{'
+
+
+def get_article_raw(article_id: str, author_id: str, *, include_block_trash: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Метаданные статьи и сохранённый текст article_doc_json как есть (docJsonText), без json.loads/dumps;
+    размер и хэш берутся из колонок. Возвращает None, если статьи нет или документ пустой/невалидный —
+    тогда нужен полный путь get_article (он умеет self-heal).
+    """
+    cols = _ARTICLE_READ_COLUMNS + (', block_trash' if include_block_trash else '')
+    row = CONN.execute(
+        f'SELECT {cols} FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NULL',
+        (article_id, author_id),
+    ).fetchone()
+    if not row:
+        return None
+    encrypted_flag = _infer_article_encrypted_flag(row, log_inferred=True)
+    if encrypted_flag:
+        # Plaintext docJson для зашифрованных статей не отдаём (как build_article_from_row).
+        doc_text: str | None = 'null'
+        doc_bytes, doc_hash = doc_json_stats(doc_text)
+    else:
+        doc_text = row.get('article_doc_json')
+        doc_bytes, doc_hash = row.get('doc_json_bytes'), row.get('doc_json_hash')
+        if row.get('doc_json_stale'):
+            doc_text = materialize_article_doc_json(row['id'])
+            doc_bytes, doc_hash = doc_json_stats(doc_text)
+        if not doc_text or not doc_text.startswith(_DOC_JSON_NONEMPTY_PREFIX):
+            return None
+        if doc_bytes is None or not doc_hash:
+            doc_bytes, doc_hash = doc_json_stats(doc_text)
+    article = {
+        'id': row['id'],
+        'title': row['title'],
+        'createdAt': row['created_at'],
+        'updatedAt': row['updated_at'],
+        'deletedAt': row['deleted_at'],
+        'parentId': row.get('parent_id'),
+        'position': row.get('position') or 0,
+        'authorId': row.get('author_id'),
+        'publicSlug': row.get('public_slug'),
+        'outlineStructureRev': int(row.get('outline_structure_rev') or 0),
+        'contentRev': int(row.get('content_rev') or 0),
+        'encrypted': encrypted_flag,
+        'encryptionSalt': row.get('encryption_salt'),
+        'encryptionVerifier': row.get('encryption_verifier'),
+        'encryptionHint': row.get('encryption_hint'),
+        'docJsonText': doc_text,
+        'docJsonBytes': int(doc_bytes or 0),
+        'docJsonHash': doc_hash or '',
+    }
+    if include_block_trash:
+        article['blockTrash'] = deserialize_history(row.get('block_trash'))
+    return article
+
+
+def get_article_meta(article_id: str, author_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Метаданные для /meta из колонок (покрывающий индекс idx_articles_meta), без article_doc_json.
+    Пока проекция doc_json_stale, размер/хэш документа неизвестны — отдаём None, ревизия при этом уже новая.
+    """
+    row = CONN.execute(
+        'SELECT updated_at, content_rev, doc_json_bytes, doc_json_hash, doc_json_stale '
+        'FROM articles WHERE id = ? AND author_id = ? AND deleted_at IS NULL',
+        (article_id, author_id),
+    ).fetchone()
+    if not row:
+        return None
+    stale = bool(row.get('doc_json_stale'))
+    return {
+        'updatedAt': row.get('updated_at'),
+        'contentRev': int(row.get('content_rev') or 0),
+        'docJsonBytes': None if stale else int(row.get('doc_json_bytes') or 0),
+        'docJsonHash': None if stale else (row.get('doc_json_hash') or ''),
+    }
+
+
+# Лента /api/sync/changes: размер страницы выбирает сервер (число статей и бюджет байт docJson).
+SYNC_CHANGES_PAGE_SIZE = int(os.environ.get('SERVPY_SYNC_CHANGES_PAGE_SIZE') or '200')
+SYNC_CHANGES_PAGE_BYTES = int(os.environ.get('SERVPY_SYNC_CHANGES_PAGE_BYTES') or str(4 * 1024 * 1024))
+
+_SYNC_CHANGES_COLUMNS = (
+    'id, title, created_at, updated_at, deleted_at, parent_id, position, author_id, public_slug, '
+    'outline_structure_rev, is_encrypted, encryption_salt, encryption_verifier, encryption_hint, '
+    'content_rev, doc_json_bytes, doc_json_hash, doc_json_stale, change_xid::text AS change_xid'
+)
+
+
+def _parse_sync_cursor(cursor: str | None) -> tuple[str, str, str]:
+    """
+    (since, xid, after_id). "X" — все изменения с change_xid >= X; "S:X:id" — следующая страница того же
+    прохода: строки после (X, id), а новизну содержимого и embeddings по-прежнему считаем от водяного знака S
+    клиента. Старый формат продолжения "X:id" читается как S = X.
+    """
+    raw = (cursor or '').strip()
+    if not raw:
+        return '0', '0', ''
+    parts = raw.split(':', 2)
+    if len(parts) == 3 and parts[1].isdigit():
+        since, xid, after_id = parts
+    else:
+        xid, _, after_id = raw.partition(':')
+        since = xid
+    if not since.isdigit() or not xid.isdigit():
+        raise InvalidOperation('Invalid sync cursor')
+    return since, xid, after_id
+
+
+def get_sync_changes(author_id: str, cursor: str | None = None, *, dtype: str | None = None) -> Dict[str, Any]:
+    """
+    Одна страница дельта-синхронизации для автора: статьи, изменённые после курсора (docJsonText — только
+    если менялось содержимое), их embeddings, удаления и следующий курсор.
+
+    Курсор — xid8 транзакции последней правки (articles.change_xid). Отдаём только строки с change_xid
+    ниже xmin текущего снимка: все более ранние транзакции уже завершены, поэтому правка, закоммиченная
+    позже, не может получить xid меньше выданного курсора и не будет пропущена.
+    dtype='f32'/'f16' — embeddings упакованы в bytes (pack_vector_send).
+    """
+    since, lower, after_id = _parse_sync_cursor(cursor)
+    xmin = CONN.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS xmin').fetchone()['xmin']
+    # Позиция страницы — (lower, after_id); «что изменилось» — всегда относительно since: на следующих
+    # страницах lower уже продвинут, а содержимое/embeddings статьи могли измениться между since и lower.
+    rows = CONN.execute(
+        f"""
+        SELECT {_SYNC_CHANGES_COLUMNS}, content_xid >= ?::xid8 AS content_changed
+        FROM articles
+        WHERE author_id = ? AND change_xid < ?::xid8 AND (change_xid, id) > (?::xid8, ?)
+        ORDER BY change_xid, id
+        LIMIT ?
+        """,
+        (since, author_id, xmin, lower, after_id, SYNC_CHANGES_PAGE_SIZE + 1),
+    ).fetchall()
+
+    page: list[Any] = []
+    budget = 0
+    has_more = len(rows) > SYNC_CHANGES_PAGE_SIZE
+    for row in rows[:SYNC_CHANGES_PAGE_SIZE]:
+        if row['content_changed'] and not row['deleted_at']:
+            budget += int(row.get('doc_json_bytes') or 0)
+            if page and budget > SYNC_CHANGES_PAGE_BYTES:
+                has_more = True
+                break
+        page.append(row)
+
+    doc_ids = [r['id'] for r in page if r['content_changed'] and not r['deleted_at']]
+    docs: Dict[str, str] = {}
+    if doc_ids:
+        for doc_row in CONN.execute(
+            'SELECT id, article_doc_json, doc_json_stale FROM articles WHERE id = ANY(?)',
+            (doc_ids,),
+        ).fetchall():
+            text = doc_row.get('article_doc_json')
+            if doc_row.get('doc_json_stale'):
+                text = materialize_article_doc_json(doc_row['id'])
+            docs[doc_row['id']] = text if text and text.startswith('{') else 'null'
+
+    live_ids = [r['id'] for r in page if not r['deleted_at']]
+    embeddings: Dict[str, list[dict[str, Any]]] = {}
+    if live_ids and CONN.execute("SELECT to_regclass('block_embeddings') IS NOT NULL AS ok").fetchone()['ok']:
+        # Для статей с новым содержимым — полный набор (клиент заменяет), для остальных — только свежие.
+        emb_expr = 'vector_send(embedding)' if dtype else 'embedding'
+        for emb in CONN.execute(
+            f"""
+            SELECT block_id, article_id, updated_at, {emb_expr} AS embedding
+            FROM block_embeddings
+            WHERE author_id = ? AND article_id = ANY(?) AND (article_id = ANY(?) OR change_xid >= ?::xid8)
+            ORDER BY article_id, block_id
+            """,
+            (author_id, live_ids, doc_ids, since),
+        ).fetchall():
+            embeddings.setdefault(emb['article_id'], []).append(
+                {
+                    'blockId': emb['block_id'],
+                    'updatedAt': emb['updated_at'],
+                    'embedding': (
+                        pack_vector_send(emb['embedding'], dtype) if dtype else _coerce_embedding_to_list(emb['embedding'])
+                    ),
+                }
+            )
+    title_embeddings = get_article_title_embeddings(article_ids=live_ids, author_id=author_id, dtype=dtype)
+
+    doc_set = set(doc_ids)
+    articles: list[dict[str, Any]] = []
+    deleted: list[dict[str, Any]] = []
+    for row in page:
+        if row['deleted_at']:
+            deleted.append({'articleId': row['id'], 'deletedAt': row['deleted_at'], 'permanent': False})
+            continue
+        encrypted_flag = _infer_article_encrypted_flag(row)
+        doc_text = docs.get(row['id']) if row['id'] in doc_set else None
+        if encrypted_flag and doc_text is not None:
+            doc_text = 'null'
+        articles.append(
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'createdAt': row['created_at'],
+                'updatedAt': row['updated_at'],
+                'deletedAt': None,
+                'parentId': row.get('parent_id'),
+                'position': row.get('position') or 0,
+                'authorId': row.get('author_id'),
+                'publicSlug': row.get('public_slug'),
+                'outlineStructureRev': int(row.get('outline_structure_rev') or 0),
+                'contentRev': int(row.get('content_rev') or 0),
+                'encrypted': encrypted_flag,
+                'encryptionSalt': row.get('encryption_salt'),
+                'encryptionVerifier': row.get('encryption_verifier'),
+                'encryptionHint': row.get('encryption_hint'),
+                'docJsonText': doc_text,
+                'embeddings': embeddings.get(row['id'], []),
+                'titleEmbedding': title_embeddings.get(row['id']),
+            }
+        )
+
+    if not has_more:
+        # Окончательные удаления — один раз за проход, на последней странице: её xmin и станет курсором.
+        tombstones = CONN.execute(
+            """
+            SELECT article_id, deleted_at FROM article_tombstones
+            WHERE author_id = ? AND change_xid >= ?::xid8 AND change_xid < ?::xid8
+            ORDER BY change_xid, article_id
+            """,
+            (author_id, since, xmin),
+        ).fetchall()
+        for tomb in tombstones:
+            deleted.append({'articleId': tomb['article_id'], 'deletedAt': tomb['deleted_at'], 'permanent': True})
+
+    if has_more:
+        next_cursor = f"{since}:{page[-1]['change_xid']}:{page[-1]['id']}"
+    else:
+        next_cursor = xmin if int(xmin) >= int(lower) else lower
+    return {'articles': articles, 'deleted': deleted, 'cursor': next_cursor, 'hasMore': has_more}
+
+
 def delete_article(article_id: str, force: bool = False) -> bool:
     """Soft-delete article or remove permanently when force=True."""
     with CONN:
-        exists = CONN.execute('SELECT 1 FROM articles WHERE id = ?', (article_id,)).fetchone()
+        exists = CONN.execute('SELECT author_id FROM articles WHERE id = ?', (article_id,)).fetchone()
         if not exists:
             return False
         if force:
             CONN.execute('DELETE FROM outline_sections_fts WHERE article_id = ?', (article_id,))
             CONN.execute('DELETE FROM articles_fts WHERE article_id = ?', (article_id,))
             CONN.execute('DELETE FROM articles WHERE id = ?', (article_id,))
+            # Tombstone для ленты /api/sync/changes: офлайн-клиенты должны узнать об удалении.
+            CONN.execute(
+                '''
+                INSERT INTO article_tombstones (article_id, author_id, deleted_at, change_xid)
+                VALUES (?, ?, ?, pg_current_xact_id())
+                ON CONFLICT (article_id) DO UPDATE
+                SET author_id = EXCLUDED.author_id,
+                    deleted_at = EXCLUDED.deleted_at,
+                    change_xid = EXCLUDED.change_xid
+                ''',
+                (article_id, exists['author_id'], iso_now()),
+            )
         else:
             now = iso_now()
             CONN.execute(
-                'UPDATE articles SET deleted_at = ?, updated_at = ? WHERE id = ?',
+                'UPDATE articles SET deleted_at = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
                 (now, now, article_id),
             )
     return True
@@ -1316,7 +2251,7 @@ def restore_article(article_id: str, author_id: Optional[str] = None) -> Optiona
             return None
         now = iso_now()
         CONN.execute(
-            'UPDATE articles SET deleted_at = NULL, updated_at = ? WHERE id = ?',
+            'UPDATE articles SET deleted_at = NULL, updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
             (now, article_id),
         )
     return get_article(article_id, author_id=author_id, include_deleted=True)
@@ -1349,7 +2284,11 @@ def update_article_doc_json(article_id: str, author_id: str, doc_json: Any) -> b
         if encrypted_flag:
             # Never store plaintext docJson for encrypted articles.
             return False
-        CONN.execute('UPDATE articles SET article_doc_json = ? WHERE id = ?', (doc_json_str, article_id))
+        CONN.execute(
+            'UPDATE articles SET article_doc_json = ?, doc_json_bytes = ?, doc_json_hash = ?, '
+            'content_rev = content_rev + 1, sections_synced = FALSE, doc_json_stale = FALSE WHERE id = ?',
+            (doc_json_str, *doc_json_stats(doc_json_str), article_id),
+        )
     return True
 
 
@@ -1367,7 +2306,7 @@ def save_article_doc_json(
     - article_links (internal links).
 
     Also updates `articles.updated_at`, clears redo history, and appends per-section history entries
-    (plain text before/after).
+    (plain text before/after) to `article_history_entries`.
     """
     if not article_id or not author_id:
         raise ArticleNotFound('Article not found')
@@ -1381,7 +2320,8 @@ def save_article_doc_json(
     # Otherwise concurrent operations can read stale doc_json and later overwrite newer state.
     with CONN:
         article_row = CONN.execute(
-            'SELECT id, author_id, title, updated_at, history, redo_history, is_encrypted, encryption_salt, encryption_verifier, article_doc_json '
+            'SELECT id, author_id, title, updated_at, is_encrypted, encryption_salt, encryption_verifier, '
+            'doc_json_stale, article_doc_json '
             'FROM articles WHERE id = ? AND deleted_at IS NULL FOR UPDATE',
             (article_id,),
         ).fetchone()
@@ -1394,8 +2334,8 @@ def save_article_doc_json(
         if encrypted_flag:
             # For encrypted articles we don't accept plaintext doc_json.
             raise InvalidOperation('Encrypted articles are not supported in outline save')
+        raw_prev = _locked_article_doc_json_str(article_id, article_row)
 
-        history = deserialize_history(article_row.get('history'))
         history_entries_added: list[dict[str, Any]] = []
 
         # Auto-version "before first edit after N hours".
@@ -1424,31 +2364,32 @@ def save_article_doc_json(
                                     f'auto-{hours}h',
                                     None,
                                     json.dumps([]),
-                                    article_row.get('article_doc_json'),
+                                    raw_prev or None,
                                 ),
                             )
                     except Exception:
                         pass
 
-        # Diff sections based on plain text (heading+body).
-        prev_map: dict[str, str] = {}
-        prev_frags: dict[str, dict[str, Any]] = {}
-        raw_prev = article_row.get('article_doc_json') or ''
+        # Diff sections by plain-text hash (heading+body); each doc is walked once.
+        prev_analysis = OutlineDocAnalysis()
         if raw_prev:
             try:
                 prev_doc = json.loads(raw_prev) if isinstance(raw_prev, str) else raw_prev
-                prev_map = build_outline_section_plain_text_map(prev_doc)
-                prev_frags = build_outline_section_fragments_map(prev_doc)
+                prev_analysis = analyze_outline_doc(prev_doc)
             except Exception:
-                prev_map = {}
-                prev_frags = {}
-        next_map = build_outline_section_plain_text_map(doc_json)
-        next_frags = build_outline_section_fragments_map(doc_json)
-
-        removed_ids = set(prev_map.keys()) - set(next_map.keys())
+                prev_analysis = OutlineDocAnalysis()
+        next_analysis = analyze_outline_doc(doc_json)
+        prev_map = prev_analysis.plain_text_map()
+        prev_frags = prev_analysis.fragments_map()
+        next_map = next_analysis.plain_text_map()
+        next_frags = next_analysis.fragments_map()
+
+        removed_ids = set(prev_analysis.sections.keys()) - set(next_analysis.sections.keys())
+        empty_text_hash = outline_text_hash('')
         changed_ids: set[str] = set()
-        for sid, new_text in next_map.items():
-            if prev_map.get(sid, '') != (new_text or ''):
+        for sid, info in next_analysis.sections.items():
+            prev_info = prev_analysis.sections.get(sid)
+            if (prev_info.text_hash if prev_info else empty_text_hash) != info.text_hash:
                 changed_ids.add(sid)
 
         def _push_history(section_id: str, before_plain: str, after_plain: str) -> None:
@@ -1467,51 +2408,64 @@ def save_article_doc_json(
                 'afterBodyJson': after_frag.get('body'),
                 'timestamp': now,
             }
-            history.append(entry)
             history_entries_added.append(entry)
 
         for sid in sorted(changed_ids):
             _push_history(sid, prev_map.get(sid, ''), next_map.get(sid, ''))
 
         # Persist article_doc_json and metadata.
+        # Full doc becomes the source of truth again; outline_sections are re-hydrated on the next section upsert.
         doc_json_str = json.dumps(doc_json, ensure_ascii=False)
         CONN.execute(
-            'UPDATE articles SET updated_at = ?, history = ?, redo_history = ?, article_doc_json = ? WHERE id = ?',
-            (now, serialize_history(history), '[]', doc_json_str, article_id),
+            'UPDATE articles SET updated_at = ?, content_rev = content_rev + 1, article_doc_json = ?, doc_json_bytes = ?, doc_json_hash = ?, '
+            'sections_synced = FALSE, doc_json_stale = FALSE WHERE id = ?',
+            (now, doc_json_str, *doc_json_stats(doc_json_str), article_id),
         )
+        clear_article_redo_history(article_id)
+        append_article_history_entries(article_id, history_entries_added)
 
         # Rebuild internal links from doc_json (best-effort: never fail the save).
         try:
-            _rebuild_article_links_for_article_id(article_id, doc_json=doc_json)
+            _rebuild_article_links_for_article_id(article_id, link_map=next_analysis.internal_links_map())
         except Exception as exc:  # noqa: BLE001
             logger.warning('Failed to rebuild article_links for save_article_doc_json: %r', exc)
 
-        # Rebuild section FTS for the whole article (best-effort: never fail the save).
+        # Incremental section FTS: only changed/removed sections (best-effort: never fail the save).
+        # Sections missing from the index (e.g. after an earlier failure) are re-indexed too.
         try:
-            CONN.execute('DELETE FROM outline_sections_fts WHERE article_id = ?', (article_id,))
-            for sid, plain in (next_map or {}).items():
-                text = (plain or '').strip()
-                lemma = build_lemma(text)
-                normalized = build_normalized_tokens(text)
-                upsert_outline_section_search_index(sid, article_id, text, lemma, normalized, now)
+            indexed_ids = {
+                str(r['section_id'])
+                for r in CONN.execute(
+                    'SELECT section_id FROM outline_sections_fts WHERE article_id = ?',
+                    (article_id,),
+                ).fetchall()
+            }
+            fts_removed = sorted(indexed_ids - set(next_map.keys()))
+            fts_changed = changed_ids | (set(next_map.keys()) - indexed_ids)
+            delete_outline_sections_search_index(fts_removed)
+            upsert_outline_sections_search_index_batch(
+                article_id,
+                {sid: next_map.get(sid, '') for sid in sorted(fts_changed)},
+                now,
+            )
         except Exception as exc:  # noqa: BLE001
-            logger.warning('Failed to rebuild outline_sections_fts for save_article_doc_json: %r', exc)
+            logger.warning('Failed to update outline_sections_fts for save_article_doc_json: %r', exc)
 
-    # Semantic embeddings updates after transaction.
-    try:
-        if removed_ids:
-            delete_block_embeddings(list(removed_ids))
+        # Embeddings are computed by background workers; the job commits together with the doc.
         if changed_ids:
-            changed_plain = {sid: next_map.get(sid, '') for sid in changed_ids}
             upsert_embeddings_for_plain_texts(
                 author_id=author_id,
                 article_id=article_id,
                 article_title=article_row.get('title') or '',
-                block_texts=changed_plain,
+                block_texts={sid: next_map.get(sid, '') for sid in changed_ids},
                 updated_at=now,
             )
+
+    try:
+        if removed_ids:
+            delete_block_embeddings(list(removed_ids))
     except Exception as exc:  # noqa: BLE001
-        logger.warning('Failed to update semantic embeddings after save_article_doc_json: %r', exc)
+        logger.warning('Failed to delete semantic embeddings after save_article_doc_json: %r', exc)
 
     return {
         'status': 'ok',
@@ -1523,288 +2477,571 @@ def save_article_doc_json(
     }
 
 
-def upsert_outline_section_content(
+# --- Пакетное применение операций над секциями (/sync/compact и одиночные ops) ---
+# Одна блокировка статьи, один разбор документа и одна запись на пакет; FTS, ссылки и очередь
+# эмбеддингов обновляются один раз по итоговому состоянию секций.
+
+OUTLINE_HISTORY_WINDOW_SECONDS = 3600
+
+
+def _outline_upsert_op(op_id: str | None, section_id: str, heading_json: Any, body_json: Any, seq: int) -> dict[str, Any]:
+    if not _json_is_outline_heading(heading_json) or not _json_is_outline_body(body_json):
+        raise InvalidOperation('Invalid section JSON')
+    if seq <= 0:
+        raise InvalidOperation('seq must be positive')
+    return {'opId': op_id, 'sectionId': section_id, 'headingJson': heading_json, 'bodyJson': body_json, 'seq': seq}
+
+
+def _patch_outline_section_content(sec: dict[str, Any], heading_json: Any, body_json: Any) -> None:
+    """Заменяет heading/body секции в doc_json на месте, сохраняя детей."""
+    content = sec.get('content') or []
+    if not isinstance(content, list) or len(content) < 3:
+        # keep whatever children we can find
+        children = None
+        for c in content if isinstance(content, list) else []:
+            if isinstance(c, dict) and c.get('type') == 'outlineChildren':
+                children = c
+                break
+        sec['content'] = [heading_json, body_json, children or {'type': 'outlineChildren', 'content': []}]
+        return
+    # Replace heading/body nodes by type.
+    h_idx = None
+    b_idx = None
+    for i, c in enumerate(content):
+        if isinstance(c, dict) and c.get('type') == 'outlineHeading' and h_idx is None:
+            h_idx = i
+        elif isinstance(c, dict) and c.get('type') == 'outlineBody' and b_idx is None:
+            b_idx = i
+    if h_idx is None:
+        content.insert(0, heading_json)
+    else:
+        content[h_idx] = heading_json
+    if b_idx is None:
+        insert_at = 1 if h_idx in (None, 0) else h_idx + 1
+        content.insert(insert_at, body_json)
+    else:
+        content[b_idx] = body_json
+    # Ensure children container exists at the end.
+    if not any(isinstance(c, dict) and c.get('type') == 'outlineChildren' for c in content):
+        content.append({'type': 'outlineChildren', 'content': []})
+    sec['content'] = content
+
+
+def _apply_outline_section_ops(
     *,
     article_id: str,
     author_id: str,
-    section_id: str,
-    heading_json: Any,
-    body_json: Any,
-    seq: int,
-    op_id: str | None = None,
+    deletes: list[dict[str, Any]],
+    upserts: list[dict[str, Any]],
     create_version_if_stale_hours: int | None = None,
 ) -> dict[str, Any]:
     """
-    Content-only upsert for a single outline section (heading+body).
-    - Does not change structure.
-    - Uses per-section seq to avoid stale updates.
-    - Uses optional op_id for idempotency.
+    Применяет пакет уже провалидированных операций под одной блокировкой статьи.
+    - deletes: [{opId, sectionIds}] — применяются первыми, секции удаляются с поддеревьями;
+    - upserts: [{opId, sectionId, headingJson, bodyJson, seq}] — content-only, структуру не меняют.
+    Семантика та же, что у последовательных одиночных вызовов: повтор op_id -> duplicate,
+    seq <= last_seq -> stale, удалённые секции (есть meta) не воскрешаем.
+    Возвращает updatedAt и результаты операций в исходном порядке (deleteResults/upsertResults).
     """
-    if not article_id or not author_id:
-        raise ArticleNotFound('Article not found')
-    sid = str(section_id or '').strip()
-    if not sid:
-        raise InvalidOperation('sectionId is required')
-    if not _json_is_outline_heading(heading_json) or not _json_is_outline_body(body_json):
-        raise InvalidOperation('Invalid section JSON')
-    try:
-        seq_num = int(seq)
-    except Exception:
-        seq_num = 0
-    if seq_num <= 0:
-        raise InvalidOperation('seq must be positive')
-
     now = iso_now()
     now_dt = datetime.utcnow()
-    # Concurrency guard: lock the article row and patch against the latest doc_json.
-    # This prevents lost updates when concurrent saves modify different parts of the doc.
+    delete_results: list[dict[str, Any]] = []
+    upsert_results: list[dict[str, Any]] = []
+    removed_all: dict[str, None] = {}
+    # section_id -> итоговый анализ секции (для FTS/ссылок/эмбеддингов), в порядке правок.
+    touched: dict[str, OutlineSectionInfo | None] = {}
+    history_entries: list[dict[str, Any]] = []
+    pending_entries: dict[str, dict[str, Any]] = {}
+    any_upsert_applied = False
+
     with CONN:
         article_row = CONN.execute(
-            'SELECT id, author_id, title, updated_at, history, is_encrypted, encryption_salt, encryption_verifier, article_doc_json '
+            'SELECT id, author_id, title, updated_at, is_encrypted, encryption_salt, encryption_verifier, '
+            'sections_synced, doc_json_stale '
             'FROM articles WHERE id = ? AND deleted_at IS NULL FOR UPDATE',
             (article_id,),
         ).fetchone()
         if not article_row or str(article_row.get('author_id') or '') != str(author_id):
             raise ArticleNotFound('Article not found')
-
         encrypted_flag = bool(article_row.get('is_encrypted', 0)) or (
             bool(article_row.get('encryption_salt')) and bool(article_row.get('encryption_verifier'))
         )
         if encrypted_flag:
             raise InvalidOperation('Encrypted articles are not supported')
 
-        if op_id:
-            newly = _try_mark_op_applied(op_id, article_id=article_id, op_type='section.upsertContent', section_id=sid)
-            if not newly:
-                return {'status': 'duplicate'}
-
-        meta_row = CONN.execute(
-            'SELECT last_seq, history_window_started_at, history_window_entry_id '
-            'FROM outline_section_meta WHERE article_id = ? AND section_id = ? FOR UPDATE',
-            (article_id, sid),
-        ).fetchone()
-        last_seq = int(meta_row['last_seq']) if meta_row and meta_row.get('last_seq') is not None else 0
-        window_started_at_raw = (meta_row.get('history_window_started_at') or '').strip() if meta_row else ''
-        window_entry_id = (meta_row.get('history_window_entry_id') or '').strip() if meta_row else ''
-        window_started_dt: datetime | None = None
-        if window_started_at_raw:
-            try:
-                window_started_dt = datetime.fromisoformat(window_started_at_raw)
-            except Exception:
-                window_started_dt = None
-        if seq_num <= last_seq:
-            return {'status': 'ignored', 'reason': 'stale', 'lastSeq': last_seq}
-
-        # Auto-version best-effort: reuse existing full-save logic only for staleness condition.
-        if create_version_if_stale_hours:
-            try:
-                hours = int(create_version_if_stale_hours)
-            except Exception:
-                hours = 0
-            if hours > 0:
-                updated_at_raw = (article_row.get('updated_at') or '').strip()
-                if updated_at_raw:
-                    try:
-                        updated_dt = datetime.fromisoformat(updated_at_raw)
-                        age_seconds = (datetime.utcnow() - updated_dt).total_seconds()
-                        if age_seconds >= hours * 3600:
-                            CONN.execute(
-                                '''
-                                INSERT INTO article_versions (id, article_id, author_id, created_at, reason, label, blocks_json, doc_json)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                                ''',
-                                (
-                                    str(uuid.uuid4()),
-                                    article_id,
-                                    author_id,
-                                    now,
-                                    f'auto-{hours}h',
-                                    None,
-                                    json.dumps([]),
-                                    article_row.get('article_doc_json'),
-                                ),
-                            )
-                    except Exception:
-                        pass
-
-        raw_prev = article_row.get('article_doc_json') or ''
-        prev_doc: Any = None
-        if raw_prev:
-            try:
-                prev_doc = json.loads(raw_prev) if isinstance(raw_prev, str) else raw_prev
-            except Exception:
-                prev_doc = None
-        if not isinstance(prev_doc, dict):
-            prev_doc = {'type': 'doc', 'content': []}
+        fresh_ops = _mark_ops_applied(
+            article_id,
+            [(op.get('opId'), 'sections.delete', None) for op in deletes]
+            + [(op.get('opId'), 'section.upsertContent', op['sectionId']) for op in upserts],
+        )
+        seen_ops: set[str] = set()
 
-        before_plain = build_outline_section_plain_text(prev_doc, sid)
-        before_frags = build_outline_section_fragments_map(prev_doc).get(sid) or {}
-
-        # Patch the section in-place (keep children intact).
-        doc_json = prev_doc
-        sec = _find_outline_section_by_id(doc_json, sid)
-        if sec is None:
-            # Important: do NOT resurrect deleted sections.
-            #
-            # We use `outline_section_meta` to track per-section seq. If a section has meta, it existed
-            # before (we've applied at least one content update). If it's now missing from docJson,
-            # it was deleted by a delete op. Late/duplicate upserts (e.g. delayed spellcheck/autosave)
-            # must be ignored instead of re-creating the section at the end of the article.
-            if meta_row:
-                return {'status': 'ignored', 'reason': 'missing', 'lastSeq': last_seq}
-
-            # New section: allow creating it from the first content upsert.
-            sec = _ensure_outline_section_node(sid, heading=heading_json, body=body_json)
-            if not isinstance(doc_json.get('content'), list):
-                doc_json['content'] = []
-            # Inbox should behave like "newest first": when a section is missing from structure,
-            # create it at the top-level root and put it first.
+        def is_fresh(op_id: Any) -> bool:
+            oid = str(op_id or '').strip()
+            if not oid:
+                return True
+            if oid in seen_ops:
+                return False
+            seen_ops.add(oid)
+            return oid in fresh_ops
+
+        upsert_ids = list(dict.fromkeys(op['sectionId'] for op in upserts))
+        meta: dict[str, dict[str, Any]] = {}
+        if upsert_ids:
+            for row in CONN.execute(
+                'SELECT section_id, last_seq, history_window_started_at, history_window_entry_id '
+                'FROM outline_section_meta WHERE article_id = ? AND section_id = ANY(?) FOR UPDATE',
+                (article_id, upsert_ids),
+            ).fetchall():
+                meta[row['section_id']] = {
+                    'last_seq': int(row.get('last_seq') or 0),
+                    'started_at': (row.get('history_window_started_at') or '').strip(),
+                    'entry_id': (row.get('history_window_entry_id') or '').strip(),
+                }
+        meta_dirty: dict[str, None] = {}
+
+        # Представление статьи: строки outline_sections (если документ в них разложен) или один doc_json.
+        sections_synced = bool(article_row.get('sections_synced'))
+        doc_json: Any = None
+        if not sections_synced:
+            raw_prev = _locked_article_doc_json_str(article_id, article_row)
+            if raw_prev:
+                try:
+                    doc_json = json.loads(raw_prev)
+                except Exception:
+                    doc_json = None
+            if not isinstance(doc_json, dict):
+                doc_json = {'type': 'doc', 'content': []}
+            sections_synced = _hydrate_outline_sections(article_id, doc_json, now)
+
+        parents: dict[str, str | None] = {}
+        positions: dict[str, float] = {}
+        kids: dict[str, list[str]] = {}
+        contents: dict[str, tuple[Any, Any]] = {}
+        orig_hashes: dict[str, str] = {}
+        created: dict[str, None] = {}
+        dirty: dict[str, None] = {}
+        if sections_synced:
+            for row in CONN.execute(
+                'SELECT section_id, parent_id, position FROM outline_sections WHERE article_id = ?',
+                (article_id,),
+            ).fetchall():
+                sid = row['section_id']
+                parents[sid] = row.get('parent_id')
+                positions[sid] = float(row.get('position') or 0.0)
+                if row.get('parent_id'):
+                    kids.setdefault(row['parent_id'], []).append(sid)
+            present_ids = [sid for sid in upsert_ids if sid in parents]
+            if present_ids:
+                for row in CONN.execute(
+                    'SELECT section_id, heading_json, body_json, content_hash FROM outline_sections '
+                    'WHERE article_id = ? AND section_id = ANY(?) FOR UPDATE',
+                    (article_id, present_ids),
+                ).fetchall():
+                    contents[row['section_id']] = (json.loads(row['heading_json']), json.loads(row['body_json']))
+                    orig_hashes[row['section_id']] = row.get('content_hash') or ''
+        orig_ids = set(parents)
+
+        def remove_section(sid: str) -> list[str]:
+            if not sections_synced:
+                sec = _find_outline_section_by_id(doc_json, sid)
+                if sec is None:
+                    return []
+                ids = [str((s.get('attrs') or {}).get('id') or '').strip() for s in _walk_outline_sections(sec)]
+                _delete_outline_section_by_id(doc_json, sid)
+                return [x for x in ids if x]
+            out: list[str] = []
+            stack = [sid]
+            while stack:
+                cur = stack.pop()
+                if cur not in parents:
+                    continue
+                out.append(cur)
+                del parents[cur]
+                stack.extend(kids.get(cur) or [])
+            return out
+
+        def current_content(sid: str) -> tuple[Any, Any] | None:
+            if sections_synced:
+                return contents.get(sid) if sid in parents else None
+            sec = _find_outline_section_by_id(doc_json, sid)
+            if sec is None:
+                return None
+            heading, body, _ = _split_outline_section_content(sec)
+            return heading, body
+
+        def create_section(sid: str, heading: Any, body: Any) -> None:
+            # Inbox behaves like "newest first": a new section goes to the root and comes first.
             # NOTE: the public id is "inbox", but in DB it is "inbox-<user_id>".
-            if str(article_id).startswith('inbox-'):
-                doc_json['content'].insert(0, sec)
-            else:
-                doc_json['content'].append(sec)
-        else:
-            content = sec.get('content') or []
-            if not isinstance(content, list) or len(content) < 3:
-                # keep whatever children we can find
-                children = None
-                for c in content if isinstance(content, list) else []:
-                    if isinstance(c, dict) and c.get('type') == 'outlineChildren':
-                        children = c
-                        break
-                sec['content'] = [heading_json, body_json, children or {'type': 'outlineChildren', 'content': []}]
-            else:
-                # Replace heading/body nodes by type.
-                h_idx = None
-                b_idx = None
-                for i, c in enumerate(content):
-                    if isinstance(c, dict) and c.get('type') == 'outlineHeading' and h_idx is None:
-                        h_idx = i
-                    elif isinstance(c, dict) and c.get('type') == 'outlineBody' and b_idx is None:
-                        b_idx = i
-                if h_idx is None:
-                    content.insert(0, heading_json)
+            inbox = str(article_id).startswith('inbox-')
+            if not sections_synced:
+                if not isinstance(doc_json.get('content'), list):
+                    doc_json['content'] = []
+                sec = _ensure_outline_section_node(sid, heading=heading, body=body)
+                if inbox:
+                    doc_json['content'].insert(0, sec)
                 else:
-                    content[h_idx] = heading_json
-                if b_idx is None:
-                    insert_at = 1 if h_idx in (None, 0) else h_idx + 1
-                    content.insert(insert_at, body_json)
-                else:
-                    content[b_idx] = body_json
-                # Ensure children container exists at the end.
-                if not any(isinstance(c, dict) and c.get('type') == 'outlineChildren' for c in content):
-                    content.append({'type': 'outlineChildren', 'content': []})
-                sec['content'] = content
-
-        after_plain = build_outline_section_plain_text(doc_json, sid)
-        after_frags = build_outline_section_fragments_map(doc_json).get(sid) or {}
-
-        history = deserialize_history(article_row.get('history'))
-        history_entries_added: list[dict[str, Any]] = []
+                    doc_json['content'].append(sec)
+                return
+            root_positions = [positions[s] for s, p in parents.items() if p is None and s in positions]
+            if not root_positions:
+                pos = 0.0
+            else:
+                pos = min(root_positions) - 1.0 if inbox else max(root_positions) + 1.0
+            parents[sid] = None
+            positions[sid] = pos
+            kids.pop(sid, None)
+            contents[sid] = (heading, body)
+            created[sid] = None
+
+        def set_content(sid: str, heading: Any, body: Any) -> None:
+            if sections_synced:
+                contents[sid] = (heading, body)
+                dirty[sid] = None
+                return
+            sec = _find_outline_section_by_id(doc_json, sid)
+            if sec is not None:
+                _patch_outline_section_content(sec, heading, body)
 
-        history_window_seconds = 3600
-        should_consider_history = before_plain != after_plain
-        should_update_window = (
-            bool(window_entry_id)
-            and window_started_dt is not None
-            and (now_dt - window_started_dt).total_seconds() < history_window_seconds
-        )
-        history_window_entry_updated = False
-        history_window_entry_id_to_set: str | None = None
-        history_window_started_at_to_set: str | None = None
+        for op in deletes:
+            if not is_fresh(op.get('opId')):
+                delete_results.append({'status': 'duplicate'})
+                continue
+            removed: list[str] = []
+            for sid in op['sectionIds']:
+                removed.extend(remove_section(sid))
+            for sid in removed:
+                removed_all[sid] = None
+                created.pop(sid, None)
+                touched.pop(sid, None)
+            delete_results.append({'status': 'ok', 'removedBlockIds': sorted(set(removed))})
+
+        version_checked = False
+        for op in upserts:
+            sid = op['sectionId']
+            heading_json = op['headingJson']
+            body_json = op['bodyJson']
+            seq_num = int(op['seq'])
+            if not is_fresh(op.get('opId')):
+                upsert_results.append({'status': 'duplicate'})
+                continue
+            m = meta.get(sid)
+            last_seq = m['last_seq'] if m else 0
+            if seq_num <= last_seq:
+                upsert_results.append({'status': 'ignored', 'reason': 'stale', 'lastSeq': last_seq})
+                continue
 
-        if should_consider_history:
-            if should_update_window:
-                # Sliding window: update the existing history entry (keep "before" from the first change in the window).
-                try:
-                    for e in history:
-                        if (
-                            isinstance(e, dict)
-                            and str(e.get('id') or '') == window_entry_id
-                            and str(e.get('blockId') or '') == sid
-                        ):
-                            e['after'] = after_plain
-                            e['afterHeadingJson'] = after_frags.get('heading')
-                            e['afterBodyJson'] = after_frags.get('body')
-                            # Keep e['timestamp'] as window start; optionally track last update time.
-                            e['updatedAt'] = now
-                            history_window_entry_updated = True
-                            break
-                except Exception:
-                    history_window_entry_updated = False
-
-            if not history_window_entry_updated:
-                entry_id = str(uuid.uuid4())
-                entry = {
-                    'id': entry_id,
-                    'blockId': sid,
-                    'before': before_plain,
-                    'after': after_plain,
-                    'beforeHeadingJson': before_frags.get('heading'),
-                    'beforeBodyJson': before_frags.get('body'),
-                    'afterHeadingJson': after_frags.get('heading'),
-                    'afterBodyJson': after_frags.get('body'),
-                    'timestamp': now,
-                }
-                history.append(entry)
-                history_entries_added.append(entry)
-                history_window_entry_id_to_set = entry_id
-                history_window_started_at_to_set = now
+            # Auto-version best-effort: once per batch, snapshot of the doc before the batch.
+            if not version_checked:
+                version_checked = True
+                _maybe_create_stale_article_version(
+                    article_id, author_id, article_row, create_version_if_stale_hours, now
+                )
 
-        doc_json_str = json.dumps(doc_json, ensure_ascii=False)
-        CONN.execute(
-            'UPDATE articles SET updated_at = ?, history = ?, redo_history = ?, article_doc_json = ? WHERE id = ?',
-            (now, serialize_history(history), '[]', doc_json_str, article_id),
-        )
-        if meta_row:
-            if history_window_entry_id_to_set is not None:
+            current = current_content(sid)
+            if current is None:
+                # Important: do NOT resurrect deleted sections.
+                #
+                # We use `outline_section_meta` to track per-section seq. If a section has meta, it existed
+                # before (we've applied at least one content update). If it's now missing, it was deleted
+                # by a delete op. Late/duplicate upserts (e.g. delayed spellcheck/autosave) must be ignored
+                # instead of re-creating the section at the end of the article.
+                if m is not None:
+                    upsert_results.append({'status': 'ignored', 'reason': 'missing', 'lastSeq': last_seq})
+                    continue
+                # New section: allow creating it from the first content upsert.
+                before_plain, before_frags = '', {}
+                create_section(sid, heading_json, body_json)
+            else:
+                before_plain, before_frags = _section_plain_and_fragments(sid, current[0], current[1])
+                set_content(sid, heading_json, body_json)
+
+            after_info = _outline_section_info(sid, heading_json, body_json)
+            after_plain = after_info.plain_text if after_info else ''
+            after_frags = {'heading': after_info.heading, 'body': after_info.body} if after_info else {}
+            touched.pop(sid, None)
+            touched[sid] = after_info
+            any_upsert_applied = True
+
+            if m is None:
+                m = meta[sid] = {'last_seq': 0, 'started_at': '', 'entry_id': ''}
+            op_entries: list[dict[str, Any]] = []
+            if before_plain != after_plain:
+                window_started_dt: datetime | None = None
+                if m['started_at']:
+                    try:
+                        window_started_dt = datetime.fromisoformat(m['started_at'])
+                    except Exception:
+                        window_started_dt = None
+                window_updated = False
+                if (
+                    m['entry_id']
+                    and window_started_dt is not None
+                    and (now_dt - window_started_dt).total_seconds() < OUTLINE_HISTORY_WINDOW_SECONDS
+                ):
+                    # Sliding window: update the existing history entry (keep "before" from the first change in the window).
+                    # Keep 'timestamp' as window start; track last update time in 'updatedAt'.
+                    patch = {
+                        'after': after_plain,
+                        'afterHeadingJson': after_frags.get('heading'),
+                        'afterBodyJson': after_frags.get('body'),
+                        'updatedAt': now,
+                    }
+                    pending = pending_entries.get(m['entry_id'])
+                    if pending is not None:
+                        pending.update(patch)
+                        window_updated = True
+                    else:
+                        try:
+                            window_updated = _update_article_history_entry(article_id, m['entry_id'], patch)
+                        except Exception:
+                            window_updated = False
+                if not window_updated:
+                    entry_id = str(uuid.uuid4())
+                    entry = {
+                        'id': entry_id,
+                        'blockId': sid,
+                        'before': before_plain,
+                        'after': after_plain,
+                        'beforeHeadingJson': before_frags.get('heading'),
+                        'beforeBodyJson': before_frags.get('body'),
+                        'afterHeadingJson': after_frags.get('heading'),
+                        'afterBodyJson': after_frags.get('body'),
+                        'timestamp': now,
+                    }
+                    op_entries.append(entry)
+                    history_entries.append(entry)
+                    pending_entries[entry_id] = entry
+                    m['entry_id'] = entry_id
+                    m['started_at'] = now
+            m['last_seq'] = seq_num
+            meta_dirty[sid] = None
+            upsert_results.append({'status': 'ok', 'historyEntriesAdded': op_entries})
+
+        removed_ids = [sid for sid in removed_all if current_content(sid) is None]
+        changed = any_upsert_applied or bool(removed_all)
+        if changed:
+            if sections_synced:
+                gone = [sid for sid in orig_ids if sid not in parents or sid in created]
+                if gone:
+                    CONN.execute(
+                        'DELETE FROM outline_sections WHERE article_id = ? AND section_id = ANY(?)',
+                        (article_id, gone),
+                    )
+                updates: list[tuple[Any, ...]] = []
+                for sid in dirty:
+                    if sid in created or sid not in parents:
+                        continue
+                    heading, body = contents[sid]
+                    content_hash = outline_section_content_hash(heading, body)
+                    if content_hash == orig_hashes.get(sid):
+                        continue
+                    updates.append(
+                        (
+                            json.dumps(heading, ensure_ascii=False),
+                            json.dumps(body, ensure_ascii=False),
+                            content_hash,
+                            now,
+                            article_id,
+                            sid,
+                        )
+                    )
+                if updates:
+                    CONN.executemany(
+                        'UPDATE outline_sections SET heading_json = ?, body_json = ?, content_hash = ?, updated_at = ? '
+                        'WHERE article_id = ? AND section_id = ?',
+                        updates,
+                    )
+                inserts: list[tuple[Any, ...]] = []
+                for sid in created:
+                    heading, body = contents[sid]
+                    inserts.append(
+                        (
+                            article_id,
+                            sid,
+                            positions[sid],
+                            json.dumps({'id': sid, 'collapsed': False}),
+                            json.dumps(heading, ensure_ascii=False),
+                            json.dumps(body, ensure_ascii=False),
+                            outline_section_content_hash(heading, body),
+                            now,
+                        )
+                    )
+                if inserts:
+                    CONN.executemany(
+                        '''
+                        INSERT INTO outline_sections
+                            (article_id, section_id, parent_id, position, collapsed, attrs_json, heading_json, body_json, content_hash, updated_at)
+                        VALUES (?, ?, NULL, ?, FALSE, ?, ?, ?, ?, ?)
+                        ''',
+                        inserts,
+                    )
+                # article_doc_json пересоберётся при чтении.
                 CONN.execute(
-                    'UPDATE outline_section_meta SET last_seq = ?, history_window_started_at = ?, history_window_entry_id = ?, updated_at = ? WHERE article_id = ? AND section_id = ?',
-                    (seq_num, history_window_started_at_to_set, history_window_entry_id_to_set, now, article_id, sid),
+                    'UPDATE articles SET updated_at = ?, content_rev = content_rev + 1, doc_json_stale = TRUE WHERE id = ?',
+                    (now, article_id),
                 )
             else:
+                doc_json_str = json.dumps(doc_json, ensure_ascii=False)
                 CONN.execute(
-                    'UPDATE outline_section_meta SET last_seq = ?, updated_at = ? WHERE article_id = ? AND section_id = ?',
-                    (seq_num, now, article_id, sid),
+                    'UPDATE articles SET updated_at = ?, content_rev = content_rev + 1, article_doc_json = ?, doc_json_bytes = ?, doc_json_hash = ? '
+                    'WHERE id = ?',
+                    (now, doc_json_str, *doc_json_stats(doc_json_str), article_id),
                 )
-        else:
+            clear_article_redo_history(article_id)
+            append_article_history_entries(article_id, history_entries)
+            if meta_dirty:
+                CONN.executemany(
+                    '''
+                    INSERT INTO outline_section_meta
+                        (article_id, section_id, last_seq, history_window_started_at, history_window_entry_id, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (article_id, section_id) DO UPDATE SET
+                        last_seq = EXCLUDED.last_seq,
+                        history_window_started_at = EXCLUDED.history_window_started_at,
+                        history_window_entry_id = EXCLUDED.history_window_entry_id,
+                        updated_at = EXCLUDED.updated_at
+                    ''',
+                    [
+                        (
+                            article_id,
+                            sid,
+                            meta[sid]['last_seq'],
+                            meta[sid]['started_at'] or None,
+                            meta[sid]['entry_id'] or None,
+                            now,
+                            now,
+                        )
+                        for sid in meta_dirty
+                    ],
+                )
+
+            # Derived data — once per batch, only for the sections touched by it.
+            # Ссылки строятся по heading+body секции: заменяем строки изменённых и удалённых секций.
+            link_ids = list(dict.fromkeys([*removed_ids, *touched]))
+            if link_ids:
+                CONN.execute(
+                    'DELETE FROM article_links WHERE from_id = ? AND block_id = ANY(?)',
+                    (article_id, link_ids),
+                )
+                _insert_article_links(
+                    article_id,
+                    {sid: info.internal_links for sid, info in touched.items() if info is not None},
+                )
+            if removed_ids:
+                delete_outline_sections_search_index(removed_ids)
+            texts = {sid: (info.plain_text if info else '') for sid, info in touched.items()}
+            if texts:
+                upsert_outline_sections_search_index_batch(article_id, texts, now)
+                # Embedding is recomputed by background workers (debounced across rapid edits).
+                upsert_embeddings_for_plain_texts(
+                    author_id=author_id,
+                    article_id=article_id,
+                    article_title=article_row.get('title') or '',
+                    block_texts=texts,
+                    updated_at=now,
+                )
+
+    if removed_ids:
+        try:
+            delete_block_embeddings(removed_ids)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('Failed to delete embeddings for removed sections of %s: %r', article_id, exc)
+
+    return {
+        'updatedAt': now if changed else (article_row.get('updated_at') or now),
+        'deleteResults': delete_results,
+        'upsertResults': upsert_results,
+    }
+
+
+def _maybe_create_stale_article_version(
+    article_id: str,
+    author_id: str,
+    article_row: RowMapping,
+    create_version_if_stale_hours: int | None,
+    now: str,
+) -> None:
+    """Auto-version best-effort: снимок текущего doc_json, если статья не менялась `hours` часов."""
+    if not create_version_if_stale_hours:
+        return
+    try:
+        hours = int(create_version_if_stale_hours)
+    except Exception:
+        hours = 0
+    if hours <= 0:
+        return
+    updated_at_raw = (article_row.get('updated_at') or '').strip()
+    if not updated_at_raw:
+        return
+    try:
+        updated_dt = datetime.fromisoformat(updated_at_raw)
+        age_seconds = (datetime.utcnow() - updated_dt).total_seconds()
+        if age_seconds >= hours * 3600:
             CONN.execute(
-                'INSERT INTO outline_section_meta (article_id, section_id, last_seq, history_window_started_at, history_window_entry_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                '''
+                INSERT INTO article_versions (id, article_id, author_id, created_at, reason, label, blocks_json, doc_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
                 (
+                    str(uuid.uuid4()),
                     article_id,
-                    sid,
-                    seq_num,
-                    history_window_started_at_to_set,
-                    history_window_entry_id_to_set,
-                    now,
+                    author_id,
                     now,
+                    f'auto-{hours}h',
+                    None,
+                    json.dumps([]),
+                    _locked_article_doc_json_str(article_id, article_row) or None,
                 ),
             )
-        # Update FTS for this section only.
-        plain = (after_plain or '').strip()
-        lemma = build_lemma(plain)
-        normalized = build_normalized_tokens(plain)
-        upsert_outline_section_search_index(sid, article_id, plain, lemma, normalized, now)
-
-    try:
-        upsert_embeddings_for_plain_texts(
-            author_id=author_id,
-            article_id=article_id,
-            article_title=article_row.get('title') or '',
-            block_texts={sid: after_plain},
-            updated_at=now,
-        )
     except Exception:
         pass
 
+
+def upsert_outline_section_content(
+    *,
+    article_id: str,
+    author_id: str,
+    section_id: str,
+    heading_json: Any,
+    body_json: Any,
+    seq: int,
+    op_id: str | None = None,
+    create_version_if_stale_hours: int | None = None,
+) -> dict[str, Any]:
+    """
+    Content-only upsert for a single outline section (heading+body).
+    - Does not change structure.
+    - Uses per-section seq to avoid stale updates.
+    - Uses optional op_id for idempotency.
+    """
+    if not article_id or not author_id:
+        raise ArticleNotFound('Article not found')
+    sid = str(section_id or '').strip()
+    if not sid:
+        raise InvalidOperation('sectionId is required')
+    try:
+        seq_num = int(seq)
+    except Exception:
+        seq_num = 0
+    op = _outline_upsert_op(op_id, sid, heading_json, body_json, seq_num)
+    out = _apply_outline_section_ops(
+        article_id=article_id,
+        author_id=author_id,
+        deletes=[],
+        upserts=[op],
+        create_version_if_stale_hours=create_version_if_stale_hours,
+    )
+    res = out['upsertResults'][0]
+    if res['status'] != 'ok':
+        return res
     return {
         'status': 'ok',
         'articleId': article_id,
-        'updatedAt': now,
+        'updatedAt': out['updatedAt'],
         'changedBlockIds': [sid],
         'removedBlockIds': [],
-        'historyEntriesAdded': history_entries_added,
+        'historyEntriesAdded': res['historyEntriesAdded'],
     }
 
 
@@ -1827,7 +3064,8 @@ def apply_outline_structure_snapshot(
     # Otherwise an older operation can read stale doc_json, wait on a row lock, and later overwrite newer state.
     with CONN:
         article_row = CONN.execute(
-            'SELECT id, author_id, updated_at, outline_structure_rev, is_encrypted, encryption_salt, encryption_verifier, article_doc_json '
+            'SELECT id, author_id, updated_at, outline_structure_rev, is_encrypted, encryption_salt, encryption_verifier, '
+            'sections_synced, doc_json_stale, article_doc_json '
             'FROM articles WHERE id = ? AND deleted_at IS NULL FOR UPDATE',
             (article_id,),
         ).fetchone()
@@ -1894,7 +3132,7 @@ def apply_outline_structure_snapshot(
         if encrypted_flag:
             raise InvalidOperation('Encrypted articles are not supported')
 
-        raw_prev = article_row.get('article_doc_json') or ''
+        raw_prev = _locked_article_doc_json_str(article_id, article_row)
         prev_doc: Any = None
         if raw_prev:
             try:
@@ -1923,9 +3161,23 @@ def apply_outline_structure_snapshot(
                 }
 
         CONN.execute(
-            'UPDATE articles SET updated_at = ?, redo_history = ?, article_doc_json = ?, outline_structure_rev = outline_structure_rev + 1 WHERE id = ?',
-            (now, '[]', doc_json_str, article_id),
+            'UPDATE articles SET updated_at = ?, content_rev = content_rev + 1, article_doc_json = ?, doc_json_bytes = ?, doc_json_hash = ?, '
+            'doc_json_stale = FALSE, outline_structure_rev = outline_structure_rev + 1 WHERE id = ?',
+            (now, doc_json_str, *doc_json_stats(doc_json_str), article_id),
         )
+        if article_row.get('sections_synced'):
+            # Контент секций не меняется — переносим в outline_sections только структуру.
+            structure_rows = [
+                (n['parentId'], float(n['position']), bool(n['collapsed']), now, article_id, n['sectionId'])
+                for n in _build_outline_structure_nodes(doc_json)
+            ]
+            if structure_rows:
+                CONN.executemany(
+                    'UPDATE outline_sections SET parent_id = ?, position = ?, collapsed = ?, updated_at = ? '
+                    'WHERE article_id = ? AND section_id = ?',
+                    structure_rows,
+                )
+        clear_article_redo_history(article_id)
         if _should_log_structure_snapshot(article_id):
             after_row = CONN.execute(
                 'SELECT updated_at, outline_structure_rev FROM articles WHERE id = ?',
@@ -1966,7 +3218,7 @@ def delete_outline_sections(
     op_id: str | None = None,
 ) -> dict[str, Any]:
     """
-    Delete one or more outline sections by id (structure-only: removes nodes from docJson).
+    Delete one or more outline sections by id (structure-only: removes sections with their subtrees).
     This is cheaper than full doc-json/save and avoids rebuilding unrelated derived data.
     """
     if not article_id or not author_id:
@@ -1974,77 +3226,16 @@ def delete_outline_sections(
     ids = [str(x or '').strip() for x in (section_ids or []) if str(x or '').strip()]
     if not ids:
         raise InvalidOperation('sectionIds is required')
-
-    if op_id:
-        newly = _try_mark_op_applied(op_id, article_id=article_id, op_type='sections.delete', section_id=None)
-        if not newly:
-            return {'status': 'duplicate'}
-
-    with CONN:
-        article_row = CONN.execute(
-            'SELECT id, author_id, is_encrypted, encryption_salt, encryption_verifier, article_doc_json '
-            'FROM articles WHERE id = ? AND deleted_at IS NULL FOR UPDATE',
-            (article_id,),
-        ).fetchone()
-        if not article_row or str(article_row.get('author_id') or '') != str(author_id):
-            raise ArticleNotFound('Article not found')
-        encrypted_flag = bool(article_row.get('is_encrypted', 0)) or (
-            bool(article_row.get('encryption_salt')) and bool(article_row.get('encryption_verifier'))
-        )
-        if encrypted_flag:
-            raise InvalidOperation('Encrypted articles are not supported')
-
-        raw_prev = article_row.get('article_doc_json') or ''
-        prev_doc: Any = None
-        if raw_prev:
-            try:
-                prev_doc = json.loads(raw_prev) if isinstance(raw_prev, str) else raw_prev
-            except Exception:
-                prev_doc = None
-        if not isinstance(prev_doc, dict):
-            prev_doc = {'type': 'doc', 'content': []}
-
-        before_ids = {str((sec.get('attrs') or {}).get('id') or '').strip() for sec in _walk_outline_sections(prev_doc)}
-
-        changed = False
-        for sid in ids:
-            try:
-                if _delete_outline_section_by_id(prev_doc, sid):
-                    changed = True
-            except Exception:
-                continue
-
-        after_ids = {str((sec.get('attrs') or {}).get('id') or '').strip() for sec in _walk_outline_sections(prev_doc)}
-        removed_ids = sorted([sid for sid in before_ids if sid and sid not in after_ids])
-
-        # If nothing changed, keep the server state as-is (idempotent).
-        if not changed and not removed_ids:
-            return {'status': 'ok', 'articleId': article_id, 'updatedAt': article_row.get('updated_at') or iso_now(), 'removedBlockIds': []}
-
-        doc_json_str = json.dumps(prev_doc, ensure_ascii=False)
-        now = iso_now()
-        CONN.execute(
-            'UPDATE articles SET updated_at = ?, redo_history = ?, article_doc_json = ? WHERE id = ?',
-            (now, '[]', doc_json_str, article_id),
-        )
-
-        # Best-effort derived updates limited to what depends on structure.
-        try:
-            _rebuild_article_links_for_article_id(article_id, doc_json=prev_doc)
-        except Exception:
-            pass
-        try:
-            if removed_ids:
-                delete_outline_sections_search_index(removed_ids)
-        except Exception:
-            pass
-        try:
-            if removed_ids:
-                delete_block_embeddings(list(removed_ids))
-        except Exception:
-            pass
-
-    return {'status': 'ok', 'articleId': article_id, 'updatedAt': now, 'removedBlockIds': removed_ids}
+    out = _apply_outline_section_ops(
+        article_id=article_id,
+        author_id=author_id,
+        deletes=[{'opId': op_id, 'sectionIds': ids}],
+        upserts=[],
+    )
+    res = out['deleteResults'][0]
+    if res['status'] != 'ok':
+        return res
+    return {'status': 'ok', 'articleId': article_id, 'updatedAt': out['updatedAt'], 'removedBlockIds': res['removedBlockIds']}
 
 
 def sync_outline_compact(
@@ -2060,19 +3251,12 @@ def sync_outline_compact(
     - upserts: [{ opId, sectionId, headingJson, bodyJson, seq }]
 
     The server applies deletes first, then upserts (content-only). Structure snapshots are handled
-    by /structure/snapshot separately.
+    by /structure/snapshot separately. Весь пакет валидируется заранее и применяется одной транзакцией
+    (см. _apply_outline_section_ops); acks — по одному на операцию.
     """
-    latest_updated_at: str | None = None
-    delete_acks: list[dict[str, Any]] = []
-    upsert_acks: list[dict[str, Any]] = []
-
-    def _pick_latest(a: str | None, b: str | None) -> str | None:
-        if not a:
-            return b
-        if not b:
-            return a
-        return b if str(b) > str(a) else a
-
+    if not article_id or not author_id:
+        raise ArticleNotFound('Article not found')
+    delete_ops: list[dict[str, Any]] = []
     for item in deletes or []:
         op_id = str((item or {}).get('opId') or '').strip()
         section_ids = (item or {}).get('sectionIds') or []
@@ -2080,29 +3264,15 @@ def sync_outline_compact(
             raise InvalidOperation('delete.opId is required')
         if not isinstance(section_ids, list):
             raise InvalidOperation('delete.sectionIds must be list')
-        out = delete_outline_sections(
-            article_id=article_id,
-            author_id=author_id,
-            section_ids=[str(x or '').strip() for x in section_ids],
-            op_id=op_id,
-        )
-        latest_updated_at = _pick_latest(latest_updated_at, str(out.get('updatedAt') or '').strip() or None)
-        if out.get('status') == 'duplicate':
-            delete_acks.append({'opId': op_id, 'result': 'duplicate', 'removedBlockIds': []})
-        else:
-            delete_acks.append(
-                {
-                    'opId': op_id,
-                    'result': 'ok',
-                    'removedBlockIds': out.get('removedBlockIds') or [],
-                }
-            )
+        ids = [str(x or '').strip() for x in section_ids if str(x or '').strip()]
+        if not ids:
+            raise InvalidOperation('sectionIds is required')
+        delete_ops.append({'opId': op_id, 'sectionIds': ids})
 
+    upsert_ops: list[dict[str, Any]] = []
     for item in upserts or []:
         op_id = str((item or {}).get('opId') or '').strip()
         section_id = str((item or {}).get('sectionId') or '').strip()
-        heading_json = (item or {}).get('headingJson')
-        body_json = (item or {}).get('bodyJson')
         seq = (item or {}).get('seq')
         if not op_id:
             raise InvalidOperation('upsert.opId is required')
@@ -2112,28 +3282,43 @@ def sync_outline_compact(
             seq_num = int(seq) if seq is not None else 0
         except Exception:
             raise InvalidOperation('upsert.seq must be integer') from None
-        out = upsert_outline_section_content(
-            article_id=article_id,
-            author_id=author_id,
-            section_id=section_id,
-            heading_json=heading_json,
-            body_json=body_json,
-            seq=seq_num,
-            op_id=op_id,
-            create_version_if_stale_hours=12,
+        upsert_ops.append(
+            _outline_upsert_op(op_id, section_id, (item or {}).get('headingJson'), (item or {}).get('bodyJson'), seq_num)
         )
-        latest_updated_at = _pick_latest(latest_updated_at, str(out.get('updatedAt') or '').strip() or None)
-        status = str(out.get('status') or '')
+
+    if not delete_ops and not upsert_ops:
+        return {'status': 'ok', 'articleId': article_id, 'updatedAt': iso_now(), 'deleteAcks': [], 'upsertAcks': []}
+
+    out = _apply_outline_section_ops(
+        article_id=article_id,
+        author_id=author_id,
+        deletes=delete_ops,
+        upserts=upsert_ops,
+        create_version_if_stale_hours=12,
+    )
+
+    delete_acks: list[dict[str, Any]] = []
+    for op, res in zip(delete_ops, out['deleteResults']):
+        if res['status'] == 'duplicate':
+            delete_acks.append({'opId': op['opId'], 'result': 'duplicate', 'removedBlockIds': []})
+        else:
+            delete_acks.append({'opId': op['opId'], 'result': 'ok', 'removedBlockIds': res.get('removedBlockIds') or []})
+
+    upsert_acks: list[dict[str, Any]] = []
+    for op, res in zip(upsert_ops, out['upsertResults']):
+        op_id = op['opId']
+        section_id = op['sectionId']
+        status = str(res.get('status') or '')
         if status == 'duplicate':
             upsert_acks.append({'opId': op_id, 'sectionId': section_id, 'result': 'duplicate'})
-        elif status == 'ignored' and str(out.get('reason') or '') == 'stale':
+        elif status == 'ignored' and str(res.get('reason') or '') == 'stale':
             upsert_acks.append(
                 {
                     'opId': op_id,
                     'sectionId': section_id,
                     'result': 'conflict',
                     'reason': 'stale',
-                    'lastSeq': out.get('lastSeq'),
+                    'lastSeq': res.get('lastSeq'),
                 }
             )
         elif status == 'ok':
@@ -2144,14 +3329,14 @@ def sync_outline_compact(
                     'opId': op_id,
                     'sectionId': section_id,
                     'result': 'ignored',
-                    'reason': out.get('reason') or status or 'ignored',
+                    'reason': res.get('reason') or status or 'ignored',
                 }
             )
 
     return {
         'status': 'ok',
         'articleId': article_id,
-        'updatedAt': latest_updated_at or iso_now(),
+        'updatedAt': out['updatedAt'],
         'deleteAcks': delete_acks,
         'upsertAcks': upsert_acks,
     }
@@ -2162,7 +3347,7 @@ def get_block_text_history(article_id: str, author_id: str, block_id: str, limit
         raise ArticleNotFound('Article not found')
     row = CONN.execute(
         '''
-        SELECT author_id, history, redo_history, is_encrypted, encryption_salt, encryption_verifier
+        SELECT author_id, is_encrypted, encryption_salt, encryption_verifier
         FROM articles
         WHERE id = ? AND deleted_at IS NULL
         ''',
@@ -2175,13 +3360,9 @@ def get_block_text_history(article_id: str, author_id: str, block_id: str, limit
     )
     if encrypted_flag:
         raise InvalidOperation('Block history is not available for encrypted articles')
-    history = deserialize_history(row.get('history'))
-    entries = [h for h in (history or []) if str(h.get('blockId') or '') == str(block_id)]
-    if limit and limit > 0:
-        entries = entries[-int(limit) :]
+    page = list_article_history(article_id, block_id=str(block_id), limit=limit if limit and limit > 0 else None)
     # newest first
-    entries = list(reversed(entries))
-    return {'entries': entries}
+    return {'entries': list(reversed(page['entries']))}
 
 def insert_blocks_recursive(
     article_id: str,
@@ -2191,8 +3372,9 @@ def insert_blocks_recursive(
 ) -> None:
     for index, block in enumerate(blocks):
         plain_text = strip_html(block.get('text', ''))
-        lemma = build_lemma(plain_text)
-        normalized_text = build_normalized_tokens(plain_text)
+        analysis = analyze(plain_text)
+        lemma = analysis.lemma
+        normalized_text = analysis.normalized
         block_rowid = _insert_block_row(
             (
                 block['id'],
@@ -2229,8 +3411,9 @@ def normalize_article(article: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
 def _article_search_fields(title: str = '') -> Tuple[str, str, str]:
     plain_title = strip_html(title or '')
-    lemma = build_lemma(plain_title)
-    normalized = build_normalized_tokens(plain_title)
+    analysis = analyze(plain_title)
+    lemma = analysis.lemma
+    normalized = analysis.normalized
     return plain_title, lemma, normalized
 
 
@@ -2239,14 +3422,20 @@ def upsert_article_search_index(article_id: str, title: str, *, use_transaction:
     def _execute():
         CONN.execute(
             '''
-            INSERT INTO articles_fts (article_id, title, lemma, normalized_text)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO articles_fts (article_id, title, lemma, normalized_text, author_id, deleted)
+            VALUES (
+                ?, ?, ?, ?,
+                COALESCE((SELECT author_id FROM articles WHERE id = ?), ''),
+                COALESCE((SELECT deleted_at IS NOT NULL FROM articles WHERE id = ?), FALSE)
+            )
             ON CONFLICT (article_id) DO UPDATE
             SET title = EXCLUDED.title,
                 lemma = EXCLUDED.lemma,
-                normalized_text = EXCLUDED.normalized_text
+                normalized_text = EXCLUDED.normalized_text,
+                author_id = EXCLUDED.author_id,
+                deleted = EXCLUDED.deleted
             ''',
-            (article_id, plain_title, lemma, normalized),
+            (article_id, plain_title, lemma, normalized, article_id, article_id),
         )
     if use_transaction:
         with CONN:
@@ -2272,7 +3461,7 @@ def save_article(article: Dict[str, Any]) -> None:
             CONN.execute(
                 '''
                 UPDATE articles
-                SET title = ?, updated_at = ?, history = ?, redo_history = ?, block_trash = ?, public_slug = ?
+                SET title = ?, updated_at = ?, content_rev = content_rev + 1, history = ?, redo_history = ?, block_trash = ?, public_slug = ?
                 WHERE id = ?
                 ''',
                 (
@@ -2348,7 +3537,7 @@ def get_or_create_user_inbox(author_id: str) -> Dict[str, Any]:
             now = iso_now()
             with CONN:
                 CONN.execute(
-                    'UPDATE articles SET deleted_at = NULL, updated_at = ? WHERE id = ? AND author_id = ?',
+                    'UPDATE articles SET deleted_at = NULL, updated_at = ?, content_rev = content_rev + 1 WHERE id = ? AND author_id = ?',
                     (now, inbox_id, author_id),
                 )
             existing = get_article(inbox_id, author_id=author_id, include_deleted=True) or existing
@@ -2358,11 +3547,13 @@ def get_or_create_user_inbox(author_id: str) -> Dict[str, Any]:
     # Outline-first: inbox is stored as docJson and never rebuilt from legacy blocks.
     section_id = str(uuid.uuid4())
     doc_json = {'type': 'doc', 'content': [_ensure_outline_section_node(section_id)]}
+    doc_json_str = json.dumps(doc_json, ensure_ascii=False)
     with CONN:
         CONN.execute(
             '''
-            INSERT INTO articles (id, title, created_at, updated_at, history, redo_history, block_trash, author_id, public_slug, article_doc_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO articles (id, title, created_at, updated_at, history, redo_history, block_trash, author_id, public_slug, article_doc_json,
+                doc_json_bytes, doc_json_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''',
             (
                 inbox_id,
@@ -2374,7 +3565,8 @@ def get_or_create_user_inbox(author_id: str) -> Dict[str, Any]:
                 serialize_history([]),
                 author_id,
                 None,
-                json.dumps(doc_json, ensure_ascii=False),
+                doc_json_str,
+                *doc_json_stats(doc_json_str),
             ),
         )
     # Build derived indexes/links/embeddings. (No history diff because docJson already stored.)
@@ -2406,6 +3598,7 @@ def create_article(title: Optional[str] = None, author_id: Optional[str] = None,
     new_id = str(article_id or uuid.uuid4())
     section_id = str(uuid.uuid4())
     doc_json = {'type': 'doc', 'content': [_ensure_outline_section_node(section_id)]}
+    doc_json_str = json.dumps(doc_json, ensure_ascii=False)
     created_new = False
     with CONN:
         exists = CONN.execute('SELECT author_id FROM articles WHERE id = ?', (new_id,)).fetchone()
@@ -2413,15 +3606,22 @@ def create_article(title: Optional[str] = None, author_id: Optional[str] = None,
             if author_id is not None and str(exists.get('author_id') or '') != str(author_id):
                 raise InvalidOperation('Cannot create/update чужую статью')
             CONN.execute(
-                'UPDATE articles SET title = ?, updated_at = ? WHERE id = ?',
+                'UPDATE articles SET title = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
                 (title or 'Новая статья', now, new_id),
             )
         else:
             created_new = True
+            # Новая статья — первой в корне (перед текущим первым siblings), без перенумерации остальных.
+            top = CONN.execute(
+                'SELECT MIN(position) AS p FROM articles WHERE deleted_at IS NULL AND author_id = ? AND parent_id IS NULL',
+                (author_id,),
+            ).fetchone()
+            position = float(top['p']) - 1.0 if top and top['p'] is not None else 0.0
             CONN.execute(
                 '''
-                INSERT INTO articles (id, title, created_at, updated_at, history, redo_history, block_trash, author_id, public_slug, article_doc_json)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO articles (id, title, created_at, updated_at, history, redo_history, block_trash, author_id, public_slug, article_doc_json,
+                    doc_json_bytes, doc_json_hash, position)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''',
                 (
                     new_id,
@@ -2433,7 +3633,9 @@ def create_article(title: Optional[str] = None, author_id: Optional[str] = None,
                     serialize_history([]),
                     author_id,
                     None,
-                    json.dumps(doc_json, ensure_ascii=False),
+                    doc_json_str,
+                    *doc_json_stats(doc_json_str),
+                    position,
                 ),
             )
     if created_new:
@@ -2497,7 +3699,8 @@ def upsert_article_doc_json_snapshot(
                 CONN.execute(
                     '''
                     UPDATE articles
-                    SET title = ?, updated_at = ?, deleted_at = NULL, history = ?, redo_history = ?, block_trash = ?, public_slug = ?, article_doc_json = ?
+                    SET title = ?, updated_at = ?, content_rev = content_rev + 1, deleted_at = NULL, history = ?, redo_history = ?, block_trash = ?, public_slug = ?, article_doc_json = ?,
+                        doc_json_bytes = ?, doc_json_hash = ?, sections_synced = FALSE, doc_json_stale = FALSE
                     WHERE id = ?
                     ''',
                     (
@@ -2508,23 +3711,27 @@ def upsert_article_doc_json_snapshot(
                         serialize_history([]),
                         public_slug,
                         doc_json_str,
+                        *doc_json_stats(doc_json_str),
                         article_id,
                     ),
                 )
+                clear_article_history(article_id)
             else:
                 CONN.execute(
                     '''
                     UPDATE articles
-                    SET title = ?, updated_at = ?, deleted_at = NULL, public_slug = ?, article_doc_json = ?
+                    SET title = ?, updated_at = ?, content_rev = content_rev + 1, deleted_at = NULL, public_slug = ?, article_doc_json = ?,
+                        doc_json_bytes = ?, doc_json_hash = ?, sections_synced = FALSE, doc_json_stale = FALSE
                     WHERE id = ?
                     ''',
-                    (title, now, public_slug, doc_json_str, article_id),
+                    (title, now, public_slug, doc_json_str, *doc_json_stats(doc_json_str), article_id),
                 )
         else:
             CONN.execute(
                 '''
-                INSERT INTO articles (id, title, created_at, updated_at, history, redo_history, block_trash, author_id, public_slug, article_doc_json)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO articles (id, title, created_at, updated_at, history, redo_history, block_trash, author_id, public_slug, article_doc_json,
+                    doc_json_bytes, doc_json_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''',
                 (
                     article_id,
@@ -2537,6 +3744,7 @@ def upsert_article_doc_json_snapshot(
                     author_id,
                     public_slug,
                     doc_json_str,
+                    *doc_json_stats(doc_json_str),
                 ),
             )
 
@@ -2584,6 +3792,7 @@ def delete_user_with_data(user_id: str) -> None:
             # Таблицы sessions может не быть в старой схеме.
             pass
         CONN.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        invalidate_user_sessions(user_id)
 
 
 def clone_block(block: Dict[str, Any]) -> Dict[str, Any]:
@@ -2746,7 +3955,7 @@ def update_block(article_id: str, block_id: str, attrs: Dict[str, Any]) -> Optio
             if not row:
                 raise BlockNotFound(f'Блок с ID {block_id} не найден.')
             CONN.execute(
-                'UPDATE articles SET updated_at = ? WHERE id = ?',
+                'UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
                 (now, article_id),
             )
         return {'id': block_id, 'collapsed': collapsed_val, 'updatedAt': now}
@@ -2775,7 +3984,7 @@ def update_block(article_id: str, block_id: str, attrs: Dict[str, Any]) -> Optio
 
                 # Автоматически разворачиваем wikilinks [[...]] в ссылки на статьи пользователя.
                 article_row = CONN.execute(
-                    'SELECT history, redo_history, author_id, title FROM articles WHERE id = ?',
+                    'SELECT author_id, title FROM articles WHERE id = ?',
                     (article_id,),
                 ).fetchone()
                 if not article_row:
@@ -2784,28 +3993,27 @@ def update_block(article_id: str, block_id: str, attrs: Dict[str, Any]) -> Optio
                 if author_id:
                     new_text = _expand_wikilinks(new_text, author_id)
 
-                article_history = deserialize_history(article_row['history'])
-
                 history_entry = push_text_history_entry(
-                    {'history': article_history, 'redoHistory': []},
+                    {'history': [], 'redoHistory': []},
                     block_id,
                     previous_text,
                     new_text,
                 )
 
                 plain_text = strip_html(new_text)
-                lemma = build_lemma(plain_text)
-                normalized_text = build_normalized_tokens(plain_text)
+                analysis = analyze(plain_text)
+                lemma = analysis.lemma
+                normalized_text = analysis.normalized
 
                 CONN.execute(
                     'UPDATE blocks SET text = ?, normalized_text = ?, updated_at = ? WHERE id = ?',
                     (new_text, normalized_text, now, block_id),
                 )
                 upsert_block_search_index(block_rowid, article_id, new_text, lemma, normalized_text)
-                CONN.execute(
-                    'UPDATE articles SET updated_at = ?, history = ?, redo_history = ? WHERE id = ?',
-                    (now, serialize_history(article_history), '[]', article_id),
-                )
+                CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
+                clear_article_redo_history(article_id)
+                if history_entry:
+                    append_article_history_entries(article_id, [history_entry])
                 response['text'] = new_text
                 # После изменения текста блока инкрементально обновляем связи.
                 _update_article_links_for_block(article_id, block_id, previous_text, new_text)
@@ -2822,7 +4030,7 @@ def update_block(article_id: str, block_id: str, attrs: Dict[str, Any]) -> Optio
                     (int(collapsed_val), now, block_id),
                 )
                 CONN.execute(
-                    'UPDATE articles SET updated_at = ? WHERE id = ?',
+                    'UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
                     (now, article_id),
                 )
                 response['collapsed'] = collapsed_val
@@ -2959,8 +4167,9 @@ def replace_article_blocks_tree(
                 'updatedAt': row.get('updated_at') or '',
             }
 
+    materialize_article_doc_json(article_id)
     article_row = CONN.execute(
-        'SELECT history, redo_history, author_id, title, updated_at, article_doc_json FROM articles WHERE id = ?',
+        'SELECT author_id, title, updated_at, article_doc_json FROM articles WHERE id = ?',
         (article_id,),
     ).fetchone()
     if not article_row:
@@ -2968,7 +4177,6 @@ def replace_article_blocks_tree(
     if str(article_row.get('author_id') or '') != str(author_id):
         raise ArticleNotFound('Article not found')
 
-    history = deserialize_history(article_row.get('history'))
     history_entries_added: list[dict[str, Any]] = []
     now = iso_now()
     now_dt = datetime.utcnow()
@@ -3031,7 +4239,6 @@ def replace_article_blocks_tree(
             'after': after,
             'timestamp': now,
         }
-        history.append(entry)
         history_entries_added.append(entry)
 
     # Собираем список блоков, для которых нужно обновить embeddings (новые или изменившие текст).
@@ -3070,8 +4277,9 @@ def replace_article_blocks_tree(
                 changed_for_embeddings.append({'id': bid, 'text': new_text, 'children': []})
 
             plain_text = strip_html(new_text)
-            lemma = build_lemma(plain_text)
-            normalized_text = build_normalized_tokens(plain_text)
+            analysis = analyze(plain_text)
+            lemma = analysis.lemma
+            normalized_text = analysis.normalized
             block_rowid = _insert_block_row(
                 (
                     bid,
@@ -3097,9 +4305,17 @@ def replace_article_blocks_tree(
         CONN.execute('DELETE FROM blocks_fts WHERE article_id = ?', (article_id,))
         _insert_tree(blocks, parent_id=None)
         CONN.execute(
-            'UPDATE articles SET updated_at = ?, history = ?, redo_history = ?, article_doc_json = COALESCE(?, article_doc_json) WHERE id = ?',
-            (now, serialize_history(history), '[]', doc_json_str, article_id),
+            'UPDATE articles SET updated_at = ?, content_rev = content_rev + 1, article_doc_json = COALESCE(?, article_doc_json) WHERE id = ?',
+            (now, doc_json_str, article_id),
         )
+        if doc_json_str is not None:
+            CONN.execute(
+                'UPDATE articles SET doc_json_bytes = ?, doc_json_hash = ?, sections_synced = FALSE, doc_json_stale = FALSE '
+                'WHERE id = ?',
+                (*doc_json_stats(doc_json_str), article_id),
+            )
+        clear_article_redo_history(article_id)
+        append_article_history_entries(article_id, history_entries_added)
         # Prefer doc_json for link extraction in outline-first mode.
         if doc_json is not None and not article_row.get('is_encrypted'):
             _rebuild_article_links_for_article_id(article_id, doc_json=doc_json)
@@ -3145,8 +4361,9 @@ def replace_article_blocks_tree(
             section_map = build_outline_section_plain_text_map(doc_json)
             for sid, plain in (section_map or {}).items():
                 text = (plain or '').strip()
-                lemma = build_lemma(text)
-                normalized = build_normalized_tokens(text)
+                analysis = analyze(text)
+                lemma = analysis.lemma
+                normalized = analysis.normalized
                 upsert_outline_section_search_index(
                     sid,
                     article_id,
@@ -3185,7 +4402,7 @@ def insert_block(article_id: str, target_block_id: str, direction: str, payload:
     new_block = clone_block(payload or create_default_block())
     inserted = _insert_block_tree(article_id, new_block, target['parent_id'], insertion, now)
     with CONN:
-      CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (now, article_id))
+      CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
       # Если блок создаётся с готовым содержимым (payload) и в нём уже есть
       # текст или дети, он может содержать ссылки — пересчитываем связи.
       # Пустые/по умолчанию блоки (Ctrl+↑/↓, быстрые заметки и т.п.)
@@ -3252,7 +4469,7 @@ def delete_block(article_id: str, block_id: str) -> Optional[Dict[str, Any]]:
             },
         )
         CONN.execute(
-            'UPDATE articles SET block_trash = ? , updated_at = ? WHERE id = ?',
+            'UPDATE articles SET block_trash = ? , updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
             (serialize_history(trash), now, article_id),
         )
         subtree_rows = CONN.execute(
@@ -3340,7 +4557,7 @@ def delete_block_permanent(article_id: str, block_id: str) -> Optional[Dict[str,
           f'UPDATE blocks SET position = position - 1 WHERE article_id = ? AND {clause} AND position > ?',
           (article_id, *params, target_row['position']),
       )
-      CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (now, article_id))
+      CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
       _rebuild_article_links_for_article_id(article_id)
   return {
       'removedBlockId': block_id,
@@ -3357,7 +4574,7 @@ def clear_block_trash(article_id: str) -> Dict[str, Any]:
     now = iso_now()
     with CONN:
         CONN.execute(
-            'UPDATE articles SET block_trash = ?, updated_at = ? WHERE id = ?',
+            'UPDATE articles SET block_trash = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
             (serialize_history([]), now, article_id),
         )
     article['blockTrash'] = []
@@ -3389,7 +4606,7 @@ def move_block(article_id: str, block_id: str, direction: str) -> Optional[Dict[
         for pos, bid in enumerate(order):
             CONN.execute('UPDATE blocks SET position = ? WHERE id = ? AND article_id = ?', (pos, bid, article_id))
         CONN.execute('UPDATE blocks SET updated_at = ? WHERE id = ? AND article_id = ?', (now, block_id, article_id))
-        CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (now, article_id))
+        CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
     return {'block': {'id': block_id}, 'parentId': target['parent_id']}
 
 
@@ -3424,7 +4641,7 @@ def indent_block(article_id: str, block_id: str) -> Optional[Dict[str, Any]]:
             'UPDATE blocks SET parent_id = ?, position = ?, updated_at = ? WHERE id = ? AND article_id = ?',
             (new_parent_id, child_count, now, block_id, article_id),
         )
-        CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (now, article_id))
+        CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
     return {'block': {'id': block_id}, 'parentId': new_parent_id}
 
 
@@ -3462,7 +4679,7 @@ def outdent_block(article_id: str, block_id: str) -> Optional[Dict[str, Any]]:
             'UPDATE blocks SET parent_id = ?, position = ?, updated_at = ? WHERE id = ? AND article_id = ?',
             (parent_row['parent_id'], insert_pos, now, block_id, article_id),
         )
-        CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (now, article_id))
+        CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
     return {'block': {'id': block_id}, 'parentId': parent_row['parent_id']}
 
 
@@ -3473,7 +4690,7 @@ def restore_block(article_id: str, parent_id: Optional[str], index: Optional[int
     restored = clone_block(payload)
     inserted = _insert_block_tree(article_id, restored, parent_id, insertion, now)
     with CONN:
-        CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (now, article_id))
+        CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
         # Восстановленный блок мог содержать ссылки.
         _rebuild_article_links_for_article_id(article_id)
     return {'block': inserted, 'parentId': parent_id or None, 'index': insertion}
@@ -3518,7 +4735,7 @@ def restore_block_from_trash(article_id: str, trashed_block_id: str) -> Optional
   now = iso_now()
   with CONN:
       CONN.execute(
-          'UPDATE articles SET block_trash = ?, updated_at = ? WHERE id = ?',
+          'UPDATE articles SET block_trash = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
           (serialize_history(new_trash), now, article_id),
       )
 
@@ -3616,7 +4833,7 @@ def move_block_to_parent(
                 'UPDATE blocks SET parent_id = ?, position = ?, updated_at = ? WHERE id = ? AND article_id = ?',
                 (target_parent_id, pos, now, bid, article_id),
             )
-        CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (now, article_id))
+        CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
 
     return {
         'block': {'id': block_id},
@@ -3648,7 +4865,7 @@ def move_block_to_article(src_article_id: str, block_id: str, target_article_id:
     insertion = len(siblings)
     inserted = _insert_block_tree(target_article_id, payload, None, insertion, iso_now())
     with CONN:
-        CONN.execute('UPDATE articles SET updated_at = ? WHERE id = ?', (iso_now(), target_article_id))
+        CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (iso_now(), target_article_id))
     try:
         author_id = target_article.get('authorId') or ''
         if author_id:
@@ -3711,6 +4928,10 @@ def update_article_meta(article_id: str, attrs: Dict[str, Any]) -> Optional[Dict
             # незашифрованного содержимого на сервере.
             if desired:
                 updates.append('article_doc_json = NULL')
+                updates.append('doc_json_bytes = NULL')
+                updates.append('doc_json_hash = NULL')
+                updates.append('sections_synced = FALSE')
+                updates.append('doc_json_stale = FALSE')
                 article['docJson'] = None
 
     if 'encryptionSalt' in attrs:
@@ -3736,16 +4957,25 @@ def update_article_meta(article_id: str, attrs: Dict[str, Any]) -> Optional[Dict
 
     now = iso_now()
     updates.append('updated_at = ?')
+    updates.append('content_rev = content_rev + 1')
     params.append(now)
     params.append(article_id)
     with CONN:
         CONN.execute(f'UPDATE articles SET {", ".join(updates)} WHERE id = ?', tuple(params))
+        if 'sections_synced = FALSE' in updates:
+            # Посекционные копии тоже содержат plaintext.
+            CONN.execute('DELETE FROM outline_sections WHERE article_id = ?', (article_id,))
 
     if title_changed and title is not None:
         article['title'] = title
     article['updatedAt'] = now
     if title_changed and title is not None:
         upsert_article_search_index(article_id, title)
+        # Embeddings секций от заголовка не зависят: пересчитывается один вектор заголовка (в фоне).
+        try:
+            mark_article_title_embeddings([article_id])
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('Failed to queue title embedding for %s: %r', article_id, exc)
 
     # Логируем финальное состояние шифрования статьи для отладки.
     print(
@@ -3763,89 +4993,48 @@ def update_article_meta(article_id: str, attrs: Dict[str, Any]) -> Optional[Dict
     return article
 
 
-def undo_block_text_change(article_id: str, entry_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    article_row = CONN.execute('SELECT history, redo_history FROM articles WHERE id = ?', (article_id,)).fetchone()
-    if not article_row:
-        raise ArticleNotFound(f'Article {article_id} not found')
-    history = deserialize_history(article_row['history'])
-    redo = deserialize_history(article_row['redo_history'])
-    if not history:
-        raise InvalidOperation('Nothing to undo')
-    if entry_id:
-        index = next((i for i, item in enumerate(history) if item['id'] == entry_id), None)
-    else:
-        index = len(history) - 1
-    if index is None or index < 0 or index >= len(history):
-        raise InvalidOperation('Nothing to undo')
-    entry = history.pop(index)
-    redo.append(entry)
-    block_id = entry['blockId']
-    block_row = CONN.execute(
-        'SELECT block_rowid FROM blocks WHERE id = ? AND article_id = ?',
-        (block_id, article_id),
-    ).fetchone()
-    if not block_row:
-        # Блок был удалён после записи истории — текстовое undo для него
-        # больше невозможно, считаем что "нечего отменять", а не ошибка.
-        raise InvalidOperation('Nothing to undo')
-    new_text = sanitize_html(entry.get('before') or '')
-    plain_text = strip_html(new_text)
-    lemma = build_lemma(plain_text)
-    normalized_text = build_normalized_tokens(plain_text)
-    now = iso_now()
+def _apply_block_text_from_history(article_id: str, *, undo: bool, entry_id: Optional[str]) -> Dict[str, Any]:
+    nothing = 'Nothing to undo' if undo else 'Nothing to redo'
     with CONN:
+        article_row = CONN.execute('SELECT id FROM articles WHERE id = ? FOR UPDATE', (article_id,)).fetchone()
+        if not article_row:
+            raise ArticleNotFound(f'Article {article_id} not found')
+        # undo берёт запись из истории, redo — из redo-стека; это перевод одной строки, а не перезапись массивов.
+        entry_row = _pick_history_entry_row(article_id, entry_id, undone=not undo)
+        if not entry_row:
+            raise InvalidOperation(nothing)
+        entry = _history_entry_from_row(entry_row)
+        block_id = entry.get('blockId')
+        block_row = CONN.execute(
+            'SELECT block_rowid FROM blocks WHERE id = ? AND article_id = ?',
+            (block_id, article_id),
+        ).fetchone()
+        if not block_row:
+            # Блок был удалён после записи истории — текстовое undo/redo для него
+            # больше невозможно, считаем что "нечего отменять", а не ошибка.
+            raise InvalidOperation(nothing)
+        new_text = sanitize_html(entry.get('before' if undo else 'after') or '')
+        plain_text = strip_html(new_text)
+        analysis = analyze(plain_text)
+        lemma = analysis.lemma
+        normalized_text = analysis.normalized
+        now = iso_now()
         CONN.execute(
             'UPDATE blocks SET text = ?, normalized_text = ?, updated_at = ? WHERE id = ? AND article_id = ?',
             (new_text, normalized_text, now, block_id, article_id),
         )
         upsert_block_search_index(block_row['block_rowid'], article_id, new_text, lemma, normalized_text)
-        CONN.execute(
-            'UPDATE articles SET history = ?, redo_history = ?, updated_at = ? WHERE id = ?',
-            (serialize_history(history), serialize_history(redo), now, article_id),
-        )
+        _set_history_entry_undone(article_id, int(entry_row['seq']), undo)
+        CONN.execute('UPDATE articles SET updated_at = ?, content_rev = content_rev + 1 WHERE id = ?', (now, article_id))
     return {'blockId': block_id, 'block': {'id': block_id, 'text': new_text}}
 
 
+def undo_block_text_change(article_id: str, entry_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    return _apply_block_text_from_history(article_id, undo=True, entry_id=entry_id)
+
+
 def redo_block_text_change(article_id: str, entry_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    article_row = CONN.execute('SELECT history, redo_history FROM articles WHERE id = ?', (article_id,)).fetchone()
-    if not article_row:
-        raise ArticleNotFound(f'Article {article_id} not found')
-    history = deserialize_history(article_row['history'])
-    redo = deserialize_history(article_row['redo_history'])
-    if not redo:
-        raise InvalidOperation('Nothing to redo')
-    if entry_id:
-        index = next((i for i, item in enumerate(redo) if item['id'] == entry_id), None)
-    else:
-        index = len(redo) - 1
-    if index is None or index < 0 or index >= len(redo):
-        raise InvalidOperation('Nothing to redo')
-    entry = redo.pop(index)
-    history.append(entry)
-    block_id = entry['blockId']
-    block_row = CONN.execute(
-        'SELECT block_rowid FROM blocks WHERE id = ? AND article_id = ?',
-        (block_id, article_id),
-    ).fetchone()
-    if not block_row:
-        # Соответствующий блок уже удалён — повторять нечего.
-        raise InvalidOperation('Nothing to redo')
-    new_text = sanitize_html(entry.get('after') or '')
-    plain_text = strip_html(new_text)
-    lemma = build_lemma(plain_text)
-    normalized_text = build_normalized_tokens(plain_text)
-    now = iso_now()
-    with CONN:
-        CONN.execute(
-            'UPDATE blocks SET text = ?, normalized_text = ?, updated_at = ? WHERE id = ? AND article_id = ?',
-            (new_text, normalized_text, now, block_id, article_id),
-        )
-        upsert_block_search_index(block_row['block_rowid'], article_id, new_text, lemma, normalized_text)
-        CONN.execute(
-            'UPDATE articles SET history = ?, redo_history = ?, updated_at = ? WHERE id = ?',
-            (serialize_history(history), serialize_history(redo), now, article_id),
-        )
-    return {'blockId': block_id, 'block': {'id': block_id, 'text': new_text}}
+    return _apply_block_text_from_history(article_id, undo=False, entry_id=entry_id)
 
 
 def _attachment_public_paths(article_id: str, stored_path: str) -> Tuple[str, str]:
@@ -3926,26 +5115,11 @@ def list_attachments(article_id: str) -> List[Dict[str, Any]]:
 
 def _tokenize_search_term(term: str) -> Tuple[List[str], List[str]]:
     """
-    Разбивает поисковый запрос на леммы и нормализованные токены.
-    Дополнительно добавляет "укороченные" префиксы нормализованных токенов, чтобы
-    запросы вроде "приветик" могли находить "Привет" (по общему началу слова).
+    Разбивает поисковый запрос на леммы и нормализованные токены (списки выровнены по словам).
+    Похожие словоформы и опечатки («приветик» → «привет») ищет режим fuzzy через pg_trgm.
     """
-    lemma_tokens = build_lemma_tokens(term)
-    base_tokens = [token for token in build_normalized_tokens(term).split() if token]
-    prefix_tokens: List[str] = []
-    for token in base_tokens:
-        # Для более-менее длинных слов добавляем префикс из первых 4–5 символов.
-        # Например, "приветик" -> "приве", "integration" -> "integ".
-        if len(token) >= 5:
-            prefix = token[:5]
-            if prefix not in base_tokens:
-                prefix_tokens.append(prefix)
-    # Сохраняем порядок и убираем дубликаты.
-    all_normalized: List[str] = []
-    for tok in base_tokens + prefix_tokens:
-        if tok not in all_normalized:
-            all_normalized.append(tok)
-    return lemma_tokens, all_normalized
+    analysis = analyze(term)
+    return list(analysis.lemma_tokens), list(analysis.tokens)
 
 
 def _mapping_get_first(mapping: Any, *keys: str) -> Any:
@@ -3968,156 +5142,441 @@ def _mapping_get_first(mapping: Any, *keys: str) -> Any:
     return None
 
 
+SEARCH_PREFIX_MIN_LEN = 3
+
+
 def build_postgres_ts_query(term: str) -> str:
+    """
+    tsquery запроса: каждое слово — (лемма | словоформа:*), слова объединяются через AND.
+    Префикс :* ставится только словам от SEARCH_PREFIX_MIN_LEN букв — короткие префиксы разворачиваются
+    в огромные списки лексем. Например, «книгами о» -> "(книга | книгами:*) & о".
+    """
     lemma_tokens, normalized_tokens = _tokenize_search_term(term)
-    cleaned: List[str] = []
-    for token in lemma_tokens + normalized_tokens:
-        normalized = TOKEN_SANITIZE_RE.sub('', token.lower())
-        if normalized:
-            cleaned.append(normalized)
-    # Preserve order but deduplicate tokens to keep queries short.
-    unique_tokens: List[str] = []
-    for token in cleaned:
-        if token not in unique_tokens:
-            unique_tokens.append(token)
-    return ' | '.join(f"{token}:*" for token in unique_tokens)
-
-
-def search_articles(query: str, limit: int = 10, author_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    groups: List[str] = []
+    for lemma_raw, token_raw in zip(lemma_tokens, normalized_tokens):
+        lemma = TOKEN_SANITIZE_RE.sub('', lemma_raw.lower())
+        token = TOKEN_SANITIZE_RE.sub('', token_raw.lower())
+        alternatives = []
+        if token:
+            alternatives.append(f'{token}:*' if len(token) >= SEARCH_PREFIX_MIN_LEN else token)
+        if lemma and lemma != token:
+            alternatives.insert(0, lemma)
+        if not alternatives:
+            continue
+        group = alternatives[0] if len(alternatives) == 1 else f"({' | '.join(alternatives)})"
+        # Повторы слов в запросе не расширяют tsquery.
+        if group not in groups:
+            groups.append(group)
+    return ' & '.join(groups)
+
+
+# Поиск в две фазы: сначала по GIN-индексу отбираются только (id, rank) текущей страницы,
+# затем ts_headline/текст/заголовки считаются лишь для этих строк (ts_headline дорогой).
+# author_id и deleted лежат в самих FTS-таблицах: составной GIN (author_id, search_vector) WHERE NOT deleted
+# отбирает совпадения только из корпуса пользователя.
+# Порядок — rank DESC, updated_at DESC, id DESC; курсор «загрузить ещё» — ключ последней строки.
+
+
+def _encode_search_cursor(rank: float, updated_at: str, last_id: str) -> str:
+    raw = json.dumps([float(rank), str(updated_at or ''), str(last_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_search_cursor(cursor: str) -> tuple[float, str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        rank, updated_at, last_id = json.loads(raw)
+        return float(rank), str(updated_at), str(last_id)
+    except Exception as exc:  # noqa: BLE001
+        raise InvalidOperation('Invalid search cursor') from exc
+
+
+def _search_rank_page(
+    ranked_sql: str,
+    params: List[Any],
+    id_col: str,
+    limit: int,
+    cursor: Optional[str],
+) -> tuple[list[RowMapping], Optional[str]]:
+    """Фаза 1: ключи страницы (id_col, rank, updated_at) без чтения текста. limit + 1 — признак следующей страницы."""
+    sql = f'SELECT * FROM ({ranked_sql}) ranked'
+    params = list(params)
+    if cursor:
+        rank, updated_at, last_id = _decode_search_cursor(cursor)
+        sql += f' WHERE (rank, updated_at, {id_col}) < (?::float8, ?, ?)'
+        params += [rank, updated_at, last_id]
+    sql += f' ORDER BY rank DESC, updated_at DESC, {id_col} DESC LIMIT ?'
+    params.append(max(1, int(limit)) + 1)
+    rows = CONN.execute(sql, tuple(params)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, _encode_search_cursor(last['rank'], last['updated_at'], last[id_col])
+
+
+# Режимы поиска: 'fts' — только tsvector; 'fuzzy' — tsvector + pg_trgm (опечатки, другие словоформы,
+# недописанные слова) с общим скором rank = ts_rank_cd + word_similarity * SEARCH_TRGM_WEIGHT.
+SEARCH_MODES = ('fts', 'fuzzy')
+SEARCH_DEFAULT_MODE = (os.environ.get('SERVPY_SEARCH_MODE') or 'fuzzy').strip().lower()
+# Порог pg_trgm.word_similarity_threshold для оператора <% (выше — точнее, ниже — больше опечаток).
+SEARCH_TRGM_THRESHOLD = float(os.environ.get('SERVPY_SEARCH_TRGM_THRESHOLD') or '0.5')
+SEARCH_TRGM_WEIGHT = float(os.environ.get('SERVPY_SEARCH_TRGM_WEIGHT') or '0.5')
+
+_SEARCH_TRGM_AVAILABLE: Optional[bool] = None
+
+
+def search_trigram_available() -> bool:
+    global _SEARCH_TRGM_AVAILABLE
+    if _SEARCH_TRGM_AVAILABLE is None:
+        try:
+            row = CONN.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").fetchone()
+            _SEARCH_TRGM_AVAILABLE = bool(row)
+        except Exception:  # noqa: BLE001
+            _SEARCH_TRGM_AVAILABLE = False
+    return _SEARCH_TRGM_AVAILABLE
+
+
+def _resolve_search_mode(mode: Optional[str]) -> str:
+    resolved = (mode or SEARCH_DEFAULT_MODE or 'fts').strip().lower()
+    if resolved not in SEARCH_MODES:
+        raise InvalidOperation(f'Unknown search mode: {resolved}')
+    if resolved == 'fuzzy' and not search_trigram_available():
+        return 'fts'
+    return resolved
+
+
+def build_trigram_search_term(term: str) -> str:
+    """Запрос для pg_trgm: нормализованные словоформы (как в normalized_text индекса)."""
+    return ' '.join(analyze(term).tokens)
+
+
+def _ranked_search_sql(
+    table: str,
+    id_col: str,
+    updated_expr: str,
+    join_sql: str,
+    ts_query: str,
+    trgm_term: str,
+    author_id: Optional[str],
+    mode: str,
+) -> tuple[str, List[Any]]:
+    """Фаза 1 (SQL): (id_col, rank, updated_at) совпадений по GIN-индексам, без текста."""
+    if mode == 'fuzzy':
+        rank_sql = "ts_rank_cd(f.search_vector, to_tsquery('simple', ?)) + word_similarity(?, f.normalized_text) * ?"
+        match_sql = "(f.search_vector @@ to_tsquery('simple', ?) OR ? <% f.normalized_text)"
+        params: List[Any] = [ts_query, trgm_term, SEARCH_TRGM_WEIGHT, ts_query, trgm_term]
+    else:
+        rank_sql = "ts_rank_cd(f.search_vector, to_tsquery('simple', ?))"
+        match_sql = "f.search_vector @@ to_tsquery('simple', ?)"
+        params = [ts_query, ts_query]
+    sql = f'''
+        SELECT f.{id_col}, ({rank_sql})::float8 AS rank, {updated_expr} AS updated_at
+        FROM {table} f
+        {join_sql}
+        WHERE NOT f.deleted AND {match_sql}
+    '''
+    if author_id is not None:
+        sql += ' AND f.author_id = ?'
+        params.append(author_id)
+    return sql, params
+
+
+def _search_phase_one(
+    ranked_sql: str,
+    params: List[Any],
+    id_col: str,
+    limit: int,
+    cursor: Optional[str],
+    mode: str,
+    threshold: Optional[float],
+) -> tuple[list[RowMapping], Optional[str]]:
+    with CONN:
+        if mode == 'fuzzy':
+            # SET LOCAL: порог действует только в этой транзакции.
+            value = SEARCH_TRGM_THRESHOLD if threshold is None else float(threshold)
+            CONN.execute("SELECT set_config('pg_trgm.word_similarity_threshold', ?, true)", (str(value),))
+        return _search_rank_page(ranked_sql, params, id_col, limit, cursor)
+
+
+def search_articles_page(
+    query: str,
+    limit: int = 10,
+    author_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    mode: Optional[str] = None,
+    threshold: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Поиск статей по заголовку: {'results': [...], 'nextCursor': str | None}."""
     ts_query = build_postgres_ts_query(query)
     if not ts_query:
-        return []
-    base_sql = '''
+        return {'results': [], 'nextCursor': None}
+    mode = _resolve_search_mode(mode)
+    ranked_sql, params = _ranked_search_sql(
+        'articles_fts',
+        'article_id',
+        "COALESCE(a.updated_at, '')",
+        # JOIN только ради updated_at (порядок при равном rank): строки уже отобраны по author_id в индексе.
+        'JOIN articles a ON a.id = f.article_id',
+        ts_query,
+        build_trigram_search_term(query),
+        author_id,
+        mode,
+    )
+    page, next_cursor = _search_phase_one(ranked_sql, params, 'article_id', limit, cursor, mode, threshold)
+    if not page:
+        return {'results': [], 'nextCursor': None}
+    ids = [row['article_id'] for row in page]
+    # Фаза 2: заголовки и подсветка только для строк страницы.
+    rows = CONN.execute(
+        '''
         SELECT
-            articles.id AS articleId,
-            articles.title AS title,
-            ts_headline('simple', articles_fts.title, to_tsquery('simple', ?)) AS snippet,
-            ts_rank_cd(articles_fts.search_vector, to_tsquery('simple', ?)) AS rank
+            articles.id,
+            articles.title,
+            ts_headline('simple', articles_fts.title, to_tsquery('simple', ?)) AS snippet
         FROM articles_fts
         JOIN articles ON articles.id = articles_fts.article_id
-        WHERE articles.deleted_at IS NULL
-          AND articles_fts.search_vector @@ to_tsquery('simple', ?)
-    '''
-    params: List[Any] = [ts_query, ts_query, ts_query]
-    if author_id is not None:
-        base_sql += ' AND articles.author_id = ?'
-        params.append(author_id)
-    base_sql += ' ORDER BY rank DESC, articles.updated_at DESC LIMIT ?'
-    params.append(limit)
-    rows = CONN.execute(base_sql, tuple(params)).fetchall()
+        WHERE articles_fts.article_id = ANY(?)
+        ''',
+        (ts_query, ids),
+    ).fetchall()
+    by_id = {row['id']: row for row in rows}
     results: List[Dict[str, Any]] = []
-    for row in rows:
-        mapping = getattr(row, '_mapping', row)
-        title = _mapping_get_first(mapping, 'title') or ''
-        snippet = _mapping_get_first(mapping, 'snippet') or title
-        article_id = _mapping_get_first(mapping, 'articleId', 'articleid', 'article_id')
+    for article_id in ids:
+        row = by_id.get(article_id)
+        if not row:
+            continue
+        title = row['title'] or ''
         results.append(
             {
                 'type': 'article',
                 'articleId': article_id,
                 'articleTitle': title,
-                'snippet': snippet,
+                'snippet': row['snippet'] or title,
             }
         )
-    return results
+    return {'results': results, 'nextCursor': next_cursor}
+
+
+def search_articles(
+    query: str,
+    limit: int = 10,
+    author_id: Optional[str] = None,
+    mode: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return search_articles_page(query, limit=limit, author_id=author_id, mode=mode)['results']
 
 
-def search_blocks(query: str, limit: int = 20, author_id: Optional[str] = None) -> List[Dict[str, Any]]:
+def search_blocks_page(
+    query: str,
+    limit: int = 20,
+    author_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    mode: Optional[str] = None,
+    threshold: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Поиск по тексту секций: {'results': [...], 'nextCursor': str | None}."""
     ts_query = build_postgres_ts_query(query)
     if not ts_query:
-        return []
-    base_sql = '''
+        return {'results': [], 'nextCursor': None}
+    mode = _resolve_search_mode(mode)
+    ranked_sql, params = _ranked_search_sql(
+        'outline_sections_fts',
+        'section_id',
+        'f.updated_at',
+        '',
+        ts_query,
+        build_trigram_search_term(query),
+        author_id,
+        mode,
+    )
+    page, next_cursor = _search_phase_one(ranked_sql, params, 'section_id', limit, cursor, mode, threshold)
+    if not page:
+        return {'results': [], 'nextCursor': None}
+    ids = [row['section_id'] for row in page]
+    # Фаза 2: текст, заголовок статьи и ts_headline только для строк страницы.
+    rows = CONN.execute(
+        '''
         SELECT
-            outline_sections_fts.section_id AS blockId,
-            articles.id AS articleId,
-            articles.title AS articleTitle,
-            ts_headline('simple', outline_sections_fts.text, to_tsquery('simple', ?)) AS snippet,
-            outline_sections_fts.text AS blockText,
-            ts_rank_cd(outline_sections_fts.search_vector, to_tsquery('simple', ?)) AS rank
+            outline_sections_fts.section_id,
+            outline_sections_fts.article_id,
+            outline_sections_fts.text,
+            articles.title AS article_title,
+            ts_headline('simple', outline_sections_fts.text, to_tsquery('simple', ?)) AS snippet
         FROM outline_sections_fts
         JOIN articles ON articles.id = outline_sections_fts.article_id
-        WHERE articles.deleted_at IS NULL
-          AND outline_sections_fts.search_vector @@ to_tsquery('simple', ?)
-    '''
-    params: List[Any] = [ts_query, ts_query, ts_query]
-    if author_id is not None:
-        base_sql += ' AND articles.author_id = ?'
-        params.append(author_id)
-    base_sql += ' ORDER BY rank DESC, outline_sections_fts.updated_at DESC LIMIT ?'
-    params.append(limit)
-    rows = CONN.execute(base_sql, tuple(params)).fetchall()
+        WHERE outline_sections_fts.section_id = ANY(?)
+        ''',
+        (ts_query, ids),
+    ).fetchall()
+    by_id = {row['section_id']: row for row in rows}
     results: List[Dict[str, Any]] = []
-    for row in rows:
-        mapping = getattr(row, '_mapping', row)
-        block_text = _mapping_get_first(mapping, 'blockText', 'blocktext', 'block_text', 'text') or ''
-        snippet = _mapping_get_first(mapping, 'snippet') or strip_html(block_text)[:160]
-        article_id = _mapping_get_first(mapping, 'articleId', 'articleid', 'article_id')
-        article_title = _mapping_get_first(mapping, 'articleTitle', 'articletitle', 'article_title') or ''
-        block_id = _mapping_get_first(mapping, 'blockId', 'blockid', 'block_id')
+    for section_id in ids:
+        row = by_id.get(section_id)
+        if not row:
+            continue
+        block_text = row['text'] or ''
         results.append(
             {
                 'type': 'block',
-                'articleId': article_id,
-                'articleTitle': article_title,
-                'blockId': block_id,
-                'snippet': snippet,
+                'articleId': row['article_id'],
+                'articleTitle': row['article_title'] or '',
+                'blockId': section_id,
+                'snippet': row['snippet'] or strip_html(block_text)[:160],
                 'blockText': block_text,
             }
         )
-    return results
+    return {'results': results, 'nextCursor': next_cursor}
+
+
+def search_blocks(
+    query: str,
+    limit: int = 20,
+    author_id: Optional[str] = None,
+    mode: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return search_blocks_page(query, limit=limit, author_id=author_id, mode=mode)['results']
 
 
-def search_everything(query: str, block_limit: int = 20, article_limit: int = 10, author_id: Optional[str] = None) -> List[Dict[str, Any]]:
+def search_everything(
+    query: str,
+    block_limit: int = 20,
+    article_limit: int = 10,
+    author_id: Optional[str] = None,
+    mode: Optional[str] = None,
+) -> List[Dict[str, Any]]:
     """
     Combined search for articles (by title) and blocks (by content) to support a single search box.
     """
-    # Фильтрация по автору делается на уровне SQL join с таблицей articles;
-    # поэтому здесь достаточно передать запрос и лимиты, а author_id использовать в SQL.
-    articles = search_articles(query, limit=article_limit, author_id=author_id)
-    blocks = search_blocks(query, limit=block_limit, author_id=author_id)
+    # Фильтрация по автору делается в SQL по author_id самих FTS-таблиц;
+    # поэтому здесь достаточно передать запрос и лимиты.
+    # Два FTS-запроса идут параллельно: заголовки — в пуле лексического поиска, секции — в текущем потоке.
+    articles_future = _FTS_SEARCH_POOL.submit(search_articles, query, article_limit, author_id, mode)
+    blocks = search_blocks(query, limit=block_limit, author_id=author_id, mode=mode)
+    if articles_future.cancel():
+        # Пул занят и задача ещё не стартовала — не ждём очередь, считаем здесь же.
+        articles = search_articles(query, article_limit, author_id, mode)
+    else:
+        articles = articles_future.result()
     return articles + blocks
 
 
-def rebuild_search_indexes() -> None:
+# Гибридный поиск: FTS секций, FTS заголовков и pgvector выполняются параллельно (каждый источник — в своём
+# потоке пула со своим соединением из пула БД), результаты сливаются reciprocal rank fusion.
+# У каждого источника свой бюджет времени: опоздавший источник не задерживает ответ (partial=True).
+# FTS и semantic — в разных пулах: досчитывающие в фоне semantic-задачи (embeddings, провайдер)
+# не занимают потоки лексического поиска, которым пользуется и обычный /api/search.
+HYBRID_SEARCH_WORKERS = int(os.environ.get('SERVPY_HYBRID_SEARCH_WORKERS') or '8')
+FTS_SEARCH_WORKERS = int(os.environ.get('SERVPY_FTS_SEARCH_WORKERS') or '8')
+HYBRID_SEARCH_FTS_TIMEOUT_SECONDS = float(os.environ.get('SERVPY_HYBRID_SEARCH_FTS_TIMEOUT_SECONDS') or '3')
+HYBRID_SEARCH_SEMANTIC_TIMEOUT_SECONDS = float(os.environ.get('SERVPY_HYBRID_SEARCH_SEMANTIC_TIMEOUT_SECONDS') or '1.5')
+HYBRID_SEARCH_RRF_K = int(os.environ.get('SERVPY_HYBRID_SEARCH_RRF_K') or '60')
+
+_SEMANTIC_SEARCH_POOL = ThreadPoolExecutor(max_workers=max(1, HYBRID_SEARCH_WORKERS), thread_name_prefix='semantic-search')
+_FTS_SEARCH_POOL = ThreadPoolExecutor(max_workers=max(1, FTS_SEARCH_WORKERS), thread_name_prefix='fts-search')
+
+
+def _timed_search(fn, *args, **kwargs) -> tuple[float, List[Dict[str, Any]]]:
+    started = time.monotonic()
+    out = fn(*args, **kwargs)
+    return round((time.monotonic() - started) * 1000, 1), out
+
+
+def _hybrid_result_key(item: Dict[str, Any]) -> tuple[str, str]:
+    if item.get('type') == 'article':
+        return 'article', str(item.get('articleId') or '')
+    return 'block', str(item.get('blockId') or '')
+
+
+def fuse_search_results(sources: Dict[str, List[Dict[str, Any]]], k: int = HYBRID_SEARCH_RRF_K) -> List[Dict[str, Any]]:
     """
-    Rebuild FTS indexes for articles and blocks from stored data.
-    Useful after schema migrations or cold start when virtual tables were recreated.
+    Reciprocal rank fusion: score = Σ 1 / (k + rank) по источникам, где найден результат.
+    Дубли (одна секция из FTS и из pgvector) сливаются; поля берутся из первого источника (подсветка FTS).
     """
-    with CONN:
-        CONN.execute('DELETE FROM outline_sections_fts')
-        CONN.execute('DELETE FROM articles_fts')
-    article_rows = CONN.execute('SELECT id, title FROM articles').fetchall()
-    with CONN:
-        for row in article_rows:
-            upsert_article_search_index(row['id'], row['title'] or '', use_transaction=False)
-
-    # Outline sections index (doc_json-first).
-    article_rows = CONN.execute(
-        '''
-        SELECT id, title, updated_at, is_encrypted, encryption_salt, encryption_verifier, article_doc_json
-        FROM articles
-        WHERE deleted_at IS NULL
-        '''
-    ).fetchall()
-    with CONN:
-        for row in article_rows:
-            encrypted_flag = bool(row.get('is_encrypted', 0)) or (
-                bool(row.get('encryption_salt')) and bool(row.get('encryption_verifier'))
-            )
-            if encrypted_flag:
-                continue
-            raw_doc = row.get('article_doc_json') or ''
-            if not raw_doc:
-                continue
-            try:
-                doc = json.loads(raw_doc) if isinstance(raw_doc, str) else raw_doc
-            except Exception:
+    merged: Dict[tuple[str, str], Dict[str, Any]] = {}
+    for source, items in sources.items():
+        for rank, item in enumerate(items or [], start=1):
+            key = _hybrid_result_key(item)
+            if not key[1]:
                 continue
-            section_map = build_outline_section_plain_text_map(doc)
-            updated_at = str(row.get('updated_at') or '') or iso_now()
-            for sid, plain in (section_map or {}).items():
-                text = (plain or '').strip()
-                lemma = build_lemma(text)
-                normalized = build_normalized_tokens(text)
-                upsert_outline_section_search_index(sid, row['id'], text, lemma, normalized, updated_at)
-    mark_search_index_clean()
+            entry = merged.get(key)
+            if entry is None:
+                entry = dict(item)
+                entry['score'] = 0.0
+                entry['sources'] = []
+                merged[key] = entry
+            entry['score'] += 1.0 / (k + rank)
+            entry['sources'].append(source)
+    return sorted(merged.values(), key=lambda item: item['score'], reverse=True)
+
+
+def hybrid_search(
+    query: str,
+    author_id: str,
+    block_limit: int = 30,
+    article_limit: int = 15,
+    semantic_limit: int = 30,
+    mode: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Единый поиск: {'results': [...], 'sources': {name: {'status', 'count', 'ms'}}, 'partial': bool}.
+    Время ответа — max(источников) в пределах бюджетов, а не их сумма.
+    """
+    started = time.monotonic()
+    tasks = {
+        'blocks': (
+            HYBRID_SEARCH_FTS_TIMEOUT_SECONDS,
+            _FTS_SEARCH_POOL.submit(_timed_search, search_blocks, query, block_limit, author_id, mode),
+        ),
+        'articles': (
+            HYBRID_SEARCH_FTS_TIMEOUT_SECONDS,
+            _FTS_SEARCH_POOL.submit(_timed_search, search_articles, query, article_limit, author_id, mode),
+        ),
+        'semantic': (
+            HYBRID_SEARCH_SEMANTIC_TIMEOUT_SECONDS,
+            _SEMANTIC_SEARCH_POOL.submit(
+                _timed_search, search_similar_blocks, author_id=author_id, query=query, limit=semantic_limit
+            ),
+        ),
+    }
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    statuses: Dict[str, Dict[str, Any]] = {}
+    for name, (budget, future) in tasks.items():
+        status = 'ok'
+        elapsed_ms = round(budget * 1000, 1)
+        try:
+            elapsed_ms, results[name] = future.result(timeout=max(0.0, started + budget - time.monotonic()))
+        except FutureTimeoutError:
+            # Поток досчитает в фоне, результат будет отброшен.
+            status = 'timeout'
+        except EmbeddingsUnavailable as exc:
+            logger.warning('hybrid search: semantic source unavailable: %s', exc)
+            status = 'unavailable'
+        except InvalidOperation:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('hybrid search: source %s failed: %r', name, exc)
+            status = 'error'
+        statuses[name] = {
+            'status': status,
+            'count': len(results.get(name) or []),
+            'ms': elapsed_ms,
+        }
+    # Порядок источников задаёт, чьи поля остаются у дублей: FTS (с подсветкой) раньше semantic.
+    fused = fuse_search_results({name: results[name] for name in ('blocks', 'articles', 'semantic') if name in results})
+    return {
+        'results': fused,
+        'sources': statuses,
+        'partial': any(s['status'] != 'ok' for s in statuses.values()),
+    }
+
+
+def rebuild_search_indexes() -> Dict[str, Any]:
+    """
+    Перестраивает FTS (articles_fts, outline_sections_fts) в текущем потоке и возвращает состояние задачи.
+    Строки пишутся в теневые таблицы и подменяют живые в конце — поиск всё время отвечает по старому индексу;
+    прерванная задача продолжается с чекпоинта. Фоновый запуск — search_rebuild.start_search_rebuild.
+    """
+    from .search_rebuild import run_search_rebuild
+
+    return run_search_rebuild()
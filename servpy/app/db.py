@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import importlib.util
 import os
 import threading
 import re
@@ -60,6 +61,41 @@ def _set_postgres_options(dbapi_connection, connection_record):  # type: ignore[
         return
 
 
+# Бинарный адаптер pgvector (пакет pgvector): numpy.ndarray уходит в vector-колонки без текстового литерала,
+# а vector читается сразу как ndarray. Включается schema._ensure_pgvector после CREATE EXTENSION vector;
+# без пакета pgvector векторы передаются текстом ('[...]'::vector).
+_PGVECTOR_ADAPTER = False
+
+
+def enable_pgvector_adapter() -> bool:
+    global _PGVECTOR_ADAPTER
+    _PGVECTOR_ADAPTER = importlib.util.find_spec('pgvector') is not None
+    return _PGVECTOR_ADAPTER
+
+
+def pgvector_adapter_enabled() -> bool:
+    return _PGVECTOR_ADAPTER
+
+
+@event.listens_for(engine, 'checkout')
+def _register_pgvector(dbapi_connection, connection_record, connection_proxy):  # type: ignore[override]
+    # На checkout, а не на connect: соединения пула могли открыться до создания расширения.
+    if not _PGVECTOR_ADAPTER or 'pgvector' in connection_record.info:
+        return
+    try:
+        from pgvector.psycopg import register_vector
+
+        register_vector(dbapi_connection)
+        connection_record.info['pgvector'] = True
+    except Exception:
+        connection_record.info['pgvector'] = False
+    try:
+        # register_vector читает pg_type и открывает транзакцию — закрываем до выдачи соединения.
+        dbapi_connection.rollback()
+    except Exception:
+        pass
+
+
 class Database:
     """
     Thin helper over SQLAlchemy engine to preserve the old CONN.execute API.
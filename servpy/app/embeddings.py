@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-import math
+import base64
+import hashlib
+import logging
 import os
-from typing import Iterable, List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, List
 
 import httpx
+import numpy as np
+
+from .ai_http import get_provider_client
+
+logger = logging.getLogger('uvicorn.error')
 
 # Embeddings провайдер:
 #   - OpenAI (если задан SERVPY_OPENAI_API_KEY/OPENAI_API_KEY)
@@ -42,30 +54,22 @@ EMBEDDING_DIM = int(os.environ.get('SERVPY_EMBEDDING_DIM') or '768')
 EMBEDDING_MAX_CHARS = int(os.environ.get('SERVPY_EMBEDDING_MAX_CHARS') or '12000')
 EMBEDDING_CHUNK_OVERLAP_CHARS = int(os.environ.get('SERVPY_EMBEDDING_CHUNK_OVERLAP_CHARS') or '200')
 GEMINI_TIMEOUT_SECONDS = float(os.environ.get('SERVPY_GEMINI_TIMEOUT_SECONDS') or '30')
-HTTP_PROXY = os.environ.get('SERVPY_HTTP_PROXY') or os.environ.get('HTTP_PROXY') or ''
-HTTPS_PROXY = os.environ.get('SERVPY_HTTPS_PROXY') or os.environ.get('HTTPS_PROXY') or ''
-ALL_PROXY = os.environ.get('SERVPY_ALL_PROXY') or os.environ.get('ALL_PROXY') or ''
 EMBEDDINGS_API_BATCH_SIZE = int(os.environ.get('SERVPY_EMBEDDINGS_API_BATCH_SIZE') or '64')
-
-
-def _httpx_proxies() -> str | dict | None:
-    """
-    Возвращает proxy-конфиг для httpx.
-    Поддерживаем env:
-      - SERVPY_HTTPS_PROXY / SERVPY_HTTP_PROXY (приоритет)
-      - HTTPS_PROXY / HTTP_PROXY (fallback)
-      - SERVPY_ALL_PROXY / ALL_PROXY
-    """
-    if ALL_PROXY:
-        return ALL_PROXY
-    if HTTP_PROXY or HTTPS_PROXY:
-        proxies: dict[str, str] = {}
-        if HTTP_PROXY:
-            proxies['http://'] = HTTP_PROXY
-        if HTTPS_PROXY:
-            proxies['https://'] = HTTPS_PROXY
-        return proxies
-    return None
+# Микробатчинг: тексты параллельных вызовов (сохранения разных пользователей, воркеры очереди, поиск)
+# собираются в общий запрос. Батч уходит по лимиту (SERVPY_EMBEDDINGS_API_BATCH_SIZE, токены провайдера)
+# или через SERVPY_EMBEDDING_BATCH_WINDOW_MS после первого текста в очереди.
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get('SERVPY_EMBEDDING_BATCH_WINDOW_MS') or '5')
+EMBEDDING_BATCH_MAX_TOKENS = int(os.environ.get('SERVPY_EMBEDDING_BATCH_MAX_TOKENS') or '0')
+EMBEDDING_BATCH_WORKERS = int(os.environ.get('SERVPY_EMBEDDING_BATCH_WORKERS') or '4')
+# Сколько вызывающий ждёт результат батча (очередь + запрос с повторами), прежде чем считать провайдер недоступным.
+EMBEDDING_RESULT_TIMEOUT_SECONDS = float(os.environ.get('SERVPY_EMBEDDING_RESULT_TIMEOUT_SECONDS') or '180')
+# Кэш embeddings (таблица embedding_cache, ключ — провайдер/модель/dim/sha256 текста): неизменённый текст
+# не эмбеддится повторно — ни при переносе секции, ни при переиндексации. 0 — кэш выключен.
+EMBEDDING_CACHE_MAX_ROWS = int(os.environ.get('SERVPY_EMBEDDING_CACHE_MAX_ROWS') or '200000')
+EMBEDDING_CACHE_TOUCH_SECONDS = int(os.environ.get('SERVPY_EMBEDDING_CACHE_TOUCH_SECONDS') or '3600')
+EMBEDDING_CACHE_PRUNE_INTERVAL_SECONDS = int(os.environ.get('SERVPY_EMBEDDING_CACHE_PRUNE_INTERVAL_SECONDS') or '600')
+# Лимиты одного запроса (текстов, токенов): OpenAI — 2048 inputs и 300k токенов, Gemini — 100 requests.
+_PROVIDER_BATCH_LIMITS = {'openai': (2048, 250_000), 'gemini': (100, 100 * 2048)}
 
 
 def _redact_key(url: str) -> str:
@@ -86,14 +90,38 @@ class EmbeddingInputUnsupported(ValueError):
     """
 
 
-def _normalize_l2(vec: List[float]) -> List[float]:
-    s = 0.0
-    for x in vec:
-        s += x * x
-    if s <= 0:
-        return vec
-    inv = 1.0 / math.sqrt(s)
-    return [x * inv for x in vec]
+def _normalize_l2(vecs: np.ndarray) -> np.ndarray:
+    """L2-нормализация вектора (dim,) или строк матрицы (n, dim); нулевые векторы остаются нулевыми."""
+    arr = np.asarray(vecs, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return np.divide(arr, norms, out=np.zeros_like(arr), where=norms > 0)
+
+
+def _as_vector(values: Any, provider: str) -> np.ndarray:
+    """float32-вектор из ответа провайдера: список чисел или base64 little-endian float32 (encoding_format=base64)."""
+    try:
+        if isinstance(values, str):
+            vec = np.frombuffer(base64.b64decode(values), dtype='<f4').astype(np.float32)
+        else:
+            vec = np.asarray(values, dtype=np.float32)
+    except Exception as exc:  # noqa: BLE001
+        raise EmbeddingsUnavailable(f'{provider} вернул embedding в неверном формате') from exc
+    if vec.ndim != 1 or not vec.size:
+        raise EmbeddingsUnavailable(f'{provider} вернул пустой embedding')
+    if vec.size != EMBEDDING_DIM:
+        raise EmbeddingsUnavailable(
+            f'Размер embedding {vec.size} не совпадает с SERVPY_EMBEDDING_DIM={EMBEDDING_DIM}. '
+            'Выставьте SERVPY_EMBEDDING_DIM под модель и пересоздайте block_embeddings под vector(N).'
+        )
+    return vec
+
+
+def _openai_error_code(response: httpx.Response) -> str | None:
+    try:
+        body = response.json()
+        return ((body or {}).get('error') or {}).get('code')
+    except Exception:
+        return None
 
 
 def _split_into_chunks(text: str, max_chars: int) -> List[str]:
@@ -171,7 +199,7 @@ def _gemini_headers() -> dict[str, str]:
     }
 
 
-def _extract_embedding_values(obj) -> List[float]:
+def _extract_embedding_values(obj) -> np.ndarray:
     if not isinstance(obj, dict):
         raise EmbeddingsUnavailable('Gemini вернул некорректный ответ (не объект)')
     emb = obj.get('embedding')
@@ -181,13 +209,7 @@ def _extract_embedding_values(obj) -> List[float]:
         values = obj.get('values')
     if not isinstance(values, list) or not values:
         raise EmbeddingsUnavailable('Gemini вернул пустой embedding')
-    try:
-        vec = [float(x) for x in values]
-    except Exception as exc:  # noqa: BLE001
-        raise EmbeddingsUnavailable('Gemini вернул embedding в неверном формате') from exc
-    if len(vec) != EMBEDDING_DIM:
-        raise EmbeddingsUnavailable(f'Размер embedding {len(vec)} не совпадает с SERVPY_EMBEDDING_DIM={EMBEDDING_DIM}.')
-    return vec
+    return _as_vector(values, 'Gemini')
 
 
 def probe_embedding_info(text: str = 'test') -> dict[str, object]:
@@ -202,22 +224,16 @@ def probe_embedding_info(text: str = 'test') -> dict[str, object]:
         url = f'{OPENAI_BASE_URL.rstrip("/")}/embeddings'
         payload = {'model': OPENAI_EMBED_MODEL, 'input': [prompt]}
         try:
-            with httpx.Client(timeout=OPENAI_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-                resp = client.post(
-                    url,
-                    headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
-                    json=payload,
-                )
-                resp.raise_for_status()
-                data = resp.json()
+            resp = get_provider_client('openai').post(
+                url,
+                timeout=OPENAI_TIMEOUT_SECONDS,
+                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
+                json=payload,
+            )
+            data = resp.json()
         except httpx.HTTPStatusError as exc:
-            try:
-                body = exc.response.json()
-                code = ((body or {}).get('error') or {}).get('code')
-                if code == 'invalid_encrypted_content':
-                    raise EmbeddingInputUnsupported('OpenAI отклонил зашифрованный input (invalid_encrypted_content)') from exc
-            except Exception:
-                pass
+            if _openai_error_code(exc.response) == 'invalid_encrypted_content':
+                raise EmbeddingInputUnsupported('OpenAI отклонил зашифрованный input (invalid_encrypted_content)') from exc
             raise EmbeddingsUnavailable(f'OpenAI embeddings недоступны: {exc!r}') from exc
         except httpx.HTTPError as exc:
             raise EmbeddingsUnavailable(f'OpenAI embeddings недоступны: {exc!r}') from exc
@@ -243,10 +259,14 @@ def probe_embedding_info(text: str = 'test') -> dict[str, object]:
         'content': {'parts': [{'text': prompt}]},
     }
     try:
-        with httpx.Client(timeout=GEMINI_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-            resp = client.post(url, params=params, headers=_gemini_headers(), json=payload)
-            resp.raise_for_status()
-            data = resp.json()
+        resp = get_provider_client('gemini').post(
+            url,
+            timeout=GEMINI_TIMEOUT_SECONDS,
+            params=params,
+            headers=_gemini_headers(),
+            json=payload,
+        )
+        data = resp.json()
     except httpx.HTTPError as exc:
         msg = repr(exc)
         if hasattr(exc, 'request') and exc.request is not None:
@@ -264,32 +284,23 @@ def probe_embedding_info(text: str = 'test') -> dict[str, object]:
     return {'provider': 'gemini', 'model': model_path, 'dim': len(values)}
 
 
-def embed_texts(texts: Iterable[str]) -> List[List[float]]:
-    items = [(t or '').strip() for t in (texts or [])]
-    items = [t for t in items if t]
-    if not items:
-        return []
-
+def _request_embeddings(items: List[str]) -> List[np.ndarray]:
+    """Один запрос к активному провайдеру; items — непустые тексты в пределах лимитов батча."""
     if OPENAI_API_KEY:
         url = f'{OPENAI_BASE_URL.rstrip("/")}/embeddings'
-        payload = {'model': OPENAI_EMBED_MODEL, 'input': items}
+        # base64 — сырые float32 вместо десятичной записи каждого числа в JSON.
+        payload = {'model': OPENAI_EMBED_MODEL, 'input': items, 'encoding_format': 'base64'}
         try:
-            with httpx.Client(timeout=OPENAI_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-                resp = client.post(
-                    url,
-                    headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
-                    json=payload,
-                )
-                resp.raise_for_status()
-                data = resp.json()
+            resp = get_provider_client('openai').post(
+                url,
+                timeout=OPENAI_TIMEOUT_SECONDS,
+                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
+                json=payload,
+            )
+            data = resp.json()
         except httpx.HTTPStatusError as exc:
-            try:
-                body = exc.response.json()
-                code = ((body or {}).get('error') or {}).get('code')
-                if code == 'invalid_encrypted_content':
-                    raise EmbeddingInputUnsupported('OpenAI отклонил зашифрованный input (invalid_encrypted_content)') from exc
-            except Exception:
-                pass
+            if _openai_error_code(exc.response) == 'invalid_encrypted_content':
+                raise EmbeddingInputUnsupported('OpenAI отклонил зашифрованный input (invalid_encrypted_content)') from exc
             raise EmbeddingsUnavailable(f'OpenAI embeddings недоступны: {exc!r}') from exc
         except httpx.HTTPError as exc:
             raise EmbeddingsUnavailable(f'OpenAI embeddings недоступны: {exc!r}') from exc
@@ -300,20 +311,14 @@ def embed_texts(texts: Iterable[str]) -> List[List[float]]:
         if not isinstance(rows, list) or len(rows) != len(items):
             raise EmbeddingsUnavailable('OpenAI вернул неожиданный ответ embeddings')
         ordered = sorted(rows, key=lambda x: int(x.get('index', 0)) if isinstance(x, dict) else 0)
-        vectors: List[List[float]] = []
+        vectors: List[np.ndarray] = []
         for row in ordered:
             if not isinstance(row, dict):
                 continue
             emb = row.get('embedding')
-            if not isinstance(emb, list) or not emb:
+            if not isinstance(emb, (list, str)) or not emb:
                 raise EmbeddingsUnavailable('OpenAI вернул пустой embedding')
-            vec = [float(x) for x in emb]
-            if len(vec) != EMBEDDING_DIM:
-                raise EmbeddingsUnavailable(
-                    f'Размер embedding {len(vec)} не совпадает с SERVPY_EMBEDDING_DIM={EMBEDDING_DIM}. '
-                    'Выставьте SERVPY_EMBEDDING_DIM под модель и пересоздайте block_embeddings под vector(N).'
-                )
-            vectors.append(vec)
+            vectors.append(_as_vector(emb, 'OpenAI'))
         if len(vectors) != len(items):
             raise EmbeddingsUnavailable('OpenAI вернул неверное количество embeddings')
         return vectors
@@ -334,10 +339,14 @@ def embed_texts(texts: Iterable[str]) -> List[List[float]]:
         ]
     }
     try:
-        with httpx.Client(timeout=GEMINI_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-            resp = client.post(url, params=params, headers=_gemini_headers(), json=payload)
-            resp.raise_for_status()
-            data = resp.json()
+        resp = get_provider_client('gemini').post(
+            url,
+            timeout=GEMINI_TIMEOUT_SECONDS,
+            params=params,
+            headers=_gemini_headers(),
+            json=payload,
+        )
+        data = resp.json()
     except httpx.HTTPError as exc:
         msg = repr(exc)
         if hasattr(exc, 'request') and exc.request is not None:
@@ -352,77 +361,353 @@ def embed_texts(texts: Iterable[str]) -> List[List[float]]:
     return [_extract_embedding_values(e) for e in embeddings]
 
 
-def embed_text(text: str) -> List[float]:
-    prompt = (text or '').strip()
-    if not prompt:
-        return [0.0] * EMBEDDING_DIM
+def _active_provider() -> str:
+    return 'openai' if OPENAI_API_KEY else 'gemini'
+
 
-    chunks = _split_into_chunks(prompt, EMBEDDING_MAX_CHARS)
-    if not chunks:
-        return [0.0] * EMBEDDING_DIM
-    if len(chunks) == 1:
-        vec = embed_texts([chunks[0]])[0]
-        return _normalize_l2(vec)
+def _estimate_tokens(text: str) -> int:
+    # Верхняя оценка без токенизатора: ~4 байта UTF-8 на токен (кириллица — 2 байта на символ).
+    return len(text.encode('utf-8')) // 4 + 1
 
-    vectors = embed_texts(chunks)
-    acc = [0.0] * EMBEDDING_DIM
-    for vec in vectors:
-        for i, x in enumerate(vec):
-            acc[i] += x
-    avg = [x / max(1, len(vectors)) for x in acc]
-    return _normalize_l2(avg)
 
+def _batch_limits() -> tuple[int, int]:
+    max_items, max_tokens = _PROVIDER_BATCH_LIMITS.get(_active_provider(), (EMBEDDINGS_API_BATCH_SIZE, 100_000))
+    max_items = max(1, min(max_items, int(EMBEDDINGS_API_BATCH_SIZE)))
+    if EMBEDDING_BATCH_MAX_TOKENS > 0:
+        max_tokens = min(max_tokens, EMBEDDING_BATCH_MAX_TOKENS)
+    return max_items, max(1, max_tokens)
 
-def embed_text_batch(texts: List[str]) -> List[List[float]]:
+
+class EmbeddingBatcher:
+    """
+    Микробатчер embeddings: submit() ставит тексты в общую очередь и сразу возвращает futures.
+    Поток-диспетчер отправляет батч, как только набран лимит провайдера (число текстов/токенов)
+    или через window_seconds после первого текста в очереди; запросы выполняет пул потоков.
+    Одинаковые тексты в батче отправляются один раз.
     """
-    Возвращает embeddings для каждого текста, сохраняя семантику embed_text():
+
+    def __init__(self, request_fn: Callable[[List[str]], List[np.ndarray]], window_seconds: float, workers: int) -> None:
+        self._request_fn = request_fn
+        self._window = max(0.0, window_seconds)
+        self._workers = max(1, workers)
+        self._pending: List[tuple[str, Future]] = []
+        self._first_at = 0.0
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._pool: ThreadPoolExecutor | None = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'batches': 0, 'texts': 0, 'sentTexts': 0, 'maxBatch': 0}
+
+    def submit(self, texts: List[str]) -> List[Future]:
+        futures: List[Future] = [Future() for _ in texts]
+        with self._cond:
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.extend(zip(texts, futures))
+            if self._thread is None or not self._thread.is_alive():
+                self._pool = self._pool or ThreadPoolExecutor(
+                    max_workers=self._workers, thread_name_prefix='embedding-batch'
+                )
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return futures
+
+    def _split_point(self) -> tuple[int, bool]:
+        """Сколько первых текстов очереди влезает в один запрос и упёрлись ли в лимит."""
+        max_items, max_tokens = _batch_limits()
+        seen: set[str] = set()
+        tokens = 0
+        for idx, (text, _future) in enumerate(self._pending):
+            if text in seen:
+                continue
+            cost = _estimate_tokens(text)
+            if seen and (len(seen) + 1 > max_items or tokens + cost > max_tokens):
+                return idx, True
+            seen.add(text)
+            tokens += cost
+        full = len(seen) >= max_items or tokens >= max_tokens
+        return len(self._pending), full
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while True:
+                    size, full = self._split_point()
+                    remaining = self._first_at + self._window - time.monotonic()
+                    if full or remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:size]
+                # Остаток уже ждал окно — уйдёт следующим батчем без новой задержки.
+                self._pending = self._pending[size:]
+            assert self._pool is not None
+            self._pool.submit(self._flush, batch)
+
+    def _flush(self, batch: List[tuple[str, Future]]) -> None:
+        waiters: dict[str, List[Future]] = {}
+        for text, future in batch:
+            waiters.setdefault(text, []).append(future)
+        texts = list(waiters)
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['texts'] += len(batch)
+            self._stats['sentTexts'] += len(texts)
+            self._stats['maxBatch'] = max(self._stats['maxBatch'], len(texts))
+        try:
+            vectors = self._request_fn(texts)
+        except EmbeddingInputUnsupported as exc:
+            if len(texts) == 1:
+                for future in waiters[texts[0]]:
+                    future.set_exception(exc)
+                return
+            # Провайдер отклонил один из входов — не роняем чужие тексты из того же батча:
+            # делим пополам, пока отклонённый текст не останется один.
+            half = len(texts) // 2
+            for part in (texts[:half], texts[half:]):
+                self._flush([(text, future) for text in part for future in waiters[text]])
+            return
+        except BaseException as exc:  # noqa: BLE001
+            for futures in waiters.values():
+                for future in futures:
+                    future.set_exception(exc)
+            return
+        for text, vec in zip(texts, vectors):
+            for idx, future in enumerate(waiters[text]):
+                future.set_result(vec if idx == 0 else vec.copy())
+
+    def stats(self) -> dict[str, Any]:
+        with self._stats_lock:
+            stats: dict[str, Any] = dict(self._stats)
+        with self._cond:
+            stats['pending'] = len(self._pending)
+        stats['avgBatch'] = round(stats['sentTexts'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
+
+
+_CACHE_STATS_LOCK = threading.Lock()
+_CACHE_STATS = {'hits': 0, 'misses': 0, 'stored': 0, 'pruned': 0, 'errors': 0}
+_CACHE_LAST_PRUNE = 0.0
+
+
+def _cache_model_key() -> tuple[str, str, int]:
+    if OPENAI_API_KEY:
+        return 'openai', OPENAI_EMBED_MODEL, EMBEDDING_DIM
+    return 'gemini', _gemini_model_path(), EMBEDDING_DIM
+
+
+def embedding_cache_key(text: str) -> str:
+    """sha256 текста с нормализованными пробелами — ключ embedding_cache (вместе с провайдером/моделью/dim)."""
+    normalized = ' '.join((text or '').split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _cache_count(**deltas: int) -> None:
+    with _CACHE_STATS_LOCK:
+        for name, delta in deltas.items():
+            _CACHE_STATS[name] += delta
+
+
+def _cache_failed(action: str, exc: Exception) -> None:
+    # Кэш — оптимизация: при ошибке БД просто идём к провайдеру.
+    _cache_count(errors=1)
+    logger.warning('embedding_cache: %s failed: %r', action, exc)
+
+
+def _cache_lookup(keys: List[str]) -> dict[str, np.ndarray]:
+    """Один запрос на все ключи; {text_hash: vector}. Давно не тронутым записям обновляет last_used_at."""
+    if EMBEDDING_CACHE_MAX_ROWS <= 0 or not keys:
+        return {}
+    provider, model, dim = _cache_model_key()
+    unique = list(dict.fromkeys(keys))
+    now_dt = datetime.utcnow()
+    try:
+        from .db import CONN
+
+        rows = CONN.execute(
+            '''
+            SELECT text_hash, embedding, last_used_at
+            FROM embedding_cache
+            WHERE provider = ? AND model = ? AND dim = ? AND text_hash = ANY(?)
+            ''',
+            (provider, model, dim, unique),
+        ).fetchall()
+        touch_before = (now_dt - timedelta(seconds=EMBEDDING_CACHE_TOUCH_SECONDS)).isoformat()
+        found: dict[str, np.ndarray] = {}
+        stale: List[str] = []
+        for row in rows or []:
+            vec = np.asarray(row.get('embedding') or [], dtype=np.float32)
+            if vec.shape != (dim,):
+                continue
+            found[str(row['text_hash'])] = vec
+            # last_used_at пишем не чаще раза в EMBEDDING_CACHE_TOUCH_SECONDS: для LRU этого достаточно.
+            if str(row.get('last_used_at') or '') < touch_before:
+                stale.append(str(row['text_hash']))
+        if stale:
+            CONN.execute(
+                '''
+                UPDATE embedding_cache SET last_used_at = ?
+                WHERE provider = ? AND model = ? AND dim = ? AND text_hash = ANY(?)
+                ''',
+                (now_dt.isoformat(), provider, model, dim, stale),
+            )
+        return found
+    except Exception as exc:  # noqa: BLE001
+        _cache_failed('lookup', exc)
+        return {}
+
+
+def _cache_store(texts: List[str], vectors: List[np.ndarray]) -> None:
+    if EMBEDDING_CACHE_MAX_ROWS <= 0 or not texts:
+        return
+    provider, model, dim = _cache_model_key()
+    now = datetime.utcnow().isoformat()
+    rows = {embedding_cache_key(text): vec for text, vec in zip(texts, vectors)}
+    try:
+        from .db import CONN
+
+        CONN.executemany(
+            '''
+            INSERT INTO embedding_cache (provider, model, dim, text_hash, embedding, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (provider, model, dim, text_hash) DO UPDATE
+            SET embedding = EXCLUDED.embedding,
+                last_used_at = EXCLUDED.last_used_at
+            ''',
+            [(provider, model, dim, key, vec.tolist(), now, now) for key, vec in rows.items()],
+        )
+    except Exception as exc:  # noqa: BLE001
+        _cache_failed('store', exc)
+        return
+    _cache_count(stored=len(rows))
+    _maybe_prune_embedding_cache()
+
+
+def prune_embedding_cache(max_rows: int | None = None) -> int:
+    """Удаляет давно не использованные записи сверх max_rows (LRU по last_used_at). Возвращает число удалённых."""
+    from .db import CONN
+
+    limit = EMBEDDING_CACHE_MAX_ROWS if max_rows is None else max_rows
+    row = CONN.execute(
+        '''
+        WITH gone AS (
+            DELETE FROM embedding_cache
+            WHERE ctid IN (SELECT ctid FROM embedding_cache ORDER BY last_used_at DESC OFFSET ?)
+            RETURNING 1
+        )
+        SELECT COUNT(*) AS c FROM gone
+        ''',
+        (max(0, int(limit)),),
+    ).fetchone()
+    pruned = int((row or {}).get('c') or 0)
+    _cache_count(pruned=pruned)
+    return pruned
+
+
+def _maybe_prune_embedding_cache() -> None:
+    global _CACHE_LAST_PRUNE
+    with _CACHE_STATS_LOCK:
+        now = time.monotonic()
+        if _CACHE_LAST_PRUNE and now - _CACHE_LAST_PRUNE < EMBEDDING_CACHE_PRUNE_INTERVAL_SECONDS:
+            return
+        _CACHE_LAST_PRUNE = now
+    try:
+        prune_embedding_cache()
+    except Exception as exc:  # noqa: BLE001
+        _cache_failed('prune', exc)
+
+
+def get_embedding_cache_stats() -> dict[str, Any]:
+    with _CACHE_STATS_LOCK:
+        stats: dict[str, Any] = dict(_CACHE_STATS)
+    total = stats['hits'] + stats['misses']
+    stats['hitRate'] = round(stats['hits'] / total, 3) if total else 0.0
+    stats['maxRows'] = EMBEDDING_CACHE_MAX_ROWS
+    return stats
+
+
+def _request_and_cache(texts: List[str]) -> List[np.ndarray]:
+    vectors = [np.asarray(vec, dtype=np.float32) for vec in _request_embeddings(texts)]
+    _cache_store(texts, vectors)
+    return vectors
+
+
+_EMBEDDING_BATCHER = EmbeddingBatcher(
+    lambda texts: _request_and_cache(texts),
+    EMBEDDING_BATCH_WINDOW_MS / 1000.0,
+    EMBEDDING_BATCH_WORKERS,
+)
+
+
+def get_embedding_batcher_stats() -> dict[str, Any]:
+    return _EMBEDDING_BATCHER.stats()
+
+
+def embed_texts(texts: Iterable[str]) -> List[np.ndarray]:
+    """
+    Embeddings непустых текстов (в исходном порядке), float32-векторы без нормализации.
+    Сначала один запрос к embedding_cache; промахи уходят к провайдеру через общий микробатчер.
+    """
+    items = [(t or '').strip() for t in (texts or [])]
+    items = [t for t in items if t]
+    if not items:
+        return []
+    keys = [embedding_cache_key(t) for t in items]
+    cached = _cache_lookup(keys)
+    missing = [t for t, key in zip(items, keys) if key not in cached]
+    _cache_count(hits=len(items) - len(missing), misses=len(missing))
+    futures = iter(_EMBEDDING_BATCHER.submit(missing) if missing else [])
+    deadline = time.monotonic() + EMBEDDING_RESULT_TIMEOUT_SECONDS
+    out: List[np.ndarray] = []
+    for key in keys:
+        vec = cached.get(key)
+        if vec is None:
+            try:
+                vec = next(futures).result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError as exc:
+                raise EmbeddingsUnavailable(
+                    f'Embeddings: нет ответа за {EMBEDDING_RESULT_TIMEOUT_SECONDS:g}s (SERVPY_EMBEDDING_RESULT_TIMEOUT_SECONDS)'
+                ) from exc
+        else:
+            vec = vec.copy()
+        out.append(vec)
+    return out
+
+
+def embed_text(text: str) -> np.ndarray:
+    """Embedding одного текста: float32-вектор (dim,), L2-нормализованный; пустой текст — нулевой вектор."""
+    prompt = (text or '').strip()
+    if not prompt:
+        return np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    return embed_text_batch([prompt])[0]
+
+
+def embed_text_batch(texts: List[str]) -> np.ndarray:
+    """
+    Возвращает матрицу float32 (len(texts), dim), строка i — embedding texts[i]:
     - split на чанки > EMBEDDING_MAX_CHARS
     - эмбеддим чанки батчами
     - усредняем embedding чанков
     - L2-нормализация результата
+    Пустые тексты дают нулевые строки.
     """
     items = [(t or '').strip() for t in (texts or [])]
+    out = np.zeros((len(items), EMBEDDING_DIM), dtype=np.float32)
     if not items:
-        return []
-
-    chunks_by_item: List[List[str]] = [_split_into_chunks(t, EMBEDDING_MAX_CHARS) for t in items]
-    flat_chunks: List[str] = []
-    offsets: List[tuple[int, int]] = []
-    cur = 0
-    for chunks in chunks_by_item:
-        start = cur
-        for c in chunks:
-            if c:
-                flat_chunks.append(c)
-                cur += 1
-        offsets.append((start, cur))
+        return out
 
+    chunks_by_item: List[List[str]] = [_split_into_chunks(t, EMBEDDING_MAX_CHARS) if t else [] for t in items]
+    flat_chunks = [c for chunks in chunks_by_item for c in chunks]
     if not flat_chunks:
-        return [[0.0] * EMBEDDING_DIM for _ in items]
-
-    # Не отправляем слишком большие input-массивы в один запрос.
-    batch_size = max(1, int(EMBEDDINGS_API_BATCH_SIZE))
-    flat_vectors: List[List[float]] = []
-    for i in range(0, len(flat_chunks), batch_size):
-        flat_vectors.extend(embed_texts(flat_chunks[i : i + batch_size]))
-
-    out: List[List[float]] = []
-    for (start, end), original in zip(offsets, items):
-        if not original:
-            out.append([0.0] * EMBEDDING_DIM)
-            continue
-        if end <= start:
-            out.append([0.0] * EMBEDDING_DIM)
-            continue
-        if end - start == 1:
-            out.append(_normalize_l2(flat_vectors[start]))
-            continue
-        acc = [0.0] * EMBEDDING_DIM
-        n = 0
-        for vec in flat_vectors[start:end]:
-            n += 1
-            for j, x in enumerate(vec):
-                acc[j] += x
-        avg = [x / max(1, n) for x in acc]
-        out.append(_normalize_l2(avg))
-    return out
+        return out
+
+    # На запросы к провайдеру (с учётом лимитов) чанки делит микробатчер.
+    flat = np.vstack(embed_texts(flat_chunks))
+    # Чанки текста лежат подряд: среднее по отрезкам одной операцией reduceat.
+    counts = np.fromiter((len(chunks) for chunks in chunks_by_item), dtype=np.intp, count=len(items))
+    has_chunks = counts > 0
+    starts = (np.cumsum(counts) - counts)[has_chunks]
+    out[has_chunks] = np.add.reduceat(flat, starts, axis=0) / counts[has_chunks, None].astype(np.float32)
+    return _normalize_l2(out)
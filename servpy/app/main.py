@@ -46,6 +46,7 @@ from .auth import (
     get_current_user,
     get_user_by_id,
     get_user_by_username,
+    kick_session_cache_listener,
     set_session_cookie,
     verify_password,
 )
@@ -82,7 +83,6 @@ from .data_store import (
     get_article,
     create_attachment,
     save_article,
-    rebuild_search_indexes,
     build_postgres_ts_query,
     delete_user_with_data,
     _expand_wikilinks,
@@ -127,6 +127,8 @@ from .routers import import_html as import_html_routes
 from .routers import import_logseq as import_logseq_routes
 from .audio_transcripts import kick_audio_transcript_worker
 from .attachments_gc import kick_attachments_gc_worker
+from .search_rebuild import resume_search_rebuild, start_search_rebuild
+from .semantic_search import kick_embedding_workers
 from .import_html import _parse_memus_export_payload, _process_block_html_for_import
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -158,12 +160,17 @@ ensure_inbox_article()
 kick_audio_transcript_worker()
 # Auto-GC orphan attachments (unreferenced for TTL days).
 kick_attachments_gc_worker()
-# Полная перестройка поисковых индексов может занимать много времени
-# на больших базах и замедлять запуск сервера, поэтому по умолчанию
-# она отключена. При необходимости её можно включить через
-# переменную окружения SERVPY_REBUILD_INDEXES_ON_STARTUP=1.
+# Cross-worker invalidation of the in-process session cache (LISTEN/NOTIFY).
+kick_session_cache_listener()
+# Background embeddings: durable embedding_jobs queue, drained in batches off the request path.
+kick_embedding_workers()
+# Полная перестройка поисковых индексов идёт в фоне (теневые таблицы, поиск не простаивает)
+# и по умолчанию при старте не запускается; включается SERVPY_REBUILD_INDEXES_ON_STARTUP=1.
+# Задача, прерванная рестартом, продолжается с чекпоинта.
 if os.environ.get('SERVPY_REBUILD_INDEXES_ON_STARTUP') == '1':
-    rebuild_search_indexes()
+    start_search_rebuild()
+else:
+    resume_search_rebuild()
 # Гарантируем наличие суперпользователя kirill.
 ensure_superuser('kirill', 'zZ141400', 'kirill')
 try:
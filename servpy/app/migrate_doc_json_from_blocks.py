@@ -9,7 +9,7 @@ from pathlib import Path
 
 from .db import CONN
 from .schema import init_schema
-from .data_store import rows_to_tree
+from .data_store import doc_json_stats, rows_to_tree
 
 
 def _repo_root() -> Path:
@@ -78,9 +78,11 @@ def migrate(*, limit: int | None = None, force: bool = False, dry_run: bool = Fa
             blocks = rows_to_tree(article_id)
             doc_json = _convert_blocks_to_doc_json(blocks)
             if not dry_run:
+                doc_json_str = json.dumps(doc_json, ensure_ascii=False)
                 CONN.execute(
-                    "UPDATE articles SET article_doc_json = ? WHERE id = ?",
-                    (json.dumps(doc_json, ensure_ascii=False), article_id),
+                    "UPDATE articles SET article_doc_json = ?, doc_json_bytes = ?, doc_json_hash = ?, "
+                    "content_rev = content_rev + 1, sections_synced = FALSE, doc_json_stale = FALSE WHERE id = ?",
+                    (doc_json_str, *doc_json_stats(doc_json_str), article_id),
                 )
             migrated += 1
             if migrated % 25 == 0 or migrated == 1:
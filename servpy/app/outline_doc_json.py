@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import re
-from typing import Any
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import Any, Callable
 
 
 _WS_RE = re.compile(r"[ \t]+")
@@ -18,10 +22,12 @@ def _normalize_plain(text: str) -> str:
     return out.strip()
 
 
-def _pm_text(node: Any) -> str:
+def _pm_text(node: Any, visit: Callable[[dict[str, Any]], None] | None = None) -> str:
     """
     Extracts plain text from a ProseMirror/Tiptap JSON node.
     This is a best-effort conversion intended for embeddings/search (not rendering).
+    `visit` (optional) is called for every dict node on the way, so callers can collect
+    links/refs in the same pass.
     """
     if node is None:
         return ""
@@ -30,12 +36,14 @@ def _pm_text(node: Any) -> str:
     if isinstance(node, list):
         parts: list[str] = []
         for item in node:
-            t = _pm_text(item)
+            t = _pm_text(item, visit)
             if t:
                 parts.append(t)
         return "".join(parts)
     if not isinstance(node, dict):
         return ""
+    if visit is not None:
+        visit(node)
 
     t = node.get("type") or ""
     content = node.get("content") or []
@@ -53,31 +61,31 @@ def _pm_text(node: Any) -> str:
 
     # Block-ish boundaries.
     if t in {"paragraph", "blockquote", "codeBlock"}:
-        inner = _pm_text(content)
+        inner = _pm_text(content, visit)
         return (inner + "\n") if inner else "\n"
     if t in {"heading"}:
-        inner = _pm_text(content)
+        inner = _pm_text(content, visit)
         return (inner + "\n") if inner else "\n"
     if t in {"bulletList", "orderedList"}:
-        return _pm_text(content) + "\n"
+        return _pm_text(content, visit) + "\n"
     if t in {"listItem"}:
-        inner = _pm_text(content)
+        inner = _pm_text(content, visit)
         inner = inner.rstrip("\n")
         return (inner + "\n") if inner else "\n"
     if t in {"table"}:
-        return _pm_text(content) + "\n"
+        return _pm_text(content, visit) + "\n"
     if t in {"tableRow"}:
         cells: list[str] = []
         for c in content if isinstance(content, list) else []:
-            cell_text = _pm_text(c).strip()
+            cell_text = _pm_text(c, visit).strip()
             cells.append(cell_text)
         row = " | ".join(cells).strip()
         return (row + "\n") if row else "\n"
     if t in {"tableCell", "tableHeader"}:
-        return _pm_text(content).strip() + " "
+        return _pm_text(content, visit).strip() + " "
 
     # Default: recurse.
-    return _pm_text(content)
+    return _pm_text(content, visit)
 
 
 def build_outline_section_plain_text_map(doc_json: Any) -> dict[str, str]:
@@ -283,3 +291,142 @@ def build_outline_section_internal_links_map(doc_json: Any) -> dict[str, set[str
 
     walk(doc_json)
     return out
+
+
+def outline_text_hash(plain_text: str) -> str:
+    return hashlib.sha256((plain_text or "").encode("utf-8")).hexdigest()
+
+
+def outline_section_content_hash(heading: Any, body: Any) -> str:
+    """Stable hash of section heading+body JSON (key order independent)."""
+    raw = json.dumps([heading, body], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _add_attachment_ref(refs: set[str], href: str) -> None:
+    h = str(href or "").strip()
+    if not h:
+        return
+    refs.add(h)
+    if h.startswith("/api/yandex/disk/file?"):
+        # Yandex proxy URLs reference app:/... paths.
+        try:
+            qs = urllib.parse.parse_qs(urllib.parse.urlparse(h).query or "")
+            p = (qs.get("path") or [""])[0]
+            if p:
+                refs.add(p)
+        except Exception:
+            pass
+
+
+@dataclass
+class OutlineSectionInfo:
+    section_id: str
+    heading: dict[str, Any] | None
+    body: dict[str, Any] | None
+    plain_text: str
+    internal_links: set[str]
+    content_hash: str
+    text_hash: str
+
+
+@dataclass
+class OutlineDocAnalysis:
+    sections: dict[str, OutlineSectionInfo] = field(default_factory=dict)
+    # URL-like strings that can reference attachments (link href, image src, attrs.href/src).
+    attachment_refs: set[str] = field(default_factory=set)
+
+    def plain_text_map(self) -> dict[str, str]:
+        return {sid: info.plain_text for sid, info in self.sections.items()}
+
+    def fragments_map(self) -> dict[str, dict[str, Any]]:
+        return {sid: {"heading": info.heading, "body": info.body} for sid, info in self.sections.items()}
+
+    def internal_links_map(self) -> dict[str, set[str]]:
+        return {sid: info.internal_links for sid, info in self.sections.items()}
+
+
+def analyze_outline_doc(doc_json: Any) -> OutlineDocAnalysis:
+    """
+    Single walk over the doc: per-section plain text, heading/body fragments, internal links,
+    content hashes, plus attachment refs for the whole doc.
+    Equivalent to build_outline_section_{plain_text,fragments,internal_links}_map combined.
+    """
+    result = OutlineDocAnalysis()
+    refs = result.attachment_refs
+
+    def visit_refs(node: dict[str, Any], links: set[str] | None = None) -> None:
+        marks = node.get("marks")
+        if isinstance(marks, list):
+            for m in marks:
+                if not isinstance(m, dict) or m.get("type") != "link":
+                    continue
+                attrs = m.get("attrs")
+                href = str((attrs.get("href") or "") if isinstance(attrs, dict) else "")
+                _add_attachment_ref(refs, href)
+                if links is not None:
+                    target = _extract_internal_article_id_from_href(href)
+                    if target:
+                        links.add(target)
+        attrs = node.get("attrs")
+        if isinstance(attrs, dict):
+            if isinstance(attrs.get("href"), str):
+                _add_attachment_ref(refs, attrs["href"])
+            if isinstance(attrs.get("src"), str):
+                _add_attachment_ref(refs, attrs["src"])
+
+    def walk(node: Any) -> None:
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+            return
+        if not isinstance(node, dict):
+            return
+        visit_refs(node)
+
+        if node.get("type") == "outlineSection":
+            attrs = node.get("attrs") or {}
+            section_id = str(attrs.get("id") or "").strip()
+            content = node.get("content") or []
+            heading_node = None
+            body_node = None
+            children_node = None
+            extra_nodes: list[Any] = []
+            for child in content if isinstance(content, list) else []:
+                if not isinstance(child, dict):
+                    continue
+                ctype = child.get("type")
+                if ctype == "outlineHeading" and heading_node is None:
+                    heading_node = child
+                elif ctype == "outlineBody" and body_node is None:
+                    body_node = child
+                elif ctype == "outlineChildren" and children_node is None:
+                    children_node = child
+                else:
+                    extra_nodes.append(child)
+
+            links: set[str] = set()
+            visit = lambda n: visit_refs(n, links)  # noqa: E731
+            heading_plain = _normalize_plain(_pm_text(heading_node, visit))
+            body_plain = _normalize_plain(_pm_text(body_node, visit))
+            combined = "\n".join([p for p in [heading_plain, body_plain] if p]).strip()
+            if section_id:
+                result.sections[section_id] = OutlineSectionInfo(
+                    section_id=section_id,
+                    heading=heading_node,
+                    body=body_node,
+                    plain_text=combined,
+                    internal_links=links,
+                    content_hash=outline_section_content_hash(heading_node, body_node),
+                    text_hash=outline_text_hash(combined),
+                )
+
+            # Stray nodes still count for attachment refs.
+            walk(extra_nodes)
+            walk(children_node)
+            return
+
+        walk(node.get("content") or [])
+
+    walk(doc_json)
+    return result
@@ -5,6 +5,7 @@ from typing import Any, Dict, List
 
 import httpx
 
+from .ai_http import get_provider_client
 from .embeddings import EmbeddingsUnavailable
 from .text_utils import strip_html
 
@@ -16,23 +17,6 @@ RAG_SUMMARY_MAX_BLOCKS = int(os.environ.get('SERVPY_RAG_SUMMARY_MAX_BLOCKS') or
 RAG_SUMMARY_MAX_TOTAL_CHARS = int(os.environ.get('SERVPY_RAG_SUMMARY_MAX_TOTAL_CHARS') or '24000')
 RAG_SUMMARY_MAX_BLOCK_CHARS = int(os.environ.get('SERVPY_RAG_SUMMARY_MAX_BLOCK_CHARS') or '2000')
 
-HTTP_PROXY = os.environ.get('SERVPY_HTTP_PROXY') or os.environ.get('HTTP_PROXY') or ''
-HTTPS_PROXY = os.environ.get('SERVPY_HTTPS_PROXY') or os.environ.get('HTTPS_PROXY') or ''
-ALL_PROXY = os.environ.get('SERVPY_ALL_PROXY') or os.environ.get('ALL_PROXY') or ''
-
-
-def _httpx_proxies() -> str | dict | None:
-    if ALL_PROXY:
-        return ALL_PROXY
-    if HTTP_PROXY or HTTPS_PROXY:
-        proxies: dict[str, str] = {}
-        if HTTP_PROXY:
-            proxies['http://'] = HTTP_PROXY
-        if HTTPS_PROXY:
-            proxies['https://'] = HTTPS_PROXY
-        return proxies
-    return None
-
 
 def _coerce_blocks(query: str, results: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     items = []
@@ -113,14 +97,13 @@ def summarize_search_results(*, query: str, results: List[Dict[str, Any]]) -> st
         'temperature': 0.2,
     }
     try:
-        with httpx.Client(timeout=RAG_SUMMARY_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-            resp = client.post(
-                url,
-                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
-                json=payload,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        resp = get_provider_client('openai').post(
+            url,
+            timeout=RAG_SUMMARY_TIMEOUT_SECONDS,
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
+            json=payload,
+        )
+        data = resp.json()
     except httpx.HTTPError as exc:
         raise EmbeddingsUnavailable(f'OpenAI summary недоступен: {exc!r}') from exc
     except Exception as exc:  # noqa: BLE001
@@ -4,8 +4,9 @@ from .data_store import rebuild_search_indexes
 
 def main():
     init_schema()
-    rebuild_search_indexes()
-    print('FTS reindexed (articles_fts, outline_sections_fts)')
+    status = rebuild_search_indexes()
+    print(f"FTS reindex (articles_fts, outline_sections_fts): {status.get('status')}, "
+          f"{status.get('processed', 0)} articles, {status.get('sections', 0)} sections")
 
 
 if __name__ == '__main__':
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import base64
 import json
 import re
+import struct
 import time
 from pathlib import Path
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 
 from ..auth import User, get_current_user
 from ..data_store import (
@@ -17,22 +19,35 @@ from ..data_store import (
     delete_outline_sections,
     create_article,
     delete_article,
+    delete_article_subtree,
+    EMBEDDING_PACKED_DTYPES,
+    doc_json_stats,
     get_article,
+    get_article_ancestors,
+    get_article_meta,
+    get_article_raw,
     get_articles,
     get_articles_index,
+    get_article_subtree,
     get_deleted_articles,
     get_or_create_user_inbox,
+    get_sync_changes,
     indent_article as indent_article_ds,
     move_article as move_article_ds,
     move_article_to_parent,
     outdent_article as outdent_article_ds,
     restore_article,
+    restore_article_subtree,
     update_article_meta,
     update_article_doc_json,
     save_article_doc_json,
     upsert_outline_section_content,
     sync_outline_compact,
     get_article_block_embeddings,
+    get_article_title_embeddings,
+    get_block_text_history,
+    list_article_history,
+    list_article_redo_history,
 )
 from ..export_utils import _build_backup_article_html, _inline_uploads_for_backup
 from .common import _present_article, _resolve_article_id_for_user
@@ -103,6 +118,22 @@ def post_article(payload: dict[str, Any], current_user: User = Depends(get_curre
     return article
 
 
+def _article_etag(article: dict[str, Any], doc_json_hash: str) -> str:
+    # content_rev растёт при любой правке тела ответа (документ, заголовок, parentId/position, publicSlug),
+    # в том числе при move up/down, которые не трогают updated_at. position — отдельно: перенумерация
+    # соседей (rebalance_article_positions) меняет его без content_rev.
+    return f'W/"{int(article.get("contentRev") or 0)}:{article.get("position") or 0}:{doc_json_hash or ""}"'
+
+
+def _spliced_article_body(payload: dict[str, Any], doc_json_text: str) -> bytes:
+    """
+    JSON-тело статьи: сериализуем только метаданные, а сохранённый текст docJson вставляем как есть
+    (он уже валидный JSON, записанный data_store) — многомегабайтный документ не парсится и не дампится.
+    """
+    head = json.dumps(payload, ensure_ascii=False)
+    return b''.join((head[:-1].encode('utf-8'), b', "docJson": ', doc_json_text.encode('utf-8'), b'}'))
+
+
 # Вынесено из app/main.py → app/routers/articles.py
 @router.get('/api/articles/{article_id}')
 def read_article(
@@ -112,106 +143,80 @@ def read_article(
     current_user: User = Depends(get_current_user),
 ):
     started = time.perf_counter()
-    if article_id == 'inbox':
-        article = get_or_create_user_inbox(current_user.id)
+    real_article_id = f'inbox-{current_user.id}' if article_id == 'inbox' else article_id
+    # doc_json-first: metadata + stored docJson text, no legacy blocks and no JSON parse on the hot path.
+    article = get_article_raw(real_article_id, current_user.id, include_block_trash=include_history)
+    if article is not None:
+        doc_json_text = article['docJsonText']
+        doc_bytes = article['docJsonBytes']
+        doc_hash = article['docJsonHash']
+    else:
+        # Rare path: inbox not created yet / restored from trash, or docJson missing/invalid (self-heal).
+        if article_id == 'inbox':
+            article = get_or_create_user_inbox(current_user.id)
+        else:
+            article = get_article(article_id, current_user.id, include_blocks=False)
         if not article:
             raise HTTPException(status_code=404, detail='Article not found')
-        payload = {
-            'id': article.get('id'),
-            'title': article.get('title'),
-            'createdAt': article.get('createdAt'),
-            'updatedAt': article.get('updatedAt'),
-            'deletedAt': article.get('deletedAt'),
-            'parentId': article.get('parentId'),
-            'position': article.get('position') or 0,
-            'authorId': article.get('authorId'),
-            'publicSlug': article.get('publicSlug'),
-            'encrypted': bool(article.get('encrypted')),
-            'encryptionSalt': article.get('encryptionSalt'),
-            'encryptionVerifier': article.get('encryptionVerifier'),
-            'encryptionHint': article.get('encryptionHint'),
-            'outlineStructureRev': int(article.get('outlineStructureRev') or 0),
-            'docJson': article.get('docJson') or None,
-            # Large arrays: load on demand via /history to avoid slow JSON.parse on mobile.
-            'history': (article.get('history') or []) if include_history else [],
-            'redoHistory': (article.get('redoHistory') or []) if include_history else [],
-            'blockTrash': (article.get('blockTrash') or []) if include_history else [],
-            'blocks': [],
-        }
-        try:
-            elapsed_ms = int((time.perf_counter() - started) * 1000)
-            doc_bytes = len(json.dumps(payload.get('docJson') or {}, ensure_ascii=False))
-            etag = f'W/"{payload.get("updatedAt") or ""}:{doc_bytes}"'
-            if request.headers.get('if-none-match') == etag:
-                return Response(status_code=304, headers={'ETag': etag})
-            headers = {
-                'X-Memus-Article-ms': str(elapsed_ms),
-                'X-Memus-DocJson-bytes': str(doc_bytes),
-                'ETag': etag,
-            }
-            return Response(
-                content=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
-                media_type='application/json; charset=utf-8',
-                headers=headers,
-            )
-        except Exception:
-            return payload
-    # doc_json-first: return metadata + docJson without legacy blocks (faster, smaller payload).
-    article = get_article(article_id, current_user.id, include_blocks=False)
-    if not article:
-        raise HTTPException(status_code=404, detail='Article not found')
+        doc_json_text = json.dumps(article.get('docJson') or None, ensure_ascii=False)
+        doc_bytes, doc_hash = doc_json_stats(doc_json_text)
+
+    etag = _article_etag(article, doc_hash)
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'ETag': etag})
+    payload = {
+        'id': article.get('id'),
+        'title': article.get('title'),
+        'createdAt': article.get('createdAt'),
+        'updatedAt': article.get('updatedAt'),
+        'deletedAt': article.get('deletedAt'),
+        'parentId': article.get('parentId'),
+        'position': article.get('position') or 0,
+        'authorId': article.get('authorId'),
+        'publicSlug': article.get('publicSlug'),
+        'encrypted': bool(article.get('encrypted')),
+        'encryptionSalt': article.get('encryptionSalt'),
+        'encryptionVerifier': article.get('encryptionVerifier'),
+        'encryptionHint': article.get('encryptionHint'),
+        'outlineStructureRev': int(article.get('outlineStructureRev') or 0),
+        'contentRev': int(article.get('contentRev') or 0),
+        # Large arrays: load on demand via /history to avoid slow JSON.parse on mobile.
+        'history': list_article_history(article.get('id'))['entries'] if include_history else [],
+        'redoHistory': list_article_redo_history(article.get('id')) if include_history else [],
+        'blockTrash': (article.get('blockTrash') or []) if include_history else [],
+        'blocks': [],
+    }
     # Diagnostics: expose timing + payload size in headers (useful for devtools).
-    try:
-        payload = {
-            'id': article.get('id'),
-            'title': article.get('title'),
-            'createdAt': article.get('createdAt'),
-            'updatedAt': article.get('updatedAt'),
-            'deletedAt': article.get('deletedAt'),
-            'parentId': article.get('parentId'),
-            'position': article.get('position') or 0,
-            'authorId': article.get('authorId'),
-            'publicSlug': article.get('publicSlug'),
-            'encrypted': bool(article.get('encrypted')),
-            'encryptionSalt': article.get('encryptionSalt'),
-            'encryptionVerifier': article.get('encryptionVerifier'),
-            'encryptionHint': article.get('encryptionHint'),
-            'outlineStructureRev': int(article.get('outlineStructureRev') or 0),
-            'docJson': article.get('docJson') or None,
-            'history': (article.get('history') or []) if include_history else [],
-            'redoHistory': (article.get('redoHistory') or []) if include_history else [],
-            'blockTrash': (article.get('blockTrash') or []) if include_history else [],
-            'blocks': [],
-        }
-        elapsed_ms = int((time.perf_counter() - started) * 1000)
-        doc_bytes = len(json.dumps(payload.get('docJson') or {}, ensure_ascii=False))
-        etag = f'W/"{payload.get("updatedAt") or ""}:{doc_bytes}"'
-        if request.headers.get('if-none-match') == etag:
-            return Response(status_code=304, headers={'ETag': etag})
-        headers = {
-            'X-Memus-Article-ms': str(elapsed_ms),
-            'X-Memus-DocJson-bytes': str(doc_bytes),
-            'ETag': etag,
-        }
-        return Response(
-            content=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
-            media_type='application/json; charset=utf-8',
-            headers=headers,
-        )
-    except Exception:
-        return payload if 'payload' in locals() else article
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    headers = {
+        'X-Memus-Article-ms': str(elapsed_ms),
+        'X-Memus-DocJson-bytes': str(doc_bytes),
+        'ETag': etag,
+    }
+    return Response(
+        content=_spliced_article_body(payload, doc_json_text),
+        media_type='application/json; charset=utf-8',
+        headers=headers,
+    )
 
 
 @router.get('/api/articles/{article_id}/history')
-def read_article_history(article_id: str, current_user: User = Depends(get_current_user)):
+def read_article_history(
+    article_id: str,
+    before: int | None = None,
+    limit: int | None = None,
+    current_user: User = Depends(get_current_user),
+):
     """
     Heavy fields (history/redoHistory/blockTrash) are served separately so article open is fast.
+    History is paginated by keyset: pass `before=<nextCursor>` to load older entries.
     """
     started = time.perf_counter()
     if article_id == 'inbox':
         article = get_or_create_user_inbox(current_user.id)
         if not article:
             raise HTTPException(status_code=404, detail='Article not found')
+        real_article_id = f'inbox-{current_user.id}'
     else:
         real_article_id = _resolve_article_id_for_user(article_id, current_user)
         article = get_article(real_article_id, current_user.id, include_blocks=False)
@@ -219,10 +224,13 @@ def read_article_history(article_id: str, current_user: User = Depends(get_curre
             raise HTTPException(status_code=404, detail='Article not found')
         article = _present_article(article, article_id)
 
+    page = list_article_history(real_article_id, before_seq=before, limit=limit)
     payload = {
         'id': article_id,
-        'history': article.get('history') or [],
-        'redoHistory': article.get('redoHistory') or [],
+        'history': page['entries'],
+        'nextCursor': page['nextCursor'],
+        # Redo stack is only sent with the first page.
+        'redoHistory': list_article_redo_history(real_article_id) if before is None else [],
         'blockTrash': article.get('blockTrash') or [],
     }
     try:
@@ -237,46 +245,48 @@ def read_article_history(article_id: str, current_user: User = Depends(get_curre
         return payload
 
 
+# Перенесено из app/routers/blocks.py: история секции нужна outline-режиму, а legacy blocks-роутер не подключён.
+@router.get('/api/articles/{article_id}/blocks/{block_id}/history')
+def get_block_history(article_id: str, block_id: str, limit: int = 100, current_user: User = Depends(get_current_user)):
+    real_article_id = _resolve_article_id_for_user(article_id, current_user)
+    try:
+        result = get_block_text_history(real_article_id, current_user.id, block_id, limit=limit)
+        return result
+    except ArticleNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except InvalidOperation as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
 @router.get('/api/articles/{article_id}/meta')
 def read_article_meta(article_id: str, request: Request, current_user: User = Depends(get_current_user)):
     """
     Lightweight article metadata for offline-first client decisions.
-    Returns updatedAt + docJsonBytes so the client can avoid downloading full docJson when unchanged.
+    Returns updatedAt + contentRev (+ docJsonBytes/docJsonHash) so the client can avoid downloading
+    full docJson when unchanged. Answered from stored columns only: the document is never read.
     """
     started = time.perf_counter()
-    if article_id == 'inbox':
-        article = get_or_create_user_inbox(current_user.id)
-        if not article:
-            raise HTTPException(status_code=404, detail='Article not found')
-        doc_json = article.get('docJson') or None
-        updated_at = article.get('updatedAt')
-    else:
-        article = get_article(article_id, current_user.id, include_blocks=False)
-        if not article:
-            raise HTTPException(status_code=404, detail='Article not found')
-        doc_json = article.get('docJson') or None
-        updated_at = article.get('updatedAt')
-
-    try:
-        doc_bytes = len(json.dumps(doc_json or {}, ensure_ascii=False))
-    except Exception:
-        doc_bytes = 0
+    real_article_id = f'inbox-{current_user.id}' if article_id == 'inbox' else article_id
+    meta = get_article_meta(real_article_id, current_user.id)
+    if meta is None and article_id == 'inbox':
+        # Inbox is created (or restored from trash) lazily on first access.
+        get_or_create_user_inbox(current_user.id)
+        meta = get_article_meta(real_article_id, current_user.id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail='Article not found')
 
-    etag = f'W/"{updated_at or ""}:{doc_bytes}"'
+    etag = f'W/"{meta["updatedAt"] or ""}:{meta["contentRev"]}"'
     if request.headers.get('if-none-match') == etag:
         return Response(status_code=304, headers={'ETag': etag})
 
-    payload = {'id': article_id, 'updatedAt': updated_at, 'docJsonBytes': doc_bytes}
-    try:
-        elapsed_ms = int((time.perf_counter() - started) * 1000)
-        headers = {'X-Memus-Article-ms': str(elapsed_ms), 'ETag': etag}
-        return Response(
-            content=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
-            media_type='application/json; charset=utf-8',
-            headers=headers,
-        )
-    except Exception:
-        return payload
+    payload = {'id': article_id, **meta}
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    headers = {'X-Memus-Article-ms': str(elapsed_ms), 'ETag': etag}
+    return Response(
+        content=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        media_type='application/json; charset=utf-8',
+        headers=headers,
+    )
 
 
 @router.get('/api/articles/{article_id}/export/html')
@@ -311,25 +321,109 @@ def export_article_html(article_id: str, download: bool = True, current_user: Us
     headers = {'Content-Disposition': f'{disposition}; filename=\"{filename}\"'}
     return Response(content=html.encode('utf-8'), media_type='text/html; charset=utf-8', headers=headers)
 
+# Заголовок бинарного ответа embeddings: magic, версия, байт на компоненту, 2 байта резерва.
+_EMBEDDINGS_BINARY_MAGIC = b'TEMB'
+_EMBEDDINGS_BINARY_VERSION = 2
+
+
+def _embedding_transport(format_: str | None, accept: str | None) -> tuple[str | None, bool]:
+    """
+    format=json (по умолчанию) | f32 | f16 (бинарный поток) | f32-b64 | f16-b64 (base64 в JSON).
+    Без format бинарный f32 выбирается заголовком Accept: application/octet-stream.
+    Возвращает (dtype или None для list[float], binary).
+    """
+    fmt = (format_ or '').strip().lower()
+    if not fmt:
+        fmt = 'f32' if 'application/octet-stream' in (accept or '').lower() else 'json'
+    if fmt == 'json':
+        return None, False
+    dtype, _, b64 = fmt.partition('-')
+    if dtype not in EMBEDDING_PACKED_DTYPES or b64 not in ('', 'b64'):
+        raise HTTPException(status_code=400, detail='Unsupported embeddings format')
+    return dtype, not b64
+
+
+def _embeddings_binary_frames(items: list[dict[str, Any]], dtype: str, title: dict[str, Any] | None = None):
+    """
+    Бинарный поток: заголовок (4s magic, u8 version, u8 bytes-per-value, 2 байта резерва), затем на секцию:
+    u16 len + blockId (utf-8), u16 len + updatedAt (utf-8), u16 dim, dim значений little-endian.
+    Версия 2: первым кадром идёт вектор заголовка статьи с пустым blockId (dim = 0, если вектора нет).
+    """
+    value_size = 2 if dtype == 'f16' else 4
+    yield _EMBEDDINGS_BINARY_MAGIC + struct.pack('<BBH', _EMBEDDINGS_BINARY_VERSION, value_size, 0)
+    for item in [{'blockId': '', **(title or {'embedding': b''})}, *items]:
+        block_id = str(item.get('blockId') or '').encode('utf-8')
+        updated_at = str(item.get('updatedAt') or '').encode('utf-8')
+        data = item['embedding']
+        yield b''.join(
+            (
+                struct.pack('<H', len(block_id)),
+                block_id,
+                struct.pack('<H', len(updated_at)),
+                updated_at,
+                struct.pack('<H', len(data) // value_size),
+                data,
+            )
+        )
+
+
+def _embeddings_b64(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [{**item, 'embedding': base64.b64encode(item['embedding']).decode('ascii')} for item in items]
+
+
+def _title_embedding_payload(title: dict[str, Any] | None, dtype: str | None) -> dict[str, Any] | None:
+    if title is None or not dtype:
+        return title
+    return _embeddings_b64([title])[0]
+
+
 @router.get('/api/articles/{article_id}/embeddings')
-def get_article_embeddings(article_id: str, since: str | None = None, ids: str | None = None, current_user: User = Depends(get_current_user)):
+def get_article_embeddings(
+    article_id: str,
+    request: Request,
+    since: str | None = None,
+    ids: str | None = None,
+    format_: str | None = Query(None, alias='format'),
+    current_user: User = Depends(get_current_user),
+):
     """
     Возвращает embeddings для секций статьи (block_embeddings) для offline-first клиента.
-    `since` — iso timestamp; `ids` — comma-separated blockIds (опционально).
+    `since` — iso timestamp; `ids` — comma-separated blockIds (опционально);
+    `format` — транспорт векторов (см. _embedding_transport): упакованные float32/float16 вместо
+    сотен десятичных чисел на секцию.
+    titleEmbedding — вектор заголовка статьи (article_embeddings) или null: клиент смешивает его
+    близость с близостью секции так же, как серверное ранжирование.
     """
+    dtype, binary = _embedding_transport(format_, request.headers.get('accept'))
     real_article_id = _resolve_article_id_for_user(article_id, current_user)
     block_ids = None
     if ids:
         block_ids = [s.strip() for s in str(ids).split(',') if s.strip()]
-    return {
-        'articleId': real_article_id,
-        'embeddings': get_article_block_embeddings(
-            article_id=real_article_id,
-            author_id=current_user.id,
-            since=str(since or '').strip() or None,
-            block_ids=block_ids,
-        ),
-    }
+    items = get_article_block_embeddings(
+        article_id=real_article_id,
+        author_id=current_user.id,
+        since=str(since or '').strip() or None,
+        block_ids=block_ids,
+        dtype=dtype,
+    )
+    title = get_article_title_embeddings(
+        article_ids=[real_article_id], author_id=current_user.id, dtype=dtype
+    ).get(real_article_id)
+    if binary:
+        return StreamingResponse(
+            _embeddings_binary_frames(items, dtype, title),
+            media_type='application/octet-stream',
+            headers={'X-Embeddings-Dtype': dtype},
+        )
+    title_embedding = _title_embedding_payload(title, dtype)
+    if dtype:
+        return {
+            'articleId': real_article_id,
+            'encoding': f'{dtype}-b64',
+            'embeddings': _embeddings_b64(items),
+            'titleEmbedding': title_embedding,
+        }
+    return {'articleId': real_article_id, 'embeddings': items, 'titleEmbedding': title_embedding}
 
 
 @router.put('/api/articles/{article_id}/doc-json')
@@ -469,6 +563,56 @@ def put_article_outline_sync_compact(
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
+def _sync_changes_lines(page: dict[str, Any], dtype: str | None):
+    for item in page['deleted']:
+        yield json.dumps({'type': 'deleted', **item}, ensure_ascii=False).encode('utf-8') + b'\n'
+    for article in page['articles']:
+        doc_json_text = article.pop('docJsonText')
+        embeddings = article.pop('embeddings')
+        title_embedding = article.pop('titleEmbedding')
+        payload = {'type': 'article', **article, 'docJsonChanged': doc_json_text is not None}
+        if doc_json_text is not None:
+            yield _spliced_article_body(payload, doc_json_text) + b'\n'
+        else:
+            yield json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n'
+        if doc_json_text is not None or embeddings or title_embedding is not None:
+            # replace=True: клиент заменяет все embeddings статьи (секции могли исчезнуть вместе с документом).
+            record = {
+                'type': 'embeddings',
+                'articleId': article['id'],
+                'replace': doc_json_text is not None,
+                'titleEmbedding': _title_embedding_payload(title_embedding, dtype),
+            }
+            if dtype:
+                record.update(encoding=f'{dtype}-b64', embeddings=_embeddings_b64(embeddings))
+            else:
+                record['embeddings'] = embeddings
+            yield json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+    yield json.dumps({'type': 'cursor', 'cursor': page['cursor'], 'hasMore': page['hasMore']}).encode('utf-8') + b'\n'
+
+
+@router.get('/api/sync/changes')
+def get_sync_changes_feed(
+    cursor: str | None = None,
+    format_: str | None = Query(None, alias='format'),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Дельта-синхронизация офлайн-клиента одним NDJSON-ответом: удаления, статьи (docJson — только если
+    менялось содержимое), их embeddings и последней строкой — следующий курсор ({type: 'cursor', hasMore}).
+    Без курсора отдаётся полный снимок. Размер страницы выбирает сервер.
+    format=f32-b64/f16-b64 — embeddings base64-упакованными векторами (как у /embeddings).
+    """
+    dtype, binary = _embedding_transport(format_, None)
+    if binary:
+        raise HTTPException(status_code=400, detail='Unsupported embeddings format')
+    try:
+        page = get_sync_changes(current_user.id, cursor, dtype=dtype)
+    except InvalidOperation as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return StreamingResponse(_sync_changes_lines(page, dtype), media_type='application/x-ndjson')
+
+
 @router.put('/api/articles/{article_id}/structure/snapshot')
 def put_article_structure_snapshot(
     article_id: str,
@@ -636,3 +780,45 @@ def post_restore_article(article_id: str, current_user: User = Depends(get_curre
     if not article:
         raise HTTPException(status_code=404, detail='Article not found or not deleted')
     return _present_article(article, article_id)
+
+
+@router.get('/api/articles/{article_id}/subtree')
+def read_article_subtree(
+    article_id: str,
+    include_deleted: bool = Query(False, alias='includeDeleted'),
+    current_user: User = Depends(get_current_user),
+):
+    """Статья и все её потомки одним индексным запросом (по tree_path), родители раньше детей."""
+    real_article_id = _resolve_article_id_for_user(article_id, current_user)
+    items = get_article_subtree(real_article_id, current_user.id, include_deleted=include_deleted)
+    if not items:
+        raise HTTPException(status_code=404, detail='Article not found')
+    return {'articles': items}
+
+
+@router.get('/api/articles/{article_id}/ancestors')
+def read_article_ancestors(article_id: str, current_user: User = Depends(get_current_user)):
+    real_article_id = _resolve_article_id_for_user(article_id, current_user)
+    try:
+        return {'articles': get_article_ancestors(real_article_id, current_user.id)}
+    except ArticleNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@router.delete('/api/articles/{article_id}/subtree')
+def remove_article_subtree(article_id: str, force: bool = False, current_user: User = Depends(get_current_user)):
+    real_article_id = _resolve_article_id_for_user(article_id, current_user)
+    ids = delete_article_subtree(real_article_id, current_user.id, force=force)
+    if not ids:
+        raise HTTPException(status_code=404, detail='Article not found')
+    return {'status': 'deleted' if not force else 'purged', 'articleIds': ids}
+
+
+@router.post('/api/articles/{article_id}/subtree/restore')
+def post_restore_article_subtree(article_id: str, current_user: User = Depends(get_current_user)):
+    real_article_id = _resolve_article_id_for_user(article_id, current_user)
+    ids = restore_article_subtree(real_article_id, current_user.id)
+    if not ids:
+        raise HTTPException(status_code=404, detail='Article not found or not deleted')
+    article = get_article(real_article_id, current_user.id)
+    return {'article': _present_article(article, article_id), 'articleIds': ids}
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Cookie, Depends, Response
 
-from ..auth import User, clear_session_cookie, get_current_user
+from ..auth import SESSION_COOKIE_NAME, User, clear_session_cookie, delete_session, get_current_user
 
 router = APIRouter()
 
 
 # Вынесено из app/main.py → app/routers/auth.py
 @router.post('/api/auth/logout')
-def logout(response: Response, current_user: User = Depends(get_current_user)):
+def logout(
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    session_id: str | None = Cookie(default=None, alias=SESSION_COOKIE_NAME),
+):
+    delete_session(session_id)
     clear_session_cookie(response)
     return {'status': 'ok'}
 
@@ -7,11 +7,11 @@ from datetime import datetime
 from io import BytesIO
 from pathlib import Path
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import Response
 
 from ..auth import User, get_current_user
-from ..data_store import get_articles
+from ..data_store import get_article_subtree_articles, get_articles
 from ..export_utils import _build_backup_article_html, _inline_uploads_for_backup
 
 router = APIRouter()
@@ -23,14 +23,23 @@ CLIENT_DIR = BASE_DIR / "client"
 
 # Вынесено из app/main.py → app/routers/export.py
 @router.get('/api/export/html-zip')
-def export_all_articles_html_zip(current_user: User = Depends(get_current_user)):
+def export_all_articles_html_zip(
+    root_id: str | None = Query(None, alias='rootId'),
+    current_user: User = Depends(get_current_user),
+):
     """
     Формирует ZIP-архив со всеми статьями пользователя в виде HTML-файлов.
+    С `?rootId=` — только ветка: статья и её потомки (одним запросом по tree_path).
     Каждый HTML:
     - содержит структуру блоков и стили, похожие на основной интерфейс;
     - включает JSON-снапшот memus-export, совместимый с /api/import/html.
     """
-    articles = [article for article in get_articles(current_user.id) if article]
+    if root_id:
+        articles = [article for article in get_article_subtree_articles(root_id, current_user.id) if article]
+        if not articles:
+            raise HTTPException(status_code=404, detail='Article not found')
+    else:
+        articles = [article for article in get_articles(current_user.id) if article]
     try:
         css_text = (CLIENT_DIR / 'style.css').read_text(encoding='utf-8')
     except OSError:
@@ -41,7 +41,7 @@ def set_article_public(
         new_slug = None
     with CONN:
         CONN.execute(
-            'UPDATE articles SET public_slug = ?, updated_at = ? WHERE id = ?',
+            'UPDATE articles SET public_slug = ?, updated_at = ?, content_rev = content_rev + 1 WHERE id = ?',
             (new_slug, datetime.utcnow().isoformat(), real_article_id),
         )
     updated = get_article(real_article_id, current_user.id, include_blocks=False)
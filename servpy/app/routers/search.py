@@ -2,18 +2,97 @@ from __future__ import annotations
 
 from typing import Any
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 
 from ..auth import User, get_current_user
-from ..data_store import search_everything
+from ..data_store import (
+    InvalidOperation,
+    hybrid_search,
+    search_articles_page,
+    search_blocks_page,
+    search_everything,
+)
+from ..search_rebuild import get_search_rebuild_status, start_search_rebuild
 
 router = APIRouter()
 
 
 # Вынесено из app/main.py → app/routers/search.py
 @router.get('/api/search')
-def get_search(q: str = '', current_user: User = Depends(get_current_user)):
+def get_search(q: str = '', mode: str | None = None, current_user: User = Depends(get_current_user)):
     query = q.strip()
     if not query:
         return []
-    return search_everything(query, block_limit=30, article_limit=15, author_id=current_user.id)
+    try:
+        return search_everything(query, block_limit=30, article_limit=15, author_id=current_user.id, mode=mode)
+    except InvalidOperation as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get('/api/search/page')
+def get_search_page(
+    q: str = '',
+    kind: str = Query('blocks', alias='type'),
+    cursor: str | None = None,
+    limit: int = 30,
+    mode: str | None = None,
+    threshold: float | None = Query(None, ge=0.0, le=1.0),
+    current_user: User = Depends(get_current_user),
+) -> dict[str, Any]:
+    """
+    Постраничный полнотекстовый поиск для «загрузить ещё».
+    type=blocks|articles; cursor — nextCursor из предыдущего ответа (null — страниц больше нет).
+    mode=fts|fuzzy (по умолчанию SERVPY_SEARCH_MODE); threshold — порог похожести pg_trgm для fuzzy.
+    """
+    query = q.strip()
+    if not query:
+        return {'results': [], 'nextCursor': None}
+    if kind not in {'blocks', 'articles'}:
+        raise HTTPException(status_code=400, detail='Unknown search type')
+    limit = max(1, min(int(limit), 100))
+    search_page = search_blocks_page if kind == 'blocks' else search_articles_page
+    try:
+        return search_page(
+            query,
+            limit=limit,
+            author_id=current_user.id,
+            cursor=cursor or None,
+            mode=mode,
+            threshold=threshold,
+        )
+    except InvalidOperation as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get('/api/search/hybrid')
+def get_search_hybrid(q: str = '', mode: str | None = None, current_user: User = Depends(get_current_user)):
+    """
+    FTS секций, FTS заголовков и семантический поиск параллельно, слияние reciprocal rank fusion.
+    Если источник не уложился в бюджет или недоступен, ответ частичный: partial=true, sources[name].status.
+    """
+    query = q.strip()
+    if not query:
+        return {'results': [], 'sources': {}, 'partial': False}
+    try:
+        return hybrid_search(query, current_user.id, mode=mode)
+    except InvalidOperation as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.post('/api/search/rebuild')
+def post_search_rebuild(restart: bool = False, current_user: User = Depends(get_current_user)):
+    """
+    Фоновая перестройка FTS-индексов: поиск продолжает работать по старому индексу до подмены.
+    Прерванная задача продолжается с чекпоинта; restart=true начинает заново.
+    """
+    if not getattr(current_user, 'is_superuser', False):
+        raise HTTPException(status_code=403, detail='Superuser required')
+    return start_search_rebuild(restart=restart)
+
+
+@router.get('/api/search/rebuild/status')
+def get_search_rebuild(current_user: User = Depends(get_current_user)):
+    # Состояние перестройки глобальное (счётчики по всем пользователям) — как и запуск, только для superuser.
+    if not getattr(current_user, 'is_superuser', False):
+        raise HTTPException(status_code=403, detail='Superuser required')
+    return get_search_rebuild_status()
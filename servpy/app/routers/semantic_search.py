@@ -3,11 +3,19 @@ from __future__ import annotations
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
+from ..ai_http import get_provider_http_stats
 from ..auth import User, get_current_user
 from ..embeddings import EmbeddingsUnavailable, probe_embedding_info
 from ..embeddings import embed_text
 from ..rag_summary import summarize_search_results
-from ..semantic_search import get_reindex_task, request_cancel_reindex_task, start_reindex_task, try_semantic_search
+from ..semantic_search import (
+    get_embedding_queue_stats,
+    get_reindex_task,
+    request_cancel_reindex_task,
+    start_reindex_task,
+    get_semantic_title_weight,
+    try_semantic_search,
+)
 from ..telegram_notify import notify_user
 
 # Вынесено из app/main.py → app/routers/semantic_search.py
@@ -57,13 +65,14 @@ def semantic_query_embedding(q: str = '', current_user: User = Depends(get_curre
     """
     Возвращает embedding только для запроса (без ранжирования на сервере).
     Используется для client-side semantic search (ранжирование/поиск делается в IndexedDB).
+    titleWeight — вес близости заголовка статьи в score, как в серверном ранжировании.
     """
     query = (q or '').strip()
     if not query:
-        return {'embedding': [], 'dim': 0}
+        return {'embedding': [], 'dim': 0, 'titleWeight': get_semantic_title_weight()}
     try:
         vec = embed_text(query)
-        return {'embedding': vec, 'dim': len(vec)}
+        return {'embedding': vec.tolist(), 'dim': len(vec), 'titleWeight': get_semantic_title_weight()}
     except EmbeddingsUnavailable as exc:
         notify_user(current_user.id, f'Query embedding: недоступно — {exc}', key='semantic-search')
         raise HTTPException(status_code=503, detail=str(exc))
@@ -102,6 +111,26 @@ def semantic_reindex_status(current_user: User = Depends(get_current_user)):
     return task
 
 
+@router.get('/api/search/semantic/queue')
+def semantic_embedding_queue(current_user: User = Depends(get_current_user)):
+    """
+    Метрики фоновой очереди embeddings: глубина, готовые к обработке, ретраи, лаг самой старой задачи.
+    """
+    if not getattr(current_user, 'is_superuser', False):
+        raise HTTPException(status_code=403, detail='Superuser required')
+    return get_embedding_queue_stats()
+
+
+@router.get('/api/search/semantic/providers')
+def semantic_provider_stats(current_user: User = Depends(get_current_user)):
+    """
+    Метрики исходящих запросов к AI-провайдерам: число запросов, ошибок и повторов, p50/p95 латентности.
+    """
+    if not getattr(current_user, 'is_superuser', False):
+        raise HTTPException(status_code=403, detail='Superuser required')
+    return get_provider_http_stats()
+
+
 @router.post('/api/search/semantic/reindex/cancel')
 def semantic_reindex_cancel(current_user: User = Depends(get_current_user)):
     task = request_cancel_reindex_task(current_user.id)
@@ -8,7 +8,13 @@ from fastapi import APIRouter, Depends, HTTPException
 
 from ..auth import User, get_current_user
 from ..db import CONN
-from ..data_store import ArticleNotFound, InvalidOperation, get_article, save_article_doc_json
+from ..data_store import (
+    ArticleNotFound,
+    InvalidOperation,
+    get_article,
+    materialize_article_doc_json,
+    save_article_doc_json,
+)
 from .common import _resolve_article_id_for_user
 
 router = APIRouter()
@@ -72,6 +78,7 @@ def create_article_version(article_id: str, payload: dict[str, Any] | None = Non
     # Используем текущее время, чтобы версия была упорядочена корректно.
     from datetime import datetime
     created_at = datetime.utcnow().isoformat()
+    materialize_article_doc_json(real_article_id)
     doc_json = CONN.execute(
         'SELECT article_doc_json FROM articles WHERE id = ? AND author_id = ?',
         (real_article_id, current_user.id),
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
+import threading
+from datetime import datetime
+from typing import Callable
 
-from .db import execute
+from .db import CONN, enable_pgvector_adapter, execute, executemany
 
 # PostgreSQL-only schema.
 
@@ -21,7 +25,7 @@ def _parse_version(ver: str) -> tuple[int, int, int]:
     return (out[0], out[1], out[2])
 
 
-def _init_postgres_schema() -> None:
+def _migration_0001_baseline() -> None:
     statements = [
         '''
         CREATE TABLE IF NOT EXISTS users (
@@ -264,6 +268,14 @@ def _init_postgres_schema() -> None:
         CREATE UNIQUE INDEX IF NOT EXISTS idx_audio_transcript_jobs_attachment
         ON audio_transcript_jobs(attachment_id)
         ''',
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            expires_at TEXT NOT NULL
+        )
+        ''',
     ]
 
     for stmt in statements:
@@ -396,23 +408,143 @@ def _init_postgres_schema() -> None:
         """
     )
 
+
+def _migration_0002_purge_legacy_block_history() -> None:
     # One-time purge of legacy block history (HTML blocks mode is deprecated).
-    try:
-        row = execute("SELECT value FROM schema_meta WHERE key = 'purged_legacy_block_history_v1'").fetchone()
-        already = bool(row and (row.get('value') or '').strip())
-        if not already:
-            execute("UPDATE articles SET history = '[]', redo_history = '[]'")
-            execute(
-                """
-                INSERT INTO schema_meta(key, value)
-                VALUES ('purged_legacy_block_history_v1', '1')
-                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+    # Старый маркер оставляем: на базах, где purge уже был, повторно историю не чистим.
+    row = execute("SELECT value FROM schema_meta WHERE key = 'purged_legacy_block_history_v1'").fetchone()
+    if row and (row.get('value') or '').strip():
+        return
+    execute("UPDATE articles SET history = '[]', redo_history = '[]'")
+    execute(
+        """
+        INSERT INTO schema_meta(key, value)
+        VALUES ('purged_legacy_block_history_v1', '1')
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        """
+    )
+    logger.info("Purged legacy block history (articles.history/redo_history cleared).")
+
+
+def _migration_0003_article_history_entries() -> None:
+    # История правок секций: отдельная insert-only таблица вместо JSON-массивов в строке articles.
+    # history_seq — счётчик статьи: выдаёт seq новым записям и undone_seq при undo.
+    # undone_seq IS NOT NULL — запись в redo-стеке (порядок redo — по undone_seq).
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS article_history_entries (
+            article_id TEXT NOT NULL REFERENCES articles(id) ON DELETE CASCADE,
+            seq BIGINT NOT NULL,
+            entry_id TEXT NOT NULL,
+            block_id TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL,
+            undone_seq BIGINT,
+            entry_json TEXT NOT NULL,
+            PRIMARY KEY (article_id, seq)
+        )
+        """
+    )
+    execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_article_history_entries_entry
+        ON article_history_entries(article_id, entry_id)
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_article_history_entries_block
+        ON article_history_entries(article_id, block_id, seq)
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_article_history_entries_redo
+        ON article_history_entries(article_id, undone_seq)
+        WHERE undone_seq IS NOT NULL
+        """
+    )
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS history_seq BIGINT NOT NULL DEFAULT 0')
+
+    # Переносим накопленные JSON-массивы и очищаем колонки, чтобы строки articles перестали расти.
+    rows = execute(
+        "SELECT id, history, redo_history FROM articles "
+        "WHERE COALESCE(history, '[]') <> '[]' OR COALESCE(redo_history, '[]') <> '[]'"
+    ).fetchall()
+    for row in rows:
+        params = []
+        seq = 0
+        stacks = []
+        for column in ('history', 'redo_history'):
+            try:
+                items = json.loads(row.get(column) or '[]')
+            except Exception:
+                items = []
+            stacks.append([e for e in items if isinstance(e, dict)] if isinstance(items, list) else [])
+        history, redo = stacks
+        redo_base = len(history) + len(redo)
+        for idx, entry in enumerate(history + redo):
+            seq += 1
+            undone_seq = redo_base + (idx - len(history)) + 1 if idx >= len(history) else None
+            params.append(
+                (
+                    row['id'],
+                    seq,
+                    str(entry.get('id') or f'legacy-{seq}'),
+                    str(entry.get('blockId') or ''),
+                    str(entry.get('timestamp') or ''),
+                    undone_seq,
+                    json.dumps(entry, ensure_ascii=False),
+                )
+            )
+        if params:
+            executemany(
                 """
+                INSERT INTO article_history_entries (article_id, seq, entry_id, block_id, created_at, undone_seq, entry_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT DO NOTHING
+                """,
+                params,
             )
-            logger.info("Purged legacy block history (articles.history/redo_history cleared).")
-    except Exception as exc:  # noqa: BLE001
-        logger.warning("Failed to purge legacy block history: %r", exc)
+        execute(
+            "UPDATE articles SET history = '[]', redo_history = '[]', history_seq = ? WHERE id = ?",
+            (redo_base + len(redo), row['id']),
+        )
+    if rows:
+        logger.info('schema: moved history of %s articles into article_history_entries', len(rows))
+
+
+def _migration_0004_outline_sections() -> None:
+    # Посекционное хранилище outline: одна строка на секцию.
+    # articles.sections_synced — строки outline_sections отражают актуальный документ;
+    # articles.doc_json_stale — article_doc_json отстаёт от outline_sections и будет материализован при чтении.
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS outline_sections (
+            article_id TEXT NOT NULL REFERENCES articles(id) ON DELETE CASCADE,
+            section_id TEXT NOT NULL,
+            parent_id TEXT,
+            position DOUBLE PRECISION NOT NULL DEFAULT 0,
+            collapsed BOOLEAN NOT NULL DEFAULT FALSE,
+            attrs_json TEXT NOT NULL DEFAULT '{}',
+            heading_json TEXT NOT NULL,
+            body_json TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (article_id, section_id)
+        )
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_outline_sections_parent
+        ON outline_sections(article_id, parent_id, position)
+        """
+    )
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS sections_synced BOOLEAN NOT NULL DEFAULT FALSE')
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS doc_json_stale BOOLEAN NOT NULL DEFAULT FALSE')
 
+
+def _ensure_pgvector() -> None:
     # Семантический поиск (pgvector) — опционально.
     # Если расширение/права недоступны, core-функциональность не должна падать.
     try:
@@ -424,6 +556,7 @@ def _init_postgres_schema() -> None:
         ivfflat_lists = int(os.environ.get('SERVPY_PGVECTOR_IVFFLAT_LISTS') or '200')
 
         execute('CREATE EXTENSION IF NOT EXISTS vector')
+        enable_pgvector_adapter()
         # Выясняем версию pgvector, чтобы корректно выбирать индексы.
         # На старых версиях/сборках бывает ограничение dims<=2000 и для hnsw, и для ivfflat.
         try:
@@ -453,6 +586,34 @@ def _init_postgres_schema() -> None:
             ON block_embeddings(author_id)
             '''
         )
+        # Для ленты /api/sync/changes: какие embeddings изменились после курсора клиента.
+        execute(
+            'ALTER TABLE block_embeddings ADD COLUMN IF NOT EXISTS change_xid xid8 '
+            'NOT NULL DEFAULT pg_current_xact_id()'
+        )
+        # Вектор заголовка статьи (один на статью): секции эмбеддятся без заголовка, а поиск
+        # смешивает обе близости, поэтому переименование пересчитывает только этот вектор.
+        # pending — заголовок изменился и ждёт пересчёта воркером embedding_jobs.
+        execute(
+            f'''
+            CREATE TABLE IF NOT EXISTS article_embeddings (
+                article_id TEXT PRIMARY KEY,
+                author_id TEXT NOT NULL,
+                title TEXT NOT NULL DEFAULT '',
+                embedding vector({EMBEDDING_DIM}),
+                pending BOOLEAN NOT NULL DEFAULT TRUE,
+                locked_until TEXT,
+                updated_at TEXT NOT NULL
+            )
+            '''
+        )
+        execute('CREATE INDEX IF NOT EXISTS idx_article_embeddings_author ON article_embeddings(author_id)')
+        execute(
+            'CREATE INDEX IF NOT EXISTS idx_article_embeddings_pending ON article_embeddings(updated_at) WHERE pending'
+        )
+        # Ошибка провайдера откладывает пересчёт заголовка (экспоненциальная задержка, как у embedding_jobs).
+        execute('ALTER TABLE article_embeddings ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0')
+        execute("ALTER TABLE article_embeddings ADD COLUMN IF NOT EXISTS not_before TEXT NOT NULL DEFAULT ''")
         # Индекс по embedding:
         # - hnsw быстрее, но в pgvector имеет ограничение dims<=2000
         # - ivfflat работает и для больших размерностей (например vector(3072))
@@ -492,5 +653,496 @@ def _init_postgres_schema() -> None:
         logger.warning('pgvector is not available; semantic search disabled: %r', exc)
 
 
+def _migration_0005_embedding_jobs() -> None:
+    # Очередь пересчёта embeddings: одна строка на секцию (повторные правки схлопываются, last-write-wins).
+    # rev растёт при каждой постановке — воркер удаляет задачу, только если она не менялась за время обработки.
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS embedding_jobs (
+            block_id TEXT PRIMARY KEY,
+            author_id TEXT NOT NULL,
+            article_id TEXT NOT NULL,
+            article_title TEXT NOT NULL DEFAULT '',
+            plain_text TEXT NOT NULL DEFAULT '',
+            updated_at TEXT NOT NULL,
+            rev BIGINT NOT NULL DEFAULT 1,
+            enqueued_at TEXT NOT NULL,
+            not_before TEXT NOT NULL,
+            locked_until TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT NOT NULL DEFAULT ''
+        )
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_embedding_jobs_not_before
+        ON embedding_jobs(not_before)
+        """
+    )
+
+
+def _migration_0006_article_doc_json_stats() -> None:
+    # Размер и sha256 article_doc_json пишутся вместе с документом (data_store.doc_json_stats):
+    # чтение статьи отдаёт сохранённый текст как есть, ETag/размер берутся из колонок.
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS doc_json_bytes INTEGER')
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS doc_json_hash TEXT')
+    execute(
+        """
+        UPDATE articles
+        SET doc_json_bytes = octet_length(article_doc_json),
+            doc_json_hash = encode(sha256(convert_to(article_doc_json, 'UTF8')), 'hex')
+        WHERE article_doc_json IS NOT NULL
+        """
+    )
+
+
+def _migration_0007_article_content_rev() -> None:
+    # articles.content_rev — счётчик правок статьи (растёт при каждой записи, меняющей updated_at/документ).
+    # /meta отвечает из покрывающего индекса, не читая article_doc_json.
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS content_rev BIGINT NOT NULL DEFAULT 0')
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_articles_meta
+        ON articles(id, author_id)
+        INCLUDE (deleted_at, updated_at, content_rev, doc_json_bytes, doc_json_hash, doc_json_stale)
+        """
+    )
+
+
+def _migration_0008_sync_change_feed() -> None:
+    # Лента дельта-синхронизации (GET /api/sync/changes): курсор — xid8 транзакции последней правки.
+    # change_xid двигается при любой записи, меняющей content_rev, и при пересчёте embeddings статьи;
+    # content_xid — только при правке содержимого (по нему решаем, слать ли docJson целиком).
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id()')
+    execute('ALTER TABLE articles ADD COLUMN IF NOT EXISTS content_xid xid8 NOT NULL DEFAULT pg_current_xact_id()')
+    execute('CREATE INDEX IF NOT EXISTS idx_articles_author_change_xid ON articles(author_id, change_xid, id)')
+    execute(
+        """
+        CREATE OR REPLACE FUNCTION articles_track_change_xid() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.content_rev IS DISTINCT FROM OLD.content_rev THEN
+                NEW.change_xid := pg_current_xact_id();
+                NEW.content_xid := pg_current_xact_id();
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    execute('DROP TRIGGER IF EXISTS trg_articles_track_change_xid ON articles')
+    execute(
+        """
+        CREATE TRIGGER trg_articles_track_change_xid
+        BEFORE UPDATE ON articles
+        FOR EACH ROW EXECUTE FUNCTION articles_track_change_xid()
+        """
+    )
+    # Окончательно удалённые статьи: строки в articles уже нет, клиенту нужен tombstone.
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS article_tombstones (
+            article_id TEXT PRIMARY KEY,
+            author_id TEXT NOT NULL,
+            deleted_at TEXT NOT NULL,
+            change_xid xid8 NOT NULL DEFAULT pg_current_xact_id()
+        )
+        """
+    )
+    execute(
+        'CREATE INDEX IF NOT EXISTS idx_article_tombstones_author_change_xid '
+        'ON article_tombstones(author_id, change_xid)'
+    )
+
+
+def _migration_0009_article_fractional_positions() -> None:
+    # articles.position становится дробным (как outline_sections.position): перемещение статьи пишет одну строку.
+    # Текущий порядок siblings (position, updated_at DESC) фиксируется перенумерацией 0, 1, 2, …
+    execute('ALTER TABLE articles ALTER COLUMN position TYPE DOUBLE PRECISION USING position::double precision')
+    execute(
+        """
+        UPDATE articles a
+        SET position = r.pos
+        FROM (
+            SELECT id, (row_number() OVER (
+                PARTITION BY author_id, parent_id ORDER BY position, updated_at DESC
+            ) - 1)::double precision AS pos
+            FROM articles
+            WHERE deleted_at IS NULL
+        ) r
+        WHERE a.id = r.id AND a.position <> r.pos
+        """
+    )
+    execute(
+        'CREATE INDEX IF NOT EXISTS idx_articles_author_parent_position '
+        'ON articles(author_id, parent_id, position) WHERE deleted_at IS NULL'
+    )
+
+
+def _migration_0010_article_tree_paths() -> None:
+    # articles.tree_path — материализованный путь от корня до самой статьи (id предков + свой id).
+    # Потомки статьи X: tree_path @> ARRAY[X] (GIN-индекс); предки: id = ANY(tree_path X).
+    # Путь поддерживают триггеры: BEFORE — по пути нового родителя, AFTER — переписывает пути поддерева.
+    execute("ALTER TABLE articles ADD COLUMN IF NOT EXISTS tree_path TEXT[] NOT NULL DEFAULT '{}'")
+    # Статьи с отсутствующим родителем (сирота) считаются корнями; циклы в старых данных обрываются.
+    execute(
+        """
+        WITH RECURSIVE t(id, path) AS (
+            SELECT a.id, ARRAY[a.id]
+            FROM articles a
+            WHERE a.parent_id IS NULL OR NOT EXISTS (SELECT 1 FROM articles p WHERE p.id = a.parent_id)
+            UNION ALL
+            SELECT a.id, t.path || a.id
+            FROM articles a
+            JOIN t ON a.parent_id = t.id
+            WHERE NOT a.id = ANY(t.path)
+        )
+        UPDATE articles a
+        SET tree_path = t.path
+        FROM t
+        WHERE a.id = t.id
+        """
+    )
+    execute("UPDATE articles SET tree_path = ARRAY[id] WHERE tree_path = '{}'")
+    execute('CREATE INDEX IF NOT EXISTS idx_articles_tree_path ON articles USING GIN (tree_path)')
+    execute(
+        """
+        CREATE OR REPLACE FUNCTION articles_set_tree_path() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.parent_id IS NULL THEN
+                NEW.tree_path := ARRAY[NEW.id];
+            ELSE
+                NEW.tree_path := COALESCE(
+                    (SELECT tree_path FROM articles WHERE id = NEW.parent_id),
+                    '{}'::text[]
+                ) || NEW.id;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    execute(
+        """
+        CREATE OR REPLACE FUNCTION articles_propagate_tree_path() RETURNS trigger AS $$
+        BEGIN
+            UPDATE articles
+            SET tree_path = NEW.tree_path || tree_path[cardinality(OLD.tree_path) + 1:]
+            WHERE tree_path @> ARRAY[OLD.id] AND id <> OLD.id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    execute('DROP TRIGGER IF EXISTS trg_articles_set_tree_path ON articles')
+    execute(
+        """
+        CREATE TRIGGER trg_articles_set_tree_path
+        BEFORE INSERT OR UPDATE OF parent_id ON articles
+        FOR EACH ROW EXECUTE FUNCTION articles_set_tree_path()
+        """
+    )
+    execute('DROP TRIGGER IF EXISTS trg_articles_propagate_tree_path ON articles')
+    execute(
+        """
+        CREATE TRIGGER trg_articles_propagate_tree_path
+        AFTER UPDATE OF parent_id ON articles
+        FOR EACH ROW WHEN (OLD.tree_path IS DISTINCT FROM NEW.tree_path)
+        EXECUTE FUNCTION articles_propagate_tree_path()
+        """
+    )
+
+
+def _migration_0011_search_author_columns() -> None:
+    # author_id и признак удаления статьи переносятся в FTS-таблицы: поиск фильтрует их прямо в GIN-индексе,
+    # не сканируя совпадения всех пользователей и не делая JOIN articles до ранжирования.
+    # Строки FTS пишут author_id/deleted из articles при upsert; смену deleted_at/author_id статьи
+    # переносит триггер articles_sync_search_owner.
+    for table in ('outline_sections_fts', 'articles_fts'):
+        execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS author_id TEXT NOT NULL DEFAULT ''")
+        execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS deleted BOOLEAN NOT NULL DEFAULT FALSE')
+        execute(
+            f"""
+            UPDATE {table} f
+            SET author_id = COALESCE(a.author_id, ''), deleted = a.deleted_at IS NOT NULL
+            FROM articles a
+            WHERE a.id = f.article_id
+            """
+        )
+    execute(
+        """
+        CREATE OR REPLACE FUNCTION articles_sync_search_owner() RETURNS trigger AS $$
+        BEGIN
+            UPDATE outline_sections_fts
+            SET author_id = COALESCE(NEW.author_id, ''), deleted = NEW.deleted_at IS NOT NULL
+            WHERE article_id = NEW.id;
+            UPDATE articles_fts
+            SET author_id = COALESCE(NEW.author_id, ''), deleted = NEW.deleted_at IS NOT NULL
+            WHERE article_id = NEW.id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    execute('DROP TRIGGER IF EXISTS trg_articles_sync_search_owner ON articles')
+    execute(
+        """
+        CREATE TRIGGER trg_articles_sync_search_owner
+        AFTER UPDATE OF deleted_at, author_id ON articles
+        FOR EACH ROW WHEN (
+            (OLD.deleted_at IS NULL) IS DISTINCT FROM (NEW.deleted_at IS NULL)
+            OR OLD.author_id IS DISTINCT FROM NEW.author_id
+        )
+        EXECUTE FUNCTION articles_sync_search_owner()
+        """
+    )
+    # Составной GIN (author_id, search_vector) требует btree_gin (trusted-расширение, PG13+).
+    # Без него — частичный GIN по search_vector и btree по author_id: планировщик пересечёт их bitmap-ом.
+    execute(
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS btree_gin;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'btree_gin is not available: %', SQLERRM;
+        END$$;
+        """
+    )
+    has_btree_gin = execute("SELECT 1 FROM pg_extension WHERE extname = 'btree_gin'").fetchone()
+    for table in ('outline_sections_fts', 'articles_fts'):
+        execute(f'DROP INDEX IF EXISTS idx_{table}_search')
+        if has_btree_gin:
+            execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{table}_author_search '
+                f'ON {table} USING GIN (author_id, search_vector) WHERE NOT deleted'
+            )
+        else:
+            execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{table}_search_live '
+                f'ON {table} USING GIN (search_vector) WHERE NOT deleted'
+            )
+            execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_author ON {table}(author_id) WHERE NOT deleted')
+
+
+def _migration_0012_search_trigram_indexes() -> None:
+    # Нечёткий/префиксный поиск (mode=fuzzy): pg_trgm по normalized_text секций и заголовков.
+    # Без pg_trgm поиск работает только по tsvector (data_store.search_trigram_available()).
+    execute(
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm is not available: %', SQLERRM;
+        END$$;
+        """
+    )
+    if not execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").fetchone():
+        logger.warning('pg_trgm is not available; fuzzy search falls back to full-text search')
+        return
+    has_btree_gin = execute("SELECT 1 FROM pg_extension WHERE extname = 'btree_gin'").fetchone()
+    for table in ('outline_sections_fts', 'articles_fts'):
+        columns = 'author_id, normalized_text gin_trgm_ops' if has_btree_gin else 'normalized_text gin_trgm_ops'
+        execute(
+            f'CREATE INDEX IF NOT EXISTS idx_{table}_trgm '
+            f'ON {table} USING GIN ({columns}) WHERE NOT deleted'
+        )
+
+
+def _migration_0013_search_rebuild_state() -> None:
+    # Состояние фоновой перестройки FTS (search_rebuild.py): одна строка на задачу.
+    # cursor — последний обработанный articles.id (чекпоинт, пишется в одной транзакции с чанком),
+    # catchup_xmin — нижняя граница change_xid статей, изменённых после начала загрузки.
+    # lease_owner/lease_until — аренда: задачу выполняет один процесс, истёкшая аренда позволяет продолжить.
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS search_rebuild_state (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'idle',
+            cursor TEXT NOT NULL DEFAULT '',
+            catchup_xmin xid8,
+            total INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            sections INTEGER NOT NULL DEFAULT 0,
+            started_at TEXT,
+            updated_at TEXT,
+            finished_at TEXT,
+            lease_owner TEXT,
+            lease_until TEXT,
+            error TEXT NOT NULL DEFAULT ''
+        )
+        """
+    )
+
+
+def _migration_0014_embedding_cache() -> None:
+    # Контентно-адресуемый кэш embeddings (embeddings.py): ключ — провайдер, модель, размерность
+    # и sha256 нормализованного текста. Вектор хранится как real[] (без привязки к vector(N)).
+    # last_used_at — для вытеснения давно не использованных записей (LRU).
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding REAL[] NOT NULL,
+            created_at TEXT NOT NULL,
+            last_used_at TEXT NOT NULL,
+            PRIMARY KEY (provider, model, dim, text_hash)
+        )
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used
+        ON embedding_cache(last_used_at)
+        """
+    )
+
+
+def _migration_0015_section_content_embeddings() -> None:
+    # Раньше embedding секции считался по строке "<заголовок статьи>\n<текст>". Теперь секция эмбеддится
+    # без заголовка (у статьи свой вектор в article_embeddings) — ставим существующие секции в очередь
+    # embedding_jobs на пересчёт. Текст берём из block_embeddings.plain_text, отрезав префикс-заголовок.
+    row = execute("SELECT to_regclass('block_embeddings') IS NOT NULL AS ok").fetchone()
+    if not row or not row.get('ok'):
+        return
+    now = datetime.utcnow().isoformat()
+    execute(
+        """
+        INSERT INTO embedding_jobs (block_id, author_id, article_id, article_title, plain_text, updated_at, enqueued_at, not_before)
+        SELECT
+            block_id,
+            author_id,
+            article_id,
+            article_title,
+            CASE
+                WHEN article_title <> '' AND left(plain_text, length(article_title) + 1) = article_title || E'\\n'
+                    THEN substr(plain_text, length(article_title) + 2)
+                ELSE plain_text
+            END,
+            updated_at,
+            ?,
+            ?
+        FROM block_embeddings
+        ON CONFLICT (block_id) DO NOTHING
+        """,
+        (now, now),
+    )
+
+
+def _migration_0016_tree_path_parent_lock() -> None:
+    # Путь родителя читается FOR SHARE: параллельный перенос родителя (UPDATE держит блокировку строки)
+    # либо завершится раньше и мы увидим новый путь, либо дождётся нашего коммита, и его
+    # articles_propagate_tree_path перепишет уже закоммиченный путь потомка. Без блокировки потомок
+    # мог сохранить устаревший путь, который потом никто не исправлял.
+    execute(
+        """
+        CREATE OR REPLACE FUNCTION articles_set_tree_path() RETURNS trigger AS $$
+        DECLARE
+            parent_path TEXT[];
+        BEGIN
+            IF NEW.parent_id IS NULL THEN
+                NEW.tree_path := ARRAY[NEW.id];
+            ELSE
+                SELECT tree_path INTO parent_path FROM articles WHERE id = NEW.parent_id FOR SHARE;
+                NEW.tree_path := COALESCE(parent_path, '{}'::text[]) || NEW.id;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+# Упорядоченный список миграций: (версия, имя, функция).
+# Новые шаги добавляются только в конец; уже выпущенные шаги не редактируются.
+MIGRATIONS: list[tuple[int, str, Callable[[], None]]] = [
+    (1, 'baseline', _migration_0001_baseline),
+    (2, 'purge_legacy_block_history', _migration_0002_purge_legacy_block_history),
+    (3, 'article_history_entries', _migration_0003_article_history_entries),
+    (4, 'outline_sections', _migration_0004_outline_sections),
+    (5, 'embedding_jobs', _migration_0005_embedding_jobs),
+    (6, 'article_doc_json_stats', _migration_0006_article_doc_json_stats),
+    (7, 'article_content_rev', _migration_0007_article_content_rev),
+    (8, 'sync_change_feed', _migration_0008_sync_change_feed),
+    (9, 'article_fractional_positions', _migration_0009_article_fractional_positions),
+    (10, 'article_tree_paths', _migration_0010_article_tree_paths),
+    (11, 'search_author_columns', _migration_0011_search_author_columns),
+    (12, 'search_trigram_indexes', _migration_0012_search_trigram_indexes),
+    (13, 'search_rebuild_state', _migration_0013_search_rebuild_state),
+    (14, 'embedding_cache', _migration_0014_embedding_cache),
+    (15, 'section_content_embeddings', _migration_0015_section_content_embeddings),
+    (16, 'tree_path_parent_lock', _migration_0016_tree_path_parent_lock),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Ключ pg_advisory_xact_lock: сериализует миграции между воркерами uvicorn.
+_MIGRATIONS_LOCK_KEY = 7_470_371_001
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+
+
+def get_schema_version() -> int:
+    try:
+        row = execute("SELECT value FROM schema_meta WHERE key = 'schema_version'").fetchone()
+    except Exception:
+        return 0
+    try:
+        return int((row or {}).get('value') or 0)
+    except Exception:
+        return 0
+
+
+def run_migrations() -> int:
+    """
+    Применяет недостающие миграции в одной транзакции под advisory lock.
+    Возвращает версию схемы после применения.
+    """
+    with CONN:
+        execute('SELECT pg_advisory_xact_lock(?)', (_MIGRATIONS_LOCK_KEY,))
+        execute(
+            '''
+            CREATE TABLE IF NOT EXISTS schema_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            '''
+        )
+        current = get_schema_version()
+        for version, name, step in MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info('schema: applying migration %s (%s)', version, name)
+            step()
+            execute(
+                '''
+                INSERT INTO schema_meta(key, value)
+                VALUES ('schema_version', ?)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+                ''',
+                (str(version),),
+            )
+            current = version
+        return current
+
+
 def init_schema() -> None:
-    _init_postgres_schema()
+    """
+    Гарантирует актуальную схему. DDL выполняется один раз на процесс (на старте);
+    последующие вызовы — дешёвая проверка флага, без запросов к БД.
+    """
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if _SCHEMA_READY:
+            return
+        run_migrations()
+        # pgvector опционален и не версионируется: если расширение появится позже,
+        # таблица/индекс будут созданы при следующем старте (все шаги идемпотентны).
+        _ensure_pgvector()
+        _SCHEMA_READY = True
@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+from sqlalchemy.engine import RowMapping
+
+from .data_store import _build_doc_from_outline_sections, _infer_article_encrypted_flag, iso_now
+from .db import CONN, mark_search_index_clean
+from .outline_doc_json import build_outline_section_plain_text_map
+from .text_utils import analyze_many, strip_html
+
+logger = logging.getLogger('uvicorn.error')
+
+# Перестройка FTS без простоя поиска:
+#   1) статьи читаются чанками по id (keyset), тексты лемматизируются пулом процессов,
+#      строки пишутся пачками (unnest) в теневые таблицы {table}_rebuild;
+#   2) чекпоинт (cursor) и аренда обновляются в той же транзакции, что и чанк — после падения задача продолжается;
+#   3) статьи, изменённые после начала (change_xid >= catchup_xmin), переиндексируются (догонка);
+#   4) под блокировкой последняя догонка и подмена таблиц переименованием.
+# Всё это время поиск читает старые outline_sections_fts/articles_fts.
+SEARCH_REBUILD_CHUNK_SIZE = int(os.environ.get('SERVPY_SEARCH_REBUILD_CHUNK_SIZE') or '200')
+SEARCH_REBUILD_PROCESSES = int(os.environ.get('SERVPY_SEARCH_REBUILD_PROCESSES') or str(min(4, os.cpu_count() or 1)))
+SEARCH_REBUILD_LEASE_SECONDS = int(os.environ.get('SERVPY_SEARCH_REBUILD_LEASE_SECONDS') or '120')
+SEARCH_REBUILD_SWAP_ATTEMPTS = int(os.environ.get('SERVPY_SEARCH_REBUILD_SWAP_ATTEMPTS') or '5')
+SEARCH_REBUILD_LOCK_TIMEOUT_MS = int(os.environ.get('SERVPY_SEARCH_REBUILD_LOCK_TIMEOUT_MS') or '5000')
+# Меньше этого числа текстов чанк разбирается в текущем процессе: пересылка в пул дороже самого pymorphy2.
+SEARCH_REBUILD_POOL_MIN_TEXTS = 64
+# Сколько проходов догонки без блокировки делать, прежде чем брать блокировку на подмену.
+SEARCH_REBUILD_CATCHUP_PASSES = 3
+
+_STATE_ID = 'fts'
+_TABLES = ('articles_fts', 'outline_sections_fts')
+_SHADOW_SUFFIX = '_rebuild'
+_ACTIVE_STATUSES = ('loading', 'catchup')
+_RESUMABLE_STATUSES = ('loading', 'catchup', 'failed')
+# Ключ pg_advisory_xact_lock: захват задачи атомарен между воркерами uvicorn.
+_SEARCH_REBUILD_LOCK_KEY = 7_470_371_002
+_ARTICLE_COLUMNS = (
+    'id, title, updated_at, deleted_at, is_encrypted, encryption_salt, encryption_verifier, '
+    'doc_json_stale, article_doc_json'
+)
+
+_LOCK = threading.Lock()
+_THREAD: threading.Thread | None = None
+
+
+class _LeaseLost(Exception):
+    """Аренду задачи перехватил другой процесс (наша истекла)."""
+
+
+def _lease_until() -> str:
+    return (datetime.utcnow() + timedelta(seconds=max(30, SEARCH_REBUILD_LEASE_SECONDS))).isoformat()
+
+
+def _state_row() -> RowMapping | None:
+    return CONN.execute('SELECT * FROM search_rebuild_state WHERE id = ?', (_STATE_ID,)).fetchone()
+
+
+def get_search_rebuild_status() -> dict[str, Any]:
+    row = _state_row()
+    if not row:
+        return {'status': 'idle'}
+    status = row['status']
+    total = int(row['total'] or 0)
+    processed = int(row['processed'] or 0)
+    if total:
+        progress = round(min(1.0, processed / total), 4)
+    else:
+        progress = 1.0 if status == 'done' else 0.0
+    return {
+        'status': status,
+        'running': status in _ACTIVE_STATUSES and (row['lease_until'] or '') > datetime.utcnow().isoformat(),
+        'processed': processed,
+        'total': total,
+        'sections': int(row['sections'] or 0),
+        'progress': progress,
+        'startedAt': row['started_at'],
+        'updatedAt': row['updated_at'],
+        'finishedAt': row['finished_at'],
+        'error': row['error'] or None,
+    }
+
+
+def _shadow_tables_exist() -> bool:
+    for table in _TABLES:
+        row = CONN.execute('SELECT to_regclass(?) IS NOT NULL AS ok', (table + _SHADOW_SUFFIX,)).fetchone()
+        if not row or not row['ok']:
+            return False
+    return True
+
+
+def _begin_job(owner: str) -> None:
+    """Новая задача: пустые теневые таблицы (только PK/FK — прочие индексы строятся после загрузки)."""
+    for table in _TABLES:
+        shadow = table + _SHADOW_SUFFIX
+        CONN.execute(f'DROP TABLE IF EXISTS {shadow}')
+        CONN.execute(f'CREATE TABLE {shadow} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)')
+    CONN.execute('ALTER TABLE articles_fts_rebuild ADD CONSTRAINT articles_fts_rebuild_pkey PRIMARY KEY (article_id)')
+    CONN.execute(
+        'ALTER TABLE outline_sections_fts_rebuild '
+        'ADD CONSTRAINT outline_sections_fts_rebuild_pkey PRIMARY KEY (section_id)'
+    )
+    CONN.execute(
+        'ALTER TABLE outline_sections_fts_rebuild ADD CONSTRAINT outline_sections_fts_rebuild_article_id_fkey '
+        'FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE'
+    )
+    now = iso_now()
+    # catchup_xmin — xmin текущего снимка: всё, что закоммитят позже, получит change_xid не меньше.
+    CONN.execute(
+        '''
+        INSERT INTO search_rebuild_state (
+            id, status, cursor, catchup_xmin, total, processed, sections,
+            started_at, updated_at, finished_at, lease_owner, lease_until, error
+        )
+        SELECT ?, 'loading', '', pg_snapshot_xmin(pg_current_snapshot()), COUNT(*), 0, 0, ?, ?, NULL, ?, ?, ''
+        FROM articles
+        ON CONFLICT (id) DO UPDATE
+        SET status = EXCLUDED.status,
+            cursor = EXCLUDED.cursor,
+            catchup_xmin = EXCLUDED.catchup_xmin,
+            total = EXCLUDED.total,
+            processed = 0,
+            sections = 0,
+            started_at = EXCLUDED.started_at,
+            updated_at = EXCLUDED.updated_at,
+            finished_at = NULL,
+            lease_owner = EXCLUDED.lease_owner,
+            lease_until = EXCLUDED.lease_until,
+            error = ''
+        ''',
+        (_STATE_ID, now, now, owner, _lease_until()),
+    )
+
+
+def _claim_job(owner: str, *, restart: bool = False) -> bool:
+    """
+    Берёт аренду задачи. Прерванная задача (процесс упал, аренда истекла) продолжается с чекпоинта,
+    restart=True или завершённая задача — начинается заново. False — задачу выполняет другой процесс.
+    """
+    with CONN:
+        CONN.execute('SELECT pg_advisory_xact_lock(?)', (_SEARCH_REBUILD_LOCK_KEY,))
+        row = _state_row()
+        if row and row['status'] in _ACTIVE_STATUSES and (row['lease_until'] or '') > datetime.utcnow().isoformat():
+            return False
+        if row and not restart and row['status'] in _RESUMABLE_STATUSES and _shadow_tables_exist():
+            CONN.execute(
+                '''
+                UPDATE search_rebuild_state
+                SET status = 'loading', lease_owner = ?, lease_until = ?, updated_at = ?, error = ''
+                WHERE id = ?
+                ''',
+                (owner, _lease_until(), iso_now(), _STATE_ID),
+            )
+            logger.info('search rebuild: resuming from cursor %r', row['cursor'])
+            return True
+        _begin_job(owner)
+        return True
+
+
+def _checkpoint(owner: str, **fields: Any) -> None:
+    """Продлевает аренду и пишет поля состояния; вызывается в транзакции чанка."""
+    values: dict[str, Any] = {'lease_until': _lease_until(), 'updated_at': iso_now()}
+    values.update(fields)
+    assignments: list[str] = []
+    params: list[Any] = []
+    for column, value in values.items():
+        if column in {'processed', 'sections'}:
+            assignments.append(f'{column} = {column} + ?')
+        elif column == 'catchup_xmin':
+            assignments.append('catchup_xmin = ?::xid8')
+        else:
+            assignments.append(f'{column} = ?')
+        params.append(value)
+    row = CONN.execute(
+        f'UPDATE search_rebuild_state SET {", ".join(assignments)} WHERE id = ? AND lease_owner = ? RETURNING id',
+        (*params, _STATE_ID, owner),
+    ).fetchone()
+    if not row:
+        raise _LeaseLost()
+
+
+@contextmanager
+def _analysis_pool() -> Iterator[ProcessPoolExecutor | None]:
+    # spawn: дочерние процессы не наследуют пул соединений БД и потоки сервера.
+    if SEARCH_REBUILD_PROCESSES <= 1:
+        yield None
+        return
+    pool = ProcessPoolExecutor(
+        max_workers=SEARCH_REBUILD_PROCESSES,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+    try:
+        yield pool
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _analyze(texts: list[str], pool: ProcessPoolExecutor | None) -> list[tuple[str, str]]:
+    if pool is None or len(texts) < SEARCH_REBUILD_POOL_MIN_TEXTS:
+        return analyze_many(texts)
+    step = -(-len(texts) // SEARCH_REBUILD_PROCESSES)
+    out: list[tuple[str, str]] = []
+    for part in pool.map(analyze_many, [texts[i:i + step] for i in range(0, len(texts), step)]):
+        out.extend(part)
+    return out
+
+
+def _collect_texts(rows: list[RowMapping]) -> tuple[list[tuple[str, str]], dict[str, tuple[str, str, str]]]:
+    """Заголовки всех статей и тексты секций живых незашифрованных: (id, title), section_id -> (article_id, text, updated_at)."""
+    titles: list[tuple[str, str]] = []
+    sections: dict[str, tuple[str, str, str]] = {}
+    for row in rows:
+        titles.append((row['id'], strip_html(row['title'] or '')))
+        if row['deleted_at'] or _infer_article_encrypted_flag(row):
+            continue
+        try:
+            if row['doc_json_stale']:
+                # Проекция устарела: собираем документ из outline_sections, не записывая статью.
+                doc = _build_doc_from_outline_sections(row['id'])
+            else:
+                raw_doc = row['article_doc_json'] or ''
+                if not raw_doc:
+                    continue
+                doc = json.loads(raw_doc) if isinstance(raw_doc, str) else raw_doc
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('search rebuild: skipping sections of %s: %r', row['id'], exc)
+            continue
+        updated_at = str(row['updated_at'] or '') or iso_now()
+        for sid, plain in (build_outline_section_plain_text_map(doc) or {}).items():
+            if sid:
+                sections[sid] = (row['id'], (plain or '').strip(), updated_at)
+    return titles, sections
+
+
+def _write_articles(
+    article_ids: list[str],
+    titles: list[tuple[str, str]],
+    sections: dict[str, tuple[str, str, str]],
+    analyses: list[tuple[str, str]],
+) -> None:
+    """Заменяет строки статей в теневых таблицах; author_id/deleted берутся из articles на момент записи."""
+    title_analyses = analyses[:len(titles)]
+    section_analyses = analyses[len(titles):]
+    CONN.execute('DELETE FROM outline_sections_fts_rebuild WHERE article_id = ANY(?)', (article_ids,))
+    CONN.execute('DELETE FROM articles_fts_rebuild WHERE article_id = ANY(?)', (article_ids,))
+    if titles:
+        CONN.execute(
+            '''
+            INSERT INTO articles_fts_rebuild (article_id, title, lemma, normalized_text, author_id, deleted)
+            SELECT u.article_id, u.title, u.lemma, u.normalized_text, COALESCE(a.author_id, ''), a.deleted_at IS NOT NULL
+            FROM unnest(?::text[], ?::text[], ?::text[], ?::text[]) AS u(article_id, title, lemma, normalized_text)
+            JOIN articles a ON a.id = u.article_id
+            ''',
+            (
+                [aid for aid, _ in titles],
+                [title for _, title in titles],
+                [lemma for lemma, _ in title_analyses],
+                [normalized for _, normalized in title_analyses],
+            ),
+        )
+    if sections:
+        values = list(sections.values())
+        CONN.execute(
+            '''
+            INSERT INTO outline_sections_fts_rebuild (
+                section_id, article_id, text, lemma, normalized_text, updated_at, author_id, deleted
+            )
+            SELECT u.section_id, a.id, u.text, u.lemma, u.normalized_text, u.updated_at,
+                   COALESCE(a.author_id, ''), a.deleted_at IS NOT NULL
+            FROM unnest(?::text[], ?::text[], ?::text[], ?::text[], ?::text[], ?::text[])
+                AS u(section_id, article_id, text, lemma, normalized_text, updated_at)
+            JOIN articles a ON a.id = u.article_id
+            ON CONFLICT (section_id) DO UPDATE
+            SET article_id = EXCLUDED.article_id,
+                text = EXCLUDED.text,
+                lemma = EXCLUDED.lemma,
+                normalized_text = EXCLUDED.normalized_text,
+                updated_at = EXCLUDED.updated_at,
+                author_id = EXCLUDED.author_id,
+                deleted = EXCLUDED.deleted
+            ''',
+            (
+                list(sections.keys()),
+                [v[0] for v in values],
+                [v[1] for v in values],
+                [lemma for lemma, _ in section_analyses],
+                [normalized for _, normalized in section_analyses],
+                [v[2] for v in values],
+            ),
+        )
+
+
+def _prepare(
+    rows: list[RowMapping], pool: ProcessPoolExecutor | None
+) -> tuple[list[tuple[str, str]], dict[str, tuple[str, str, str]], list[tuple[str, str]]]:
+    """Тексты чанка и их (lemma, normalized) — вне транзакции, разбор идёт в пуле процессов."""
+    titles, sections = _collect_texts(rows)
+    analyses = _analyze([title for _, title in titles] + [v[1] for v in sections.values()], pool)
+    return titles, sections, analyses
+
+
+def _load(owner: str, pool: ProcessPoolExecutor | None) -> None:
+    chunk_size = max(1, SEARCH_REBUILD_CHUNK_SIZE)
+    state = _state_row()
+    cursor = (state['cursor'] if state else '') or ''
+    while True:
+        rows = CONN.execute(
+            f'SELECT {_ARTICLE_COLUMNS} FROM articles WHERE id > ? ORDER BY id LIMIT ?',
+            (cursor, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        titles, sections, analyses = _prepare(rows, pool)
+        cursor = rows[-1]['id']
+        # Чанк и чекпоинт — одна транзакция: после падения продолжаем ровно с cursor.
+        with CONN:
+            _checkpoint(owner, cursor=cursor, processed=len(rows), sections=len(sections))
+            _write_articles([row['id'] for row in rows], titles, sections, analyses)
+
+
+def _create_shadow_indexes() -> None:
+    """Вторичные индексы теневых таблиц — по определениям живых (GIN строится один раз, после загрузки)."""
+    for table in _TABLES:
+        shadow = table + _SHADOW_SUFFIX
+        rows = CONN.execute(
+            '''
+            SELECT c.relname AS name, pg_get_indexdef(i.indexrelid) AS definition
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = ?::regclass AND NOT i.indisprimary
+            ''',
+            (table,),
+        ).fetchall()
+        for row in rows:
+            match = re.match(r'CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ ', row['definition'])
+            if not match:
+                logger.warning('search rebuild: cannot copy index %s: %s', row['name'], row['definition'])
+                continue
+            CONN.execute(
+                f'CREATE {match.group(1) or ""}INDEX IF NOT EXISTS {row["name"]}{_SHADOW_SUFFIX} '
+                f'ON {shadow} {row["definition"][match.end():]}'
+            )
+
+
+def _catch_up(owner: str, pool: ProcessPoolExecutor | None) -> int:
+    """
+    Переиндексирует статьи с change_xid >= catchup_xmin и сдвигает границу на xmin текущего снимка.
+    Возвращает число переиндексированных статей.
+    """
+    chunk_size = max(1, SEARCH_REBUILD_CHUNK_SIZE)
+    mark = CONN.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS xmin').fetchone()['xmin']
+    since = CONN.execute(
+        'SELECT catchup_xmin::text AS xmin FROM search_rebuild_state WHERE id = ?',
+        (_STATE_ID,),
+    ).fetchone()['xmin']
+    ids = [
+        row['id']
+        for row in CONN.execute(
+            'SELECT id FROM articles WHERE change_xid >= ?::xid8 ORDER BY id',
+            (since,),
+        ).fetchall()
+    ]
+    for start in range(0, len(ids), chunk_size):
+        chunk_ids = ids[start:start + chunk_size]
+        rows = CONN.execute(
+            f'SELECT {_ARTICLE_COLUMNS} FROM articles WHERE id = ANY(?) ORDER BY id',
+            (chunk_ids,),
+        ).fetchall()
+        titles, sections, analyses = _prepare(rows, pool)
+        with CONN:
+            _checkpoint(owner)
+            # Удалённые за это время статьи тоже в chunk_ids: их строки просто не вставятся заново.
+            _write_articles(chunk_ids, titles, sections, analyses)
+    with CONN:
+        # Окончательно удалённые статьи: секции уходят каскадом по FK, заголовки чистим здесь.
+        CONN.execute(
+            'DELETE FROM articles_fts_rebuild f WHERE NOT EXISTS (SELECT 1 FROM articles a WHERE a.id = f.article_id)'
+        )
+        _checkpoint(owner, catchup_xmin=mark)
+    return len(ids)
+
+
+def _swap_tables() -> None:
+    for table in _TABLES:
+        shadow = table + _SHADOW_SUFFIX
+        CONN.execute(f'DROP TABLE {table}')
+        CONN.execute(f'ALTER TABLE {shadow} RENAME TO {table}')
+        constraints = CONN.execute(
+            'SELECT conname FROM pg_constraint WHERE conrelid = ?::regclass',
+            (table,),
+        ).fetchall()
+        for row in constraints:
+            name = row['conname']
+            if name.startswith(shadow):
+                CONN.execute(f'ALTER TABLE {table} RENAME CONSTRAINT {name} TO {table}{name[len(shadow):]}')
+        indexes = CONN.execute(
+            '''
+            SELECT c.relname AS name
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = ?::regclass
+            ''',
+            (table,),
+        ).fetchall()
+        for row in indexes:
+            name = row['name']
+            if name.endswith(_SHADOW_SUFFIX):
+                CONN.execute(f'ALTER INDEX {name} RENAME TO {name[:-len(_SHADOW_SUFFIX)]}')
+
+
+def _swap(owner: str, pool: ProcessPoolExecutor | None) -> None:
+    """
+    Последняя догонка и подмена таблиц в одной транзакции. articles блокируется в SHARE (ждём пишущих,
+    новые правки статей ждут нас), затем FTS-таблицы — в ACCESS EXCLUSIVE: поиск ждёт только на время подмены.
+    """
+    attempts = max(1, SEARCH_REBUILD_SWAP_ATTEMPTS)
+    for attempt in range(1, attempts + 1):
+        try:
+            with CONN:
+                CONN.execute("SELECT set_config('lock_timeout', ?, true)", (f'{SEARCH_REBUILD_LOCK_TIMEOUT_MS}ms',))
+                CONN.execute('LOCK TABLE articles IN SHARE MODE')
+                CONN.execute('LOCK TABLE articles_fts, outline_sections_fts IN ACCESS EXCLUSIVE MODE')
+                _catch_up(owner, pool)
+                _swap_tables()
+                _checkpoint(owner, status='done', finished_at=iso_now(), lease_until=None, lease_owner=None)
+            return
+        except _LeaseLost:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            # Таймаут блокировки или deadlock с пишущей транзакцией — откатились целиком, пробуем ещё.
+            if attempt >= attempts:
+                raise
+            logger.warning('search rebuild: swap attempt %s failed: %r', attempt, exc)
+            time.sleep(min(5, attempt))
+
+
+def run_search_rebuild(*, restart: bool = False, owner: str | None = None) -> dict[str, Any]:
+    """
+    Выполняет задачу перестройки в текущем потоке (CLI reindex_fts, тесты, фоновый поток).
+    Если задачу уже выполняет другой процесс — сразу возвращает её состояние.
+    """
+    if owner is None:
+        owner = uuid.uuid4().hex
+        if not _claim_job(owner, restart=restart):
+            return get_search_rebuild_status()
+    started = time.monotonic()
+    try:
+        with _analysis_pool() as pool:
+            _load(owner, pool)
+            with CONN:
+                _checkpoint(owner, status='catchup')
+            _create_shadow_indexes()
+            for _ in range(max(0, SEARCH_REBUILD_CATCHUP_PASSES)):
+                if _catch_up(owner, pool) <= SEARCH_REBUILD_CHUNK_SIZE:
+                    break
+            _swap(owner, pool)
+    except _LeaseLost:
+        logger.warning('search rebuild: lease lost, another worker continues the job')
+        return get_search_rebuild_status()
+    except Exception as exc:
+        logger.error('search rebuild failed: %r', exc)
+        with CONN:
+            CONN.execute(
+                '''
+                UPDATE search_rebuild_state
+                SET status = 'failed', error = ?, updated_at = ?, lease_owner = NULL, lease_until = NULL
+                WHERE id = ? AND lease_owner = ?
+                ''',
+                (repr(exc), iso_now(), _STATE_ID, owner),
+            )
+        raise
+    mark_search_index_clean()
+    status = get_search_rebuild_status()
+    logger.info(
+        'search rebuild: done, %s articles, %s sections in %.1fs',
+        status.get('processed'),
+        status.get('sections'),
+        time.monotonic() - started,
+    )
+    return status
+
+
+def start_search_rebuild(*, restart: bool = False) -> dict[str, Any]:
+    """Захватывает задачу и выполняет её в фоновом потоке; сразу возвращает состояние."""
+    global _THREAD
+    with _LOCK:
+        if _THREAD is not None and _THREAD.is_alive():
+            return get_search_rebuild_status()
+        owner = uuid.uuid4().hex
+        if not _claim_job(owner, restart=restart):
+            return get_search_rebuild_status()
+
+        def _runner() -> None:
+            try:
+                run_search_rebuild(owner=owner)
+            except Exception as exc:  # noqa: BLE001
+                logger.error('search rebuild: background job failed: %r', exc)
+
+        _THREAD = threading.Thread(target=_runner, name='search-rebuild', daemon=True)
+        _THREAD.start()
+    return get_search_rebuild_status()
+
+
+def resume_search_rebuild() -> None:
+    """При старте продолжает задачу, прерванную рестартом/падением процесса (аренда истекла)."""
+    try:
+        row = _state_row()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning('search rebuild: cannot read state: %r', exc)
+        return
+    if row and row['status'] in _ACTIVE_STATUSES:
+        start_search_rebuild()
@@ -6,12 +6,21 @@ import threading
 import logging
 import time
 from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Any, Iterable, List
 from uuid import uuid4
 
-from .db import CONN
-from .embeddings import EmbeddingInputUnsupported, EmbeddingsUnavailable, embed_text, embed_text_batch
+import numpy as np
+
+from .db import CONN, pgvector_adapter_enabled
+from .embeddings import (
+    EmbeddingInputUnsupported,
+    EmbeddingsUnavailable,
+    embed_text,
+    embed_text_batch,
+    get_embedding_batcher_stats,
+    get_embedding_cache_stats,
+)
 from .telegram_notify import notify_user
 from .text_utils import strip_html
 from .outline_doc_json import build_outline_section_plain_text_map
@@ -24,6 +33,33 @@ SEMANTIC_REINDEX_COOLDOWN_SECONDS = 0 * 60
 SEMANTIC_REINDEX_CONCURRENCY = int(os.environ.get('SERVPY_SEMANTIC_REINDEX_CONCURRENCY') or '4')
 SEMANTIC_REINDEX_BLOCK_BATCH_SIZE = int(os.environ.get('SERVPY_SEMANTIC_REINDEX_BLOCK_BATCH_SIZE') or '32')
 
+# Фоновая очередь embeddings (embedding_jobs): save только ставит задачи, воркеры считают батчами.
+EMBEDDING_WORKERS = int(os.environ.get('SERVPY_EMBEDDING_WORKERS') or '2')
+EMBEDDING_JOBS_BATCH_SIZE = int(os.environ.get('SERVPY_EMBEDDING_JOBS_BATCH_SIZE') or '32')
+EMBEDDING_JOBS_DEBOUNCE_SECONDS = float(os.environ.get('SERVPY_EMBEDDING_JOBS_DEBOUNCE_SECONDS') or '3')
+EMBEDDING_JOBS_POLL_SECONDS = float(os.environ.get('SERVPY_EMBEDDING_JOBS_POLL_SECONDS') or '2')
+EMBEDDING_JOBS_LEASE_SECONDS = int(os.environ.get('SERVPY_EMBEDDING_JOBS_LEASE_SECONDS') or '300')
+EMBEDDING_JOBS_MAX_ATTEMPTS = int(os.environ.get('SERVPY_EMBEDDING_JOBS_MAX_ATTEMPTS') or '10')
+
+# Ранжирование: секция и заголовок статьи эмбеддятся отдельно (block_embeddings / article_embeddings),
+# score = (1 - w) * близость секции + w * близость заголовка её статьи.
+SEMANTIC_TITLE_WEIGHT = float(os.environ.get('SERVPY_SEMANTIC_TITLE_WEIGHT') or '0.2')
+# Кандидаты для пересчёта score: ближайшие секции (ANN-индекс) + все секции статей с ближайшими заголовками.
+SEMANTIC_CANDIDATES = int(os.environ.get('SERVPY_SEMANTIC_CANDIDATES') or '200')
+SEMANTIC_TITLE_CANDIDATES = int(os.environ.get('SERVPY_SEMANTIC_TITLE_CANDIDATES') or '10')
+
+_EMBEDDING_WORKERS_LOCK = threading.Lock()
+_EMBEDDING_WORKER_THREADS: list[threading.Thread] = []
+_EMBEDDING_JOBS_STATS_LOCK = threading.Lock()
+EMBEDDING_JOBS_STATS: dict[str, Any] = {
+    'processed': 0,
+    'failed': 0,
+    'dropped': 0,
+    'batches': 0,
+    'lastBatchAt': None,
+    'lastError': '',
+}
+
 
 def _iso_now() -> str:
     return datetime.utcnow().isoformat()
@@ -109,6 +145,9 @@ def start_reindex_task(author_id: str, mode: str = 'all') -> dict[str, Any]:
             article_titles: dict[str, str] = {}
             article_section_texts: dict[str, dict[str, str]] = {}
             try:
+                from .data_store import materialize_stale_article_doc_jsons
+
+                materialize_stale_article_doc_jsons(author_id)
                 article_rows = CONN.execute(
                     '''
                     SELECT id, title, article_doc_json
@@ -241,12 +280,11 @@ def start_reindex_task(author_id: str, mode: str = 'all') -> dict[str, Any]:
                 for r in todo_rows:
                     bid = str(r.get('block_id') or '')
                     article_id = str(r.get('article_id') or '')
-                    article_title = article_titles.get(article_id) or (r.get('article_title') or '')
                     # Prefer doc_json-derived section text. Fallback to the legacy HTML.
                     section_plain = (article_section_texts.get(article_id) or {}).get(bid) or ''
                     if not section_plain:
                         section_plain = strip_html(r.get('block_text') or '')
-                    text = _build_embedding_text_from_plain(article_title, section_plain)
+                    text = _build_section_embedding_text(section_plain)
                     if not text:
                         empty_ids.append(bid)
                         processed_local += 1
@@ -272,19 +310,35 @@ def start_reindex_task(author_id: str, mode: str = 'all') -> dict[str, Any]:
                         try:
                             vectors.append(embed_text(t))
                         except EmbeddingInputUnsupported:
-                            vectors.append([])
+                            vectors.append(None)
+                unsupported_ids: list[str] = []
+                upsert_rows: list[tuple] = []
                 for r, vec, plain in zip(embed_rows, vectors, plain_texts):
                     bid = str(r.get('block_id') or '')
                     if not bid:
                         continue
                     processed_local += 1
-                    if not vec:
+                    if vec is None:
                         # unsupported input
                         failed_local += 1
-                        CONN.execute('DELETE FROM block_embeddings WHERE block_id = ?', (bid,))
+                        unsupported_ids.append(bid)
                         continue
-                    vec_lit = _vector_literal(vec)
-                    CONN.execute(
+                    upsert_rows.append(
+                        (
+                            bid,
+                            author_id,
+                            r.get('article_id') or '',
+                            r.get('article_title') or '',
+                            plain,
+                            _vector_param(vec),
+                            r.get('updated_at') or '',
+                        )
+                    )
+                if unsupported_ids:
+                    delete_block_embeddings(unsupported_ids)
+                if upsert_rows:
+                    # Весь батч одним executemany (psycopg 3 отправляет его пайплайном), без запроса на строку.
+                    CONN.executemany(
                         '''
                         INSERT INTO block_embeddings (block_id, author_id, article_id, article_title, plain_text, embedding, updated_at)
                         VALUES (?, ?, ?, ?, ?, ?::vector, ?)
@@ -296,17 +350,9 @@ def start_reindex_task(author_id: str, mode: str = 'all') -> dict[str, Any]:
                             embedding = EXCLUDED.embedding,
                             updated_at = EXCLUDED.updated_at
                         ''',
-                        (
-                            bid,
-                            author_id,
-                            r.get('article_id') or '',
-                            r.get('article_title') or '',
-                            plain,
-                            vec_lit,
-                            r.get('updated_at') or '',
-                        ),
+                        upsert_rows,
                     )
-                    indexed_local += 1
+                    indexed_local += len(upsert_rows)
 
                 return (processed_local, indexed_local, failed_local)
 
@@ -407,6 +453,11 @@ def start_reindex_task(author_id: str, mode: str = 'all') -> dict[str, Any]:
                                         t['queued'] = next_index
                                         t['lastActivityAt'] = _iso_now()
 
+            # Векторы заголовков: mode=all пересчитывает все (неизменённые отдаст кэш), missing — только недостающие.
+            mark_article_title_embeddings(list(article_titles), force=requested_mode == 'all')
+            while run_title_embeddings_once():
+                pass
+
             with _SEMANTIC_REINDEX_LOCK:
                 t = SEMANTIC_REINDEX_TASKS.get(author_id)
                 if t:
@@ -451,17 +502,22 @@ def start_reindex_task(author_id: str, mode: str = 'all') -> dict[str, Any]:
     with _SEMANTIC_REINDEX_LOCK:
         return SEMANTIC_REINDEX_TASKS[author_id]
 
-def _vector_literal(vec: List[float]) -> str:
-    # pgvector принимает формат вида: [0.1, 0.2, ...]
-    return '[' + ','.join(f'{x:.8f}' for x in vec) + ']'
+def _vector_param(vec: Any) -> Any:
+    """
+    Параметр для `?::vector`: float32 ndarray, если подключён бинарный адаптер pgvector
+    (db.enable_pgvector_adapter), иначе текстовый литерал '[0.1,0.2,...]'.
+    """
+    arr = np.asarray(vec, dtype=np.float32)
+    if pgvector_adapter_enabled():
+        return arr
+    # Кратчайшая запись float32, однозначно восстанавливающая значение (pgvector хранит float4).
+    return '[' + ','.join(arr.astype(str)) + ']'
 
 
-def _build_embedding_text_from_plain(article_title: str, plain_block_text: str) -> str:
-    plain = (plain_block_text or '').strip()
-    title = (article_title or '').strip()
-    if title:
-        return f'{title}\n{plain}'.strip()
-    return plain.strip()
+def _build_section_embedding_text(plain_block_text: str) -> str:
+    # Заголовок статьи в текст секции не входит: у статьи свой вектор (article_embeddings),
+    # и переименование не инвалидирует embeddings секций.
+    return (plain_block_text or '').strip()
 
 
 def upsert_block_embedding(
@@ -507,7 +563,7 @@ def upsert_block_embedding(
         # Fallback to legacy HTML (e.g., for encrypted or inconsistent articles).
         section_plain = strip_html(block_html or '')
 
-    text = _build_embedding_text_from_plain(article_title, section_plain)
+    text = _build_section_embedding_text(section_plain)
     if not text:
         # Пустые блоки не индексируем.
         CONN.execute('DELETE FROM block_embeddings WHERE block_id = ?', (block_id,))
@@ -519,7 +575,7 @@ def upsert_block_embedding(
         # Считаем это нефатальным: просто удаляем/не создаём embedding.
         CONN.execute('DELETE FROM block_embeddings WHERE block_id = ?', (block_id,))
         return
-    vec_lit = _vector_literal(vec)
+    vec_lit = _vector_param(vec)
     CONN.execute(
         '''
         INSERT INTO block_embeddings (block_id, author_id, article_id, article_title, plain_text, embedding, updated_at)
@@ -559,7 +615,7 @@ def upsert_block_embedding_plain(
     except Exception:
         pass
 
-    text = _build_embedding_text_from_plain(article_title, block_plain_text or '')
+    text = _build_section_embedding_text(block_plain_text or '')
     if not text:
         CONN.execute('DELETE FROM block_embeddings WHERE block_id = ?', (block_id,))
         return
@@ -568,7 +624,7 @@ def upsert_block_embedding_plain(
     except EmbeddingInputUnsupported:
         CONN.execute('DELETE FROM block_embeddings WHERE block_id = ?', (block_id,))
         return
-    vec_lit = _vector_literal(vec)
+    vec_lit = _vector_param(vec)
     CONN.execute(
         '''
         INSERT INTO block_embeddings (block_id, author_id, article_id, article_title, plain_text, embedding, updated_at)
@@ -593,30 +649,452 @@ def upsert_embeddings_for_plain_texts(
     block_texts: dict[str, str],
     updated_at: str,
 ) -> None:
-    for bid, plain in (block_texts or {}).items():
-        if not bid:
-            continue
-        try:
-            upsert_block_embedding_plain(
-                author_id=author_id,
-                article_id=article_id,
-                article_title=article_title,
-                block_id=bid,
-                block_plain_text=plain or '',
-                updated_at=updated_at,
-            )
-        except Exception as exc:  # noqa: BLE001
-            logger.warning('Failed to upsert embedding for block %s: %r', bid, exc)
+    """
+    Ставит пересчёт embeddings в очередь embedding_jobs (без HTTP-вызовов в потоке запроса).
+    Вызванная внутри транзакции, задача коммитится вместе с изменением документа.
+    """
+    enqueue_embedding_jobs(
+        author_id=author_id,
+        article_id=article_id,
+        article_title=article_title,
+        block_texts=block_texts,
+        updated_at=updated_at,
+    )
 
 
 def delete_block_embeddings(block_ids: Iterable[str]) -> None:
     ids = [bid for bid in (block_ids or []) if bid]
     if not ids:
         return
+    # Отложенные пересчёты удалённых секций больше не нужны.
+    CONN.execute('DELETE FROM embedding_jobs WHERE block_id = ANY(?)', (ids,))
     placeholders = ','.join('?' for _ in ids)
     CONN.execute(f'DELETE FROM block_embeddings WHERE block_id IN ({placeholders})', tuple(ids))
 
 
+def enqueue_embedding_jobs(
+    *,
+    author_id: str,
+    article_id: str,
+    article_title: str,
+    block_texts: dict[str, str],
+    updated_at: str,
+) -> int:
+    """
+    Upsert задач в embedding_jobs. Повторная правка той же секции до обработки заменяет текст
+    (last-write-wins) и сдвигает not_before на окно debounce; enqueued_at остаётся от первой правки.
+    """
+    if not author_id or not article_id:
+        return 0
+    now_dt = datetime.utcnow()
+    now = now_dt.isoformat()
+    not_before = (now_dt + timedelta(seconds=max(0.0, EMBEDDING_JOBS_DEBOUNCE_SECONDS))).isoformat()
+    rows = [
+        (bid, author_id, article_id, article_title or '', plain or '', updated_at, now, not_before)
+        for bid, plain in (block_texts or {}).items()
+        if bid
+    ]
+    if not rows:
+        return 0
+    CONN.executemany(
+        '''
+        INSERT INTO embedding_jobs (block_id, author_id, article_id, article_title, plain_text, updated_at, enqueued_at, not_before)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (block_id) DO UPDATE
+        SET author_id = EXCLUDED.author_id,
+            article_id = EXCLUDED.article_id,
+            article_title = EXCLUDED.article_title,
+            plain_text = EXCLUDED.plain_text,
+            updated_at = EXCLUDED.updated_at,
+            rev = embedding_jobs.rev + 1,
+            not_before = EXCLUDED.not_before,
+            attempts = 0,
+            last_error = ''
+        ''',
+        rows,
+    )
+    return len(rows)
+
+
+def _claim_embedding_jobs(limit: int, *, ignore_debounce: bool = False) -> list[dict[str, Any]]:
+    now_dt = datetime.utcnow()
+    now = now_dt.isoformat()
+    lease_until = (now_dt + timedelta(seconds=max(30, EMBEDDING_JOBS_LEASE_SECONDS))).isoformat()
+    # Истёкшая аренда (воркер упал/процесс перезапущен) снова делает задачу доступной.
+    with CONN:
+        rows = CONN.execute(
+            '''
+            UPDATE embedding_jobs
+            SET locked_until = ?
+            WHERE block_id IN (
+                SELECT block_id
+                FROM embedding_jobs
+                WHERE not_before <= ? AND (locked_until IS NULL OR locked_until < ?)
+                ORDER BY not_before
+                LIMIT ?
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING block_id, author_id, article_id, article_title, plain_text, updated_at, rev, attempts
+            ''',
+            (lease_until, '9999' if ignore_debounce else now, now, max(1, int(limit))),
+        ).fetchall()
+    return [dict(r) for r in rows or []]
+
+
+def _write_block_embeddings(results: list[tuple[dict[str, Any], str, np.ndarray]]) -> None:
+    if not results:
+        return
+    # Не затираем более свежий embedding (другой воркер мог успеть обработать новую версию).
+    CONN.executemany(
+        '''
+        INSERT INTO block_embeddings (block_id, author_id, article_id, article_title, plain_text, embedding, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?::vector, ?)
+        ON CONFLICT (block_id) DO UPDATE
+        SET author_id = EXCLUDED.author_id,
+            article_id = EXCLUDED.article_id,
+            article_title = EXCLUDED.article_title,
+            plain_text = EXCLUDED.plain_text,
+            embedding = EXCLUDED.embedding,
+            updated_at = EXCLUDED.updated_at,
+            change_xid = pg_current_xact_id()
+        WHERE block_embeddings.updated_at <= EXCLUDED.updated_at
+        ''',
+        [
+            (
+                job['block_id'],
+                job['author_id'],
+                job['article_id'],
+                job.get('article_title') or '',
+                text,
+                _vector_param(vec),
+                job['updated_at'],
+            )
+            for job, text, vec in results
+        ],
+    )
+
+
+def _finish_embedding_jobs(jobs: list[dict[str, Any]]) -> None:
+    if not jobs:
+        return
+    # Задача удаляется только если её не переставили (rev не изменился); иначе просто снимаем аренду.
+    CONN.executemany(
+        'DELETE FROM embedding_jobs WHERE block_id = ? AND rev = ?',
+        [(j['block_id'], j['rev']) for j in jobs],
+    )
+    CONN.executemany(
+        'UPDATE embedding_jobs SET locked_until = NULL WHERE block_id = ?',
+        [(j['block_id'],) for j in jobs],
+    )
+
+
+def _retry_delay_seconds(attempts: int) -> int:
+    return min(3600, 15 * (2 ** attempts))
+
+
+def _fail_embedding_jobs(jobs: list[dict[str, Any]], exc: Exception) -> None:
+    now_dt = datetime.utcnow()
+    error = repr(exc)[:500]
+    dropped = 0
+    with CONN:
+        for job in jobs:
+            attempts = int(job.get('attempts') or 0) + 1
+            if attempts >= EMBEDDING_JOBS_MAX_ATTEMPTS:
+                gone = CONN.execute(
+                    'DELETE FROM embedding_jobs WHERE block_id = ? AND rev = ? RETURNING block_id',
+                    (job['block_id'], job['rev']),
+                ).fetchall()
+                dropped += len(gone)
+            else:
+                delay = _retry_delay_seconds(attempts)
+                CONN.execute(
+                    '''
+                    UPDATE embedding_jobs
+                    SET attempts = ?, not_before = ?, last_error = ?
+                    WHERE block_id = ? AND rev = ?
+                    ''',
+                    (attempts, (now_dt + timedelta(seconds=delay)).isoformat(), error, job['block_id'], job['rev']),
+                )
+            CONN.execute('UPDATE embedding_jobs SET locked_until = NULL WHERE block_id = ?', (job['block_id'],))
+    if dropped:
+        logger.warning('embedding_jobs: dropped %s job(s) after %s attempts: %s', dropped, EMBEDDING_JOBS_MAX_ATTEMPTS, error)
+    with _EMBEDDING_JOBS_STATS_LOCK:
+        EMBEDDING_JOBS_STATS['failed'] += len(jobs)
+        EMBEDDING_JOBS_STATS['dropped'] += dropped
+        EMBEDDING_JOBS_STATS['lastError'] = error
+
+
+def _process_embedding_jobs(jobs: list[dict[str, Any]]) -> None:
+    empty: list[dict[str, Any]] = []
+    pending: list[tuple[dict[str, Any], str]] = []
+    for job in jobs:
+        text = _build_section_embedding_text(job.get('plain_text') or '')
+        if text:
+            pending.append((job, text))
+        else:
+            empty.append(job)
+
+    results: list[tuple[dict[str, Any], str, np.ndarray | None]] = []
+    if pending:
+        try:
+            vectors = embed_text_batch([text for _, text in pending])
+            results = [(job, text, vec) for (job, text), vec in zip(pending, vectors)]
+        except EmbeddingInputUnsupported:
+            # Один неподдерживаемый текст не должен валить весь батч — досчитываем по одному.
+            for job, text in pending:
+                try:
+                    results.append((job, text, embed_text(text)))
+                except EmbeddingInputUnsupported:
+                    results.append((job, text, None))
+                except Exception as exc:  # noqa: BLE001
+                    _fail_embedding_jobs([job], exc)
+        except Exception as exc:  # noqa: BLE001
+            _fail_embedding_jobs([job for job, _ in pending], exc)
+
+    with CONN:
+        # Пустые и неподдерживаемые секции не индексируем.
+        unsupported = empty + [job for job, _, vec in results if vec is None]
+        if unsupported:
+            CONN.execute(
+                'DELETE FROM block_embeddings WHERE block_id = ANY(?)',
+                ([j['block_id'] for j in unsupported],),
+            )
+        _write_block_embeddings([(job, text, vec) for job, text, vec in results if vec is not None])
+        _finish_embedding_jobs(unsupported + [job for job, _, vec in results if vec is not None])
+        # Статьи с новыми embeddings снова попадают в ленту /api/sync/changes.
+        touched_articles = sorted(
+            {j['article_id'] for j in unsupported} | {j['article_id'] for j, _, vec in results if vec is not None}
+        )
+        if touched_articles:
+            CONN.execute(
+                'UPDATE articles SET change_xid = pg_current_xact_id() WHERE id = ANY(?)',
+                (touched_articles,),
+            )
+            # Статьи без вектора заголовка (новые или проиндексированные до article_embeddings) получают его.
+            mark_article_title_embeddings(touched_articles)
+    with _EMBEDDING_JOBS_STATS_LOCK:
+        EMBEDDING_JOBS_STATS['processed'] += len(empty) + len(results)
+        EMBEDDING_JOBS_STATS['batches'] += 1
+        EMBEDDING_JOBS_STATS['lastBatchAt'] = _iso_now()
+
+
+def run_embedding_jobs_once(*, limit: int | None = None, ignore_debounce: bool = False) -> int:
+    """
+    Один проход воркера: берёт до `limit` готовых задач и считает их одним батчем, затем — помеченные заголовки.
+    Возвращает число обработанных задач и заголовков.
+    """
+    jobs = _claim_embedding_jobs(limit or EMBEDDING_JOBS_BATCH_SIZE, ignore_debounce=ignore_debounce)
+    if jobs:
+        _process_embedding_jobs(jobs)
+    return len(jobs) + run_title_embeddings_once(limit=limit)
+
+
+def mark_article_title_embeddings(article_ids: Iterable[str], *, force: bool = False) -> int:
+    """
+    Помечает вектор заголовка статьи к пересчёту, если заголовок в article_embeddings устарел или вектора нет.
+    force=True — пометить все (переиндексация; неизменённые заголовки отдаст кэш embeddings). Возвращает число статей.
+    """
+    ids = sorted({str(aid) for aid in (article_ids or []) if aid})
+    if not ids:
+        return 0
+    rows = CONN.execute(
+        '''
+        INSERT INTO article_embeddings (article_id, author_id, title, pending, updated_at)
+        SELECT id, author_id, COALESCE(title, ''), TRUE, ?
+        FROM articles
+        WHERE id = ANY(?)
+        ON CONFLICT (article_id) DO UPDATE
+        SET author_id = EXCLUDED.author_id,
+            title = EXCLUDED.title,
+            pending = TRUE,
+            attempts = 0,
+            not_before = '',
+            updated_at = EXCLUDED.updated_at
+        WHERE ? OR article_embeddings.title <> EXCLUDED.title
+        RETURNING article_id
+        ''',
+        (_iso_now(), ids, bool(force)),
+    ).fetchall()
+    return len(rows or [])
+
+
+_ARTICLE_EMBEDDINGS_AVAILABLE = False
+
+
+def _article_embeddings_available() -> bool:
+    # Таблица создаётся вместе с block_embeddings (_ensure_pgvector) на старте; без pgvector её нет.
+    # Запоминаем только положительный ответ: воркер мог спросить раньше, чем _ensure_pgvector создал таблицу.
+    global _ARTICLE_EMBEDDINGS_AVAILABLE
+    if not _ARTICLE_EMBEDDINGS_AVAILABLE:
+        row = CONN.execute("SELECT to_regclass('article_embeddings') IS NOT NULL AS ok").fetchone()
+        _ARTICLE_EMBEDDINGS_AVAILABLE = bool(row and row.get('ok'))
+    return _ARTICLE_EMBEDDINGS_AVAILABLE
+
+
+def _claim_title_embeddings(limit: int) -> list[dict[str, Any]]:
+    if not _article_embeddings_available():
+        return []
+    now_dt = datetime.utcnow()
+    now = now_dt.isoformat()
+    lease_until = (now_dt + timedelta(seconds=max(30, EMBEDDING_JOBS_LEASE_SECONDS))).isoformat()
+    with CONN:
+        rows = CONN.execute(
+            '''
+            UPDATE article_embeddings
+            SET locked_until = ?
+            WHERE article_id IN (
+                SELECT article_id
+                FROM article_embeddings
+                WHERE pending AND not_before <= ? AND (locked_until IS NULL OR locked_until < ?)
+                ORDER BY updated_at
+                LIMIT ?
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING article_id, title, attempts
+            ''',
+            (lease_until, now, now, max(1, int(limit))),
+        ).fetchall()
+    return [dict(r) for r in rows or []]
+
+
+def _fail_title_embeddings(claimed: list[dict[str, Any]], exc: Exception) -> None:
+    now_dt = datetime.utcnow()
+    error = repr(exc)[:500]
+    CONN.executemany(
+        'UPDATE article_embeddings SET attempts = ?, not_before = ?, locked_until = NULL WHERE article_id = ?',
+        [
+            (
+                attempts,
+                (now_dt + timedelta(seconds=_retry_delay_seconds(attempts))).isoformat(),
+                row['article_id'],
+            )
+            for row in claimed
+            for attempts in [int(row.get('attempts') or 0) + 1]
+        ],
+    )
+    logger.warning('article_embeddings: %s title(s) postponed: %s', len(claimed), error)
+    with _EMBEDDING_JOBS_STATS_LOCK:
+        EMBEDDING_JOBS_STATS['failed'] += len(claimed)
+        EMBEDDING_JOBS_STATS['lastError'] = error
+
+
+def run_title_embeddings_once(*, limit: int | None = None) -> int:
+    """
+    Пересчитывает векторы помеченных заголовков: по одному входу embeddings на уникальный заголовок.
+    Если заголовок успели сменить ещё раз, строка остаётся pending до следующего прохода.
+    Ошибка провайдера откладывает заголовки с той же экспоненциальной задержкой, что и embedding_jobs.
+    """
+    claimed = _claim_title_embeddings(limit or EMBEDDING_JOBS_BATCH_SIZE)
+    if not claimed:
+        return 0
+    texts = list(dict.fromkeys(t for t in ((r.get('title') or '').strip() for r in claimed) if t))
+    vectors: dict[str, np.ndarray] = {}
+    try:
+        if texts:
+            try:
+                vectors = dict(zip(texts, embed_text_batch(texts)))
+            except EmbeddingInputUnsupported:
+                for text in texts:
+                    try:
+                        vectors[text] = embed_text(text)
+                    except EmbeddingInputUnsupported:
+                        pass
+    except Exception as exc:  # noqa: BLE001
+        _fail_title_embeddings(claimed, exc)
+        return 0
+    # Пустой/неподдерживаемый заголовок — вектора нет, поиск ранжирует такие секции только по тексту.
+    CONN.executemany(
+        '''
+        UPDATE article_embeddings
+        SET embedding = CASE WHEN title = ? THEN ?::vector ELSE embedding END,
+            pending = title <> ?,
+            attempts = 0,
+            not_before = '',
+            locked_until = NULL
+        WHERE article_id = ?
+        ''',
+        [
+            (
+                row['title'],
+                _vector_param(vectors[key]) if key in vectors else None,
+                row['title'],
+                row['article_id'],
+            )
+            for row in claimed
+            for key in [(row.get('title') or '').strip()]
+        ],
+    )
+    # Новый вектор заголовка уходит офлайн-клиентам через ленту /api/sync/changes, как и векторы секций.
+    CONN.execute(
+        'UPDATE articles SET change_xid = pg_current_xact_id() WHERE id = ANY(?)',
+        (sorted({row['article_id'] for row in claimed}),),
+    )
+    return len(claimed)
+
+
+def get_embedding_queue_stats() -> dict[str, Any]:
+    now_dt = datetime.utcnow()
+    row = CONN.execute(
+        '''
+        SELECT
+            COUNT(*) AS depth,
+            COUNT(*) FILTER (WHERE not_before <= ?) AS ready,
+            COUNT(*) FILTER (WHERE attempts > 0) AS retrying,
+            MIN(enqueued_at) AS oldest
+        FROM embedding_jobs
+        ''',
+        (now_dt.isoformat(),),
+    ).fetchone() or {}
+    lag_seconds = 0.0
+    oldest = row.get('oldest')
+    if oldest:
+        try:
+            lag_seconds = max(0.0, (now_dt - datetime.fromisoformat(str(oldest))).total_seconds())
+        except Exception:
+            lag_seconds = 0.0
+    with _EMBEDDING_JOBS_STATS_LOCK:
+        stats = dict(EMBEDDING_JOBS_STATS)
+    with _EMBEDDING_WORKERS_LOCK:
+        workers_alive = sum(1 for t in _EMBEDDING_WORKER_THREADS if t.is_alive())
+    return {
+        'depth': int(row.get('depth') or 0),
+        'ready': int(row.get('ready') or 0),
+        'retrying': int(row.get('retrying') or 0),
+        'oldestEnqueuedAt': oldest,
+        'lagSeconds': lag_seconds,
+        'workers': workers_alive,
+        'batcher': get_embedding_batcher_stats(),
+        'cache': get_embedding_cache_stats(),
+        **stats,
+    }
+
+
+def kick_embedding_workers() -> None:
+    """
+    Пул фоновых воркеров embedding_jobs. Задачи лежат в БД, поэтому переживают рестарт;
+    несколько процессов uvicorn делят очередь через FOR UPDATE SKIP LOCKED.
+    """
+    if EMBEDDING_WORKERS <= 0:
+        return
+    with _EMBEDDING_WORKERS_LOCK:
+        _EMBEDDING_WORKER_THREADS[:] = [t for t in _EMBEDDING_WORKER_THREADS if t.is_alive()]
+
+        def _runner() -> None:
+            while True:
+                try:
+                    processed = run_embedding_jobs_once()
+                except Exception as exc:  # noqa: BLE001
+                    logger.error('embedding_jobs: worker loop error: %r', exc)
+                    processed = 0
+                if not processed:
+                    time.sleep(max(0.1, EMBEDDING_JOBS_POLL_SECONDS))
+
+        for idx in range(len(_EMBEDDING_WORKER_THREADS), EMBEDDING_WORKERS):
+            thread = threading.Thread(target=_runner, name=f'embedding-jobs-{idx}', daemon=True)
+            thread.start()
+            _EMBEDDING_WORKER_THREADS.append(thread)
+
+
 def upsert_embeddings_for_block_tree(
     *,
     author_id: str,
@@ -651,26 +1129,81 @@ def upsert_embeddings_for_block_tree(
     _walk(blocks)
 
 
+def get_semantic_title_weight() -> float:
+    """Вес близости заголовка в score; тот же вес офлайн-клиент получает вместе с вектором запроса."""
+    return min(1.0, max(0.0, SEMANTIC_TITLE_WEIGHT))
+
+
 def search_similar_blocks(*, author_id: str, query: str, limit: int = 30) -> List[dict[str, Any]]:
     q = (query or '').strip()
     if not q:
         return []
     vec = embed_text(q)
-    vec_lit = _vector_literal(vec)
+    vec_lit = _vector_param(vec)
+    title_weight = get_semantic_title_weight()
+    # Кандидаты выбираются по индексам (ORDER BY ... <=> константа), итоговый score — взвешенная сумма.
+    # Нет вектора заголовка (пустой заголовок, ещё не посчитан) — вместо него берётся близость секции.
     rows = CONN.execute(
         '''
+        WITH content_hits AS (
+            SELECT block_id
+            FROM block_embeddings
+            WHERE author_id = ?
+            ORDER BY embedding <=> ?::vector
+            LIMIT ?
+        ),
+        title_hits AS (
+            SELECT article_id
+            FROM article_embeddings
+            WHERE author_id = ? AND embedding IS NOT NULL
+            ORDER BY embedding <=> ?::vector
+            LIMIT ?
+        ),
+        candidates AS (
+            SELECT block_id FROM content_hits
+            UNION
+            SELECT be.block_id
+            FROM block_embeddings be
+            JOIN title_hits th ON th.article_id = be.article_id
+            WHERE be.author_id = ?
+        ),
+        scored AS (
+            SELECT
+                be.block_id,
+                be.article_id,
+                be.article_title,
+                be.plain_text,
+                1 - (be.embedding <=> ?::vector) AS content_score,
+                1 - (ae.embedding <=> ?::vector) AS title_score
+            FROM candidates c
+            JOIN block_embeddings be ON be.block_id = c.block_id
+            LEFT JOIN article_embeddings ae ON ae.article_id = be.article_id
+        )
         SELECT
-            block_id AS "blockId",
-            article_id AS "articleId",
-            article_title AS "articleTitle",
-            plain_text AS "blockText",
-            (1 - (embedding <=> ?::vector)) AS score
-        FROM block_embeddings
-        WHERE author_id = ?
-        ORDER BY embedding <=> ?::vector
+            s.block_id AS "blockId",
+            s.article_id AS "articleId",
+            COALESCE(a.title, s.article_title) AS "articleTitle",
+            s.plain_text AS "blockText",
+            (1 - ?) * s.content_score + ? * COALESCE(s.title_score, s.content_score) AS score
+        FROM scored s
+        LEFT JOIN articles a ON a.id = s.article_id
+        ORDER BY score DESC
         LIMIT ?
         ''',
-        (vec_lit, author_id, vec_lit, int(limit)),
+        (
+            author_id,
+            vec_lit,
+            max(int(limit), SEMANTIC_CANDIDATES),
+            author_id,
+            vec_lit,
+            max(0, SEMANTIC_TITLE_CANDIDATES),
+            author_id,
+            vec_lit,
+            vec_lit,
+            title_weight,
+            title_weight,
+            int(limit),
+        ),
     ).fetchall()
     results: List[dict[str, Any]] = []
     for row in rows or []:
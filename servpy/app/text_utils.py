@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import functools
 import html
 import inspect
+import logging
+import os
 import re
+from typing import NamedTuple
 
 if not hasattr(inspect, 'getargspec'):
     def _getargspec(func):
@@ -16,6 +20,21 @@ import pymorphy2
 WORD_REGEX = re.compile(r'[A-Za-zА-Яа-яЁё]+')
 MORPH = pymorphy2.MorphAnalyzer()
 
+logger = logging.getLogger('uvicorn.error')
+
+# Кэш token -> lemma: словарь живого текста невелик, а разбор pymorphy2 — самая дорогая часть индексации.
+LEMMA_CACHE_SIZE = int(os.environ.get('SERVPY_LEMMA_CACHE_SIZE') or '200000')
+# Необязательный частотный словарь для прогрева (по слову в строке, допускается "слово<TAB>частота").
+LEMMA_CACHE_WARMUP_PATH = os.environ.get('SERVPY_LEMMA_CACHE_WARMUP_PATH') or ''
+LEMMA_CACHE_WARMUP_LIMIT = int(os.environ.get('SERVPY_LEMMA_CACHE_WARMUP_LIMIT') or '50000')
+
+
+class TextAnalysis(NamedTuple):
+    tokens: list[str]
+    normalized: str
+    lemma_tokens: list[str]
+    lemma: str
+
 
 def strip_html(text: str = '') -> str:
     cleaned = re.sub(r'<[^>]+>', ' ', text or '')
@@ -28,29 +47,66 @@ def tokenize(text: str = '') -> list[str]:
     return [match.group(0) for match in WORD_REGEX.finditer(lowered)]
 
 
+@functools.lru_cache(maxsize=max(1, LEMMA_CACHE_SIZE))
+def lemmatize_token(token: str) -> str:
+    try:
+        return MORPH.parse(token)[0].normal_form
+    except Exception:
+        # Be resilient: never fail the whole save/indexing due to a single bad token/parser edge case.
+        return token
+
+
+def analyze(text: str = '') -> TextAnalysis:
+    """Токенизирует текст один раз и возвращает нормализованные токены и леммы вместе."""
+    tokens = tokenize(text)
+    lemma_tokens = [lemmatize_token(token) for token in tokens]
+    return TextAnalysis(tokens, ' '.join(tokens), lemma_tokens, ' '.join(lemma_tokens))
+
+
+def analyze_many(texts: list[str]) -> list[tuple[str, str]]:
+    """(lemma, normalized) для пачки текстов; функция модульного уровня — годится для ProcessPoolExecutor."""
+    out: list[tuple[str, str]] = []
+    for text in texts:
+        analysis = analyze(text)
+        out.append((analysis.lemma, analysis.normalized))
+    return out
+
+
 def build_normalized_tokens(text: str = '') -> str:
     tokens = tokenize(text)
     return ' '.join(tokens)
 
 
 def build_lemma(text: str = '') -> str:
-    tokens = tokenize(text)
-    out: list[str] = []
-    for token in tokens:
-        try:
-            out.append(MORPH.parse(token)[0].normal_form)
-        except Exception:
-            # Be resilient: never fail the whole save/indexing due to a single bad token/parser edge case.
-            out.append(token)
-    return ' '.join(out)
+    return analyze(text).lemma
 
 
 def build_lemma_tokens(text: str = '') -> list[str]:
-    tokens = tokenize(text)
-    out: list[str] = []
-    for token in tokens:
-        try:
-            out.append(MORPH.parse(token)[0].normal_form)
-        except Exception:
-            out.append(token)
-    return out
+    return analyze(text).lemma_tokens
+
+
+def get_lemma_cache_stats() -> dict[str, int]:
+    info = lemmatize_token.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxSize': info.maxsize or 0}
+
+
+def warm_lemma_cache(words_path: str, limit: int = LEMMA_CACHE_WARMUP_LIMIT) -> int:
+    """Прогревает кэш лемм первыми `limit` словами частотного списка. Возвращает число слов."""
+    count = 0
+    with open(words_path, encoding='utf-8') as fh:
+        for line in fh:
+            if count >= limit:
+                break
+            word = (line.split('\t', 1)[0].split(' ', 1)[0] or '').strip().lower()
+            if not word or not WORD_REGEX.fullmatch(word):
+                continue
+            lemmatize_token(word)
+            count += 1
+    return count
+
+
+if LEMMA_CACHE_WARMUP_PATH:
+    try:
+        warm_lemma_cache(LEMMA_CACHE_WARMUP_PATH)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning('Failed to warm lemma cache from %s: %r', LEMMA_CACHE_WARMUP_PATH, exc)
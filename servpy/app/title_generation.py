@@ -5,6 +5,7 @@ import re
 
 import httpx
 
+from .ai_http import get_provider_client
 from .embeddings import EmbeddingsUnavailable
 
 OPENAI_API_KEY = os.environ.get('SERVPY_OPENAI_API_KEY') or os.environ.get('OPENAI_API_KEY') or ''
@@ -14,23 +15,6 @@ OUTLINE_TITLE_TIMEOUT_SECONDS = float(os.environ.get('SERVPY_OUTLINE_TITLE_TIMEO
 OUTLINE_PROOFREAD_MODEL = os.environ.get('SERVPY_OUTLINE_PROOFREAD_MODEL') or 'gpt-4o-mini'
 OUTLINE_PROOFREAD_TIMEOUT_SECONDS = float(os.environ.get('SERVPY_OUTLINE_PROOFREAD_TIMEOUT_SECONDS') or '25')
 
-HTTP_PROXY = os.environ.get('SERVPY_HTTP_PROXY') or os.environ.get('HTTP_PROXY') or ''
-HTTPS_PROXY = os.environ.get('SERVPY_HTTPS_PROXY') or os.environ.get('HTTPS_PROXY') or ''
-ALL_PROXY = os.environ.get('SERVPY_ALL_PROXY') or os.environ.get('ALL_PROXY') or ''
-
-
-def _httpx_proxies() -> str | dict | None:
-    if ALL_PROXY:
-        return ALL_PROXY
-    if HTTP_PROXY or HTTPS_PROXY:
-        proxies: dict[str, str] = {}
-        if HTTP_PROXY:
-            proxies['http://'] = HTTP_PROXY
-        if HTTPS_PROXY:
-            proxies['https://'] = HTTPS_PROXY
-        return proxies
-    return None
-
 
 def _clean_title(title: str) -> str:
     t = (title or '').strip()
@@ -78,14 +62,13 @@ def generate_outline_title_ru(*, body_text: str) -> str:
         'max_tokens': 120,
     }
     try:
-        with httpx.Client(timeout=OUTLINE_TITLE_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-            resp = client.post(
-                url,
-                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
-                json=payload,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        resp = get_provider_client('openai').post(
+            url,
+            timeout=OUTLINE_TITLE_TIMEOUT_SECONDS,
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
+            json=payload,
+        )
+        data = resp.json()
     except httpx.HTTPError as exc:
         raise EmbeddingsUnavailable(f'OpenAI title недоступен: {exc!r}') from exc
     except Exception as exc:  # noqa: BLE001
@@ -159,14 +142,13 @@ def proofread_outline_html_ru(*, html: str) -> str:
         'max_tokens': 4000,
     }
     try:
-        with httpx.Client(timeout=OUTLINE_PROOFREAD_TIMEOUT_SECONDS, proxies=_httpx_proxies()) as client:
-            resp = client.post(
-                url,
-                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
-                json=payload,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        resp = get_provider_client('openai').post(
+            url,
+            timeout=OUTLINE_PROOFREAD_TIMEOUT_SECONDS,
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {OPENAI_API_KEY}'},
+            json=payload,
+        )
+        data = resp.json()
     except httpx.HTTPError as exc:
         raise EmbeddingsUnavailable(f'OpenAI proofread недоступен: {exc!r}') from exc
     except Exception as exc:  # noqa: BLE001
@@ -38,8 +38,18 @@ def app_env(monkeypatch, tmp_path_factory):
     if not test_db_url:
         pytest.skip('SERVPY_TEST_DATABASE_URL is required for server tests (to avoid wiping a real DB)')
     monkeypatch.setenv('SERVPY_DATABASE_URL', test_db_url)
+    # Every test re-imports the app; background embedding workers would pile up connections.
+    # Tests drain the queue explicitly via run_embedding_jobs_once().
+    monkeypatch.setenv('SERVPY_EMBEDDING_WORKERS', '0')
+    # То же для LISTEN-слушателя кэша сессий: каждый держал бы своё выделенное соединение.
+    monkeypatch.setenv('SERVPY_SESSION_CACHE_LISTENER', '0')
 
     db, data_store, main = _load_app()
+    # Вложения из тестов пишем во временный каталог, а не в uploads/ рабочего дерева.
+    uploads_dir = tmp_path_factory.mktemp('uploads')
+    for name, mod in list(sys.modules.items()):
+        if name.startswith('servpy.app') and hasattr(mod, 'UPLOADS_DIR'):
+            monkeypatch.setattr(mod, 'UPLOADS_DIR', uploads_dir)
     # main imports seed sample data; wipe to keep tests isolated
     for table in (
         'attachments',
@@ -47,6 +57,10 @@ def app_env(monkeypatch, tmp_path_factory):
         'outline_sections_fts',
         'articles_fts',
         'block_embeddings',
+        'article_embeddings',
+        'embedding_jobs',
+        'search_rebuild_state',
+        'embedding_cache',
         'article_links',
         'article_versions',
         'applied_ops',
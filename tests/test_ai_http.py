@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import base64
+import importlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+
+class _FakeProvider:
+  """Локальный сервер с API в стиле OpenAI: считает соединения, запросы и пиковую параллельность."""
+
+  def __init__(self) -> None:
+    self.statuses: list[int] = []
+    self.delay = 0.0
+    self.poison = ''
+    self.requests = 0
+    self.connections = 0
+    self.in_flight = 0
+    self.max_in_flight = 0
+    self.lock = threading.Lock()
+    fake = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+
+      def setup(self):
+        super().setup()
+        with fake.lock:
+          fake.connections += 1
+
+      def log_message(self, *args):
+        pass
+
+      def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        with fake.lock:
+          fake.requests += 1
+          fake.in_flight += 1
+          fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+          status = fake.statuses.pop(0) if fake.statuses else 200
+        time.sleep(fake.delay)
+        if fake.poison and any(fake.poison in text for text in body.get('input') or []):
+          status = 400
+          payload = {'error': {'message': 'bad input', 'code': 'invalid_encrypted_content'}}
+        elif status != 200:
+          payload = {'error': {'message': 'try later'}}
+        elif self.path.endswith('/embeddings'):
+          embedding = [1.0, 0.0, 0.0]
+          if body.get('encoding_format') == 'base64':
+            embedding = base64.b64encode(np.asarray(embedding, dtype='<f4').tobytes()).decode('ascii')
+          payload = {'data': [{'index': i, 'embedding': embedding} for i, _ in enumerate(body['input'])]}
+        else:
+          payload = {'choices': [{'message': {'content': 'Заголовок'}}]}
+        raw = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        if status == 429:
+          self.send_header('Retry-After', '0')
+        self.end_headers()
+        self.wfile.write(raw)
+        with fake.lock:
+          fake.in_flight -= 1
+
+    self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    self.url = f'http://127.0.0.1:{self.server.server_address[1]}/v1'
+    self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    self.thread.start()
+
+  def close(self) -> None:
+    self.server.shutdown()
+    self.server.server_close()
+
+
+@pytest.fixture()
+def provider(monkeypatch):
+  ai_http = importlib.import_module('servpy.app.ai_http')
+  fake = _FakeProvider()
+  monkeypatch.setattr(ai_http, 'AI_HTTP_BACKOFF_SECONDS', 0.0)
+  for name in ('embeddings', 'rag_summary', 'title_generation'):
+    module = importlib.import_module(f'servpy.app.{name}')
+    monkeypatch.setattr(module, 'OPENAI_API_KEY', 'test-key')
+    monkeypatch.setattr(module, 'OPENAI_BASE_URL', fake.url)
+  monkeypatch.setattr(importlib.import_module('servpy.app.embeddings'), 'EMBEDDING_DIM', 3)
+  # Считаем запросы к провайдеру — кэш embeddings (БД) здесь не участвует.
+  monkeypatch.setattr(importlib.import_module('servpy.app.embeddings'), 'EMBEDDING_CACHE_MAX_ROWS', 0)
+  ai_http.close_provider_clients()
+  yield fake
+  ai_http.close_provider_clients()
+  fake.close()
+
+
+def test_embedding_calls_reuse_one_pooled_connection(provider):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  ai_http = importlib.import_module('servpy.app.ai_http')
+
+  for i in range(5):
+    vectors = embeddings.embed_texts([f'text {i}', 'other'])
+    assert all(v.dtype == np.float32 for v in vectors)
+    assert [v.tolist() for v in vectors] == [[1.0, 0.0, 0.0], [1.0, 0.0, 0.0]]
+
+  assert provider.requests == 5
+  assert provider.connections == 1
+  stats = ai_http.get_provider_http_stats()['openai']
+  assert stats['requests'] == 5 and stats['errors'] == 0 and stats['p95Ms'] >= 0
+
+
+def test_provider_retries_429_and_5xx(provider):
+  title_generation = importlib.import_module('servpy.app.title_generation')
+  ai_http = importlib.import_module('servpy.app.ai_http')
+  provider.statuses = [429, 503]
+
+  assert title_generation.generate_outline_title_ru(body_text='Текст заметки') == 'Заголовок'
+  assert provider.requests == 3
+  assert ai_http.get_provider_http_stats()['openai']['retries'] == 2
+
+
+def test_provider_gives_up_after_retries(provider, monkeypatch):
+  rag_summary = importlib.import_module('servpy.app.rag_summary')
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  ai_http = importlib.import_module('servpy.app.ai_http')
+  monkeypatch.setattr(ai_http, 'AI_HTTP_RETRIES', 1)
+  provider.statuses = [500, 500, 500]
+
+  with pytest.raises(embeddings.EmbeddingsUnavailable):
+    rag_summary.summarize_search_results(query='q', results=[{'type': 'block', 'blockText': 'Текст'}])
+  assert provider.requests == 2
+
+
+def test_provider_concurrency_is_bounded(provider, monkeypatch):
+  title_generation = importlib.import_module('servpy.app.title_generation')
+  monkeypatch.setenv('SERVPY_AI_CONCURRENCY_OPENAI', '2')
+  provider.delay = 0.05
+
+  threads = [
+    threading.Thread(target=title_generation.generate_outline_title_ru, kwargs={'body_text': f'Текст {i}'})
+    for i in range(6)
+  ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert provider.requests == 6
+  assert provider.max_in_flight <= 2
+
+
+def test_concurrent_embed_calls_share_one_request(provider, monkeypatch):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  batcher = embeddings.EmbeddingBatcher(embeddings._request_embeddings, 0.2, 2)
+  monkeypatch.setattr(embeddings, '_EMBEDDING_BATCHER', batcher)
+  results: dict[int, list] = {}
+
+  def call(i: int) -> None:
+    results[i] = [v.tolist() for v in embeddings.embed_texts([f't{i % 4}'])]
+
+  threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert results == {i: [[1.0, 0.0, 0.0]] for i in range(8)}
+  assert provider.requests == 1
+  stats = batcher.stats()
+  assert stats['batches'] == 1 and stats['texts'] == 8 and stats['sentTexts'] == 4
+
+
+def test_batcher_splits_by_item_and_token_limits(provider, monkeypatch):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  batcher = embeddings.EmbeddingBatcher(embeddings._request_embeddings, 0.05, 2)
+  monkeypatch.setattr(embeddings, '_EMBEDDING_BATCHER', batcher)
+  monkeypatch.setattr(embeddings, 'EMBEDDINGS_API_BATCH_SIZE', 3)
+
+  assert len(embeddings.embed_texts([f'text {i}' for i in range(7)])) == 7
+  assert provider.requests == 3
+
+  monkeypatch.setattr(embeddings, 'EMBEDDING_BATCH_MAX_TOKENS', 30)
+  assert len(embeddings.embed_texts(['слово ' * 20, 'коротко', 'слово ' * 20])) == 3
+  # Длинные тексты (~55 токенов) превышают лимит — каждый уходит отдельным запросом.
+  assert provider.requests == 6
+  assert batcher.stats()['maxBatch'] == 3
+
+
+def test_rejected_input_fails_only_its_own_future(provider, monkeypatch):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  batcher = embeddings.EmbeddingBatcher(embeddings._request_embeddings, 0.2, 2)
+  monkeypatch.setattr(embeddings, '_EMBEDDING_BATCHER', batcher)
+  provider.poison = 'poison'
+  texts = ['ok 1', 'poison', 'ok 2', 'ok 3']
+  results: dict[str, object] = {}
+
+  def call(text: str) -> None:
+    try:
+      results[text] = [v.tolist() for v in embeddings.embed_texts([text])]
+    except embeddings.EmbeddingInputUnsupported:
+      results[text] = 'unsupported'
+
+  threads = [threading.Thread(target=call, args=(text,)) for text in texts]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert results == {
+    'ok 1': [[1.0, 0.0, 0.0]],
+    'poison': 'unsupported',
+    'ok 2': [[1.0, 0.0, 0.0]],
+    'ok 3': [[1.0, 0.0, 0.0]],
+  }
+  # Один общий батч, затем деление пополам: не больше 1 + 2 + 2 запросов.
+  assert provider.requests <= 5
+
+
+def test_embed_texts_gives_up_on_stuck_batch(monkeypatch):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  release = threading.Event()
+  batcher = embeddings.EmbeddingBatcher(lambda texts: release.wait(5) and [], 0.0, 1)
+  monkeypatch.setattr(embeddings, '_EMBEDDING_BATCHER', batcher)
+  monkeypatch.setattr(embeddings, 'EMBEDDING_CACHE_MAX_ROWS', 0)
+  monkeypatch.setattr(embeddings, 'EMBEDDING_RESULT_TIMEOUT_SECONDS', 0.1)
+  started = time.monotonic()
+  try:
+    with pytest.raises(embeddings.EmbeddingsUnavailable):
+      embeddings.embed_texts(['stuck'])
+    assert time.monotonic() - started < 2
+  finally:
+    release.set()
+
+
+def test_embed_text_batch_averages_chunks_and_normalizes(monkeypatch):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  monkeypatch.setattr(embeddings, 'EMBEDDING_DIM', 3)
+  monkeypatch.setattr(embeddings, 'EMBEDDING_MAX_CHARS', 5)
+  monkeypatch.setattr(embeddings, 'EMBEDDING_CHUNK_OVERLAP_CHARS', 0)
+  chunk_vectors = {'aaaa': [3.0, 0.0, 0.0], 'bbbb': [0.0, 4.0, 0.0], 'cccc': [0.0, 0.0, 2.0]}
+  monkeypatch.setattr(
+    embeddings, 'embed_texts', lambda texts: [np.asarray(chunk_vectors[t], dtype=np.float32) for t in texts]
+  )
+
+  out = embeddings.embed_text_batch(['aaaa\n\nbbbb', '', 'cccc'])
+  assert out.dtype == np.float32 and out.shape == (3, 3)
+  # Среднее чанков [1.5, 2, 0] после L2-нормализации; пустой текст — нулевой вектор.
+  assert np.allclose(out, [[0.6, 0.8, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+  assert np.allclose(embeddings.embed_text('cccc'), [0.0, 0.0, 1.0])
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
+import importlib
 import io
+import json
+import threading
+import time
+import zipfile
 from typing import List
 
 import pytest
@@ -13,6 +18,21 @@ def create_article(client: TestClient, title: str = 'Test article') -> dict:
     return resp.json()
 
 
+def upsert_section(client: TestClient, article_id: str, section_id: str, text: str = '', *, heading: str = '', seq: int = 1):
+    paragraph = {'type': 'paragraph', 'content': [{'type': 'text', 'text': text}]} if text else {'type': 'paragraph'}
+    resp = client.put(
+        f'/api/articles/{article_id}/sections/upsert-content',
+        json={
+            'sectionId': section_id,
+            'headingJson': {'type': 'outlineHeading', 'content': [{'type': 'text', 'text': heading}] if heading else []},
+            'bodyJson': {'type': 'outlineBody', 'content': [paragraph]},
+            'seq': seq,
+        },
+    )
+    assert resp.status_code == 200
+    return resp
+
+
 def test_create_and_read_article(client: TestClient):
     created = create_article(client)
     article_id = created['id']
@@ -30,6 +50,198 @@ def test_create_and_read_article(client: TestClient):
     assert article_id in ids
 
 
+def test_read_article_serves_stored_doc_json_verbatim(client: TestClient):
+    created = create_article(client)
+    article_id = created['id']
+    section = {
+        'type': 'outlineSection',
+        'attrs': {'id': 's1', 'collapsed': False},
+        'content': [
+            {'type': 'outlineHeading', 'content': [{'type': 'text', 'text': 'Привет'}]},
+            {'type': 'outlineBody', 'content': [{'type': 'paragraph'}]},
+            {'type': 'outlineChildren', 'content': []},
+        ],
+    }
+    resp = client.put(f'/api/articles/{article_id}/doc-json/save', json={'docJson': {'type': 'doc', 'content': [section]}})
+    assert resp.status_code == 200
+
+    row = client.app_db.execute(
+        'SELECT article_doc_json, doc_json_bytes, doc_json_hash FROM articles WHERE id = ?', (article_id,)
+    ).fetchone()
+    stored = row['article_doc_json']
+    assert row['doc_json_bytes'] == len(stored.encode('utf-8'))
+    assert row['doc_json_hash'] == client.data_store.doc_json_stats(stored)[1]
+
+    resp = client.get(f'/api/articles/{article_id}')
+    assert resp.status_code == 200
+    # Сохранённый текст вставляется в ответ без повторной сериализации.
+    assert stored.encode('utf-8') in resp.content
+    assert resp.json()['docJson']['content'][0]['attrs']['id'] == 's1'
+    assert resp.headers['X-Memus-DocJson-bytes'] == str(row['doc_json_bytes'])
+    etag = resp.headers['ETag']
+    assert client.get(f'/api/articles/{article_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    # Правка секции делает проекцию устаревшей; чтение материализует её вместе с размером и хэшем.
+    upsert_section(client, article_id, 's1', heading='Пока')
+    resp = client.get(f'/api/articles/{article_id}', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert 'Пока' in resp.text
+    row = client.app_db.execute(
+        'SELECT article_doc_json, doc_json_bytes, doc_json_hash, doc_json_stale FROM articles WHERE id = ?', (article_id,)
+    ).fetchone()
+    assert not row['doc_json_stale']
+    assert row['doc_json_hash'] == client.data_store.doc_json_stats(row['article_doc_json'])[1]
+
+
+def test_article_meta_answers_from_stored_columns(client: TestClient):
+    created = create_article(client)
+    article_id = created['id']
+
+    resp = client.get(f'/api/articles/{article_id}/meta')
+    assert resp.status_code == 200
+    meta = resp.json()
+    row = client.app_db.execute(
+        'SELECT updated_at, content_rev, doc_json_bytes FROM articles WHERE id = ?', (article_id,)
+    ).fetchone()
+    assert meta['updatedAt'] == row['updated_at']
+    assert meta['contentRev'] == row['content_rev']
+    assert meta['docJsonBytes'] == row['doc_json_bytes']
+    etag = resp.headers['ETag']
+    assert client.get(f'/api/articles/{article_id}/meta', headers={'If-None-Match': etag}).status_code == 304
+
+    # Любая запись статьи увеличивает content_rev; пока проекция устарела, размер неизвестен.
+    upsert_section(client, article_id, 'fresh')
+    resp = client.get(f'/api/articles/{article_id}/meta', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.json()['contentRev'] > meta['contentRev']
+    assert resp.json()['docJsonBytes'] is None
+
+    resp = client.patch(f'/api/articles/{article_id}', json={'title': 'Renamed'})
+    assert resp.status_code == 200
+    rev = client.get(f'/api/articles/{article_id}/meta').json()['contentRev']
+    assert rev > meta['contentRev'] + 1
+    assert client.get('/api/articles/missing/meta').status_code == 404
+    assert client.get('/api/articles/inbox/meta').json()['id'] == 'inbox'
+
+
+def _read_sync_changes(client: TestClient, cursor=None):
+    resp = client.get('/api/sync/changes', params={'cursor': cursor} if cursor else None)
+    assert resp.status_code == 200
+    assert resp.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in resp.text.splitlines() if line]
+    assert lines[-1]['type'] == 'cursor'
+    return lines[:-1], lines[-1]
+
+
+def test_sync_changes_feed_is_incremental(client: TestClient):
+    first = create_article(client)
+    second = create_article(client)
+
+    records, tail = _read_sync_changes(client)
+    articles = {r['id']: r for r in records if r['type'] == 'article'}
+    assert {first['id'], second['id']} <= set(articles)
+    assert articles[first['id']]['docJsonChanged'] is True
+    assert articles[first['id']]['docJson']['type'] == 'doc'
+    assert tail['hasMore'] is False
+
+    # Без изменений лента пустая, курсор не откатывается.
+    records, same = _read_sync_changes(client, tail['cursor'])
+    assert records == []
+    assert int(same['cursor']) >= int(tail['cursor'])
+
+    resp = client.patch(f"/api/articles/{first['id']}", json={'title': 'Renamed'})
+    assert resp.status_code == 200
+    resp = client.delete(f"/api/articles/{second['id']}", params={'force': 'true'})
+    assert resp.status_code == 200
+
+    records, tail = _read_sync_changes(client, same['cursor'])
+    assert [(r['type'], r.get('id') or r.get('articleId')) for r in records if r['type'] != 'embeddings'] == [
+        ('deleted', second['id']),
+        ('article', first['id']),
+    ]
+    assert records[0]['permanent'] is True
+    assert records[1]['title'] == 'Renamed'
+    assert _read_sync_changes(client, tail['cursor'])[0] == []
+    assert client.get('/api/sync/changes', params={'cursor': 'bogus'}).status_code == 400
+
+
+def test_sync_changes_pages_compare_against_client_watermark(client: TestClient, monkeypatch):
+    embeddings = importlib.import_module('servpy.app.embeddings')
+    first = create_article(client)['id']
+    second = create_article(client)['id']
+    third = create_article(client)['id']
+    _, tail = _read_sync_changes(client)
+    author_id = client.app_db.execute('SELECT author_id FROM articles WHERE id = ?', (first,)).fetchone()['author_id']
+
+    def edit(article_id: str, text: str) -> None:
+        upsert_section(client, article_id, f'sec-{article_id}', text)
+
+    # После водяного знака: у third меняется текст, у second появляется только embedding,
+    # затем правка first; после неё воркер embeddings поднимает change_xid у second и third.
+    edit(third, 'Third body')
+    vec = '[' + ','.join(['1'] + ['0'] * (embeddings.EMBEDDING_DIM - 1)) + ']'
+    client.app_db.execute(
+        'INSERT INTO block_embeddings (block_id, author_id, article_id, embedding, updated_at) VALUES (?, ?, ?, ?::vector, ?)',
+        ('sec-e', author_id, second, vec, '2026-01-01T00:00:00'),
+    )
+    edit(first, 'First body')
+    client.app_db.execute(
+        'UPDATE articles SET change_xid = pg_current_xact_id() WHERE id = ANY(?)', ([second, third],)
+    )
+
+    monkeypatch.setattr(client.data_store, 'SYNC_CHANGES_PAGE_SIZE', 1)
+    records: list = []
+    cursor = tail['cursor']
+    for _ in range(10):
+        page, tail = _read_sync_changes(client, cursor)
+        records.extend(page)
+        cursor = tail['cursor']
+        if not tail['hasMore']:
+            break
+    assert tail['hasMore'] is False
+
+    articles = {r['id']: r for r in records if r['type'] == 'article'}
+    assert [r['id'] for r in records if r['type'] == 'article'][0] == first
+    assert articles[first]['docJsonChanged'] is True
+    assert articles[third]['docJsonChanged'] is True
+    assert articles[second]['docJsonChanged'] is False
+    second_embeddings = [r for r in records if r['type'] == 'embeddings' and r['articleId'] == second]
+    assert [e['blockId'] for e in second_embeddings[0]['embeddings']] == ['sec-e']
+    assert _read_sync_changes(client, cursor)[0] == []
+
+
+def test_position_rebalance_is_a_structure_change_only(client: TestClient):
+    first = create_article(client)['id']
+    second = create_article(client)['id']
+    author_id = client.app_db.execute('SELECT author_id FROM articles WHERE id = ?', (first,)).fetchone()['author_id']
+    client.app_db.execute('UPDATE articles SET position = 0.5 WHERE id = ?', (first,))
+    client.app_db.execute('UPDATE articles SET position = 7.25 WHERE id = ?', (second,))
+    _, tail = _read_sync_changes(client)
+
+    def state():
+        return {
+            r['id']: r
+            for r in client.app_db.execute(
+                'SELECT id, position, content_rev, content_xid::text AS content_xid FROM articles WHERE id = ANY(?)',
+                ([first, second],),
+            ).fetchall()
+        }
+
+    before = state()
+    assert client.data_store.rebalance_article_positions(author_id, None) >= 2
+    after = state()
+    assert sorted(r['position'] for r in after.values()) == sorted({r['position'] for r in after.values()})
+    assert all(float(r['position']).is_integer() for r in after.values())
+    assert {k: (r['content_rev'], r['content_xid']) for k, r in after.items()} == {
+        k: (r['content_rev'], r['content_xid']) for k, r in before.items()
+    }
+
+    records, _ = _read_sync_changes(client, tail['cursor'])
+    changed = {r['id']: r for r in records if r['type'] == 'article'}
+    assert {first, second} <= set(changed)
+    assert not changed[first]['docJsonChanged'] and not changed[second]['docJsonChanged']
+
+
 def test_update_article_meta_and_not_found(client: TestClient):
     created = create_article(client)
     article_id = created['id']
@@ -94,10 +306,217 @@ def test_search_returns_block_and_article(client: TestClient):
     assert any(item.get('blockId') == section_id for item in results)
 
 
+def test_search_tables_carry_author_and_deleted_flag(client: TestClient):
+    article_id = create_article(client, title='Okapi notes')['id']
+    row = client.app_db.execute('SELECT author_id, deleted FROM articles_fts WHERE article_id = ?', (article_id,)).fetchone()
+    owner = client.app_db.execute('SELECT author_id FROM articles WHERE id = ?', (article_id,)).fetchone()
+    assert row['author_id'] == owner['author_id'] and row['deleted'] is False
+
+    def found() -> bool:
+        return any(item.get('articleId') == article_id for item in client.get('/api/search', params={'q': 'okapi'}).json())
+
+    assert found()
+    assert client.delete(f'/api/articles/{article_id}').status_code == 200
+    assert client.app_db.execute('SELECT deleted FROM articles_fts WHERE article_id = ?', (article_id,)).fetchone()['deleted']
+    assert not found()
+    assert client.post(f'/api/articles/{article_id}/restore').status_code == 200
+    assert found()
+
+
+def test_search_page_keyset_pagination(client: TestClient):
+    article_id = create_article(client, title='Paging')['id']
+    for i in range(5):
+        upsert_section(client, article_id, f'sec-page-{i}', f'Zebra number {i}', seq=i + 1)
+
+    seen: list = []
+    cursor = None
+    for _ in range(5):
+        params = {'q': 'zebra', 'type': 'blocks', 'limit': 2}
+        if cursor:
+            params['cursor'] = cursor
+        page = client.get('/api/search/page', params=params).json()
+        assert len(page['results']) <= 2
+        seen += [item['blockId'] for item in page['results']]
+        assert all('<b>' in item['snippet'] for item in page['results'])
+        cursor = page['nextCursor']
+        if not cursor:
+            break
+    assert sorted(seen) == [f'sec-page-{i}' for i in range(5)]
+    assert client.get('/api/search/page', params={'q': 'zebra', 'cursor': '!!'}).status_code == 400
+
+
+def test_search_fuzzy_mode_matches_typos(client: TestClient):
+    if not client.app_db.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").fetchone():
+        pytest.skip('pg_trgm is not installed')
+    article_id = create_article(client, title='Fuzzy')['id']
+    upsert_section(client, article_id, 'sec-fuzzy', 'Documentation migration plan')
+
+    def block_ids(q: str, mode: str) -> list:
+        page = client.get('/api/search/page', params={'q': q, 'type': 'blocks', 'mode': mode}).json()
+        return [item['blockId'] for item in page['results']]
+
+    assert 'sec-fuzzy' in block_ids('migration plan', 'fts')
+    assert 'sec-fuzzy' not in block_ids('migartion', 'fts')
+    assert 'sec-fuzzy' in block_ids('migartion', 'fuzzy')
+    assert client.get('/api/search', params={'q': 'plan', 'mode': 'bogus'}).status_code == 400
+
+
+def test_search_hybrid_returns_partial_results_when_semantic_is_slow(client: TestClient, monkeypatch):
+    article_id = create_article(client, title='Hybrid heron')['id']
+    upsert_section(client, article_id, 'sec-hybrid', 'Heron by the river')
+
+    def slow_semantic(*, author_id, query, limit):
+        time.sleep(0.5)
+        return [{'type': 'block', 'blockId': 'sec-hybrid', 'articleId': article_id}]
+
+    monkeypatch.setattr(client.data_store, 'search_similar_blocks', slow_semantic)
+    monkeypatch.setattr(client.data_store, 'HYBRID_SEARCH_SEMANTIC_TIMEOUT_SECONDS', 0.05)
+    started = time.monotonic()
+    body = client.get('/api/search/hybrid', params={'q': 'heron'}).json()
+    assert time.monotonic() - started < 0.45
+    assert body['partial'] is True
+    assert body['sources']['semantic']['status'] == 'timeout'
+    assert body['sources']['blocks']['status'] == 'ok'
+    keys = [(item['type'], item.get('blockId') or item.get('articleId')) for item in body['results']]
+    assert ('block', 'sec-hybrid') in keys and ('article', article_id) in keys
+
+    fused = client.data_store.fuse_search_results(
+        {
+            'blocks': [{'type': 'block', 'blockId': 'a', 'snippet': '<b>a</b>'}, {'type': 'block', 'blockId': 'b'}],
+            'semantic': [{'type': 'block', 'blockId': 'b'}, {'type': 'block', 'blockId': 'a', 'snippet': 'plain'}],
+        }
+    )
+    assert [item['blockId'] for item in fused] == ['a', 'b']
+    assert fused[0]['sources'] == ['blocks', 'semantic'] and len(fused) == 2
+    assert next(item for item in fused if item['blockId'] == 'a')['snippet'] == '<b>a</b>'
+
+
+def test_plain_search_does_not_queue_behind_semantic_tasks(client: TestClient, monkeypatch):
+    article_id = create_article(client, title='Lexical kingfisher')['id']
+    release = threading.Event()
+    # Semantic-пул забит «зависшими» задачами (медленный провайдер embeddings).
+    stuck = [
+        client.data_store._SEMANTIC_SEARCH_POOL.submit(release.wait, 5)
+        for _ in range(client.data_store.HYBRID_SEARCH_WORKERS + 2)
+    ]
+    try:
+        started = time.monotonic()
+        results = client.get('/api/search', params={'q': 'kingfisher'}).json()
+        assert time.monotonic() - started < 2
+        assert any(item.get('articleId') == article_id for item in results)
+    finally:
+        release.set()
+        for future in stuck:
+            future.result()
+
+
 def test_move_indent_outdent_and_relocate(client: TestClient):
     pytest.skip('Legacy HTML blocks mode is disabled; outline-first uses structure snapshots.')
 
 
+def _root_order(client: TestClient) -> list:
+    return [row['id'] for row in client.get('/api/articles').json() if row['parentId'] is None]
+
+
+def test_article_moves_write_one_row_with_fractional_positions(client: TestClient):
+    c = create_article(client, 'C')['id']
+    b = create_article(client, 'B')['id']
+    a = create_article(client, 'A')['id']
+    assert _root_order(client) == [a, b, c]
+
+    def revs():
+        rows = client.app_db.execute('SELECT id, content_rev FROM articles WHERE id = ANY(?)', ([a, b, c],)).fetchall()
+        return {row['id']: row['content_rev'] for row in rows}
+
+    before = revs()
+    resp = client.post(f'/api/articles/{c}/move-tree', json={'parentId': None, 'anchorId': a, 'placement': 'after'})
+    assert resp.status_code == 200
+    assert _root_order(client) == [a, c, b]
+    after = revs()
+    assert [aid for aid in after if after[aid] != before[aid]] == [c]
+    assert resp.json()['position'] % 1 != 0
+
+    etag = client.get(f'/api/articles/{b}').headers['ETag']
+    assert client.post(f'/api/articles/{b}/move', json={'direction': 'up'}).status_code == 200
+    assert _root_order(client) == [a, b, c]
+    # move up/down не трогает updated_at, но закэшированное тело с прежней position устарело.
+    resp = client.get(f'/api/articles/{b}', headers={'If-None-Match': etag})
+    assert resp.status_code == 200 and resp.headers['ETag'] != etag
+
+    # indent: b становится последним ребёнком a; outdent возвращает его сразу после a.
+    assert client.post(f'/api/articles/{b}/indent').json()['parentId'] == a
+    assert _root_order(client) == [a, c]
+    resp = client.post(f'/api/articles/{a}/move-tree', json={'parentId': b, 'placement': 'inside'})
+    assert resp.status_code == 400
+    assert client.post(f'/api/articles/{b}/outdent').json()['parentId'] is None
+    assert _root_order(client) == [a, b, c]
+
+    # Совпавшие позиции перенумеровываются, порядок списка сохраняется.
+    client.app_db.execute('UPDATE articles SET position = 5 WHERE id = ANY(?)', ([a, b, c],))
+    order = _root_order(client)
+    resp = client.post(f'/api/articles/{order[2]}/move-tree', json={'parentId': None, 'anchorId': order[0], 'placement': 'after'})
+    assert resp.status_code == 200
+    assert _root_order(client) == [order[0], order[2], order[1]]
+
+
+def test_article_subtree_paths_follow_moves(client: TestClient):
+    a = create_article(client, 'A')['id']
+    b = create_article(client, 'B')['id']
+    c = create_article(client, 'C')['id']
+    assert client.post(f'/api/articles/{b}/move-tree', json={'parentId': a, 'placement': 'inside'}).status_code == 200
+    assert client.post(f'/api/articles/{c}/move-tree', json={'parentId': b, 'placement': 'inside'}).status_code == 200
+
+    subtree = client.get(f'/api/articles/{a}/subtree').json()['articles']
+    assert [(row['id'], row['depth']) for row in subtree] == [(a, 0), (b, 1), (c, 2)]
+    assert [row['id'] for row in client.get(f'/api/articles/{c}/ancestors').json()['articles']] == [a, b]
+
+    # Перенос ветки b в корень переписывает пути всех её потомков.
+    assert client.post(f'/api/articles/{b}/move-tree', json={'parentId': None}).status_code == 200
+    row = client.app_db.execute('SELECT tree_path FROM articles WHERE id = ?', (c,)).fetchone()
+    assert list(row['tree_path']) == [b, c]
+    assert [row['id'] for row in client.get(f'/api/articles/{a}/subtree').json()['articles']] == [a]
+    assert client.post(f'/api/articles/{b}/move-tree', json={'parentId': c, 'placement': 'inside'}).status_code == 400
+
+    deleted = client.delete(f'/api/articles/{b}/subtree').json()
+    assert sorted(deleted['articleIds']) == sorted([b, c])
+    assert client.get(f'/api/articles/{c}').status_code == 404
+    restored = client.post(f'/api/articles/{b}/subtree/restore').json()
+    assert sorted(restored['articleIds']) == sorted([b, c])
+    assert client.get(f'/api/articles/{c}').status_code == 200
+
+    resp = client.get('/api/export/html-zip', params={'rootId': b})
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert sorted(zf.namelist()) == ['B.html', 'C.html']
+
+    assert sorted(client.delete(f'/api/articles/{b}/subtree', params={'force': 'true'}).json()['articleIds']) == sorted([b, c])
+    assert client.get(f'/api/articles/{b}/subtree', params={'includeDeleted': 'true'}).status_code == 404
+
+
+def test_child_move_sees_concurrent_parent_move(client: TestClient):
+    a = create_article(client, 'A')['id']
+    b = create_article(client, 'B')['id']
+    c = create_article(client, 'C')['id']
+
+    mover = client.app_db.engine.connect()
+    tx = mover.begin()
+    mover.exec_driver_sql('UPDATE articles SET parent_id = %s WHERE id = %s', (a, b))
+    # Перенос c под b, пока перенос b не закоммичен: триггер ждёт блокировку строки b.
+    worker = threading.Thread(
+        target=client.app_db.execute, args=('UPDATE articles SET parent_id = ? WHERE id = ?', (b, c))
+    )
+    worker.start()
+    time.sleep(0.3)
+    assert worker.is_alive()
+    tx.commit()
+    mover.close()
+    worker.join(5)
+    assert not worker.is_alive()
+
+    row = client.app_db.execute('SELECT tree_path FROM articles WHERE id = ?', (c,)).fetchone()
+    assert list(row['tree_path']) == [a, b, c]
+
+
 def test_move_block_to_other_article(client: TestClient):
     pytest.skip('Legacy HTML blocks mode is disabled; outline-first does not expose move-to-block API.')
 
@@ -159,3 +578,42 @@ def test_search_rebuild_indexes(client: TestClient):
     client.data_store.rebuild_search_indexes()
     restored = client.get('/api/search', params={'q': 'find'}).json()
     assert any(item.get('blockId') == section_id for item in restored)
+    assert client.get('/api/search/rebuild/status').status_code == 403
+    auth = importlib.import_module('servpy.app.auth')
+    admin = auth.create_user('admin', 'admin', is_superuser=True)
+    client.cookies.set(auth.SESSION_COOKIE_NAME, auth.create_session(admin.id))
+    status = client.get('/api/search/rebuild/status').json()
+    assert status['status'] == 'done'
+    assert status['processed'] == status['total']
+
+
+def test_search_rebuild_resumes_from_checkpoint(client: TestClient, monkeypatch):
+    search_rebuild = importlib.import_module('servpy.app.search_rebuild')
+    monkeypatch.setattr(search_rebuild, 'SEARCH_REBUILD_CHUNK_SIZE', 1)
+    for title in ('Resume alpha', 'Resume beta', 'Resume gamma'):
+        create_article(client, title=title)
+
+    # Падение после первого чанка: живой индекс не тронут, чекпоинт остался.
+    original_write = search_rebuild._write_articles
+    calls = {'n': 0}
+
+    def crashing_write(*args, **kwargs):
+        calls['n'] += 1
+        if calls['n'] > 1:
+            raise RuntimeError('boom')
+        return original_write(*args, **kwargs)
+
+    monkeypatch.setattr(search_rebuild, '_write_articles', crashing_write)
+    with pytest.raises(RuntimeError):
+        client.data_store.rebuild_search_indexes()
+    failed = search_rebuild.get_search_rebuild_status()
+    assert failed['status'] == 'failed'
+    assert failed['processed'] == 1
+    assert client.get('/api/search', params={'q': 'resume'}).json()
+
+    monkeypatch.setattr(search_rebuild, '_write_articles', original_write)
+    done = client.data_store.rebuild_search_indexes()
+    assert done['status'] == 'done'
+    assert done['processed'] == done['total']
+    titles = {item.get('articleTitle') for item in client.get('/api/search', params={'q': 'resume'}).json()}
+    assert {'Resume alpha', 'Resume beta', 'Resume gamma'} <= titles
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import importlib
+import time
+
+from fastapi.testclient import TestClient
+
+
+def test_session_cache_hits_and_logout_invalidates(client: TestClient):
+  auth = importlib.import_module('servpy.app.auth')
+  auth.clear_session_cache()
+  before = auth.get_session_cache_stats()
+
+  assert client.get('/api/auth/me').status_code == 200
+  assert client.get('/api/auth/me').status_code == 200
+  stats = auth.get_session_cache_stats()
+  assert stats['misses'] - before['misses'] == 1
+  assert stats['hits'] - before['hits'] >= 1
+
+  assert client.post('/api/auth/logout').status_code == 200
+  sid = client.cookies.get(auth.SESSION_COOKIE_NAME)
+  assert auth.get_user_by_session(sid) is None
+
+
+def test_session_cache_cross_worker_notify(client: TestClient, monkeypatch):
+  auth = importlib.import_module('servpy.app.auth')
+  # conftest выключает слушатель для всех тестов; здесь он и проверяется.
+  monkeypatch.setattr(auth, 'SESSION_CACHE_LISTENER', True)
+  auth.kick_session_cache_listener()
+  me = client.get('/api/auth/me')
+  assert me.status_code == 200
+  user_id = me.json()['id']
+  assert auth.get_session_cache_stats()['size'] >= 1
+
+  # Имитируем другой воркер: только NOTIFY, без локального сброса.
+  auth._notify_invalidation(f'user:{user_id}')
+  deadline = time.time() + 5
+  while time.time() < deadline and auth.get_session_cache_stats()['size']:
+    time.sleep(0.05)
+  assert auth.get_session_cache_stats()['size'] == 0
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import base64
+import importlib
+import struct
+
+from fastapi.testclient import TestClient
+
+from tests.test_api import _read_sync_changes, create_article
+
+
+def _heading(text: str) -> dict:
+  return {'type': 'outlineHeading', 'content': [{'type': 'text', 'text': text}] if text else []}
+
+
+def _body(text: str) -> dict:
+  return {'type': 'outlineBody', 'content': [{'type': 'paragraph', 'content': [{'type': 'text', 'text': text}]}]}
+
+
+def test_section_edits_are_coalesced_into_one_embedding_job(client: TestClient, monkeypatch):
+  semantic = importlib.import_module('servpy.app.semantic_search')
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  article_id = create_article(client, title='Queue')['id']
+
+  for seq, text in enumerate(['one', 'two', 'three'], start=1):
+    resp = client.put(
+      f'/api/articles/{article_id}/sections/upsert-content',
+      json={'sectionId': 'sec-q', 'headingJson': _heading(''), 'bodyJson': _body(text), 'seq': seq},
+    )
+    assert resp.status_code == 200
+
+  # Сохранение не ходит к провайдеру: в очереди одна задача с последним текстом.
+  jobs = client.app_db.execute('SELECT plain_text, rev FROM embedding_jobs WHERE block_id = ?', ('sec-q',)).fetchall()
+  assert len(jobs) == 1
+  assert 'three' in jobs[0]['plain_text'] and jobs[0]['rev'] == 3
+  assert semantic.get_embedding_queue_stats()['depth'] >= 1
+
+  batches = []
+
+  def fake_batch(texts):
+    batches.append(list(texts))
+    return [[1.0] + [0.0] * (embeddings.EMBEDDING_DIM - 1) for _ in texts]
+
+  monkeypatch.setattr(semantic, 'embed_text_batch', fake_batch)
+  assert semantic.run_embedding_jobs_once(ignore_debounce=True) >= 1
+  assert any(any('three' in t for t in batch) for batch in batches)
+
+  row = client.app_db.execute('SELECT plain_text FROM block_embeddings WHERE block_id = ?', ('sec-q',)).fetchone()
+  assert row and 'three' in row['plain_text']
+  assert client.app_db.execute('SELECT 1 FROM embedding_jobs WHERE block_id = ?', ('sec-q',)).fetchone() is None
+
+
+def test_embeddings_packed_transport_matches_json(client: TestClient):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  article_id = create_article(client, title='Packed')['id']
+  author_id = client.app_db.execute('SELECT author_id FROM articles WHERE id = ?', (article_id,)).fetchone()['author_id']
+  vec = [0.5, -0.25, 1.5] + [0.0] * (embeddings.EMBEDDING_DIM - 3)
+  client.app_db.execute(
+    'INSERT INTO block_embeddings (block_id, author_id, article_id, embedding, updated_at) VALUES (?, ?, ?, ?::vector, ?)',
+    ('sec-p', author_id, article_id, '[' + ','.join(str(v) for v in vec) + ']', '2026-01-01T00:00:00'),
+  )
+
+  plain = client.get(f'/api/articles/{article_id}/embeddings').json()
+  assert plain['embeddings'][0]['embedding'] == vec and plain['titleEmbedding'] is None
+
+  resp = client.get(f'/api/articles/{article_id}/embeddings', headers={'Accept': 'application/octet-stream'})
+  assert resp.status_code == 200 and resp.headers['X-Embeddings-Dtype'] == 'f32'
+  data = resp.content
+  assert data[:4] == b'TEMB' and struct.unpack('<BB', data[4:6]) == (2, 4)
+  # Первый кадр — заголовок статьи: пустой blockId, вектора ещё нет.
+  assert struct.unpack_from('<HHH', data, 8) == (0, 0, 0)
+  pos = 14
+  (id_len,) = struct.unpack_from('<H', data, pos)
+  assert data[pos + 2:pos + 2 + id_len] == b'sec-p'
+  pos += 2 + id_len
+  (ts_len,) = struct.unpack_from('<H', data, pos)
+  pos += 2 + ts_len
+  (dim,) = struct.unpack_from('<H', data, pos)
+  assert dim == embeddings.EMBEDDING_DIM
+  assert list(struct.unpack_from(f'<{dim}f', data, pos + 2)) == vec
+  assert len(data) == pos + 2 + 4 * dim
+
+  packed = client.get(f'/api/articles/{article_id}/embeddings', params={'format': 'f16-b64'}).json()
+  assert packed['encoding'] == 'f16-b64'
+  raw = base64.b64decode(packed['embeddings'][0]['embedding'])
+  assert list(struct.unpack(f'<{dim}e', raw)) == vec
+
+  client.app_db.execute(
+    '''
+    INSERT INTO article_embeddings (article_id, author_id, title, embedding, pending, updated_at)
+    VALUES (?, ?, 'Packed', ?::vector, FALSE, ?)
+    ON CONFLICT (article_id) DO UPDATE SET embedding = EXCLUDED.embedding, pending = FALSE
+    ''',
+    (article_id, author_id, '[' + ','.join(str(v) for v in vec) + ']', '2026-01-01T00:00:00'),
+  )
+  title = client.get(f'/api/articles/{article_id}/embeddings', params={'format': 'f32-b64'}).json()['titleEmbedding']
+  assert list(struct.unpack(f'<{dim}f', base64.b64decode(title['embedding']))) == vec
+  assert client.get(f'/api/articles/{article_id}/embeddings', params={'format': 'f64'}).status_code == 400
+
+
+def test_title_vector_reaches_sync_feed(client: TestClient, monkeypatch):
+  semantic = importlib.import_module('servpy.app.semantic_search')
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  article_id = create_article(client, title='Offline title')['id']
+  semantic.mark_article_title_embeddings([article_id], force=True)
+  _, tail = _read_sync_changes(client)
+
+  vec = [0.0, 1.0] + [0.0] * (embeddings.EMBEDDING_DIM - 2)
+  monkeypatch.setattr(semantic, 'embed_text_batch', lambda texts: [vec for _ in texts])
+  assert semantic.run_title_embeddings_once() == 1
+
+  # Вектор посчитан после снимка: статья снова в ленте, вместе с вектором заголовка.
+  records, _ = _read_sync_changes(client, tail['cursor'])
+  shipped = [r for r in records if r['type'] == 'embeddings' and r['articleId'] == article_id]
+  assert shipped and shipped[0]['titleEmbedding']['embedding'] == vec
+  assert client.get('/api/search/semantic/query-embedding').json()['titleWeight'] == semantic.get_semantic_title_weight()
+
+
+def test_embedding_cache_serves_known_texts_without_provider(client: TestClient, monkeypatch):
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  calls = []
+
+  def fake_request(texts):
+    calls.append(list(texts))
+    return [[float(len(t))] + [0.0] * (embeddings.EMBEDDING_DIM - 1) for t in texts]
+
+  monkeypatch.setattr(embeddings, '_request_embeddings', fake_request)
+  first = embeddings.embed_texts(['Alpha text', 'Beta'])
+  assert calls == [['Alpha text', 'Beta']]
+
+  # Тот же текст с другими пробелами берётся из кэша; к провайдеру уходит только новый.
+  second = embeddings.embed_texts(['Alpha   text', 'Gamma'])
+  assert calls[-1] == ['Gamma'] and len(calls) == 2
+  assert second[0].tolist() == first[0].tolist()
+  assert [v.tolist() for v in embeddings.embed_texts(['Beta', 'Gamma'])] == [first[1].tolist(), second[1].tolist()]
+  assert len(calls) == 2
+
+  # LRU: вытесняется запись, которой дольше всех не пользовались.
+  beta = embeddings.embedding_cache_key('Beta')
+  client.app_db.execute("UPDATE embedding_cache SET last_used_at = '2000-01-01T00:00:00' WHERE text_hash = ?", (beta,))
+  assert embeddings.prune_embedding_cache(max_rows=2) == 1
+  keys = {r['text_hash'] for r in client.app_db.execute('SELECT text_hash FROM embedding_cache').fetchall()}
+  assert beta not in keys and len(keys) == 2
+
+
+def test_article_rename_reembeds_only_the_title(client: TestClient, monkeypatch):
+  semantic = importlib.import_module('servpy.app.semantic_search')
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  article_id = create_article(client, title='Рецепты')['id']
+  for seq, (section_id, text) in enumerate([('sec-r1', 'борщ со сметаной'), ('sec-r2', 'пирог с яблоками')], start=1):
+    resp = client.put(
+      f'/api/articles/{article_id}/sections/upsert-content',
+      json={'sectionId': section_id, 'headingJson': _heading(''), 'bodyJson': _body(text), 'seq': seq},
+    )
+    assert resp.status_code == 200
+
+  inputs = []
+
+  def fake_request(texts):
+    inputs.extend(texts)
+    return [[1.0] + [0.0] * (embeddings.EMBEDDING_DIM - 1) for _ in texts]
+
+  monkeypatch.setattr(embeddings, '_request_embeddings', fake_request)
+  monkeypatch.setattr(embeddings, 'EMBEDDING_CACHE_MAX_ROWS', 0)
+  while semantic.run_embedding_jobs_once(ignore_debounce=True):
+    pass
+  # Секции эмбеддятся без заголовка, у статьи — отдельный вектор заголовка.
+  assert [t for t in inputs if 'Рецепты' in t] == ['Рецепты']
+  assert any('борщ' in t for t in inputs)
+  sections = client.app_db.execute(
+    'SELECT block_id, updated_at FROM block_embeddings WHERE article_id = ? ORDER BY block_id', (article_id,)
+  ).fetchall()
+  assert [r['block_id'] for r in sections] == ['sec-r1', 'sec-r2']
+
+  inputs.clear()
+  assert client.patch(f'/api/articles/{article_id}', json={'title': 'Кулинария'}).status_code == 200
+  while semantic.run_embedding_jobs_once(ignore_debounce=True):
+    pass
+  assert inputs == ['Кулинария']
+  row = client.app_db.execute('SELECT title, pending FROM article_embeddings WHERE article_id = ?', (article_id,)).fetchone()
+  assert row['title'] == 'Кулинария' and not row['pending']
+  assert client.app_db.execute(
+    'SELECT block_id, updated_at FROM block_embeddings WHERE article_id = ? ORDER BY block_id', (article_id,)
+  ).fetchall() == sections
+
+
+def test_title_embedding_failure_is_backed_off(client: TestClient, monkeypatch):
+  semantic = importlib.import_module('servpy.app.semantic_search')
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  article_id = create_article(client, title='Outage')['id']
+  semantic.mark_article_title_embeddings([article_id], force=True)
+  calls = []
+
+  def failing(texts):
+    calls.append(list(texts))
+    raise embeddings.EmbeddingsUnavailable('provider down')
+
+  monkeypatch.setattr(semantic, 'embed_text_batch', failing)
+  assert semantic.run_title_embeddings_once() == 0
+  # Следующий опрос воркера не дёргает провайдер повторно: заголовок отложен.
+  assert semantic.run_title_embeddings_once() == 0
+  assert calls == [['Outage']]
+  row = client.app_db.execute(
+    'SELECT attempts, not_before, pending, locked_until FROM article_embeddings WHERE article_id = ?', (article_id,)
+  ).fetchone()
+  assert row['attempts'] == 1 and row['pending'] and row['locked_until'] is None and row['not_before'] > '2000'
+
+  # Новый заголовок сбрасывает задержку.
+  monkeypatch.setattr(
+    semantic, 'embed_text_batch', lambda texts: [[1.0] + [0.0] * (embeddings.EMBEDDING_DIM - 1) for _ in texts]
+  )
+  assert client.patch(f'/api/articles/{article_id}', json={'title': 'Recovered'}).status_code == 200
+  assert semantic.run_title_embeddings_once() == 1
+  row = client.app_db.execute('SELECT attempts, pending FROM article_embeddings WHERE article_id = ?', (article_id,)).fetchone()
+  assert row['attempts'] == 0 and not row['pending']
+
+
+def test_semantic_ranking_mixes_section_and_title_similarity(client: TestClient, monkeypatch):
+  semantic = importlib.import_module('servpy.app.semantic_search')
+  embeddings = importlib.import_module('servpy.app.embeddings')
+  dim = embeddings.EMBEDDING_DIM
+  first = create_article(client, title='Первая')['id']
+  second = create_article(client, title='Вторая')['id']
+  author_id = client.app_db.execute('SELECT author_id FROM articles WHERE id = ?', (first,)).fetchone()['author_id']
+
+  def vec(*head):
+    return semantic._vector_param(list(head) + [0.0] * (dim - len(head)))
+
+  # Запрос = e0. sec-1: текст ровно e0, заголовок ортогонален -> 0.7 * 1 + 0.3 * 0 = 0.7.
+  # sec-2: текст ближе к e1 (cos ~0.707), заголовок = e0 -> 0.7 * 0.707 + 0.3 = ~0.795.
+  for block_id, article_id, content in (('sec-1', first, vec(1.0)), ('sec-2', second, vec(0.7071, 0.7071))):
+    client.app_db.execute(
+      'INSERT INTO block_embeddings (block_id, author_id, article_id, plain_text, embedding, updated_at) '
+      'VALUES (?, ?, ?, ?, ?::vector, ?)',
+      (block_id, author_id, article_id, block_id, content, '2026-01-01T00:00:00'),
+    )
+  for article_id, title_vec in ((first, vec(0.0, 1.0)), (second, vec(1.0))):
+    client.app_db.execute(
+      'INSERT INTO article_embeddings (article_id, author_id, title, embedding, pending, updated_at) '
+      'VALUES (?, ?, ?, ?::vector, FALSE, ?)',
+      (article_id, author_id, 't', title_vec, '2026-01-01T00:00:00'),
+    )
+  monkeypatch.setattr(semantic, 'embed_text', lambda text: [1.0] + [0.0] * (dim - 1))
+  monkeypatch.setattr(semantic, 'SEMANTIC_TITLE_WEIGHT', 0.3)
+
+  results = semantic.search_similar_blocks(author_id=author_id, query='q')
+  assert [r['blockId'] for r in results] == ['sec-2', 'sec-1']
+  assert results[0]['articleTitle'] == 'Вторая'
+  assert abs(results[1]['score'] - 0.7) < 1e-3 and abs(results[0]['score'] - 0.795) < 1e-2
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from servpy.app import outline_doc_json as odj
+
+TARGET = '0b5f1d0e-1f3a-4c4e-9a55-6f0d3c1b2a77'
+
+
+def _section(sid: str, text: str, children: list | None = None, marks: list | None = None) -> dict:
+  return {
+    'type': 'outlineSection',
+    'attrs': {'id': sid, 'collapsed': False},
+    'content': [
+      {'type': 'outlineHeading', 'content': [{'type': 'text', 'text': sid}]},
+      {
+        'type': 'outlineBody',
+        'content': [
+          {'type': 'paragraph', 'content': [{'type': 'text', 'text': text, 'marks': marks or []}]},
+          {'type': 'image', 'attrs': {'src': f'/uploads/{sid}.png', 'alt': ''}},
+        ],
+      },
+      {'type': 'outlineChildren', 'content': children or []},
+    ],
+  }
+
+
+def test_analyze_outline_doc_matches_separate_walkers():
+  link = [{'type': 'link', 'attrs': {'href': f'/article/{TARGET}'}}]
+  yandex = [{'type': 'link', 'attrs': {'href': '/api/yandex/disk/file?path=app%3A%2Fa.pdf'}}]
+  doc = {
+    'type': 'doc',
+    'content': [
+      _section('a', 'alpha', children=[_section('b', 'beta', marks=link)]),
+      _section('c', 'gamma', marks=yandex),
+    ],
+  }
+
+  analysis = odj.analyze_outline_doc(doc)
+
+  assert analysis.plain_text_map() == odj.build_outline_section_plain_text_map(doc)
+  assert analysis.fragments_map() == odj.build_outline_section_fragments_map(doc)
+  assert analysis.internal_links_map() == odj.build_outline_section_internal_links_map(doc)
+  assert analysis.internal_links_map() == {'a': set(), 'b': {TARGET}, 'c': set()}
+  assert {'/uploads/a.png', '/uploads/b.png', 'app:/a.pdf', f'/article/{TARGET}'} <= analysis.attachment_refs
+
+  # Хэш устойчив к порядку ключей и меняется только вместе с содержимым.
+  heading = doc['content'][1]['content'][0]
+  body = doc['content'][1]['content'][1]
+  assert analysis.sections['c'].content_hash == odj.outline_section_content_hash(dict(reversed(heading.items())), body)
+  changed = odj.analyze_outline_doc({'type': 'doc', 'content': [_section('c', 'gamma!')]})
+  assert changed.sections['c'].text_hash != analysis.sections['c'].text_hash
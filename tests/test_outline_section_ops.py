@@ -39,10 +39,10 @@ def test_section_upsert_seq_stale_and_history_window(client: TestClient):
     assert resp.status_code == 200
     assert resp.json().get("status") == "ok"
 
-    # Verify section exists in stored article_doc_json.
-    row = client.app_db.execute("SELECT article_doc_json FROM articles WHERE id = ?", (article_id,)).fetchone()
-    assert row and row.get("article_doc_json")
-    doc = json.loads(row["article_doc_json"])
+    # Verify section exists in (materialized) article_doc_json.
+    raw = client.data_store.materialize_article_doc_json(article_id)
+    assert raw
+    doc = json.loads(raw)
     root_content = doc.get("content") or []
     assert any(
         isinstance(n, dict) and n.get("type") == "outlineSection" and (n.get("attrs") or {}).get("id") == section_id
@@ -100,3 +100,161 @@ def test_section_upsert_seq_stale_and_history_window(client: TestClient):
     assert "hello3" in (hist4[0]["after"] or "")
     assert hist4[0]["id"] != first_entry_id
 
+
+def test_article_history_is_paginated_and_not_stored_in_row(client: TestClient):
+    created = create_article(client, title="History pages")
+    article_id = created["id"]
+    for seq, text in enumerate(["a", "b", "c"], start=1):
+        resp = client.put(
+            f"/api/articles/{article_id}/sections/upsert-content",
+            json={"sectionId": f"sec-{seq}", "headingJson": _heading(""), "bodyJson": _body(text), "seq": 1},
+        )
+        assert resp.status_code == 200
+
+    row = client.app_db.execute("SELECT history FROM articles WHERE id = ?", (article_id,)).fetchone()
+    assert row["history"] == "[]"
+
+    page1 = client.get(f"/api/articles/{article_id}/history?limit=2").json()
+    assert [e["blockId"] for e in page1["history"]] == ["sec-2", "sec-3"]
+    assert page1["nextCursor"]
+
+    page2 = client.get(f"/api/articles/{article_id}/history?limit=2&before={page1['nextCursor']}").json()
+    assert [e["blockId"] for e in page2["history"]] == ["sec-1"]
+    assert page2["nextCursor"] is None
+
+
+def test_section_upsert_writes_outline_sections_row(client: TestClient):
+    created = create_article(client, title="Per-section storage")
+    article_id = created["id"]
+    for seq, sid in enumerate(["sec-a", "sec-b"], start=1):
+        resp = client.put(
+            f"/api/articles/{article_id}/sections/upsert-content",
+            json={"sectionId": sid, "headingJson": _heading(sid), "bodyJson": _body("v1"), "seq": 1},
+        )
+        assert resp.status_code == 200
+
+    resp = client.put(
+        f"/api/articles/{article_id}/sections/upsert-content",
+        json={"sectionId": "sec-a", "headingJson": _heading("sec-a"), "bodyJson": _body("v2"), "seq": 2},
+    )
+    assert resp.status_code == 200
+
+    # Правка секции пишет строку outline_sections, а не весь документ.
+    row = client.app_db.execute(
+        "SELECT body_json FROM outline_sections WHERE article_id = ? AND section_id = ?", (article_id, "sec-a")
+    ).fetchone()
+    assert "v2" in row["body_json"]
+    flags = client.app_db.execute("SELECT sections_synced, doc_json_stale FROM articles WHERE id = ?", (article_id,)).fetchone()
+    assert flags["sections_synced"] and flags["doc_json_stale"]
+
+    doc = client.get(f"/api/articles/{article_id}").json()["docJson"]
+    assert [n["attrs"]["id"] for n in doc["content"]][-2:] == ["sec-a", "sec-b"]
+    assert "v2" in json.dumps(doc["content"][-2])
+
+    resp = client.put(f"/api/articles/{article_id}/sections/delete", json={"sectionIds": ["sec-b"]})
+    assert resp.status_code == 200
+    assert resp.json()["removedBlockIds"] == ["sec-b"]
+    doc = client.get(f"/api/articles/{article_id}").json()["docJson"]
+    assert [n["attrs"]["id"] for n in doc["content"]][-1:] == ["sec-a"]
+
+
+def _section(sid: str, text: str) -> dict:
+    return {
+        "type": "outlineSection",
+        "attrs": {"id": sid, "collapsed": False},
+        "content": [_heading(sid), _body(text), {"type": "outlineChildren", "content": []}],
+    }
+
+
+def test_doc_json_save_updates_fts_incrementally(client: TestClient, monkeypatch):
+    created = create_article(client, title="Incremental FTS")
+    article_id = created["id"]
+    doc = {"type": "doc", "content": [_section("s1", "alpha"), _section("s2", "beta"), _section("s3", "gamma")]}
+    resp = client.put(f"/api/articles/{article_id}/doc-json/save", json={"docJson": doc})
+    assert resp.status_code == 200
+
+    lemmatized: list[str] = []
+    orig_analyze = client.data_store.analyze
+    monkeypatch.setattr(client.data_store, "analyze", lambda text: lemmatized.append(text) or orig_analyze(text))
+
+    doc = {"type": "doc", "content": [_section("s1", "alpha"), _section("s2", "delta")]}
+    resp = client.put(f"/api/articles/{article_id}/doc-json/save", json={"docJson": doc})
+    assert resp.status_code == 200
+    assert len(lemmatized) == 1 and "delta" in lemmatized[0]
+
+    rows = client.app_db.execute(
+        "SELECT section_id, text FROM outline_sections_fts WHERE article_id = ? ORDER BY section_id", (article_id,)
+    ).fetchall()
+    assert [(r["section_id"], "delta" in r["text"]) for r in rows] == [("s1", False), ("s2", True)]
+
+
+def test_sync_compact_applies_batch_with_per_op_acks(client: TestClient):
+    created = create_article(client, title="Batched sync")
+    article_id = created["id"]
+
+    def upsert(op_id: str, sid: str, text: str, seq: int) -> dict:
+        return {"opId": op_id, "sectionId": sid, "headingJson": _heading(sid), "bodyJson": _body(text), "seq": seq}
+
+    resp = client.put(
+        f"/api/articles/{article_id}/sync/compact",
+        json={"upserts": [upsert("u1", "sec-a", "one", 1), upsert("u2", "sec-b", "bee", 1)]},
+    )
+    assert resp.status_code == 200
+    assert [a["result"] for a in resp.json()["upsertAcks"]] == ["ok", "ok"]
+
+    resp = client.put(
+        f"/api/articles/{article_id}/sync/compact",
+        json={
+            "deletes": [{"opId": "d1", "sectionIds": ["sec-b"]}, {"opId": "d1", "sectionIds": ["sec-a"]}],
+            "upserts": [
+                upsert("u3", "sec-a", "two", 2),
+                upsert("u4", "sec-a", "three", 3),
+                upsert("u3", "sec-a", "dup", 4),
+                upsert("u5", "sec-a", "stale", 3),
+                upsert("u6", "sec-b", "late", 2),
+                upsert("u7", "sec-c", "new", 1),
+            ],
+        },
+    )
+    assert resp.status_code == 200
+    out = resp.json()
+    assert out["deleteAcks"] == [
+        {"opId": "d1", "result": "ok", "removedBlockIds": ["sec-b"]},
+        {"opId": "d1", "result": "duplicate", "removedBlockIds": []},
+    ]
+    assert [(a["opId"], a["result"], a.get("reason")) for a in out["upsertAcks"]] == [
+        ("u3", "ok", None),
+        ("u4", "ok", None),
+        ("u3", "duplicate", None),
+        ("u5", "conflict", "stale"),
+        ("u6", "ignored", "missing"),
+        ("u7", "ok", None),
+    ]
+    assert out["upsertAcks"][3]["lastSeq"] == 3
+
+    doc = client.get(f"/api/articles/{article_id}").json()["docJson"]
+    ids = [n["attrs"]["id"] for n in doc["content"]]
+    assert ids[-2:] == ["sec-a", "sec-c"] and "sec-b" not in ids
+    assert "three" in json.dumps(doc["content"][-2])
+
+    # Правки секции в пределах окна (включая создание прошлым пакетом) — одна запись истории.
+    hist = client.get(f"/api/articles/{article_id}/blocks/sec-a/history?limit=20").json()["entries"]
+    assert len(hist) == 1
+    assert hist[0]["before"] == "" and "three" in hist[0]["after"]
+
+    rows = client.app_db.execute(
+        "SELECT section_id, text FROM outline_sections_fts WHERE article_id = ? ORDER BY section_id", (article_id,)
+    ).fetchall()
+    assert [(r["section_id"], r["text"]) for r in rows if r["section_id"].startswith("sec-")] == [
+        ("sec-a", "sec-a\nthree"),
+        ("sec-c", "sec-c\nnew"),
+    ]
+
+    # Ошибка валидации отклоняет весь пакет, ничего не применяя.
+    resp = client.put(
+        f"/api/articles/{article_id}/sync/compact",
+        json={"upserts": [upsert("u8", "sec-a", "four", 4), {"opId": "u9", "sectionId": "sec-a", "seq": 5}]},
+    )
+    assert resp.status_code == 400
+    doc = client.get(f"/api/articles/{article_id}").json()["docJson"]
+    assert "four" not in json.dumps(doc)
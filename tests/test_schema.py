@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import importlib
+
+
+def test_migrations_recorded_and_init_schema_is_noop(app_env):
+  schema = importlib.import_module('servpy.app.schema')
+  db = app_env['db']
+
+  assert schema.get_schema_version() == schema.SCHEMA_VERSION
+  # Повторный прогон ничего не применяет и не падает.
+  assert schema.run_migrations() == schema.SCHEMA_VERSION
+
+  # После старта init_schema не должен ходить в БД.
+  calls = []
+  orig = db.CONN.execute
+  db.CONN.execute = lambda *a, **kw: calls.append(a) or orig(*a, **kw)
+  try:
+    schema.init_schema()
+  finally:
+    db.CONN.execute = orig
+  assert calls == []
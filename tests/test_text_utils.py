@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from servpy.app import text_utils
+
+
+def test_analyze_tokenizes_once_and_caches_lemmas():
+  text_utils.lemmatize_token.cache_clear()
+  analysis = text_utils.analyze('Книги о книгах, КНИГАМИ')
+
+  assert analysis.tokens == ['книги', 'о', 'книгах', 'книгами']
+  assert analysis.normalized == text_utils.build_normalized_tokens('Книги о книгах, КНИГАМИ')
+  assert analysis.lemma_tokens == ['книга', 'о', 'книга', 'книга']
+  assert analysis.lemma == 'книга о книга книга'
+
+  text_utils.analyze('книги')
+  stats = text_utils.get_lemma_cache_stats()
+  assert stats['misses'] == 4 and stats['hits'] == 1